@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Address index for matching CSV sales to listing URLs.
+
+Addresses are reduced to a canonical (house number, street, ZIP) key:
+lowercased, punctuation stripped, and street suffixes and directions
+abbreviated ("North Woodward Avenue" -> "n woodward ave"). Lookups then go:
+
+1. Exact canonical key                          confidence 1.0
+2. Same house number and street, any ZIP        confidence 0.9
+3. Fuzzy: street-name trigram similarity among
+   listings with the same house number (for a
+   street without one: listings in the same ZIP,
+   else those sharing its rarest trigrams)      confidence <= 0.8
+
+House numbers must always match exactly, so "12 Main St" never matches
+"123 Main St". Every step uses hash lookups, so matching n sales against
+m listings costs O(n + m) rather than O(n * m).
+"""
+
+import math
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+
+# USPS-style abbreviations for street suffixes and directions
+STREET_ABBREVIATIONS = {
+    'street': 'st', 'avenue': 'ave', 'av': 'ave', 'road': 'rd', 'drive': 'dr',
+    'lane': 'ln', 'court': 'ct', 'boulevard': 'blvd', 'circle': 'cir',
+    'place': 'pl', 'parkway': 'pkwy', 'terrace': 'ter', 'highway': 'hwy',
+    'trail': 'trl', 'square': 'sq', 'crescent': 'cres', 'point': 'pt',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'northeast': 'ne', 'northwest': 'nw', 'southeast': 'se', 'southwest': 'sw',
+}
+
+# Minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_ZIP_RE = re.compile(r'\b(\d{5})(?:-\d{4})?\s*$')
+
+
+class AddressKey(NamedTuple):
+    """Canonical form of a street address."""
+    house_number: str
+    street: str
+    zip_code: str
+
+
+class AddressMatch(NamedTuple):
+    """Result of an address lookup."""
+    url: str
+    confidence: float    # 0.0 (no match) to 1.0 (exact)
+
+
+def normalize_street(street: str) -> Tuple[str, str]:
+    """
+    Split a street line into (house number, canonical street name).
+
+    Args:
+        street: Street line such as "971 Stratford Lane"
+
+    Returns:
+        Tuple of house number ('' if none) and normalized street name
+    """
+    tokens = _TOKEN_RE.findall(street.lower())
+    house_number = ''
+    if tokens and tokens[0][0].isdigit():
+        house_number = tokens.pop(0)
+    street_name = ' '.join(STREET_ABBREVIATIONS.get(t, t) for t in tokens)
+    return house_number, street_name
+
+
+def canonical_key(street: str, zip_code: str = '') -> AddressKey:
+    """Build the canonical key for a street line and ZIP code."""
+    house_number, street_name = normalize_street(street)
+    return AddressKey(house_number, street_name, zip_code.strip()[:5])
+
+
+def parse_full_address(address: str) -> AddressKey:
+    """
+    Parse "Street, City, ST 12345" into a canonical key.
+
+    Args:
+        address: Full single-line address
+
+    Returns:
+        AddressKey (ZIP is '' if the address has none)
+    """
+    street = address.split(',')[0]
+    zip_match = _ZIP_RE.search(address)
+    return canonical_key(street, zip_match.group(1) if zip_match else '')
+
+
+def legacy_key(address: str) -> str:
+    """Normalized full-address key used by earlier versions (lowercase, no commas)."""
+    return ' '.join(address.lower().split()).replace(',', '')
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a string, padded so short names still match."""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressIndex:
+    """
+    Listing URLs indexed by canonical address.
+
+    Also behaves as a read-only mapping from the legacy normalized address
+    key to URL, so code that used the old dict keeps working.
+    """
+
+    def __init__(self):
+        self._urls: Dict[str, str] = {}                        # legacy key -> URL
+        self._exact: Dict[AddressKey, str] = {}
+        self._by_street: Dict[Tuple[str, str], Set[str]] = {}  # (house, street) -> URLs
+        self._entries: List[Tuple[AddressKey, str]] = []
+        self._entry_grams: List[Set[str]] = []                 # entry id -> street trigrams
+        self._by_house: Dict[str, List[int]] = {}              # house number -> entry ids
+        self._by_zip: Dict[str, List[int]] = {}                # ZIP -> entry ids
+        self._grams: Dict[str, Set[int]] = {}                  # trigram -> entry ids
+
+    def add(self, address: str, url: str) -> None:
+        """
+        Index a listing.
+
+        Args:
+            address: Full address "Street, City, ST 12345"
+            url: Listing URL
+        """
+        key = parse_full_address(address)
+        self._urls[legacy_key(address)] = url
+        self._exact[key] = url
+        self._by_street.setdefault((key.house_number, key.street), set()).add(url)
+
+        entry_id = len(self._entries)
+        self._entries.append((key, url))
+        self._by_house.setdefault(key.house_number, []).append(entry_id)
+        self._by_zip.setdefault(key.zip_code, []).append(entry_id)
+        grams = trigrams(key.street)
+        self._entry_grams.append(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(entry_id)
+
+    @classmethod
+    def from_mapping(cls, address_urls: Dict[str, str]) -> 'AddressIndex':
+        """Build an index from a {full address: URL} mapping."""
+        index = cls()
+        for address, url in address_urls.items():
+            index.add(address, url)
+        return index
+
+    def match(self, street: str, zip_code: str = '') -> AddressMatch:
+        """
+        Find the listing URL for a street address.
+
+        Args:
+            street: Street line, e.g. "971 Stratford Ln"
+            zip_code: ZIP code of the sale (improves precision)
+
+        Returns:
+            AddressMatch with the URL ('' if none) and a confidence score
+        """
+        key = canonical_key(street, zip_code)
+
+        url = self._exact.get(key)
+        if url is not None:
+            return AddressMatch(url, 1.0)
+
+        same_street = self._by_street.get((key.house_number, key.street))
+        if same_street and len(same_street) == 1:
+            return AddressMatch(next(iter(same_street)), 0.9)
+
+        return self._fuzzy_match(key)
+
+    def _fuzzy_match(self, key: AddressKey) -> AddressMatch:
+        """Score candidates sharing the house number by trigram overlap."""
+        query = trigrams(key.street)
+        if key.house_number:
+            same_house = self._by_house.get(key.house_number, [])
+            best_url, best_score = self._best_match(key, query, same_house)
+        else:
+            # No house number: listings in the same ZIP first, then any
+            # listing sharing enough of the street's trigrams
+            same_zip = self._by_zip.get(key.zip_code, []) if key.zip_code else []
+            best_url, best_score = self._best_match(key, query, same_zip)
+            if best_score < FUZZY_THRESHOLD:
+                best_url, best_score = self._best_match(key, query, self._gram_candidates(query))
+
+        if best_score < FUZZY_THRESHOLD:
+            return AddressMatch('', 0.0)
+        return AddressMatch(best_url, round(0.8 * best_score, 2))
+
+    def _best_match(self, key: AddressKey, query: Set[str],
+                    candidates: List[int]) -> Tuple[str, float]:
+        """Best-scoring (URL, similarity) among candidate entries."""
+        best_url, best_score = '', 0.0
+        for entry_id in candidates:
+            entry_key, url = self._entries[entry_id]
+            grams = self._entry_grams[entry_id]
+            score = len(query & grams) / len(query | grams)
+            if key.zip_code and entry_key.zip_code == key.zip_code:
+                score = min(1.0, score + 0.1)
+            if score > best_score:
+                best_url, best_score = url, score
+        return best_url, best_score
+
+    def _gram_candidates(self, query: Set[str]) -> List[int]:
+        """
+        Entries that may reach FUZZY_THRESHOLD against a query's trigrams.
+
+        Such an entry shares at least `needed` of the query's trigrams, so
+        it shares one of the len(query) - needed + 1 rarest: only those
+        (short) postings lists are read.
+        """
+        needed = math.ceil(FUZZY_THRESHOLD * len(query))
+        rarest = sorted(query, key=lambda gram: len(self._grams.get(gram, ())))
+        found: Set[int] = set()
+        for gram in rarest[:len(query) - needed + 1]:
+            found |= self._grams.get(gram, set())
+        return sorted(found)
+
+    # Read-only mapping interface over legacy keys
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def __contains__(self, address_key: object) -> bool:
+        return address_key in self._urls
+
+    def __getitem__(self, address_key: str) -> str:
+        return self._urls[address_key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._urls)
+
+    def get(self, address_key: str, default: Optional[str] = None) -> Optional[str]:
+        return self._urls.get(address_key, default)
+
+    def items(self):
+        return self._urls.items()
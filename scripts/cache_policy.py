@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Freshness policy for cached lookups.
+
+Sits between a CacheStore and a slow fetch function and decides whether
+a cached entry can be used as-is, used while it is refreshed in the
+background, or must be fetched again:
+
+- Successful results live for `positive_ttl` seconds.
+- Lookups the source answered with "no data" or refused (e.g. blocked)
+  are cached too (as a None value) for `negative_ttl` seconds, so a
+  blocked or unknown key is not re-fetched on every run.
+- Lookups that could not reach the source at all (the fetch raised
+  FetchUnavailable) are never cached; the old entry, if any, is kept.
+- For `stale_ttl` seconds past expiry, the old entry is still returned
+  immediately while a background refresh replaces it.
+- In offline mode, only the cache is consulted, regardless of age.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from cache_store import CacheEntry, CacheStore
+
+
+DAY = 24 * 60 * 60
+
+FRESH = 'fresh'
+STALE = 'stale'
+EXPIRED = 'expired'
+
+
+class FetchUnavailable(Exception):
+    """
+    Raised by a fetch function when the source could not be asked.
+
+    Connection failures, server errors (5xx) and open circuits say nothing
+    about the key itself, so cached_fetch() caches nothing for them.
+    """
+
+
+class CachePolicy:
+    """
+    Time-to-live rules for one kind of cached lookup.
+
+    Args:
+        positive_ttl: Seconds a successful result stays fresh
+        negative_ttl: Seconds a "no data" answer stays fresh
+        stale_ttl: Extra seconds an expired entry may still be served
+            while it is refreshed in the background
+    """
+
+    def __init__(self, positive_ttl: float = 30 * DAY, negative_ttl: float = 1 * DAY,
+                 stale_ttl: float = 30 * DAY):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+
+    def freshness(self, entry: CacheEntry, now: Optional[float] = None) -> str:
+        """
+        Classify a cache entry.
+
+        Returns:
+            FRESH, STALE (serve and refresh) or EXPIRED (fetch before use)
+        """
+        now = time.time() if now is None else now
+        ttl = self.negative_ttl if entry.value is None else self.positive_ttl
+        age = now - entry.fetched_at
+        if age < ttl:
+            return FRESH
+        if age < ttl + self.stale_ttl:
+            return STALE
+        return EXPIRED
+
+
+class BackgroundRefresher:
+    """
+    Runs stale-entry refreshes on a small thread pool.
+
+    Only one refresh per key is in flight at a time.
+
+    Args:
+        workers: Maximum number of concurrent refreshes
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, token: str, fn: Callable[[], Any]) -> None:
+        """Schedule fn() unless a refresh for token is already pending."""
+        with self._lock:
+            if token in self._pending:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='cache-refresh'
+                )
+            future = self._executor.submit(fn)
+            self._pending[token] = future
+        future.add_done_callback(lambda _f: self._done(token))
+
+    def _done(self, token: str) -> None:
+        with self._lock:
+            self._pending.pop(token, None)
+
+    def wait(self) -> None:
+        """Block until all scheduled refreshes have finished."""
+        while True:
+            with self._lock:
+                futures = list(self._pending.values())
+            if not futures:
+                return
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key.
+
+    The first caller for a key runs the function; callers that arrive
+    while it is running wait for, and share, its result (or exception).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn() for key, or wait for the call already in flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+def cached_fetch(
+    store: CacheStore,
+    namespace: str,
+    key: str,
+    fetch: Callable[[], Optional[Any]],
+    policy: CachePolicy,
+    offline: bool = False,
+    refresher: Optional[BackgroundRefresher] = None
+) -> Optional[Any]:
+    """
+    Return a value for key, using the cache according to policy.
+
+    Args:
+        store: Cache store to read and write
+        namespace: Cache namespace
+        key: Cache key
+        fetch: Function that performs the real lookup (None = no data;
+            raises FetchUnavailable if the source could not be reached)
+        policy: Freshness rules
+        offline: Answer only from the cache, never call fetch
+        refresher: Where to run background refreshes of stale entries
+            (None = refresh stale entries inline)
+
+    Returns:
+        The cached or fetched value, or None if unavailable
+    """
+    entry = store.get(namespace, key)
+
+    if offline:
+        return entry.value if entry is not None else None
+
+    state = policy.freshness(entry) if entry is not None else EXPIRED
+    if state == FRESH:
+        return entry.value
+
+    def refresh() -> Optional[Any]:
+        try:
+            value = fetch()
+        except FetchUnavailable:
+            # Nothing was learned about the key; keep whatever is cached
+            return entry.value if entry is not None else None
+        # A failed refresh never replaces a good answer that is only stale
+        if value is not None or state == EXPIRED or entry.value is None:
+            try:
+                store.put(namespace, key, value)
+            except Exception:
+                pass  # Silently fail if can't write cache
+        return value
+
+    if state == STALE and refresher is not None:
+        refresher.submit(f'{namespace}:{key}', refresh)
+        return entry.value
+
+    value = refresh()
+    if value is None and entry is not None and state == STALE:
+        return entry.value
+    return value
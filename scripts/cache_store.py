@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Key/value cache stores for lookup results.
+
+Entries are grouped into namespaces (e.g. 'zip', 'crimegrade'), hold a
+JSON-serializable value, and record when they were fetched. Two stores
+are provided:
+
+- SQLiteCacheStore: persistent, WAL-mode SQLite file. Each put() is a
+  single-row upsert, so the cost of a write does not grow with the cache,
+  and several processes can share the file safely.
+- MemoryCacheStore: in-process dict, for tests and throwaway runs.
+
+Legacy whole-file JSON caches can be imported once with import_json_cache().
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Tuple
+
+
+# Bump when the table layout changes and add a step to SQLiteCacheStore._migrate
+SCHEMA_VERSION = 1
+
+
+class CacheEntry(NamedTuple):
+    """A cached value and the Unix time it was fetched."""
+    value: Any
+    fetched_at: float
+
+
+class CacheStore:
+    """Interface for namespaced key/value caches."""
+
+    def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        """Return the entry for a key, or None if it is not cached."""
+        raise NotImplementedError
+
+    def put(self, namespace: str, key: str, value: Any,
+            fetched_at: Optional[float] = None) -> None:
+        """Insert or replace one entry."""
+        raise NotImplementedError
+
+    def put_many(self, namespace: str, items: Dict[str, Any],
+                 fetched_at: Optional[float] = None) -> None:
+        """Insert or replace several entries."""
+        for key, value in items.items():
+            self.put(namespace, key, value, fetched_at)
+
+    def delete(self, namespace: str, key: str) -> None:
+        """Remove one entry if present."""
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, CacheEntry]]:
+        """Iterate over (key, entry) pairs in a namespace."""
+        raise NotImplementedError
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Read a store-level bookkeeping value."""
+        raise NotImplementedError
+
+    def set_meta(self, key: str, value: str) -> None:
+        """Write a store-level bookkeeping value."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the store."""
+
+
+class MemoryCacheStore(CacheStore):
+    """Cache store kept in a dict; contents are lost when the process exits."""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], CacheEntry] = {}
+        self._meta: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            return self._entries.get((namespace, key))
+
+    def put(self, namespace: str, key: str, value: Any,
+            fetched_at: Optional[float] = None) -> None:
+        entry = CacheEntry(value, time.time() if fetched_at is None else fetched_at)
+        with self._lock:
+            self._entries[(namespace, key)] = entry
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, CacheEntry]]:
+        with self._lock:
+            snapshot = [(k, e) for (ns, k), e in self._entries.items() if ns == namespace]
+        return iter(snapshot)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._meta.get(key)
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._meta[key] = value
+
+
+class SQLiteCacheStore(CacheStore):
+    """
+    Persistent cache in a SQLite database using write-ahead logging.
+
+    One connection is shared by all threads of a process (guarded by a
+    lock); other processes coordinate through SQLite's own file locking.
+
+    Args:
+        path: Database file path (created if missing)
+        timeout: Seconds to wait for another process's write lock
+    """
+
+    def __init__(self, path: Path, timeout: float = 30.0):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=timeout, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Create or upgrade the schema to SCHEMA_VERSION."""
+        with self._lock:
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(
+                    f"{self.path} uses cache schema v{version}, newer than supported v{SCHEMA_VERSION}"
+                )
+            if version == SCHEMA_VERSION:
+                return
+
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Re-read under the write lock in case another process migrated first
+                version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+                if version < 1:
+                    self._conn.execute('''
+                        CREATE TABLE IF NOT EXISTS entries (
+                            namespace TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            value TEXT NOT NULL,
+                            fetched_at REAL NOT NULL,
+                            PRIMARY KEY (namespace, key)
+                        )
+                    ''')
+                    self._conn.execute('''
+                        CREATE TABLE IF NOT EXISTS meta (
+                            key TEXT PRIMARY KEY,
+                            value TEXT NOT NULL
+                        )
+                    ''')
+                self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, fetched_at FROM entries WHERE namespace = ? AND key = ?',
+                (namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(json.loads(row[0]), row[1])
+
+    def put(self, namespace: str, key: str, value: Any,
+            fetched_at: Optional[float] = None) -> None:
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        with self._lock:
+            self._conn.execute(
+                '''INSERT INTO entries (namespace, key, value, fetched_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (namespace, key)
+                   DO UPDATE SET value = excluded.value, fetched_at = excluded.fetched_at''',
+                (namespace, key, json.dumps(value), fetched_at)
+            )
+
+    def put_many(self, namespace: str, items: Dict[str, Any],
+                 fetched_at: Optional[float] = None) -> None:
+        """Upsert several entries in a single transaction."""
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        rows = [(namespace, k, json.dumps(v), fetched_at) for k, v in items.items()]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    '''INSERT INTO entries (namespace, key, value, fetched_at) VALUES (?, ?, ?, ?)
+                       ON CONFLICT (namespace, key)
+                       DO UPDATE SET value = excluded.value, fetched_at = excluded.fetched_at''',
+                    rows
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+            )
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, CacheEntry]]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value, fetched_at FROM entries WHERE namespace = ? ORDER BY key',
+                (namespace,)
+            ).fetchall()
+        return ((k, CacheEntry(json.loads(v), t)) for k, v, t in rows)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                '''INSERT INTO meta (key, value) VALUES (?, ?)
+                   ON CONFLICT (key) DO UPDATE SET value = excluded.value''',
+                (key, value)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def import_json_cache(store: CacheStore, namespace: str, json_path: Path) -> int:
+    """
+    Import a legacy whole-file JSON cache into a store, once.
+
+    The import is recorded in the store's metadata, so later calls are
+    no-ops even if the JSON file is still on disk. Entries already in the
+    store are not overwritten. Imported entries are stamped with the JSON
+    file's modification time.
+
+    Args:
+        store: Destination cache store
+        namespace: Namespace to import into
+        json_path: Path to the legacy {key: value} JSON file
+
+    Returns:
+        Number of entries imported
+    """
+    marker = f'imported:{namespace}:{Path(json_path).name}'
+    if store.get_meta(marker) is not None or not Path(json_path).exists():
+        return 0
+
+    try:
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        fetched_at = Path(json_path).stat().st_mtime
+    except (json.JSONDecodeError, IOError):
+        data, fetched_at = {}, time.time()
+
+    new_items = {
+        key: value for key, value in data.items()
+        if store.get(namespace, key) is None
+    } if isinstance(data, dict) else {}
+
+    store.put_many(namespace, new_items, fetched_at)
+    store.set_meta(marker, str(time.time()))
+    return len(new_items)
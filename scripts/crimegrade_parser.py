@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Bounded-region parser for CrimeGrade.org pages.
+
+Rendered CrimeGrade pages run to several megabytes, almost all of it
+scripts, styles and map data; the grades sit in one small widget. Rather
+than running loose regexes over the whole page, parse_crimegrade_html():
+
+1. Finds the grade labels ("Overall Crime Grade", "Violent Crime",
+   "Property Crime") with a plain substring search for "crime" that stops
+   once each label has been seen; pages without labels fall back to
+   elements with a grade class.
+2. Cuts a fixed-size window around each label (REGION_BEFORE /
+   REGION_AFTER, at most MAX_REGION bytes in total).
+3. Extracts the grades from the text of those windows only, with
+   patterns whose gaps are bounded so they cannot run across markup.
+
+Work after the label scan is therefore bounded per page regardless of the
+page size. Each result carries a confidence score (0-1) reflecting how
+the overall grade was found and how many of the other fields agree.
+
+Usage:
+    python crimegrade_parser.py <page.html>                # Show parsed grades
+    python crimegrade_parser.py --bench [page.html ...]    # Compare with the full-page regexes
+"""
+
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# Bytes kept before and after each grade label
+REGION_BEFORE = 512
+REGION_AFTER = 8 * 1024
+
+# Upper bound on the markup examined after the label scan
+MAX_REGION = 64 * 1024
+
+# Confidence contributed by how the overall grade was found
+OVERALL_CONFIDENCE = {
+    'label': 0.6,      # "Overall Crime Grade: B+"
+    'widget': 0.45,    # <div class="overall-grade">B+</div>
+    'generic': 0.25,   # "Crime Grade: B+" near a label
+}
+# Confidence added by each supporting field
+VIOLENT_CONFIDENCE = 0.15
+PROPERTY_CONFIDENCE = 0.15
+DESCRIPTION_CONFIDENCE = 0.1
+
+_GRADE = r'([A-F][+-]?)(?![A-Za-z0-9])'
+
+# Words that turn a following "crime" into a grade label
+_LABEL_WORDS = {
+    'overall': 'overall',
+    'total': 'overall',
+    'violent': 'violent',
+    'property': 'property',
+}
+_LABEL_WORD_RE = re.compile(r'([a-z]+)\s*$')
+
+_TAG_RE = re.compile(r'<[^<>]{0,2000}>')
+_SPACE_RE = re.compile(r'\s+')
+
+# Field patterns, applied to the tag-stripped text of the regions. Labels
+# are case-insensitive; grades must be capital letters.
+_OVERALL_RE = re.compile(r'(?i:(?:overall|total)\s*(?:crime\s*)?grade)[:\s]{0,10}' + _GRADE)
+_VIOLENT_RE = re.compile(r'(?i:violent\s*crime(?:\s*grade)?)[^A-Za-z0-9]{0,20}' + _GRADE)
+_PROPERTY_RE = re.compile(r'(?i:property\s*crime(?:\s*grade)?)[^A-Za-z0-9]{0,20}' + _GRADE)
+_GENERIC_RE = re.compile(r'(?i:crime\s+grade)[:\s]{1,10}' + _GRADE)
+_DESCRIPTION_RE = re.compile(
+    r'(?i:crime\s+(?:rate\s+)?(?:is\s+)?(?:\d+%?\s+)?(?:lower|higher|average|below|above))[^.<]{0,160}'
+)
+
+# Applied to the raw markup of the regions
+_WIDGET_RE = re.compile(
+    r'class="[^"<>]{0,80}grade[^"<>]{0,80}"[^<>]{0,200}>\s*' + _GRADE + r'\s*<',
+    re.IGNORECASE
+)
+
+
+def find_grade_regions(html: str) -> List[Tuple[int, int]]:
+    """
+    Locate the parts of a page around the grade labels.
+
+    Args:
+        html: Rendered CrimeGrade page
+
+    Returns:
+        Sorted, non-overlapping (start, end) offsets, MAX_REGION bytes at most
+    """
+    # Substring search on a lowercased copy is far cheaper than a
+    # case-insensitive regex over megabytes of script
+    lowered = html.lower()
+    wanted = {'overall', 'violent', 'property'}
+    anchors = []
+    pos = lowered.find('crime')
+    while pos != -1 and wanted:
+        word = _LABEL_WORD_RE.search(lowered, max(0, pos - 16), pos)
+        label = _LABEL_WORDS.get(word.group(1)) if word else None
+        if label in wanted:
+            wanted.discard(label)
+            anchors.append(word.start())
+        pos = lowered.find('crime', pos + 5)
+
+    if not anchors:
+        # No labels: anchor on the first element with a grade class
+        pos = lowered.find('grade')
+        while pos != -1:
+            attr = lowered.rfind('class="', max(0, pos - 80), pos)
+            if attr != -1 and '"' not in lowered[attr + 7:pos]:
+                anchors.append(attr)
+                break
+            pos = lowered.find('grade', pos + 5)
+
+    regions: List[Tuple[int, int]] = []
+    budget = MAX_REGION
+    for anchor in sorted(anchors):
+        start = max(0, anchor - REGION_BEFORE)
+        end = min(len(html), anchor + REGION_AFTER)
+        if regions and start <= regions[-1][1]:
+            start = regions[-1][1]
+            end = max(end, start)
+        end = min(end, start + budget)
+        if end <= start:
+            continue
+        budget -= end - start
+        if regions and start == regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+        if budget <= 0:
+            break
+    return regions
+
+
+def _text(markup: str) -> str:
+    """Visible text of a markup fragment, whitespace collapsed."""
+    return _SPACE_RE.sub(' ', _TAG_RE.sub(' ', markup))
+
+
+def parse_crimegrade_html(html: str) -> Optional[Dict]:
+    """
+    Parse CrimeGrade.org HTML to extract crime grades.
+
+    Args:
+        html: Raw HTML from CrimeGrade page
+
+    Returns:
+        {
+            'overall_grade': str or None,     # A+ ... F
+            'violent_grade': str or None,
+            'property_grade': str or None,
+            'crime_description': str or None, # e.g. "crime rate is 20% lower ..."
+            'confidence': float,              # 0-1, how sure the parse is
+        }
+        or None if no grade was found
+    """
+    regions = find_grade_regions(html)
+    if not regions:
+        return None
+
+    markup = ' \n '.join(html[start:end] for start, end in regions)
+    text = _text(markup)
+
+    result = {
+        'overall_grade': None,
+        'violent_grade': None,
+        'property_grade': None,
+        'crime_description': None,
+        'confidence': 0.0,
+    }
+
+    overall_source = None
+    for source, pattern, target in (('label', _OVERALL_RE, text),
+                                     ('widget', _WIDGET_RE, markup),
+                                     ('generic', _GENERIC_RE, text)):
+        match = pattern.search(target)
+        if match:
+            result['overall_grade'] = match.group(1)
+            overall_source = source
+            break
+
+    violent = _VIOLENT_RE.search(text)
+    if violent:
+        result['violent_grade'] = violent.group(1)
+
+    property_match = _PROPERTY_RE.search(text)
+    if property_match:
+        result['property_grade'] = property_match.group(1)
+
+    description = _DESCRIPTION_RE.search(text)
+    if description:
+        result['crime_description'] = description.group(0).strip()
+
+    if not (result['overall_grade'] or result['violent_grade'] or result['property_grade']):
+        return None
+
+    confidence = OVERALL_CONFIDENCE.get(overall_source, 0.0)
+    if result['violent_grade']:
+        confidence += VIOLENT_CONFIDENCE
+    if result['property_grade']:
+        confidence += PROPERTY_CONFIDENCE
+    if result['crime_description']:
+        confidence += DESCRIPTION_CONFIDENCE
+    result['confidence'] = round(min(confidence, 1.0), 2)
+
+    return result
+
+
+# Benchmark ----------------------------------------------------------------
+
+def _regex_parse(html: str) -> Optional[Dict]:
+    """The full-page regex parser this module replaced, for comparison."""
+    result = dict.fromkeys(['overall_grade', 'violent_grade', 'property_grade', 'crime_description'])
+    for pattern in (r'(?:overall|total)\s*(?:crime)?\s*grade[:\s]*([A-F][+-]?)',
+                    r'<[^>]*class="[^"]*grade[^"]*"[^>]*>([A-F][+-]?)</[^>]*>',
+                    r'(?:crime\s+)?grade[:\s]+([A-F][+-]?)'):
+        match = re.search(pattern, html, re.IGNORECASE)
+        if match:
+            result['overall_grade'] = match.group(1).upper()
+            break
+    for key, pattern in (('violent_grade', r'violent\s*crime[^A-F]*([A-F][+-]?)'),
+                         ('property_grade', r'property\s*crime[^A-F]*([A-F][+-]?)')):
+        match = re.search(pattern, html, re.IGNORECASE)
+        if match:
+            result[key] = match.group(1).upper()
+    match = re.search(r'crime\s+(?:rate\s+)?(?:is\s+)?(\d+%?\s+)?(?:lower|higher|average|below|above)[^.]*',
+                      html, re.IGNORECASE)
+    if match:
+        result['crime_description'] = match.group(0).strip()
+    return result if any(result[k] for k in ('overall_grade', 'violent_grade', 'property_grade')) else None
+
+
+def synthetic_page(size_mb: float = 3.0, seed: int = 1) -> str:
+    """A rendered-page stand-in: megabytes of script and map data around a small grade widget."""
+    import random
+
+    rng = random.Random(seed)
+    chunk = ''.join(
+        f'var p{i}={{lat:{rng.uniform(41, 43):.5f},lng:{rng.uniform(-84, -82):.5f},'
+        f'tile:"{rng.getrandbits(64):016x}"}};'
+        for i in range(2000)
+    )
+    script = f'<script>{chunk * max(1, int(size_mb * 1024 * 1024 / 2 / len(chunk)))}</script>'
+    widget = '''<div class="grade-card">
+  <h2>Overall Crime Grade</h2><div class="overall-grade">B+</div>
+  <p>The crime rate is 23% lower than the national average.</p>
+  <div class="row"><span>Violent Crime</span><span class="grade">A-</span></div>
+  <div class="row"><span>Property Crime</span><span class="grade">C</span></div>
+</div>'''
+    return (f'<html><head><title>Crime Grade for 48009 | CrimeGrade.org</title>{script}</head>'
+            f'<body><nav>{"<a href=/z>ZIP</a>" * 500}</nav>{widget}{script}</body></html>')
+
+
+def benchmark(pages: List[str], rounds: int = 5) -> None:
+    """Time parse_crimegrade_html against the full-page regexes."""
+    total_bytes = sum(len(page) for page in pages)
+
+    start = time.process_time()
+    for _ in range(rounds):
+        for page in pages:
+            _regex_parse(page)
+    regex_time = (time.process_time() - start) / (rounds * len(pages))
+
+    start = time.process_time()
+    for _ in range(rounds):
+        for page in pages:
+            parse_crimegrade_html(page)
+    region_time = (time.process_time() - start) / (rounds * len(pages))
+
+    print(f"Pages: {len(pages)} (avg {total_bytes / len(pages) / 1024 / 1024:.1f} MiB)")
+    print(f"Full-page regexes: {regex_time * 1000:.1f} ms CPU per page")
+    print(f"Bounded regions:   {region_time * 1000:.1f} ms CPU per page")
+    print(f"Speedup:           {regex_time / region_time:.1f}x")
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) < 2:
+        print("Usage: python crimegrade_parser.py <page.html>")
+        print("       python crimegrade_parser.py --bench [page.html ...]")
+        print("\nWith no pages, --bench uses synthetic 3 MiB rendered pages.")
+        sys.exit(1)
+
+    if sys.argv[1] == '--bench':
+        paths = sys.argv[2:]
+        if paths:
+            pages = [Path(p).read_text(encoding='utf-8', errors='replace') for p in paths]
+        else:
+            pages = [synthetic_page(3.0, seed) for seed in range(3)]
+        benchmark(pages)
+        return
+
+    result = parse_crimegrade_html(Path(sys.argv[1]).read_text(encoding='utf-8', errors='replace'))
+    if result is None:
+        print("No crime grades found")
+        sys.exit(1)
+    for key, value in result.items():
+        print(f"{key:18s} {value}")
+
+
+if __name__ == "__main__":
+    main()
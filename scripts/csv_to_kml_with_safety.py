@@ -8,376 +8,68 @@ Extends the enhanced KML converter to include:
 - Safety info in placemark descriptions
 - Sorting options by safety rating
 
+Rendering is done by kml_engine with the safety layout. The CSV is read
+twice, both times as a stream: once to collect ZIP codes for the rating
+lookups, then again to write the placemarks. With --incremental, only
+sales whose row or neighborhood rating changed since the last run are
+re-rendered (see kml_incremental). With --geocode, placemarks carry
+<Point> coordinates from geocoder.py.
+
 Usage:
-    python csv_to_kml_with_safety.py <csv> <markdown> [output.kml] [--sort-by-safety]
+    python csv_to_kml_with_safety.py <csv> <markdown> [output.kml] [--sort-by-safety] [--offline] [--kmz] [--incremental] [--geocode]
 """
 
-import csv
-import re
 import sys
 from pathlib import Path
-from typing import Dict, List, Tuple, Set
-from xml.sax.saxutils import escape
+from typing import List, Tuple
+
+from geocoder import geocode_sales
+from kml_engine import (
+    SAFETY_LEVELS,
+    SafetyLayout,
+    iter_csv_data,
+    iter_records,
+    parse_markdown_urls
+)
+from kml_incremental import IncrementalBuild
+from kml_writer import KMLWriter
+from sale_table import SaleTable
+from sales import Sale
 
 # Import neighborhood lookup module
 from neighborhood_lookup import (
-    get_neighborhood_rating,
-    format_rating_for_display,
-    get_rating_emoji
+    batch_lookup,
+    get_rating_emoji,
+    is_offline,
+    set_offline
 )
 
 
-# Icon URLs for different discount levels
-DISCOUNT_ICONS = {
-    '50%': 'http://maps.google.com/mapfiles/kml/paddle/red-stars.png',
-    '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/orange-circle.png',
-    'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/blu-circle.png',
-}
-
-# Icon URLs for neighborhood safety ratings
-SAFETY_ICONS = {
-    'excellent': 'http://maps.google.com/mapfiles/kml/paddle/grn-circle.png',
-    'good': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-circle.png',
-    'fair': 'http://maps.google.com/mapfiles/kml/paddle/ylw-circle.png',
-    'below_average': 'http://maps.google.com/mapfiles/kml/paddle/orange-circle.png',
-    'poor': 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png',
-}
-
-# Combined icons: safety outer, discount marker
-# Format: safety_rating -> discount_level -> icon
-COMBINED_ICONS = {
-    'excellent': {
-        '50%': 'http://maps.google.com/mapfiles/kml/paddle/grn-stars.png',
-        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/grn-diamond.png',
-        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/grn-circle.png',
-    },
-    'good': {
-        '50%': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-stars.png',
-        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-diamond.png',
-        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-circle.png',
-    },
-    'fair': {
-        '50%': 'http://maps.google.com/mapfiles/kml/paddle/ylw-stars.png',
-        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/ylw-diamond.png',
-        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/ylw-circle.png',
-    },
-    'below_average': {
-        '50%': 'http://maps.google.com/mapfiles/kml/paddle/orange-stars.png',
-        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/orange-diamond.png',
-        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/orange-circle.png',
-    },
-    'poor': {
-        '50%': 'http://maps.google.com/mapfiles/kml/paddle/red-stars.png',
-        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/red-diamond.png',
-        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png',
-    },
-}
-
-
-def parse_markdown_urls(markdown_path: Path) -> Dict[str, str]:
+def collect_locations(csv_path: Path) -> Tuple[int, List[Sale]]:
     """
-    Parse markdown file to extract URLs mapped by address.
+    Scan the CSV for the locations that need neighborhood ratings.
 
     Args:
-        markdown_path: Path to the markdown details file
-
-    Returns:
-        Dictionary mapping normalized addresses to their URLs
-    """
-    address_urls = {}
-
-    with open(markdown_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    sections = re.split(r'###\s+\d+\.', content)
-
-    for section in sections[1:]:
-        url_match = re.search(r'\]\((https://[^\)]+)\)', section)
-        if url_match:
-            url = url_match.group(1)
-            addr_match = re.search(r'\*\*Address:\*\*\s+([^\n]+)', section)
-            if addr_match:
-                address = addr_match.group(1).strip()
-                address_key = ' '.join(address.lower().split()).replace(',', '')
-                address_urls[address_key] = url
-
-    return address_urls
-
-
-def find_url_for_sale(sale: Dict[str, str], address_urls: Dict[str, str]) -> str:
-    """Find the URL for a sale by matching its address."""
-    full_address = f"{sale['Address']}, {sale['City']}, {sale['State']} {sale['ZIP']}"
-    address_key = ' '.join(full_address.lower().split()).replace(',', '')
-
-    if address_key in address_urls:
-        return address_urls[address_key]
-
-    street_key = ' '.join(sale['Address'].lower().split())
-    for addr, url in address_urls.items():
-        if street_key in addr:
-            return url
-
-    return ""
-
-
-def parse_days(description: str) -> Set[str]:
-    """Extract which days a sale is open from the description."""
-    days = set()
-    desc_lower = description.lower()
-
-    if re.search(r'\bfri\b', desc_lower):
-        days.add('Friday')
-    if re.search(r'\bsat\b', desc_lower):
-        days.add('Saturday')
-    if re.search(r'\bsun\b', desc_lower):
-        days.add('Sunday')
-
-    return days
-
-
-def parse_discount_level(description: str) -> str:
-    """Extract the maximum discount level from the description."""
-    if re.search(r'50%\s*off', description, re.IGNORECASE):
-        return '50%'
-    if re.search(r'(25|30)%\s*off', description, re.IGNORECASE):
-        return '25-30%'
-    return 'no_discount'
-
-
-def get_discount_for_day(description: str, day: str) -> str:
-    """Get the discount level specifically for a given day."""
-    day_abbr = {
-        'Friday': r'\bFri\b',
-        'Saturday': r'\bSat\b',
-        'Sunday': r'\bSun\b'
-    }
-
-    lines = description.split(',')
-    for line in lines:
-        if re.search(day_abbr[day], line, re.IGNORECASE):
-            if re.search(r'50%\s*off', line, re.IGNORECASE):
-                return '50%'
-            if re.search(r'(25|30)%\s*off', line, re.IGNORECASE):
-                return '25-30%'
-
-    return parse_discount_level(description)
-
-
-def create_snippet(description: str, days: Set[str], neighborhood: Dict) -> str:
-    """
-    Create a short snippet for list view including safety info.
-
-    Args:
-        description: Full sale description
-        days: Set of days the sale is open
-        neighborhood: Neighborhood rating data
-
-    Returns:
-        Snippet text with safety and discount info
-    """
-    discount = parse_discount_level(description)
-    discount_text = ""
-    if discount == '50%':
-        discount_text = "50% OFF"
-    elif discount == '25-30%':
-        discount_text = "25-30% OFF"
-
-    # Safety indicator
-    safety_emoji = get_rating_emoji(neighborhood['rating'])
-
-    # Format days
-    day_abbr = []
-    if 'Friday' in days:
-        day_abbr.append('Fri')
-    if 'Saturday' in days:
-        day_abbr.append('Sat')
-    if 'Sunday' in days:
-        day_abbr.append('Sun')
-    days_text = ', '.join(day_abbr)
-
-    parts = [p for p in [safety_emoji, discount_text, days_text] if p]
-    return ' | '.join(parts)
-
-
-def create_kml_header(include_safety_styles: bool = True) -> str:
-    """Create KML header with proper XML declaration and styling."""
-    header = '''<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-  <Document>
-    <name>Estate Sales with Safety Ratings</name>
-    <description>Estate sales color-coded by neighborhood quality and discount level</description>
-
-'''
-
-    # Add combined styles for all safety/discount combinations
-    for safety, discounts in COMBINED_ICONS.items():
-        for discount, icon_url in discounts.items():
-            style_id = f"{safety}_{discount.replace('%', 'pct').replace('-', '_')}"
-            header += f'''    <Style id="{style_id}">
-      <IconStyle>
-        <Icon>
-          <href>{icon_url}</href>
-        </Icon>
-      </IconStyle>
-    </Style>
-'''
-
-    return header
-
-
-def create_placemark(sale: Dict[str, str], url: str, discount_level: str, neighborhood: Dict) -> str:
-    """
-    Create a KML placemark for an estate sale with safety info.
-
-    Args:
-        sale: Dictionary containing sale data
-        url: URL to the estate sale website
-        discount_level: Discount level for style selection
-        neighborhood: Neighborhood rating data
-
-    Returns:
-        KML placemark string
-    """
-    name = escape(sale['Name'])
-    description = escape(sale['Description'])
-    address = escape(f"{sale['Address']}, {sale['City']}, {sale['State']} {sale['ZIP']}")
-
-    desc_parts = description.split('|')
-    times = desc_parts[0].strip() if len(desc_parts) > 0 else description
-    notes = desc_parts[1].strip() if len(desc_parts) > 1 else ""
-
-    days = parse_days(sale['Description'])
-    snippet = create_snippet(sale['Description'], days, neighborhood)
-
-    # Safety rating info
-    safety_rating = neighborhood['rating'].replace('_', ' ').title()
-    safety_score = neighborhood['score']
-    safety_desc = neighborhood['description']
-    estimated_income = neighborhood['estimated_income']
-
-    # Create CDATA section for HTML content
-    if url:
-        html_description = f'''<![CDATA[
-<h3><a href="{url}" target="_blank">{name}</a></h3>
-<p><strong>Neighborhood:</strong> {safety_rating} ({safety_score}/10)</p>
-<p style="color: #666; font-size: 0.9em;">{safety_desc}</p>
-<p><strong>Hours:</strong> {times}</p>'''
-    else:
-        html_description = f'''<![CDATA[
-<h3>{name}</h3>
-<p><strong>Neighborhood:</strong> {safety_rating} ({safety_score}/10)</p>
-<p style="color: #666; font-size: 0.9em;">{safety_desc}</p>
-<p><strong>Hours:</strong> {times}</p>'''
-
-    if notes:
-        html_description += f'''
-<p><strong>Notes:</strong> {notes}</p>'''
-    html_description += '''
-]]>'''
-
-    # Determine style based on safety and discount level
-    safety = neighborhood['rating']
-    style_id = f"{safety}_{discount_level.replace('%', 'pct').replace('-', '_')}"
-
-    placemark = f'''      <Placemark>
-        <name>{name}</name>
-        <Snippet maxLines="1">{snippet}</Snippet>
-        <description>{html_description}</description>
-        <styleUrl>#{style_id}</styleUrl>
-        <address>{address}</address>
-      </Placemark>
-'''
-
-    return placemark
-
-
-def organize_sales(
-    sales: List[Dict[str, str]],
-    address_urls: Dict[str, str],
-    sort_by_safety: bool = False
-) -> Dict:
-    """
-    Organize sales with neighborhood data.
-
-    Args:
-        sales: List of sale dictionaries
-        address_urls: Dictionary of URLs by address
-        sort_by_safety: If True, organize by safety first, then day
+        csv_path: Path to input CSV file
 
     Returns:
-        Nested dictionary with sales organized by category
+        Tuple of (number of sales, first sale seen for each ZIP code)
     """
-    # Get neighborhood ratings for all unique ZIP codes
-    zip_ratings = {}
-    for sale in sales:
-        zip_code = sale['ZIP']
-        if zip_code not in zip_ratings:
-            zip_ratings[zip_code] = get_neighborhood_rating(
-                zip_code, sale['State'], sale['City']
-            )
-
-    if sort_by_safety:
-        # Organization: Safety -> Day -> Discount -> Sales
-        safety_levels = ['excellent', 'good', 'fair', 'below_average', 'poor']
-        organization = {
-            safety: {
-                'Friday': {'50%': [], '25-30%': [], 'no_discount': []},
-                'Saturday': {'50%': [], '25-30%': [], 'no_discount': []},
-                'Sunday': {'50%': [], '25-30%': [], 'no_discount': []}
-            }
-            for safety in safety_levels
-        }
-
-        for sale in sales:
-            url = find_url_for_sale(sale, address_urls)
-            days = parse_days(sale['Description'])
-            neighborhood = zip_ratings[sale['ZIP']]
-            safety = neighborhood['rating']
-
-            for day in days:
-                if day in organization[safety]:
-                    discount = get_discount_for_day(sale['Description'], day)
-                    if discount not in organization[safety][day]:
-                        discount = 'no_discount'
-                    organization[safety][day][discount].append((sale, url, neighborhood))
-
-        return {'type': 'by_safety', 'data': organization, 'zip_ratings': zip_ratings}
-
-    else:
-        # Organization: Day -> Discount -> Sales (original structure, with neighborhood added)
-        organization = {
-            'Friday': {'50%': [], '25-30%': [], 'no_discount': []},
-            'Saturday': {'50%': [], '25-30%': [], 'no_discount': []},
-            'Sunday': {'50%': [], '25-30%': [], 'no_discount': []}
-        }
-
-        for sale in sales:
-            url = find_url_for_sale(sale, address_urls)
-            days = parse_days(sale['Description'])
-            neighborhood = zip_ratings[sale['ZIP']]
-
-            for day in days:
-                if day in organization:
-                    discount = get_discount_for_day(sale['Description'], day)
-                    if discount not in organization[day]:
-                        discount = 'no_discount'
-                    organization[day][discount].append((sale, url, neighborhood))
-
-        return {'type': 'by_day', 'data': organization, 'zip_ratings': zip_ratings}
-
-
-def create_kml_footer() -> str:
-    """Create KML footer."""
-    return '''  </Document>
-</kml>
-'''
+    sale_count = 0
+    by_zip = {}
+    for sale in iter_csv_data(csv_path):
+        sale_count += 1
+        by_zip.setdefault(sale.zip_code, sale)
+    return sale_count, list(by_zip.values())
 
 
 def convert_csv_to_kml_with_safety(
     csv_path: Path,
     markdown_path: Path,
     output_path: Path,
-    sort_by_safety: bool = False
+    sort_by_safety: bool = False,
+    incremental: bool = False,
+    geocode: bool = False
 ) -> None:
     """
     Convert CSV estate sale data to KML with neighborhood safety ratings.
@@ -385,118 +77,46 @@ def convert_csv_to_kml_with_safety(
     Args:
         csv_path: Path to input CSV file
         markdown_path: Path to markdown details file
-        output_path: Path to output KML file
+        output_path: Path to output KML (or .kmz) file
         sort_by_safety: If True, organize folders by safety rating first
+        incremental: Re-render only sales changed since the last build
+        geocode: Add <Point> coordinates from the geocoder (cached answers
+            only when offline)
     """
     print(f"Reading URLs from {markdown_path}...")
     address_urls = parse_markdown_urls(markdown_path)
     print(f"Found {len(address_urls)} URLs in markdown file")
 
     print(f"Reading sales data from {csv_path}...")
-    sales = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['Name']:
-                sales.append(row)
-    print(f"Found {len(sales)} sales in CSV file")
+    sale_count, locations = collect_locations(csv_path)
+    print(f"Found {sale_count} sales in CSV file")
 
     print(f"Looking up neighborhood ratings...")
-    organized = organize_sales(sales, address_urls, sort_by_safety)
-
-    print(f"Generating KML file with safety ratings at {output_path}...")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(create_kml_header())
-
-        if organized['type'] == 'by_safety':
-            # Safety -> Day -> Discount structure
-            safety_names = {
-                'excellent': 'Excellent Areas (Safe, Upscale)',
-                'good': 'Good Areas (Nice Suburbs)',
-                'fair': 'Fair Areas (Average)',
-                'below_average': 'Below Average Areas (Use Caution)',
-                'poor': 'Poor Areas (Be Aware)'
-            }
-
-            for safety in ['excellent', 'good', 'fair', 'below_average', 'poor']:
-                safety_data = organized['data'][safety]
-                total_in_safety = sum(
-                    len(safety_data[day][disc])
-                    for day in safety_data
-                    for disc in safety_data[day]
-                )
-
-                if total_in_safety == 0:
-                    continue
-
-                f.write(f'    <Folder>\n')
-                f.write(f'      <name>{safety_names[safety]}</name>\n')
-
-                for day in ['Friday', 'Saturday', 'Sunday']:
-                    total_in_day = sum(len(safety_data[day][d]) for d in safety_data[day])
-                    if total_in_day == 0:
-                        continue
-
-                    f.write(f'      <Folder>\n')
-                    f.write(f'        <name>{day}</name>\n')
-
-                    for discount_level in ['50%', '25-30%', 'no_discount']:
-                        sales_list = safety_data[day][discount_level]
-                        if not sales_list:
-                            continue
-
-                        folder_name = {
-                            '50%': '50% Off',
-                            '25-30%': '25-30% Off',
-                            'no_discount': 'No Discount'
-                        }[discount_level]
-
-                        f.write(f'        <Folder>\n')
-                        f.write(f'          <name>{folder_name}</name>\n')
-
-                        for sale, url, neighborhood in sales_list:
-                            f.write(create_placemark(sale, url, discount_level, neighborhood))
-
-                        f.write(f'        </Folder>\n')
-
-                    f.write(f'      </Folder>\n')
-
-                f.write(f'    </Folder>\n')
-
-        else:
-            # Day -> Discount structure (with safety in each placemark)
-            for day in ['Friday', 'Saturday', 'Sunday']:
-                f.write(f'    <Folder>\n')
-                f.write(f'      <name>{day} Sales</name>\n')
-
-                for discount_level in ['50%', '25-30%', 'no_discount']:
-                    sales_list = organized['data'][day][discount_level]
-
-                    if sales_list:
-                        folder_name = {
-                            '50%': '50% Off',
-                            '25-30%': '25-30% Off',
-                            'no_discount': 'No Discount'
-                        }[discount_level]
-
-                        f.write(f'      <Folder>\n')
-                        f.write(f'        <name>{folder_name}</name>\n')
-
-                        # Sort by safety rating within discount level
-                        safety_order = {'excellent': 0, 'good': 1, 'fair': 2, 'below_average': 3, 'poor': 4}
-                        sales_list_sorted = sorted(
-                            sales_list,
-                            key=lambda x: safety_order.get(x[2]['rating'], 5)
-                        )
-
-                        for sale, url, neighborhood in sales_list_sorted:
-                            f.write(create_placemark(sale, url, discount_level, neighborhood))
-
-                        f.write(f'      </Folder>\n')
+    # Get neighborhood ratings for all unique ZIP codes
+    zip_ratings = batch_lookup(locations)
 
-                f.write(f'    </Folder>\n')
+    geocoder = None
+    if geocode:
+        print("Geocoding sales...")
+        geocoder = geocode_sales(iter_csv_data(csv_path), offline=is_offline())
 
-        f.write(create_kml_footer())
+    print(f"Generating KML file with safety ratings at {output_path}...")
+    layout = SafetyLayout(sort_by_safety, rating_emoji=get_rating_emoji)
+    table = SaleTable()
+    if incremental:
+        with IncrementalBuild(layout, output_path, address_urls) as writer:
+            for sale in iter_csv_data(csv_path):
+                neighborhood = zip_ratings.get(sale.zip_code)
+                location = geocoder.point(sale) if geocoder else None
+                writer.add_sale(sale, neighborhood, location)
+                table.add(sale, neighborhood, location)
+        print(f"  {writer.summary()}")
+    else:
+        with KMLWriter(layout, output_path) as writer:
+            for record in iter_records(iter_csv_data(csv_path), address_urls, zip_ratings, geocoder):
+                writer.add(record)
+                table.add(record.sale, record.neighborhood, record.location)
+    safety_counts = table.count_by('safety')
 
     # Print statistics
     print(f"\n{'='*60}")
@@ -506,16 +126,10 @@ def convert_csv_to_kml_with_safety(
 
     # Safety distribution
     print(f"\nNeighborhood Safety Distribution:")
-    zip_ratings = organized['zip_ratings']
-    safety_counts = {}
-    for sale in sales:
-        rating = zip_ratings[sale['ZIP']]['rating']
-        safety_counts[rating] = safety_counts.get(rating, 0) + 1
-
-    for safety in ['excellent', 'good', 'fair', 'below_average', 'poor']:
-        count = safety_counts.get(safety, 0)
+    for safety in SAFETY_LEVELS:
+        count = safety_counts.get((safety,), 0)
         if count > 0:
-            pct = count / len(sales) * 100
+            pct = count / writer.records_written * 100
             emoji = get_rating_emoji(safety)
             print(f"  {emoji} {safety.replace('_', ' ').title()}: {count} ({pct:.0f}%)")
 
@@ -528,9 +142,13 @@ def convert_csv_to_kml_with_safety(
 def main():
     """Main entry point."""
     if len(sys.argv) < 3:
-        print("Usage: python csv_to_kml_with_safety.py <csv> <markdown> [output.kml] [--sort-by-safety]")
+        print("Usage: python csv_to_kml_with_safety.py <csv> <markdown> [output.kml] [--sort-by-safety] [--offline] [--kmz] [--incremental] [--geocode]")
         print("\nOptions:")
         print("  --sort-by-safety  Organize folders by safety rating first, then by day")
+        print("  --offline         Use cached neighborhood data only (no network)")
+        print("  --kmz             Write a compressed KMZ file instead of plain KML")
+        print("  --incremental     Re-render only sales changed since the last build")
+        print("  --geocode         Add coordinates to placemarks (see geocoder.py)")
         print("\nExample:")
         print("  python csv_to_kml_with_safety.py sales.csv details.md output.kml")
         print("  python csv_to_kml_with_safety.py sales.csv details.md --sort-by-safety")
@@ -541,6 +159,7 @@ def main():
 
     # Parse remaining arguments
     sort_by_safety = '--sort-by-safety' in sys.argv
+    set_offline('--offline' in sys.argv)
     output_path = None
 
     for arg in sys.argv[3:]:
@@ -551,6 +170,9 @@ def main():
         suffix = '_with_safety' if not sort_by_safety else '_by_safety'
         output_path = csv_path.with_stem(csv_path.stem + suffix).with_suffix('.kml')
 
+    if '--kmz' in sys.argv:
+        output_path = output_path.with_suffix('.kmz')
+
     # Validate input files
     if not csv_path.exists():
         print(f"Error: CSV file not found: {csv_path}")
@@ -561,7 +183,8 @@ def main():
         sys.exit(1)
 
     try:
-        convert_csv_to_kml_with_safety(csv_path, markdown_path, output_path, sort_by_safety)
+        convert_csv_to_kml_with_safety(csv_path, markdown_path, output_path, sort_by_safety,
+                                       '--incremental' in sys.argv, '--geocode' in sys.argv)
     except Exception as e:
         print(f"Error: {e}")
         import traceback
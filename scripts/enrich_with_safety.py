@@ -6,22 +6,53 @@ Adds neighborhood quality information to each sale based on ZIP code.
 Outputs an enriched CSV and a summary report.
 
 Usage:
-    python enrich_with_safety.py <input.csv> [output.csv]
+    python enrich_with_safety.py <input.csv> [output.csv] [--offline]
 """
 
 import csv
 import sys
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Optional
 
 from neighborhood_lookup import (
-    get_neighborhood_rating,
+    batch_lookup,
     format_rating_for_display,
-    get_rating_emoji
+    get_rating_emoji,
+    set_offline
 )
+from sale_table import SaleTable
+from sales import CSV_COLUMNS, load_sales
 
 
-def enrich_csv_with_safety(input_path: Path, output_path: Path) -> List[Dict]:
+SAFETY_COLUMNS = ['Safety_Rating', 'Safety_Score', 'Est_Median_Income', 'Safety_Note']
+
+
+def safety_columns(rating: Optional[Dict]) -> Dict[str, str]:
+    """
+    Safety column values for a neighborhood rating.
+
+    Args:
+        rating: Rating from batch_lookup, or None if the ZIP was not found
+
+    Returns:
+        Dictionary with one value per SAFETY_COLUMNS entry
+    """
+    if rating is None:
+        return {
+            'Safety_Rating': 'Unknown',
+            'Safety_Score': '0',
+            'Est_Median_Income': '0',
+            'Safety_Note': 'ZIP code not found',
+        }
+    return {
+        'Safety_Rating': rating['rating'].replace('_', ' ').title(),
+        'Safety_Score': str(rating['score']),
+        'Est_Median_Income': str(rating['estimated_income']),
+        'Safety_Note': rating['description'],
+    }
+
+
+def enrich_csv_with_safety(input_path: Path, output_path: Path) -> SaleTable:
     """
     Add neighborhood safety columns to a CSV file.
 
@@ -30,79 +61,50 @@ def enrich_csv_with_safety(input_path: Path, output_path: Path) -> List[Dict]:
         output_path: Path to output enriched CSV file
 
     Returns:
-        List of enriched sale dictionaries
+        SaleTable of the sales with their neighborhood ratings
     """
     print(f"Reading sales from {input_path}...")
-
-    # Read original CSV
-    sales = []
-    with open(input_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        original_fieldnames = reader.fieldnames
-        for row in reader:
-            if row.get('Name'):
-                sales.append(row)
+    sales = load_sales(input_path)
 
     print(f"Found {len(sales)} sales")
     print(f"Looking up neighborhood ratings...")
 
-    # Cache ratings by ZIP code
-    zip_ratings = {}
-    for sale in sales:
-        zip_code = sale.get('ZIP', '')
-        if zip_code and zip_code not in zip_ratings:
-            rating = get_neighborhood_rating(
-                zip_code,
-                sale.get('State', ''),
-                sale.get('City', '')
-            )
-            zip_ratings[zip_code] = rating
-
-    # Enrich each sale
-    enriched_sales = []
-    for sale in sales:
-        zip_code = sale.get('ZIP', '')
-        if zip_code and zip_code in zip_ratings:
-            rating = zip_ratings[zip_code]
-            sale['Safety_Rating'] = rating['rating'].replace('_', ' ').title()
-            sale['Safety_Score'] = str(rating['score'])
-            sale['Est_Median_Income'] = str(rating['estimated_income'])
-            sale['Safety_Note'] = rating['description']
-        else:
-            sale['Safety_Rating'] = 'Unknown'
-            sale['Safety_Score'] = '0'
-            sale['Est_Median_Income'] = '0'
-            sale['Safety_Note'] = 'ZIP code not found'
-
-        enriched_sales.append(sale)
+    # Look up each unique ZIP code once
+    zip_ratings = batch_lookup(sales)
 
     # Write enriched CSV
-    new_fieldnames = list(original_fieldnames) + [
-        'Safety_Rating', 'Safety_Score', 'Est_Median_Income', 'Safety_Note'
-    ]
+    extra_fieldnames = [column for column, _ in sales[0].extra] if sales else []
+    new_fieldnames = list(CSV_COLUMNS) + extra_fieldnames + SAFETY_COLUMNS
 
     print(f"Writing enriched CSV to {output_path}...")
     with open(output_path, 'w', encoding='utf-8', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=new_fieldnames)
         writer.writeheader()
-        writer.writerows(enriched_sales)
+        # Sales in the same ZIP share one set of column values
+        columns_by_zip: Dict[str, Dict[str, str]] = {}
+        for sale in sales:
+            columns = columns_by_zip.get(sale.zip_code)
+            if columns is None:
+                rating = zip_ratings.get(sale.zip_code) if sale.zip_code else None
+                columns = columns_by_zip[sale.zip_code] = safety_columns(rating)
+            row = sale.as_row()
+            row.update(columns)
+            writer.writerow(row)
 
-    return enriched_sales
+    return SaleTable.from_sales(sales, zip_ratings)
 
 
-def print_safety_report(sales: List[Dict]) -> None:
+def print_safety_report(table: SaleTable) -> None:
     """Print a summary report of neighborhood safety ratings."""
     print(f"\n{'='*60}")
     print("NEIGHBORHOOD SAFETY REPORT")
     print(f"{'='*60}\n")
 
-    # Group by safety rating
-    by_rating = {}
-    for sale in sales:
-        rating = sale.get('Safety_Rating', 'Unknown')
-        if rating not in by_rating:
-            by_rating[rating] = []
-        by_rating[rating].append(sale)
+    # Count by safety rating (None = no rating for the ZIP)
+    by_rating = {
+        (safety.replace('_', ' ').title() if safety else 'Unknown'): count
+        for (safety,), count in table.count_by('safety').items()
+    }
 
     # Print summary
     rating_order = ['Excellent', 'Good', 'Fair', 'Below Average', 'Poor', 'Unknown']
@@ -118,8 +120,8 @@ def print_safety_report(sales: List[Dict]) -> None:
     print("SUMMARY BY RATING:\n")
     for rating in rating_order:
         if rating in by_rating:
-            count = len(by_rating[rating])
-            pct = count / len(sales) * 100
+            count = by_rating[rating]
+            pct = count / len(table) * 100
             emoji = rating_emojis.get(rating, '')
             print(f"  {emoji} {rating}: {count} sales ({pct:.0f}%)")
 
@@ -132,15 +134,16 @@ def print_safety_report(sales: List[Dict]) -> None:
         if rating not in by_rating:
             continue
 
-        sales_in_rating = by_rating[rating]
-        print(f"\n{rating_emojis.get(rating, '')} {rating.upper()} ({len(sales_in_rating)} sales)")
+        print(f"\n{rating_emojis.get(rating, '')} {rating.upper()} ({by_rating[rating]} sales)")
         print("-" * 40)
 
-        for sale in sorted(sales_in_rating, key=lambda x: x.get('Name', '')):
-            name = sale.get('Name', 'Unknown')[:30]
-            city = sale.get('City', '')
-            zip_code = sale.get('ZIP', '')
-            income = sale.get('Est_Median_Income', '0')
+        rows = table.rows(table.where(safety=rating.lower().replace(' ', '_')))
+        for row in sorted(rows, key=lambda row: table.sale(row).name):
+            sale = table.sale(row)
+            name = sale.name[:30]
+            city = sale.city
+            zip_code = sale.zip_code
+            income = safety_columns(table.neighborhood(row))['Est_Median_Income']
             try:
                 income_formatted = f"${int(income):,}"
             except ValueError:
@@ -152,10 +155,10 @@ def print_safety_report(sales: List[Dict]) -> None:
     print("RECOMMENDATIONS:")
     print(f"{'='*60}\n")
 
-    excellent_count = len(by_rating.get('Excellent', []))
-    good_count = len(by_rating.get('Good', []))
-    fair_count = len(by_rating.get('Fair', []))
-    caution_count = len(by_rating.get('Below Average', [])) + len(by_rating.get('Poor', []))
+    excellent_count = by_rating.get('Excellent', 0)
+    good_count = by_rating.get('Good', 0)
+    fair_count = by_rating.get('Fair', 0)
+    caution_count = by_rating.get('Below Average', 0) + by_rating.get('Poor', 0)
 
     if excellent_count + good_count > 0:
         print(f"  PRIORITIZE: {excellent_count + good_count} sales in excellent/good areas")
@@ -173,9 +176,14 @@ def print_safety_report(sales: List[Dict]) -> None:
 
 def main():
     """Main entry point."""
-    if len(sys.argv) < 2:
-        print("Usage: python enrich_with_safety.py <input.csv> [output.csv]")
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    set_offline('--offline' in sys.argv)
+
+    if len(args) < 1:
+        print("Usage: python enrich_with_safety.py <input.csv> [output.csv] [--offline]")
         print("\nAdds neighborhood safety ratings to estate sale CSV.")
+        print("\nOptions:")
+        print("  --offline  Use cached neighborhood data only (no network)")
         print("\nNew columns added:")
         print("  - Safety_Rating: Excellent, Good, Fair, Below Average, Poor")
         print("  - Safety_Score: 1-10 scale")
@@ -183,10 +191,10 @@ def main():
         print("  - Safety_Note: Description of area")
         sys.exit(1)
 
-    input_path = Path(sys.argv[1])
+    input_path = Path(args[0])
 
-    if len(sys.argv) > 2:
-        output_path = Path(sys.argv[2])
+    if len(args) > 1:
+        output_path = Path(args[1])
     else:
         output_path = input_path.with_stem(input_path.stem + '_with_safety')
 
@@ -195,8 +203,8 @@ def main():
         sys.exit(1)
 
     try:
-        enriched_sales = enrich_csv_with_safety(input_path, output_path)
-        print_safety_report(enriched_sales)
+        table = enrich_csv_with_safety(input_path, output_path)
+        print_safety_report(table)
         print(f"\nEnriched CSV saved to: {output_path}")
     except Exception as e:
         print(f"Error: {e}")
@@ -1,75 +1,309 @@
 #!/usr/bin/env python3
 """
 Fix CSV by manually parsing and reconstructing with proper field boundaries.
+
+Scraped exports often leave the Description unquoted even though it
+contains commas. Each record is split on commas outside double quotes;
+the first five fields are Name, Address, City, State and ZIP, and
+everything after the fifth comma is the Description.
+
+The input is streamed: records are repaired and written one at a time,
+so memory use does not grow with the file. A quoted field may run over
+several lines, but at most MAX_RECORD_LINES; a quote that is still open
+after that is treated as a literal character, so one stray quote cannot
+swallow the rest of the file.
+
+Every input record also gets a JSON line in a diagnostics side file
+(<output>.repair.jsonl by default):
+    {"line": 12, "lines": 1, "fields": 8, "issues": [...], "status": "merged"}
+
+Usage:
+    python fix_csv_properly.py <input_csv> [output_csv] [--diagnostics PATH]
 """
 
 import csv
+import os
 import sys
+from collections import deque
 from pathlib import Path
+from typing import Deque, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
 
 
-def fix_csv_properly(input_path: Path, output_path: Path):
-    """
-    Fix CSV by treating everything after the 5th comma as the Description field.
-    Expected format: Name,Address,City,State,ZIP,Description (with possible commas)
+HEADER = ['Name', 'Address', 'City', 'State', 'ZIP', 'Description']
+
+# Physical lines one record may span before an open quote is given up on
+MAX_RECORD_LINES = 20
+
+# Row statuses written to the diagnostics file
+OK = 'ok'              # Exactly six fields
+MERGED = 'merged'      # Extra commas folded back into the Description
+SHORT = 'short'        # Fewer than six fields - row dropped
+HEADER_ROW = 'header'  # First line, replaced by HEADER
+
+
+class RawRecord(NamedTuple):
+    """One logical CSV record read from the input."""
+    line: int            # First physical line (1-based)
+    lines: int           # Physical lines the record spans
+    fields: List[str]
+    issues: List[str]
+
+
+def default_diagnostics_path(output_path: Path) -> Path:
+    """Diagnostics file kept next to the output (sales.csv -> sales.repair.jsonl)."""
+    return Path(output_path).with_suffix('.repair.jsonl')
+
+
+def split_fields(text: str) -> Tuple[List[str], bool, bool]:
     """
-    fixed_rows = []
+    Split record text on commas that are outside double quotes.
+
+    A quote only opens a quoted field at the start of the field (after
+    optional spaces); "" inside a quoted field is an escaped quote. Quotes
+    elsewhere are kept literally, like the csv module does.
 
-    with open(input_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    Args:
+        text: Record text, possibly spanning several lines
+
+    Returns:
+        (fields, quote still open at the end, any field was quoted)
+    """
+    if '"' not in text:
+        return text.split(','), False, False  # Common case: nothing quoted
 
-    for i, line in enumerate(lines):
-        line = line.rstrip('\n\r')
+    fields = []
+    quoted = False
+    pos = 0
+    n = len(text)
 
-        if i == 0:  # Header
-            fixed_rows.append(['Name', 'Address', 'City', 'State', 'ZIP', 'Description'])
+    while True:
+        comma = text.find(',', pos)
+        end = n if comma < 0 else comma
+        if not text[pos:end].lstrip(' ').startswith('"'):
+            # Unquoted field: quotes in it are literal
+            fields.append(text[pos:end])
+            if comma < 0:
+                return fields, False, quoted
+            pos = comma + 1
             continue
 
-        if not line:  # Skip empty lines
+        # Quoted field: find the closing quote, skipping "" escapes
+        quoted = True
+        i = text.index('"', pos) + 1
+        parts = []
+        while True:
+            close = text.find('"', i)
+            if close < 0:
+                parts.append(text[i:])
+                fields.append(''.join(parts))
+                return fields, True, quoted
+            parts.append(text[i:close])
+            if text.startswith('"', close + 1):
+                parts.append('"')
+                i = close + 2
+                continue
+            break
+
+        # Anything between the closing quote and the next comma is kept
+        comma = text.find(',', close + 1)
+        end = n if comma < 0 else comma
+        parts.append(text[close + 1:end])
+        fields.append(''.join(parts))
+        if comma < 0:
+            return fields, False, quoted
+        pos = comma + 1
+
+
+def iter_raw_records(f: TextIO, max_record_lines: int = MAX_RECORD_LINES) -> Iterator[RawRecord]:
+    """
+    Read logical records from a text stream, one line at a time.
+
+    Lines are joined while a quoted field is open, up to
+    max_record_lines. If the quote is still open then (or at end of
+    file), the first line is re-split with the quote taken literally and
+    the lines after it are read again as records of their own.
+
+    Args:
+        f: Input stream
+        max_record_lines: Most physical lines one record may span
+
+    Yields:
+        RawRecord per logical record (blank lines are skipped)
+    """
+    pending: Deque[Tuple[int, str]] = deque()  # Lines read ahead but not consumed
+    physical_lines = enumerate(f, 1)
+
+    def next_line() -> Optional[Tuple[int, str]]:
+        if pending:
+            return pending.popleft()
+        numbered = next(physical_lines, None)
+        if numbered is None:
+            return None
+        return numbered[0], numbered[1].rstrip('\n\r')
+
+    while True:
+        first = next_line()
+        if first is None:
+            return
+        start, text = first
+        if not text.strip():
             continue
 
-        # Split on comma, but only take first 5 commas as field separators
-        # Everything after the 5th comma is the Description
-        parts = line.split(',')
+        lines = [first]
+        fields, open_quote, quoted = split_fields(text)
+        while open_quote and len(lines) < max_record_lines:
+            more = next_line()
+            if more is None:
+                break
+            lines.append(more)
+            text += '\n' + more[1]
+            fields, open_quote, quoted = split_fields(text)
+
+        issues = []
+        if open_quote:
+            # Give up on the quote: keep the first line alone, quote and all
+            for line in reversed(lines[1:]):
+                pending.appendleft(line)
+            lines = lines[:1]
+            fields = lines[0][1].split(',')
+            issues.append('unterminated_quote')
+        elif quoted:
+            issues.append('quoted')
+        if len(lines) > 1:
+            issues.append('multiline')
+
+        yield RawRecord(start, len(lines), fields, issues)
+
+
+def format_diagnostic(diagnostic: Dict) -> str:
+    """
+    One diagnostics JSON line.
+
+    Values are ints and fixed status/issue names, so the line is
+    formatted directly instead of going through json.dumps per row.
+    """
+    issues = ', '.join(f'"{issue}"' for issue in diagnostic['issues'])
+    return (f'{{"line": {diagnostic["line"]}, "lines": {diagnostic["lines"]}, '
+            f'"fields": {diagnostic["fields"]}, "issues": [{issues}], '
+            f'"status": "{diagnostic["status"]}"}}\n')
+
+
+def repair_record(record: RawRecord) -> Tuple[Optional[List[str]], Dict]:
+    """
+    Rebuild a record as the six expected columns.
+
+    Returns:
+        (row, or None if it has too few fields; diagnostics entry)
+    """
+    fields = record.fields
+    diagnostic = {
+        'line': record.line,
+        'lines': record.lines,
+        'fields': len(fields),
+        'issues': record.issues,
+    }
+
+    if len(fields) < len(HEADER):
+        diagnostic['status'] = SHORT
+        return None, diagnostic
 
-        if len(parts) >= 6:
-            # First 5 fields
-            name = parts[0].strip()
-            address = parts[1].strip()
-            city = parts[2].strip()
-            state = parts[3].strip()
-            zip_code = parts[4].strip()
+    # First 5 fields, then everything else is the description (join back with commas)
+    row = [field.strip() for field in fields[:5]]
+    row.append(','.join(fields[5:]).strip())
+    diagnostic['status'] = OK if len(fields) == len(HEADER) else MERGED
+    return row, diagnostic
 
-            # Everything else is the description (join back with commas)
-            description = ','.join(parts[5:]).strip()
 
-            fixed_rows.append([name, address, city, state, zip_code, description])
-        else:
-            print(f"Warning: Line {i+1} doesn't have enough fields: {line}")
+def fix_csv_properly(input_path: Path, output_path: Path,
+                     diagnostics_path: Optional[Path] = None) -> Dict[str, int]:
+    """
+    Fix CSV by treating everything after the 5th comma as the Description field.
+    Expected format: Name,Address,City,State,ZIP,Description (with possible commas)
 
-    # Write with proper quoting
-    with open(output_path, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-        for row in fixed_rows:
-            writer.writerow(row)
+    Rows are written as they are repaired. When output_path is the input
+    itself, they go to a temporary file that replaces the input at the end.
+
+    Args:
+        input_path: CSV to repair
+        output_path: Where to write the repaired CSV (may equal input_path)
+        diagnostics_path: Per-row diagnostics JSONL (default: next to the output)
+
+    Returns:
+        Count of rows per status
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    if diagnostics_path is None:
+        diagnostics_path = default_diagnostics_path(output_path)
 
-    print(f"✓ Fixed {len(fixed_rows)-1} sales")
+    in_place = output_path.resolve() == input_path.resolve()
+    write_path = output_path.with_name(output_path.name + '.tmp') if in_place else output_path
+
+    counts = {OK: 0, MERGED: 0, SHORT: 0}
+    try:
+        with open(input_path, 'r', encoding='utf-8') as f, \
+                open(write_path, 'w', encoding='utf-8', newline='') as out, \
+                open(diagnostics_path, 'w', encoding='utf-8') as diagnostics:
+            writer = csv.writer(out, quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(HEADER)
+
+            records = iter_raw_records(f)
+            header = next(records, None)
+            if header is not None:
+                diagnostics.write(format_diagnostic({
+                    'line': header.line, 'lines': header.lines, 'fields': len(header.fields),
+                    'issues': header.issues, 'status': HEADER_ROW,
+                }))
+
+            for record in records:
+                row, diagnostic = repair_record(record)
+                counts[diagnostic['status']] += 1
+                diagnostics.write(format_diagnostic(diagnostic))
+                if row is None:
+                    print(f"Warning: Line {record.line} doesn't have enough fields: "
+                          f"{','.join(record.fields)}")
+                    continue
+                writer.writerow(row)
+    except BaseException:
+        if in_place:
+            write_path.unlink(missing_ok=True)
+        raise
+
+    if in_place:
+        os.replace(write_path, output_path)
+
+    print(f"✓ Fixed {counts[OK] + counts[MERGED]} sales "
+          f"({counts[MERGED]} with commas in the description, {counts[SHORT]} skipped)")
     print(f"✓ Written to: {output_path}")
+    print(f"✓ Diagnostics: {diagnostics_path}")
+    return counts
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python fix_csv_properly.py <input_csv> [output_csv]")
+    args = sys.argv[1:]
+    diagnostics_path = None
+    if '--diagnostics' in args:
+        i = args.index('--diagnostics')
+        if i + 1 >= len(args):
+            print("Error: --diagnostics needs a path")
+            sys.exit(1)
+        diagnostics_path = Path(args[i + 1])
+        del args[i:i + 2]
+
+    if not args:
+        print("Usage: python fix_csv_properly.py <input_csv> [output_csv] [--diagnostics PATH]")
+        print("\nWithout output_csv the input is repaired in place.")
+        print("Per-row diagnostics go to <output>.repair.jsonl unless --diagnostics is given.")
         sys.exit(1)
 
-    input_path = Path(sys.argv[1])
-    output_path = Path(sys.argv[2]) if len(sys.argv) > 2 else input_path
+    input_path = Path(args[0])
+    output_path = Path(args[1]) if len(args) > 1 else input_path
 
     if not input_path.exists():
         print(f"Error: Input file not found: {input_path}")
         sys.exit(1)
 
-    fix_csv_properly(input_path, output_path)
+    fix_csv_properly(input_path, output_path, diagnostics_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Offline-first geocoding for estate sales.
+
+Placemarks without coordinates make Google Earth/My Maps geocode every
+<address> on import. Geocoder.locate() resolves a sale to (lat, lon)
+from, in order:
+
+1. The street index: exact canonical address (house number, street, ZIP)
+   -> rooftop/parcel point.                              precision 'street'
+2. A remote geocoder (U.S. Census by default), through a persistent
+   cache. Skipped in offline mode, except for cached answers.
+                                                         precision 'address'
+3. The ZIP index: ZIP code -> ZCTA centroid.             precision 'zip'
+
+Both indexes are binary files of fixed-size records sorted by key and
+read through mmap, so opening one costs nothing and a lookup is a binary
+search over the mapped pages - no parsing, no per-entry objects.
+They are built once from public data:
+
+    # ZIP centroids from the Census ZCTA Gazetteer (or any zip,lat,lon CSV)
+    python geocoder.py --build-zip-index 2020_Gaz_zcta_national.txt
+
+    # Street points from an OpenAddresses export (NUMBER, STREET, POSTCODE, LAT, LON)
+    python geocoder.py --build-street-index us_mi_statewide.csv
+
+Usage:
+    python geocoder.py --lookup "<street>" <zip> [--offline]
+"""
+
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+import http.client
+
+from address_index import canonical_key
+from cache_policy import DAY, CachePolicy, FetchUnavailable, cached_fetch
+from cache_store import CacheStore, MemoryCacheStore, SQLiteCacheStore
+from http_client import get_client
+from retry_policy import CircuitOpenError, get_retry_policy
+from sales import Sale
+
+
+GEODATA_DIR = Path(__file__).parent / 'geodata'
+ZIP_INDEX_FILE = GEODATA_DIR / 'zip_centroids.idx'
+STREET_INDEX_FILE = GEODATA_DIR / 'streets.idx'
+
+# Persistent cache of remote geocoder answers
+GEOCODE_CACHE_DB_FILE = Path(__file__).parent / '.geocode_cache.sqlite3'
+GEOCODE_NAMESPACE = 'geocode'
+
+# Addresses rarely move, so answers (matches and no-match) are kept for a
+# year and requests the service rejected (4xx) are retried after a week.
+# Connection failures and server errors are never cached.
+GEOCODE_POLICY = CachePolicy(positive_ttl=365 * DAY, negative_ttl=7 * DAY, stale_ttl=365 * DAY)
+
+CENSUS_GEOCODER_URL = ('https://geocoding.geo.census.gov/geocoder/locations/onelineaddress'
+                       '?address={address}&benchmark=Public_AR_Current&format=json')
+
+PREFETCH_WORKERS = 8
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Index file layout: header, then fixed-size records sorted by key
+_HEADER = struct.Struct('<4sHHI')  # magic, version, record size, record count
+INDEX_VERSION = 1
+
+
+class Location(NamedTuple):
+    """Where a sale is, and how precisely that is known."""
+    lat: float
+    lon: float
+    precision: str    # 'street', 'address' (remote geocoder) or 'zip'
+
+
+def haversine_miles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance in miles between two (lat, lon) points."""
+    lat1, lon1 = math.radians(a[0]), math.radians(a[1])
+    lat2, lon2 = math.radians(b[0]), math.radians(b[1])
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(h)))
+
+
+class PointIndex:
+    """
+    Memory-mapped sorted array of (key, lat, lon) records.
+
+    Subclasses define the file magic, the record layout and how a lookup
+    is turned into an integer key.
+
+    Args:
+        path: Index file written by build()
+    """
+
+    magic = b''
+    record = struct.Struct('<Qff')
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{self.path}: not a point index")
+        magic, version, record_size, count = _HEADER.unpack_from(self._map, 0)
+        if magic != self.magic or version != INDEX_VERSION or record_size != self.record.size:
+            raise ValueError(f"{self.path}: not a {type(self).__name__} v{INDEX_VERSION} file")
+        if len(self._map) < _HEADER.size + count * record_size:
+            raise ValueError(f"{self.path}: truncated")
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> 'PointIndex':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
+
+    def close(self) -> None:
+        """Unmap the file."""
+        self._map.close()
+
+    def _find(self, key: int) -> Optional[Tuple[float, float]]:
+        """Binary search for a key; (lat, lon) or None."""
+        record, data = self.record, self._map
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found, lat, lon = record.unpack_from(data, _HEADER.size + mid * record.size)
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return lat, lon
+        return None
+
+    @classmethod
+    def build(cls, path: Path, points: Iterable[Tuple[int, float, float]]) -> int:
+        """
+        Write an index file (atomically).
+
+        Args:
+            path: Destination file
+            points: (key, lat, lon) tuples in any order; the first point
+                for a repeated key wins
+
+        Returns:
+            Number of records written
+        """
+        records = {}
+        for key, lat, lon in points:
+            records.setdefault(key, (lat, lon))
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(cls.magic, INDEX_VERSION, cls.record.size, len(records)))
+            for key in sorted(records):
+                lat, lon = records[key]
+                f.write(cls.record.pack(key, lat, lon))
+        os.replace(tmp_path, path)
+        return len(records)
+
+
+class ZipCentroidIndex(PointIndex):
+    """ZIP code -> ZCTA centroid (12 bytes per ZIP)."""
+
+    magic = b'ESZC'
+    record = struct.Struct('<Iff')
+
+    @staticmethod
+    def key(zip_code: str) -> Optional[int]:
+        zip_code = zip_code.strip()[:5]
+        return int(zip_code) if len(zip_code) == 5 and zip_code.isdigit() else None
+
+    def lookup(self, zip_code: str) -> Optional[Tuple[float, float]]:
+        """Centroid of a ZIP code, or None if it is not in the index."""
+        key = self.key(zip_code)
+        return self._find(key) if key is not None else None
+
+
+class StreetIndex(PointIndex):
+    """Canonical street address -> point (16 bytes per address)."""
+
+    magic = b'ESST'
+    record = struct.Struct('<Qff')
+
+    @staticmethod
+    def key(street: str, zip_code: str) -> Optional[int]:
+        """64-bit hash of the canonical (house number, street, ZIP) key."""
+        address = canonical_key(street, zip_code)
+        if not (address.house_number and address.street and address.zip_code):
+            return None
+        text = '|'.join(address).encode('utf-8')
+        return int.from_bytes(hashlib.sha1(text).digest()[:8], 'little')
+
+    def lookup(self, street: str, zip_code: str) -> Optional[Tuple[float, float]]:
+        """Point for a street address, or None if it is not in the index."""
+        key = self.key(street, zip_code)
+        return self._find(key) if key is not None else None
+
+
+def open_index(cls, path: Path) -> Optional[PointIndex]:
+    """Open an index file, or None if it is missing or unreadable."""
+    try:
+        return cls(path)
+    except (OSError, ValueError):
+        return None
+
+
+# Index builders -----------------------------------------------------------
+
+def _columns(header: List[str], *names: str) -> Optional[int]:
+    """Position of the first header column matching one of names (case-insensitive)."""
+    lowered = [column.strip().lower() for column in header]
+    for name in names:
+        if name in lowered:
+            return lowered.index(name)
+    return None
+
+
+def _read_table(path: Path) -> Tuple[List[str], Iterator[List[str]]]:
+    """Header and rows of a comma- or tab-separated file."""
+    f = open(path, 'r', encoding='utf-8', newline='')
+    first = f.readline()
+    f.seek(0)
+    reader = csv.reader(f, delimiter='\t' if '\t' in first else ',')
+    header = next(reader, [])
+
+    def rows():
+        with f:
+            yield from reader
+    return header, rows()
+
+
+def read_zip_centroids(path: Path) -> Iterator[Tuple[int, float, float]]:
+    """
+    Read ZIP centroids from a Census ZCTA Gazetteer file or a zip,lat,lon CSV.
+
+    Yields:
+        (ZIP as int, lat, lon)
+    """
+    header, rows = _read_table(path)
+    zip_col = _columns(header, 'geoid', 'zcta5', 'zip', 'zip_code', 'zipcode')
+    lat_col = _columns(header, 'intptlat', 'lat', 'latitude')
+    lon_col = _columns(header, 'intptlong', 'lon', 'lng', 'long', 'longitude')
+    if None in (zip_col, lat_col, lon_col):
+        raise ValueError(f"{path}: expected ZIP, latitude and longitude columns")
+
+    for row in rows:
+        try:
+            key = ZipCentroidIndex.key(row[zip_col])
+            if key is not None:
+                yield key, float(row[lat_col]), float(row[lon_col])
+        except (IndexError, ValueError):
+            continue  # Malformed line
+
+
+def read_street_points(path: Path) -> Iterator[Tuple[int, float, float]]:
+    """
+    Read address points from an OpenAddresses export (NUMBER, STREET,
+    POSTCODE, LAT, LON) or a CSV with address, zip, lat, lon columns.
+
+    Yields:
+        (street key, lat, lon)
+    """
+    header, rows = _read_table(path)
+    number_col = _columns(header, 'number')
+    street_col = _columns(header, 'street', 'address')
+    zip_col = _columns(header, 'postcode', 'zip', 'zip_code', 'zipcode')
+    lat_col = _columns(header, 'lat', 'latitude')
+    lon_col = _columns(header, 'lon', 'lng', 'long', 'longitude')
+    if None in (street_col, zip_col, lat_col, lon_col):
+        raise ValueError(f"{path}: expected street, ZIP, latitude and longitude columns")
+
+    for row in rows:
+        try:
+            street = row[street_col]
+            if number_col is not None:
+                street = f'{row[number_col]} {street}'
+            key = StreetIndex.key(street, row[zip_col])
+            if key is not None:
+                yield key, float(row[lat_col]), float(row[lon_col])
+        except (IndexError, ValueError):
+            continue  # Malformed line
+
+
+# Remote geocoders ---------------------------------------------------------
+
+class RemoteGeocoder:
+    """Interface for network geocoders used behind the cache."""
+
+    name = 'remote'
+
+    def geocode(self, one_line_address: str) -> Optional[Dict]:
+        """
+        Geocode a one-line address.
+
+        Returns:
+            {'lat': ..., 'lon': ...}, {} if the service has no match, or
+            None if it rejected the request (cached for a shorter time)
+
+        Raises:
+            FetchUnavailable: The service could not be reached, returned a
+                server error or an unreadable answer (nothing is cached)
+        """
+        raise NotImplementedError
+
+
+class CensusGeocoder(RemoteGeocoder):
+    """U.S. Census Bureau geocoder (free, no API key)."""
+
+    name = 'census'
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = timeout
+
+    def geocode(self, one_line_address: str) -> Optional[Dict]:
+        url = CENSUS_GEOCODER_URL.format(address=quote(one_line_address))
+        try:
+            response = get_retry_policy().call(
+                url, lambda: get_client().get(url, timeout=self.timeout))
+            if response.status >= 500:
+                raise FetchUnavailable(f"Census geocoder returned HTTP {response.status}")
+            if response.status != 200:
+                return None
+            matches = json.loads(response.text())['result']['addressMatches']
+        except (OSError, http.client.HTTPException, json.JSONDecodeError,
+                KeyError, TypeError, CircuitOpenError) as e:
+            raise FetchUnavailable(str(e) or type(e).__name__) from e
+        if not matches:
+            return {}
+        coordinates = matches[0]['coordinates']
+        return {'lat': float(coordinates['y']), 'lon': float(coordinates['x'])}
+
+
+# Geocoder -----------------------------------------------------------------
+
+class Geocoder:
+    """
+    Resolves sales to coordinates from local indexes, then a cached remote
+    geocoder, then ZIP centroids.
+
+    Thread-safe; results are memoized per address for the life of the
+    geocoder.
+
+    Args:
+        zip_index: ZIP centroid index (None = no ZIP fallback)
+        street_index: Street point index (None = skip)
+        remote: Remote geocoder (None = local indexes only)
+        store: Cache for remote answers (None = in-memory)
+        offline: Use only cached remote answers, never the network
+    """
+
+    def __init__(self, zip_index: Optional[ZipCentroidIndex] = None,
+                 street_index: Optional[StreetIndex] = None,
+                 remote: Optional[RemoteGeocoder] = None,
+                 store: Optional[CacheStore] = None,
+                 offline: bool = False):
+        self.zip_index = zip_index
+        self.street_index = street_index
+        self.remote = remote
+        self.store = store if store is not None else MemoryCacheStore()
+        self.offline = offline
+        self.stats = {'street': 0, 'address': 0, 'zip': 0, 'none': 0}
+        self._memo: Dict[Tuple[str, str, str, str], Optional[Location]] = {}
+        self._lock = threading.Lock()
+
+    def locate(self, sale: Sale) -> Optional[Location]:
+        """
+        Coordinates of a sale.
+
+        Returns:
+            Location, or None if no source knows the address or its ZIP
+        """
+        memo_key = (sale.address, sale.city, sale.state, sale.zip_code)
+        with self._lock:
+            if memo_key in self._memo:
+                return self._memo[memo_key]
+
+        location = self._resolve(sale)
+        with self._lock:
+            self._memo[memo_key] = location
+            self.stats[location.precision if location else 'none'] += 1
+        return location
+
+    def point(self, sale: Sale) -> Optional[Tuple[float, float]]:
+        """(lat, lon) of a sale, or None; what kml_engine puts in <Point>."""
+        location = self.locate(sale)
+        return (location.lat, location.lon) if location is not None else None
+
+    def _resolve(self, sale: Sale) -> Optional[Location]:
+        if self.street_index is not None:
+            point = self.street_index.lookup(sale.address, sale.zip_code)
+            if point is not None:
+                return Location(point[0], point[1], 'street')
+
+        if self.remote is not None:
+            answer = cached_fetch(
+                self.store, f'{GEOCODE_NAMESPACE}:{self.remote.name}', sale.full_address,
+                lambda: self.remote.geocode(sale.full_address),
+                GEOCODE_POLICY, offline=self.offline
+            )
+            if answer:
+                return Location(answer['lat'], answer['lon'], 'address')
+
+        if self.zip_index is not None:
+            point = self.zip_index.lookup(sale.zip_code)
+            if point is not None:
+                return Location(point[0], point[1], 'zip')
+        return None
+
+    def prefetch(self, sales: Iterable[Sale], workers: int = PREFETCH_WORKERS) -> None:
+        """Resolve many sales concurrently, so later locate() calls are memo hits."""
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            list(executor.map(self.locate, sales))
+
+    def summary(self) -> str:
+        """One-line count of sales per precision."""
+        return (f"Geocoded: {self.stats['street']} street, {self.stats['address']} address, "
+                f"{self.stats['zip']} ZIP centroid, {self.stats['none']} not found")
+
+    def close(self) -> None:
+        """Unmap the indexes."""
+        for index in (self.zip_index, self.street_index):
+            if index is not None:
+                index.close()
+
+
+def get_geocoder(offline: bool = False) -> Geocoder:
+    """
+    Geocoder over the default index files and the Census geocoder.
+
+    Missing index files are skipped. Remote answers are cached in
+    GEOCODE_CACHE_DB_FILE (in memory if it cannot be opened).
+    """
+    try:
+        store = SQLiteCacheStore(GEOCODE_CACHE_DB_FILE)
+    except Exception:
+        store = MemoryCacheStore()  # Silently fall back if can't write cache
+    return Geocoder(
+        zip_index=open_index(ZipCentroidIndex, ZIP_INDEX_FILE),
+        street_index=open_index(StreetIndex, STREET_INDEX_FILE),
+        remote=CensusGeocoder(),
+        store=store,
+        offline=offline,
+    )
+
+
+def geocode_sales(sales: Iterable[Sale], offline: bool = False) -> Geocoder:
+    """
+    Default geocoder with every sale already resolved.
+
+    Args:
+        sales: Sales to resolve (looked up concurrently)
+        offline: Use only cached remote answers
+
+    Returns:
+        Geocoder whose locate()/point() now answer from memory
+    """
+    geocoder = get_geocoder(offline)
+    if geocoder.zip_index is None and geocoder.street_index is None:
+        print(f"  Note: no geocoding index in {GEODATA_DIR} (see geocoder.py --build-zip-index)")
+    geocoder.prefetch(sales)
+    print(f"  {geocoder.summary()}")
+    return geocoder
+
+
+def main():
+    """Main entry point."""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+
+    if '--build-zip-index' in flags and args:
+        output = Path(args[1]) if len(args) > 1 else ZIP_INDEX_FILE
+        count = ZipCentroidIndex.build(output, read_zip_centroids(Path(args[0])))
+        print(f"✓ Wrote {count} ZIP centroids to {output}")
+    elif '--build-street-index' in flags and args:
+        output = Path(args[1]) if len(args) > 1 else STREET_INDEX_FILE
+        count = StreetIndex.build(output, read_street_points(Path(args[0])))
+        print(f"✓ Wrote {count} street points to {output}")
+    elif '--lookup' in flags and len(args) >= 2:
+        geocoder = get_geocoder(offline='--offline' in flags)
+        location = geocoder.locate(Sale('', args[0], '', '', args[1], ''))
+        if location is None:
+            print("Not found")
+        else:
+            print(f"{location.lat:.6f}, {location.lon:.6f} ({location.precision})")
+        geocoder.close()
+    else:
+        print("Usage:")
+        print("  python geocoder.py --build-zip-index <gazetteer.txt|zips.csv> [output.idx]")
+        print("  python geocoder.py --build-street-index <addresses.csv> [output.idx]")
+        print('  python geocoder.py --lookup "<street>" <zip> [--offline]')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP client with keep-alive connections and conditional GETs.
+
+urlopen() opens a new connection (and, for https, a new TLS handshake)
+for every request. HTTPClient keeps finished connections open in a small
+per-host pool and reuses them for the next request to the same host, so a
+batch of listing pages on one site pays for the handshake once per worker
+rather than once per page.
+
+Responses are requested compressed (gzip/deflate, plus br when the
+optional brotli package is installed) and decoded transparently.
+
+With conditional=True, the ETag / Last-Modified validators of a response
+are kept in a CacheStore together with the body. The next request for
+the same URL sends If-None-Match / If-Modified-Since, and a 304 Not
+Modified answer is served from the stored copy without downloading the
+page again.
+
+To enable brotli decoding (optional):
+    pip install brotli
+"""
+
+import atexit
+import base64
+import gzip
+import http.client
+import re
+import ssl
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from cache_store import CacheStore, MemoryCacheStore, SQLiteCacheStore
+
+# Brotli is optional - without it, 'br' is simply not offered to servers
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+DEFAULT_USER_AGENT = 'EstateSaleNinja/1.0'
+DEFAULT_TIMEOUT = 10
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate'
+
+# Idle keep-alive connections kept per (scheme, host, port)
+MAX_IDLE_PER_HOST = 8
+
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# Cache namespace for validators and stored bodies of conditional GETs
+VALIDATOR_NAMESPACE = 'http'
+
+# Bodies larger than this are not stored for conditional GETs
+MAX_STORED_BODY = 2 * 1024 * 1024
+
+# Persistent validator cache used by get_client()
+HTTP_CACHE_DB_FILE = Path(__file__).parent / '.http_cache.sqlite3'
+
+_CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+
+# Errors raised when a server closed an idle keep-alive connection
+_STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+_DECODE_ERRORS = (OSError, EOFError, zlib.error) + ((brotli.error,) if BROTLI_AVAILABLE else ())
+
+
+class HTTPResponse(NamedTuple):
+    """A completed GET request."""
+    url: str                  # Final URL, after redirects
+    status: int
+    headers: Dict[str, str]   # Header names lower-cased
+    body: bytes               # Content-Encoding already removed
+    from_cache: bool = False  # Answered 304 and served from the stored copy
+
+    def text(self, errors: str = 'replace') -> str:
+        """Body decoded with the charset from Content-Type (default UTF-8)."""
+        match = _CHARSET_RE.search(self.headers.get('content-type', ''))
+        charset = match.group(1) if match else 'utf-8'
+        try:
+            return self.body.decode(charset, errors=errors)
+        except LookupError:
+            return self.body.decode('utf-8', errors=errors)
+
+
+class HTTPStatusError(Exception):
+    """Raised by raise_for_status() for 4xx/5xx responses."""
+
+    def __init__(self, response: HTTPResponse):
+        super().__init__(f"HTTP {response.status} for {response.url}")
+        self.response = response
+        self.code = response.status
+
+
+def raise_for_status(response: HTTPResponse) -> HTTPResponse:
+    """Return the response, or raise HTTPStatusError if it is a 4xx/5xx."""
+    if response.status >= 400:
+        raise HTTPStatusError(response)
+    return response
+
+
+def decode_body(body: bytes, content_encoding: Optional[str]) -> bytes:
+    """
+    Undo a Content-Encoding.
+
+    Args:
+        body: Raw response body
+        content_encoding: Content-Encoding header value (may list several)
+
+    Returns:
+        Decoded body
+
+    Raises:
+        http.client.HTTPException: Unknown encoding or corrupt data
+    """
+    if not content_encoding:
+        return body
+
+    codings = [c.strip().lower() for c in content_encoding.split(',') if c.strip()]
+    for coding in reversed(codings):  # Applied in order, so undo in reverse
+        try:
+            if coding in ('gzip', 'x-gzip'):
+                body = gzip.decompress(body)
+            elif coding == 'deflate':
+                # Servers disagree on zlib-wrapped vs raw deflate
+                try:
+                    body = zlib.decompress(body)
+                except zlib.error:
+                    body = zlib.decompress(body, -zlib.MAX_WBITS)
+            elif coding == 'br' and BROTLI_AVAILABLE:
+                body = brotli.decompress(body)
+            elif coding != 'identity':
+                raise http.client.HTTPException(f"Unsupported content encoding: {coding}")
+        except _DECODE_ERRORS as e:
+            raise http.client.HTTPException(f"Could not decode {coding} body: {e}") from e
+    return body
+
+
+class HTTPClient:
+    """
+    GET requests over pooled keep-alive connections.
+
+    Thread-safe: each request checks a connection out of the pool for its
+    own exclusive use and returns it once the response has been read.
+
+    Args:
+        user_agent: Default User-Agent header
+        verify_tls: Verify https certificates (False for hosts with broken chains)
+        max_idle_per_host: Idle connections kept open per host
+        validator_store: Where conditional GETs keep validators and bodies
+            (None = conditional requests behave like plain ones)
+    """
+
+    def __init__(self, user_agent: str = DEFAULT_USER_AGENT, verify_tls: bool = True,
+                 max_idle_per_host: int = MAX_IDLE_PER_HOST,
+                 validator_store: Optional[CacheStore] = None):
+        self.user_agent = user_agent
+        self.max_idle_per_host = max_idle_per_host
+        self.validator_store = validator_store
+        self.stats = {'requests': 0, 'connections': 0, 'reused': 0, 'not_modified': 0}
+
+        self._ssl_context = ssl.create_default_context()
+        if not verify_tls:
+            self._ssl_context.check_hostname = False
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _checkout(self, key: Tuple[str, str, int],
+                  timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """Take an idle connection for a host, or open a new one."""
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            self._count('reused')
+            return conn, True
+
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        self._count('connections')
+        return conn, False
+
+    def _checkin(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        """Return a connection to the pool, closing it if the pool is full."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, url: str, headers: Dict[str, str],
+                 timeout: float) -> Tuple[int, Dict[str, str], bytes]:
+        """Send one GET (no redirects) and read the raw response."""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+        self._count('requests')
+        while True:
+            conn, reused = self._checkout(key, timeout)
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    continue  # The server dropped an idle connection; try another
+                raise
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(key, conn)
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, body
+
+    def _stored(self, url: str) -> Optional[Dict]:
+        """Validators and body kept for a URL by an earlier conditional GET."""
+        if self.validator_store is None:
+            return None
+        entry = self.validator_store.get(VALIDATOR_NAMESPACE, url)
+        return entry.value if entry is not None else None
+
+    def _store(self, url: str, response: HTTPResponse) -> None:
+        """Keep a response's validators and body for the next conditional GET."""
+        etag = response.headers.get('etag')
+        last_modified = response.headers.get('last-modified')
+        if not (etag or last_modified) or len(response.body) > MAX_STORED_BODY:
+            self.validator_store.delete(VALIDATOR_NAMESPACE, url)
+            return
+        self.validator_store.put(VALIDATOR_NAMESPACE, url, {
+            'url': response.url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_type': response.headers.get('content-type'),
+            'body': base64.b64encode(zlib.compress(response.body)).decode('ascii'),
+        })
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None,
+            timeout: float = DEFAULT_TIMEOUT, conditional: bool = False) -> HTTPResponse:
+        """
+        Fetch a URL, following redirects.
+
+        Error statuses are returned, not raised; see raise_for_status().
+
+        Args:
+            url: http or https URL
+            headers: Extra request headers (override the defaults)
+            timeout: Socket timeout in seconds
+            conditional: Revalidate against the stored copy of this URL and
+                store the response's validators for next time
+
+        Returns:
+            HTTPResponse
+
+        Raises:
+            OSError: Connection, DNS, TLS or timeout failure
+            http.client.HTTPException: Malformed response or too many redirects
+        """
+        request_headers = {'User-Agent': self.user_agent, 'Accept-Encoding': ACCEPT_ENCODING}
+        request_headers.update(headers or {})
+
+        stored = self._stored(url) if conditional else None
+        if stored:
+            if stored.get('etag'):
+                request_headers['If-None-Match'] = stored['etag']
+            if stored.get('last_modified'):
+                request_headers['If-Modified-Since'] = stored['last_modified']
+
+        current = url
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = self._request(current, request_headers, timeout)
+            if status in REDIRECT_STATUSES and 'location' in response_headers:
+                current = urljoin(current, response_headers['location'])
+                continue
+            break
+        else:
+            raise http.client.HTTPException(f"Too many redirects fetching {url}")
+
+        if status == 304 and stored:
+            self._count('not_modified')
+            return HTTPResponse(
+                url=stored['url'],
+                status=200,
+                headers={'content-type': stored.get('content_type') or ''},
+                body=zlib.decompress(base64.b64decode(stored['body'])),
+                from_cache=True
+            )
+
+        response = HTTPResponse(
+            current, status, response_headers,
+            decode_body(body, response_headers.get('content-encoding'))
+        )
+        if conditional and self.validator_store is not None and status == 200:
+            self._store(url, response)
+        return response
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle.clear()
+        for idle in pools:
+            for conn in idle:
+                conn.close()
+
+
+_default_client: Optional[HTTPClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_client() -> HTTPClient:
+    """
+    Get the shared client, creating it on first use.
+
+    Its validators are kept in HTTP_CACHE_DB_FILE; if that cannot be
+    opened, an in-memory store is used for the rest of the run.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            try:
+                store = SQLiteCacheStore(HTTP_CACHE_DB_FILE)
+            except Exception:
+                store = MemoryCacheStore()  # Silently fall back if can't write cache
+            _default_client = HTTPClient(validator_store=store)
+            atexit.register(_default_client.close)
+        return _default_client
@@ -0,0 +1,732 @@
+#!/usr/bin/env python3
+"""
+Shared CSV -> KML rendering engine for the estate sale converters.
+
+Sales are loaded as sales.Sale records and each is parsed once into a
+SaleRecord (URL, open days, per-day discounts, XML-escaped fields) and
+then handed to a layout that decides folder structure, styles and
+placemark markup:
+
+- FlatLayout: one placemark per sale, single red icon (csv_to_kml.py)
+- DayDiscountLayout: Day -> Discount folders with snippets (csv_to_kml_enhanced.py)
+- SafetyLayout: Day -> Discount or Safety -> Day -> Discount folders with
+  neighborhood ratings (csv_to_kml_with_safety.py)
+
+Records are streamed through kml_writer.KMLWriter: layouts write or
+spool each record's placemarks as it arrives and emit the folders when
+the document is finished, so converters never hold every sale at once.
+The converter scripts are thin entry points over this engine.
+"""
+
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple, Union
+from xml.sax.saxutils import escape
+
+from address_index import AddressIndex, AddressMatch
+from kml_writer import KMLWriter, PlacemarkSpool
+from sales import Sale, iter_sales
+from schedule_parser import Schedule, parse_schedule
+
+
+DAYS = ['Friday', 'Saturday', 'Sunday']
+DISCOUNT_LEVELS = ['50%', '25-30%', 'no_discount']
+SAFETY_LEVELS = ['excellent', 'good', 'fair', 'below_average', 'poor']
+
+# Safety folder and icon color for sales whose ZIP has no rating
+UNRATED_SAFETY = 'fair'
+
+DISCOUNT_FOLDER_NAMES = {
+    '50%': '50% Off',
+    '25-30%': '25-30% Off',
+    'no_discount': 'No Discount'
+}
+
+SAFETY_FOLDER_NAMES = {
+    'excellent': 'Excellent Areas (Safe, Upscale)',
+    'good': 'Good Areas (Nice Suburbs)',
+    'fair': 'Fair Areas (Average)',
+    'below_average': 'Below Average Areas (Use Caution)',
+    'poor': 'Poor Areas (Be Aware)'
+}
+
+# Icon URLs for different discount levels
+DISCOUNT_ICONS = {
+    '50%': 'http://maps.google.com/mapfiles/kml/paddle/red-stars.png',
+    '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/orange-circle.png',
+    'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/blu-circle.png',
+}
+
+# Icon URLs for neighborhood safety ratings
+SAFETY_ICONS = {
+    'excellent': 'http://maps.google.com/mapfiles/kml/paddle/grn-circle.png',
+    'good': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-circle.png',
+    'fair': 'http://maps.google.com/mapfiles/kml/paddle/ylw-circle.png',
+    'below_average': 'http://maps.google.com/mapfiles/kml/paddle/orange-circle.png',
+    'poor': 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png',
+}
+
+# Combined icons: safety outer, discount marker
+# Format: safety_rating -> discount_level -> icon
+COMBINED_ICONS = {
+    'excellent': {
+        '50%': 'http://maps.google.com/mapfiles/kml/paddle/grn-stars.png',
+        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/grn-diamond.png',
+        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/grn-circle.png',
+    },
+    'good': {
+        '50%': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-stars.png',
+        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-diamond.png',
+        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/ltblu-circle.png',
+    },
+    'fair': {
+        '50%': 'http://maps.google.com/mapfiles/kml/paddle/ylw-stars.png',
+        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/ylw-diamond.png',
+        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/ylw-circle.png',
+    },
+    'below_average': {
+        '50%': 'http://maps.google.com/mapfiles/kml/paddle/orange-stars.png',
+        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/orange-diamond.png',
+        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/orange-circle.png',
+    },
+    'poor': {
+        '50%': 'http://maps.google.com/mapfiles/kml/paddle/red-stars.png',
+        '25-30%': 'http://maps.google.com/mapfiles/kml/paddle/red-diamond.png',
+        'no_discount': 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png',
+    },
+}
+
+
+def parse_markdown_urls(markdown_path: Path) -> AddressIndex:
+    """
+    Parse markdown file to extract URLs mapped by address.
+
+    Args:
+        markdown_path: Path to the markdown details file
+
+    Returns:
+        AddressIndex of listing URLs (also usable as a mapping from
+        normalized address to URL)
+    """
+    address_urls = AddressIndex()
+
+    with open(markdown_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Split by section headers
+    sections = re.split(r'###\s+\d+\.', content)
+
+    for section in sections[1:]:  # Skip first empty section
+        # Extract URL from markdown link [text](url)
+        url_match = re.search(r'\]\((https://[^\)]+)\)', section)
+        if url_match:
+            url = url_match.group(1)
+            # Extract address from **Address:** line
+            addr_match = re.search(r'\*\*Address:\*\*\s+([^\n]+)', section)
+            if addr_match:
+                address_urls.add(addr_match.group(1).strip(), url)
+
+    return address_urls
+
+
+def iter_csv_data(csv_path: Path) -> Iterator[Sale]:
+    """
+    Stream estate sales from a CSV file.
+
+    Args:
+        csv_path: Path to the CSV file
+
+    Yields:
+        One Sale per non-empty row
+    """
+    return iter_sales(csv_path)
+
+
+def read_csv_data(csv_path: Path) -> List[Sale]:
+    """
+    Read estate sale data from CSV file.
+
+    Args:
+        csv_path: Path to the CSV file
+
+    Returns:
+        List of Sales
+    """
+    return list(iter_sales(csv_path))
+
+
+def match_sale_url(sale: Sale,
+                   address_urls: Union[AddressIndex, Dict[str, str]]) -> AddressMatch:
+    """
+    Find the URL for a sale by matching its address, with a confidence score.
+
+    Args:
+        sale: Sale to match
+        address_urls: AddressIndex from parse_markdown_urls(), or a plain
+            {normalized address: URL} dict (matched by linear scan)
+
+    Returns:
+        AddressMatch with the URL ('' if none) and confidence (0.0-1.0)
+    """
+    if isinstance(address_urls, AddressIndex):
+        return address_urls.match(sale.address, sale.zip_code)
+
+    # Plain dict: exact key, then street substring scan
+    address_key = ' '.join(sale.full_address.lower().split()).replace(',', '')
+    if address_key in address_urls:
+        return AddressMatch(address_urls[address_key], 1.0)
+
+    street_key = ' '.join(sale.address.lower().split())
+    for addr, url in address_urls.items():
+        if street_key in addr:
+            return AddressMatch(url, 0.5)
+
+    return AddressMatch('', 0.0)
+
+
+def find_url_for_sale(sale: Sale,
+                      address_urls: Union[AddressIndex, Dict[str, str]]) -> str:
+    """
+    Find the URL for a sale by matching its address.
+
+    Args:
+        sale: Sale to match
+        address_urls: AddressIndex (or dict) of URLs mapped by address
+
+    Returns:
+        URL if found, empty string otherwise
+    """
+    return match_sale_url(sale, address_urls).url
+
+
+def discount_level(percent: int) -> str:
+    """
+    Map a percentage off to the discount folder it belongs in.
+
+    Args:
+        percent: Percent off (0 = none)
+
+    Returns:
+        '50%' (50% or more), '25-30%' (25-49%), or 'no_discount'
+    """
+    if percent >= 50:
+        return '50%'
+    if percent >= 25:
+        return '25-30%'
+    return 'no_discount'
+
+
+def day_discount_level(schedule: Schedule, day: str) -> str:
+    """
+    Discount level for one day of a parsed schedule.
+
+    Days without their own discount take the best discount in the
+    description, so a multi-day sale stays in the same folder every day.
+    """
+    hours = schedule.day(day)
+    if hours is not None and hours.discount:
+        return discount_level(hours.discount)
+    return discount_level(schedule.best_discount)
+
+
+def parse_days(description: str) -> Set[str]:
+    """
+    Extract which days a sale is open from the description.
+
+    Args:
+        description: Sale description with hours info
+
+    Returns:
+        Set of full day names ('Friday', 'Saturday', ...); ranges such as
+        "Fri-Sun" include the days in between
+    """
+    return set(parse_schedule(description).day_names())
+
+
+def parse_discount_level(description: str) -> str:
+    """
+    Extract the maximum discount level from the description.
+
+    Args:
+        description: Sale description with discount info
+
+    Returns:
+        Discount level: '50%', '25-30%', or 'no_discount'
+    """
+    return discount_level(parse_schedule(description).best_discount)
+
+
+def get_discount_for_day(description: str, day: str) -> str:
+    """
+    Get the discount level specifically for a given day.
+
+    Args:
+        description: Sale description with hours/discount info
+        day: Day name ('Friday', 'Saturday', 'Sunday')
+
+    Returns:
+        Discount level for that specific day
+    """
+    return day_discount_level(parse_schedule(description), day)
+
+
+def style_suffix(discount_level: str) -> str:
+    """Convert a discount level to the form used in KML style ids."""
+    return discount_level.replace('%', 'pct').replace('-', '_')
+
+
+class SaleRecord(NamedTuple):
+    """A CSV sale parsed once for rendering."""
+    sale: Sale                        # Original CSV row
+    url: str                          # Listing URL ('' if unmatched)
+    url_confidence: float             # Address match confidence (0.0-1.0)
+    schedule: Schedule                # Parsed hours, discounts and notes
+    days: Tuple[str, ...]             # Open days, in DAYS order
+    discount: str                     # Best discount across all days
+    day_discounts: Dict[str, str]     # Discount level per open day
+    name: str                         # XML-escaped name
+    address: str                      # XML-escaped full address
+    times: str                        # XML-escaped hours (before '|')
+    notes: str                        # XML-escaped notes (after '|')
+    neighborhood: Optional[Dict]      # Rating from neighborhood_lookup, if any
+    location: Optional[Tuple[float, float]] = None  # (lat, lon) from geocoder, if known
+
+
+def parse_sale(sale: Sale, address_urls: AddressIndex,
+               neighborhood: Optional[Dict] = None,
+               location: Optional[Tuple[float, float]] = None) -> SaleRecord:
+    """
+    Parse a sale into a SaleRecord.
+
+    Args:
+        sale: Sale loaded from the CSV
+        address_urls: AddressIndex of URLs (from parse_markdown_urls)
+        neighborhood: Neighborhood rating for the sale's ZIP, if available
+        location: (lat, lon) of the sale, if geocoded
+
+    Returns:
+        SaleRecord with all fields needed by the layouts
+    """
+    description = escape(sale.description)
+
+    # Description format: "Sat 10am-4pm, Sun 11am-4pm | Park on one side of street"
+    desc_parts = description.split('|')
+    times = desc_parts[0].strip() if len(desc_parts) > 0 else description
+    notes = desc_parts[1].strip() if len(desc_parts) > 1 else ""
+
+    # One scan of the description feeds days, discounts and per-day levels
+    schedule = sale.schedule
+    open_days = schedule.day_names()
+    days = tuple(day for day in DAYS if day in open_days)
+    match = match_sale_url(sale, address_urls)
+
+    return SaleRecord(
+        sale=sale,
+        url=match.url,
+        url_confidence=match.confidence,
+        schedule=schedule,
+        days=days,
+        discount=discount_level(schedule.best_discount),
+        day_discounts={day: day_discount_level(schedule, day) for day in days},
+        name=escape(sale.name),
+        address=escape(sale.full_address),
+        times=times,
+        notes=notes,
+        neighborhood=neighborhood,
+        location=location
+    )
+
+
+def iter_records(sales: Iterable[Sale], address_urls: AddressIndex,
+                 zip_ratings: Optional[Dict[str, Dict]] = None,
+                 geocoder=None) -> Iterator[SaleRecord]:
+    """
+    Parse sales lazily, one record per CSV row.
+
+    Args:
+        sales: Sales (any iterable, e.g. iter_csv_data())
+        address_urls: AddressIndex of URLs (from parse_markdown_urls)
+        zip_ratings: Optional ZIP -> neighborhood rating mapping
+        geocoder: Optional geocoder.Geocoder giving placemarks coordinates
+
+    Yields:
+        SaleRecords in CSV order
+    """
+    for sale in sales:
+        yield parse_sale(sale, address_urls,
+                         zip_ratings.get(sale.zip_code) if zip_ratings else None,
+                         geocoder.point(sale) if geocoder is not None else None)
+
+
+def day_placements(record: SaleRecord) -> List[Tuple[str, str]]:
+    """
+    (day, discount level) for every day folder a record appears in.
+
+    Multi-day sales appear once under each day they are open.
+    """
+    placements = []
+    for day in record.days:
+        discount = record.day_discounts[day]
+        # Default to no_discount if not recognized
+        if discount not in DISCOUNT_LEVELS:
+            discount = 'no_discount'
+        placements.append((day, discount))
+    return placements
+
+
+def safety_of(record: SaleRecord) -> str:
+    """Neighborhood rating name for a record (UNRATED_SAFETY if it has none)."""
+    return record.neighborhood['rating'] if record.neighborhood else UNRATED_SAFETY
+
+
+def format_days(days) -> str:
+    """Format open days as 'Fri, Sat, Sun'."""
+    return ', '.join(day[:3] for day in DAYS if day in days)
+
+
+def html_description(record: SaleRecord, extra: str = '') -> str:
+    """
+    Build the CDATA description block shared by all layouts.
+
+    Args:
+        record: Sale record
+        extra: Additional HTML lines inserted between the title and hours
+    """
+    if record.url:
+        title = f'<h3><a href="{record.url}" target="_blank">{record.name}</a></h3>'
+    else:
+        title = f'<h3>{record.name}</h3>'
+
+    html = f'''<![CDATA[
+{title}{extra}
+<p><strong>Hours:</strong> {record.times}</p>'''
+    if record.notes:
+        html += f'''
+<p><strong>Notes:</strong> {record.notes}</p>'''
+    html += '''
+]]>'''
+    return html
+
+
+def point_markup(record: SaleRecord, indent: str) -> str:
+    """
+    <Point> line for a geocoded record, or '' without a location.
+
+    With coordinates in the file, map apps place the pin directly instead
+    of geocoding the <address> on import.
+    """
+    if record.location is None:
+        return ''
+    lat, lon = record.location
+    return f'{indent}<Point><coordinates>{lon:.6f},{lat:.6f}</coordinates></Point>\n'
+
+
+def create_kml_footer() -> str:
+    """Create KML footer."""
+    return '''  </Document>
+</kml>
+'''
+
+
+def icon_style(style_id: str, icon_url: str) -> str:
+    """Create a KML <Style> with a single icon."""
+    return f'''    <Style id="{style_id}">
+      <IconStyle>
+        <Icon>
+          <href>{icon_url}</href>
+        </Icon>
+      </IconStyle>
+    </Style>
+'''
+
+
+class _RecordCapture:
+    """Stands in for both the output stream and the spool to collect one record's placemarks."""
+
+    def __init__(self):
+        self.pieces: List[Tuple[Optional[Tuple], str]] = []
+
+    def write(self, markup: str) -> None:
+        self.pieces.append((None, markup))
+
+    def add(self, key: Tuple, markup: str) -> None:
+        self.pieces.append((key, markup))
+
+
+class Layout:
+    """
+    Base class for KML layouts.
+
+    Subclasses provide the document header (name, description, styles),
+    the placemark markup, and the folder structure. Records arrive one at
+    a time through add_record(); anything that cannot be written in
+    arrival order goes to the spool and is written by finish_body().
+    """
+
+    def header(self) -> str:
+        """Return everything from the XML declaration through the styles."""
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        """Return the closing tags of the document."""
+        return create_kml_footer()
+
+    def placemark(self, record: SaleRecord, discount_level: str) -> str:
+        """Return the <Placemark> for a record shown in a discount folder."""
+        raise NotImplementedError
+
+    def add_record(self, f: TextIO, spool: PlacemarkSpool, record: SaleRecord) -> None:
+        """Write or spool the placemarks for one record."""
+        raise NotImplementedError
+
+    def finish_body(self, f: TextIO, spool: PlacemarkSpool) -> None:
+        """Write the folders and spooled placemarks once all records are in."""
+
+    def render_record(self, record: SaleRecord) -> List[Tuple[Optional[Tuple], str]]:
+        """
+        Render one record's placemarks without writing them.
+
+        Returns:
+            (spool key, markup) pairs in the order add_record() emits them;
+            the key is None for markup written straight to the output
+        """
+        capture = _RecordCapture()
+        self.add_record(capture, capture, record)
+        return capture.pieces
+
+    def cache_token(self) -> str:
+        """Text that changes whenever this layout would render differently."""
+        return f'{type(self).__name__}\n{self.header()}'
+
+    def write_body(self, f: TextIO, records: Iterable[SaleRecord]) -> None:
+        """Write folders and placemarks for all records."""
+        spool = PlacemarkSpool()
+        try:
+            for record in records:
+                self.add_record(f, spool, record)
+            self.finish_body(f, spool)
+        finally:
+            spool.close()
+
+
+class FlatLayout(Layout):
+    """Every sale as a top-level placemark with the same icon."""
+
+    def header(self) -> str:
+        return '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>Estate Sales</name>
+    <description>Estate sale locations with details</description>
+
+''' + icon_style('estateIcon', 'http://maps.google.com/mapfiles/kml/paddle/red-circle.png')
+
+    def placemark(self, record: SaleRecord, discount_level: str = '') -> str:
+        return f'''    <Placemark>
+      <name>{record.name}</name>
+      <description>{html_description(record)}</description>
+      <styleUrl>#estateIcon</styleUrl>
+      <address>{record.address}</address>
+{point_markup(record, '      ')}    </Placemark>
+'''
+
+    def add_record(self, f: TextIO, spool: PlacemarkSpool, record: SaleRecord) -> None:
+        # Document order is CSV order, so placemarks go straight out
+        f.write(self.placemark(record))
+
+
+class DayDiscountLayout(Layout):
+    """Day -> Discount Level folders; multi-day sales repeat under each day."""
+
+    document_name = 'Estate Sales'
+    document_description = 'Estate sale locations organized by day and discount level'
+
+    def header(self) -> str:
+        header = f'''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>{self.document_name}</name>
+    <description>{self.document_description}</description>
+
+'''
+        for style_id, icon_url in self.styles():
+            header += icon_style(style_id, icon_url)
+        return header
+
+    def styles(self) -> List[Tuple[str, str]]:
+        """Return (style_id, icon_url) pairs for the header."""
+        return [(style_suffix(level), url) for level, url in DISCOUNT_ICONS.items()]
+
+    def snippet(self, record: SaleRecord) -> str:
+        """Short text shown under the name in list view."""
+        discount_text = ""
+        if record.discount == '50%':
+            discount_text = "50% OFF | "
+        elif record.discount == '25-30%':
+            discount_text = "25-30% OFF | "
+        return f"{discount_text}{format_days(record.days)}"
+
+    def style_id(self, record: SaleRecord, discount_level: str) -> str:
+        return style_suffix(discount_level)
+
+    def description(self, record: SaleRecord) -> str:
+        return html_description(record)
+
+    def placemark(self, record: SaleRecord, discount_level: str) -> str:
+        return f'''      <Placemark>
+        <name>{record.name}</name>
+        <Snippet maxLines="1">{self.snippet(record)}</Snippet>
+        <description>{self.description(record)}</description>
+        <styleUrl>#{self.style_id(record, discount_level)}</styleUrl>
+        <address>{record.address}</address>
+{point_markup(record, '        ')}      </Placemark>
+'''
+
+    def spool_key(self, record: SaleRecord, day: str, discount_level: str) -> Tuple:
+        """
+        Spool bucket for one placemark.
+
+        Starts with the folder path; any further items order placemarks
+        within the folder (buckets are written in sorted key order, and
+        placemarks within a bucket in arrival order).
+        """
+        return (day, discount_level)
+
+    def add_record(self, f: TextIO, spool: PlacemarkSpool, record: SaleRecord) -> None:
+        for day, discount_level in day_placements(record):
+            spool.add(self.spool_key(record, day, discount_level),
+                      self.placemark(record, discount_level))
+
+    def finish_body(self, f: TextIO, spool: PlacemarkSpool) -> None:
+        # Create nested folders: Day -> Discount Level
+        for day in DAYS:
+            f.write('    <Folder>\n')
+            f.write(f'      <name>{day} Sales</name>\n')
+
+            for discount_level in DISCOUNT_LEVELS:
+                if spool.count((day, discount_level)):  # Only create folder if there are sales
+                    f.write('      <Folder>\n')
+                    f.write(f'        <name>{DISCOUNT_FOLDER_NAMES[discount_level]}</name>\n')
+                    spool.copy_to((day, discount_level), f)
+                    f.write('      </Folder>\n')
+
+            f.write('    </Folder>\n')
+
+
+class SafetyLayout(DayDiscountLayout):
+    """
+    Day -> Discount folders with neighborhood ratings in every placemark.
+
+    Icons combine safety (color) and discount (shape). With
+    sort_by_safety=True the folders become Safety -> Day -> Discount.
+    Records without a neighborhood rating are filed and styled as
+    UNRATED_SAFETY and described as unknown.
+    """
+
+    document_name = 'Estate Sales with Safety Ratings'
+    document_description = 'Estate sales color-coded by neighborhood quality and discount level'
+
+    def __init__(self, sort_by_safety: bool = False, rating_emoji: Optional[Callable[[str], str]] = None):
+        self.sort_by_safety = sort_by_safety
+        self.rating_emoji = rating_emoji or (lambda rating: '')
+
+    def cache_token(self) -> str:
+        emoji = [self.rating_emoji(safety) for safety in SAFETY_LEVELS]
+        return f'{super().cache_token()}\nsort_by_safety={self.sort_by_safety}\n{emoji}'
+
+    def styles(self) -> List[Tuple[str, str]]:
+        # Add combined styles for all safety/discount combinations
+        return [
+            (f"{safety}_{style_suffix(discount)}", icon_url)
+            for safety, discounts in COMBINED_ICONS.items()
+            for discount, icon_url in discounts.items()
+        ]
+
+    def snippet(self, record: SaleRecord) -> str:
+        discount_text = ""
+        if record.discount == '50%':
+            discount_text = "50% OFF"
+        elif record.discount == '25-30%':
+            discount_text = "25-30% OFF"
+
+        # Safety indicator
+        safety_emoji = self.rating_emoji(record.neighborhood['rating']) if record.neighborhood else ''
+
+        parts = [p for p in [safety_emoji, discount_text, format_days(record.days)] if p]
+        return ' | '.join(parts)
+
+    def style_id(self, record: SaleRecord, discount_level: str) -> str:
+        return f"{safety_of(record)}_{style_suffix(discount_level)}"
+
+    def description(self, record: SaleRecord) -> str:
+        neighborhood = record.neighborhood
+        if neighborhood is None:
+            return html_description(record, '''
+<p><strong>Neighborhood:</strong> Unknown</p>''')
+        safety_rating = neighborhood['rating'].replace('_', ' ').title()
+        extra = f'''
+<p><strong>Neighborhood:</strong> {safety_rating} ({neighborhood['score']}/10)</p>
+<p style="color: #666; font-size: 0.9em;">{neighborhood['description']}</p>'''
+        return html_description(record, extra)
+
+    def spool_key(self, record: SaleRecord, day: str, discount_level: str) -> Tuple:
+        safety = safety_of(record)
+        if self.sort_by_safety:
+            return (safety, day, discount_level)
+
+        # Sort by safety rating within discount level
+        safety_order = SAFETY_LEVELS.index(safety) if safety in SAFETY_LEVELS else len(SAFETY_LEVELS)
+        return (day, discount_level, safety_order)
+
+    def finish_body(self, f: TextIO, spool: PlacemarkSpool) -> None:
+        if not self.sort_by_safety:
+            super().finish_body(f, spool)
+            return
+
+        # Safety -> Day -> Discount structure, skipping empty folders
+        for safety in SAFETY_LEVELS:
+            if spool.count((safety,)) == 0:
+                continue
+
+            f.write('    <Folder>\n')
+            f.write(f'      <name>{SAFETY_FOLDER_NAMES[safety]}</name>\n')
+
+            for day in DAYS:
+                if spool.count((safety, day)) == 0:
+                    continue
+
+                f.write('      <Folder>\n')
+                f.write(f'        <name>{day}</name>\n')
+
+                for discount_level in DISCOUNT_LEVELS:
+                    if spool.count((safety, day, discount_level)) == 0:
+                        continue
+
+                    f.write('        <Folder>\n')
+                    f.write(f'          <name>{DISCOUNT_FOLDER_NAMES[discount_level]}</name>\n')
+                    spool.copy_to((safety, day, discount_level), f)
+                    f.write('        </Folder>\n')
+
+                f.write('      </Folder>\n')
+
+            f.write('    </Folder>\n')
+
+
+def render_kml(records: Iterable[SaleRecord], layout: Layout, output_path: Path,
+               kmz: Optional[bool] = None) -> KMLWriter:
+    """
+    Write a complete KML document.
+
+    Args:
+        records: Parsed sales (any iterable; consumed once)
+        layout: Layout deciding folders, styles and placemark markup
+        output_path: Path to output KML or KMZ file
+        kmz: Write a zipped KMZ (None = decide from the .kmz suffix)
+
+    Returns:
+        The finished KMLWriter (for record and placemark counts)
+    """
+    with KMLWriter(layout, output_path, kmz) as writer:
+        for record in records:
+            writer.add(record)
+    return writer
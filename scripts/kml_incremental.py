@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Incremental KML builds.
+
+A full conversion parses and renders every sale on every run, even when
+only one sale's hours changed. IncrementalBuild keeps a manifest next to
+the output (<output>.manifest.json) holding, for every sale:
+
+- a fingerprint of its input: the CSV row, the neighborhood rating and
+  the coordinates, if geocoded;
+- its listing URL match;
+- its rendered placemarks (spool key and markup per placemark) and a
+  fingerprint of that markup.
+
+On the next build, sales whose input fingerprint is in the manifest reuse
+their stored placemarks; only added or changed sales are parsed and
+rendered, and sales no longer in the CSV simply drop out. Stored URL
+matches are reused while the markdown's address index is unchanged;
+when it changes, every sale is matched again and re-rendered only if its
+URL moved. The document is then reassembled from the placemarks in CSV
+order. If the sequence of placemark fingerprints is unchanged and the
+output file is the one the manifest describes, nothing is written at all.
+
+The manifest is discarded (and everything re-rendered) when the layout
+options or the rendering code (kml_engine, schedule_parser) change.
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import kml_engine
+import schedule_parser
+from address_index import AddressIndex, AddressMatch
+from kml_engine import Layout, match_sale_url, parse_sale
+from kml_writer import KMLWriter, is_kmz_path
+from sales import Sale
+
+
+# Bump when the manifest layout changes
+MANIFEST_VERSION = 1
+
+Pieces = List[Tuple[Optional[Tuple], str]]
+
+
+def manifest_path(output_path: Path) -> Path:
+    """Manifest kept next to an output file (map.kml -> map.kml.manifest.json)."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + '.manifest.json')
+
+
+def fingerprint(*parts) -> str:
+    """SHA-1 of the JSON encoding of parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def row_fingerprint(sale: Sale, neighborhood_key: str = '') -> str:
+    """Fingerprint of a sale's CSV values and its neighborhood rating."""
+    payload = '\x1f'.join(sale.values()) + '\x1e' + neighborhood_key
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=1)
+def engine_fingerprint() -> str:
+    """Fingerprint of the rendering code, so code changes invalidate manifests."""
+    digest = hashlib.sha1(str(MANIFEST_VERSION).encode())
+    for module in (kml_engine, schedule_parser):
+        digest.update(Path(module.__file__).read_bytes())
+    return digest.hexdigest()
+
+
+def _output_stat(output_path: Path) -> Optional[Dict[str, int]]:
+    """Size and modification time identifying the output file on disk."""
+    try:
+        stat = output_path.stat()
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class IncrementalBuild:
+    """
+    Builds a KML document, re-rendering only sales that changed.
+
+    Use as a context manager; the output and manifest are written when
+    the block exits without an error.
+
+    Args:
+        layout: kml_engine layout deciding folders, styles and markup
+        output_path: Destination .kml or .kmz file
+        address_urls: AddressIndex of URLs (from parse_markdown_urls)
+        kmz: Force KMZ output (None = decide from the file suffix)
+    """
+
+    def __init__(self, layout: Layout, output_path: Path, address_urls: AddressIndex,
+                 kmz: Optional[bool] = None):
+        self.layout = layout
+        self.output_path = Path(output_path)
+        self.address_urls = address_urls
+        self.kmz = is_kmz_path(output_path) if kmz is None else kmz
+        self.manifest_path = manifest_path(self.output_path)
+
+        self.rendered = 0
+        self.reused = 0
+        self.removed = 0
+        self.up_to_date = False
+
+        self._token = fingerprint(engine_fingerprint(), layout.cache_token(), self.kmz)
+        self._index_token = fingerprint(sorted(address_urls.items()))
+        self._matches_valid = False
+        self._previous: Dict = {}
+        self._cached: Dict[str, Dict] = {}
+        self._fragments: Dict[str, Dict] = {}
+        self._order: List[str] = []
+        self._counts: Dict[Tuple, int] = {}
+        self._neighborhood_keys: Dict[int, str] = {}
+
+    @property
+    def records_written(self) -> int:
+        """Number of sales in the document."""
+        return len(self._order)
+
+    def __enter__(self) -> 'IncrementalBuild':
+        self._previous = self._load()
+        self._cached = self._previous.get('fragments', {})
+        self._matches_valid = self._previous.get('index') == self._index_token
+        return self
+
+    def _load(self) -> Dict:
+        """Read the previous manifest, or {} if missing or built differently."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not isinstance(manifest, dict) or manifest.get('token') != self._token:
+            return {}
+        return manifest
+
+    def _neighborhood_key(self, neighborhood: Optional[Dict]) -> str:
+        """Fingerprint of a rating; ratings are shared per ZIP, so memoize by identity."""
+        if neighborhood is None:
+            return ''
+        key = self._neighborhood_keys.get(id(neighborhood))
+        if key is None:
+            key = fingerprint(neighborhood)
+            self._neighborhood_keys[id(neighborhood)] = key
+        return key
+
+    def add_sale(self, sale: Sale, neighborhood: Optional[Dict] = None,
+                 location: Optional[Tuple[float, float]] = None) -> AddressMatch:
+        """
+        Add one CSV row, rendering it only if it is new or changed.
+
+        Args:
+            sale: Sale from the CSV
+            neighborhood: Neighborhood rating for the sale's ZIP, if any
+            location: (lat, lon) of the sale, if geocoded
+
+        Returns:
+            The sale's URL match (for the converters' statistics)
+        """
+        input_key = self._neighborhood_key(neighborhood)
+        if location is not None:
+            input_key += f'@{location[0]:.6f},{location[1]:.6f}'
+        key = row_fingerprint(sale, input_key)
+
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            fragment = self._reuse(key, sale)
+            if fragment is None:
+                record = parse_sale(sale, self.address_urls, neighborhood, location)
+                pieces = self.layout.render_record(record)
+                fragment = {
+                    'url': record.url,
+                    'confidence': record.url_confidence,
+                    'hash': fingerprint(pieces),
+                    'pieces': pieces,
+                }
+                self.rendered += 1
+            else:
+                self.reused += 1
+            self._fragments[key] = fragment
+        else:
+            self.reused += 1  # Identical row seen earlier in this CSV
+
+        self._order.append(key)
+        for spool_key, _ in fragment['pieces']:
+            if spool_key is not None:
+                self._counts[spool_key] = self._counts.get(spool_key, 0) + 1
+        return AddressMatch(fragment['url'], fragment['confidence'])
+
+    def _reuse(self, key: str, sale: Sale) -> Optional[Dict]:
+        """Stored fragment for a row, if it is still valid."""
+        fragment = self._cached.get(key)
+        if fragment is None:
+            return None
+        if not self._matches_valid:
+            match = match_sale_url(sale, self.address_urls)
+            if (match.url, match.confidence) != (fragment['url'], fragment['confidence']):
+                return None
+        # JSON turned the spool key tuples into lists
+        fragment['pieces'] = [
+            (tuple(spool_key) if spool_key is not None else None, markup)
+            for spool_key, markup in fragment['pieces']
+        ]
+        return fragment
+
+    def count(self, prefix: Tuple = ()) -> int:
+        """Number of spooled placemarks whose key starts with prefix."""
+        return sum(n for key, n in self._counts.items() if key[:len(prefix)] == prefix)
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            return False
+
+        self.removed = len(set(self._cached) - set(self._fragments))
+        document = fingerprint(self._token, [self._fragments[key]['hash'] for key in self._order])
+
+        if (self._previous.get('document') == document
+                and self._previous.get('output') == _output_stat(self.output_path)):
+            self.up_to_date = True
+            return False
+
+        with KMLWriter(self.layout, self.output_path, self.kmz) as writer:
+            for key in self._order:
+                writer.add_rendered(self._fragments[key]['pieces'])
+
+        self._save(document)
+        return False
+
+    def _save(self, document: str) -> None:
+        """Write the manifest atomically."""
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'token': self._token,
+            'index': self._index_token,
+            'document': document,
+            'output': _output_stat(self.output_path),
+            'fragments': self._fragments,
+        }
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.manifest_path)
+
+    def summary(self) -> str:
+        """One-line description of what the build did."""
+        if self.up_to_date:
+            return f"Up to date ({self.records_written} sales) - output not rewritten"
+        return (f"Incremental build: {self.rendered} rendered, {self.reused} reused, "
+                f"{self.removed} removed")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Streaming placemark reader for KML files.
+
+ET.parse() builds the whole document tree before anything can be read,
+so memory grows with the size of the map. iter_placemarks() uses
+iterparse() instead: each <Placemark> is read, turned into a small dict,
+and then detached from the tree, so memory stays constant per placemark
+no matter how many weekends or folders the file holds.
+
+KMZ files (zipped KML, as written by kml_writer) are read the same way,
+streaming the document straight out of the archive.
+"""
+
+import re
+import zipfile
+from pathlib import Path
+from typing import IO, Dict, Iterator, Optional, Union
+from xml.etree import ElementTree as ET
+
+
+KML_NAMESPACE = 'http://www.opengis.net/kml/2.2'
+
+_NS = {'kml': KML_NAMESPACE}
+_URL_RE = re.compile(r'href="(https://[^"]+)"')
+
+
+def _local_name(tag: str) -> str:
+    """Strip the '{namespace}' prefix from an element tag."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def extract_url(description: Optional[str]) -> Optional[str]:
+    """Return the first https link in a placemark description, if any."""
+    if not description:
+        return None
+    url_match = _URL_RE.search(description)
+    return url_match.group(1) if url_match else None
+
+
+def _kmz_document(archive: zipfile.ZipFile) -> str:
+    """Name of the KML document in a KMZ: the first .kml entry, as Google Earth reads it."""
+    for name in archive.namelist():
+        if name.lower().endswith('.kml'):
+            return name
+    raise ValueError(f"No .kml document in {archive.filename}")
+
+
+def iter_placemarks(kml_path: Path) -> Iterator[Dict]:
+    """
+    Yield placemarks from a KML or KMZ file one at a time.
+
+    Args:
+        kml_path: Path to the KML file, or a KMZ archive containing one
+
+    Yields:
+        {
+            'name': str or None,
+            'address': str or None,
+            'url': str or None,        # First https link in the description
+            'description': str or None
+        }
+    """
+    if not zipfile.is_zipfile(kml_path):
+        yield from _iter_document(str(kml_path))
+        return
+
+    with zipfile.ZipFile(kml_path) as archive:
+        with archive.open(_kmz_document(archive)) as document:
+            yield from _iter_document(document)
+
+
+def _iter_document(source: Union[str, IO[bytes]]) -> Iterator[Dict]:
+    """Stream placemarks out of a KML document (file name or binary stream)."""
+    # Open elements from the root down; the parent of a finished element
+    # is the last entry once it has been popped
+    stack = []
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        if _local_name(elem.tag) != 'Placemark':
+            continue
+
+        name_elem = elem.find('kml:name', _NS)
+        desc_elem = elem.find('kml:description', _NS)
+        addr_elem = elem.find('kml:address', _NS)
+
+        description = desc_elem.text if desc_elem is not None else None
+        placemark = {
+            'name': name_elem.text if name_elem is not None else None,
+            'address': addr_elem.text if addr_elem is not None else None,
+            'url': extract_url(description),
+            'description': description
+        }
+
+        # Drop the finished placemark so the tree never grows
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+        yield placemark
+
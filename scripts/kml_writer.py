@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Streaming KML output with bounded memory.
+
+Converters hand sales to a KMLWriter one at a time as they are read from
+the CSV. Flat layouts write each placemark straight to the output; folder
+layouts (Day -> Discount, Safety -> Day -> Discount) must emit placemarks
+in folder order rather than CSV order, so they append each placemark's
+markup to a per-folder spool file and copy the spools out, folder by
+folder, when the document is closed. Each spool stays in memory until it
+reaches SPOOL_MEMORY_LIMIT and then rolls over to a temporary file, so
+memory use does not grow with the number of sales.
+
+Output ending in .kmz (or opened with kmz=True) is written as a zipped
+KML (doc.kml inside a deflate-compressed archive), streamed straight into
+the zip entry.
+"""
+
+import io
+import shutil
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+
+# Bytes of placemark markup a single folder spool keeps in memory before
+# rolling over to a temporary file
+SPOOL_MEMORY_LIMIT = 256 * 1024
+
+# Name of the KML document inside a KMZ archive
+KMZ_DOCUMENT_NAME = 'doc.kml'
+
+
+def is_kmz_path(output_path: Path) -> bool:
+    """Whether a path names a KMZ (zipped KML) file."""
+    return Path(output_path).suffix.lower() == '.kmz'
+
+
+@contextmanager
+def open_kml_output(output_path: Path, kmz: Optional[bool] = None) -> Iterator[TextIO]:
+    """
+    Open a text stream for a KML document.
+
+    Args:
+        output_path: Destination file
+        kmz: Write a zipped KMZ archive (None = decide from the .kmz suffix)
+
+    Yields:
+        Text stream to write the KML document to
+    """
+    if kmz is None:
+        kmz = is_kmz_path(output_path)
+
+    if not kmz:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(KMZ_DOCUMENT_NAME, 'w', force_zip64=True) as entry:
+            with io.TextIOWrapper(entry, encoding='utf-8', newline='') as f:
+                yield f
+
+
+class PlacemarkSpool:
+    """
+    Placemark markup buffered per folder until the folder is written.
+
+    Buckets are identified by tuples (e.g. (day, discount level)); a
+    prefix of a key selects every bucket beneath it, in sorted key order.
+
+    Args:
+        memory_limit: Bytes a bucket keeps in memory before using a temp file
+    """
+
+    def __init__(self, memory_limit: int = SPOOL_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self._buckets: Dict[Tuple, SpooledTemporaryFile] = {}
+        self._counts: Dict[Tuple, int] = {}
+
+    def add(self, key: Tuple, markup: str) -> None:
+        """Append one placemark's markup to a bucket."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = SpooledTemporaryFile(
+                max_size=self.memory_limit, mode='w+', encoding='utf-8', newline=''
+            )
+            self._buckets[key] = bucket
+        bucket.write(markup)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def count(self, prefix: Tuple = ()) -> int:
+        """Number of placemarks in all buckets whose key starts with prefix."""
+        return sum(n for key, n in self._counts.items() if key[:len(prefix)] == prefix)
+
+    def copy_to(self, prefix: Tuple, out: TextIO) -> None:
+        """Write the markup of every bucket under prefix to out, in key order."""
+        for key in sorted(k for k in self._buckets if k[:len(prefix)] == prefix):
+            bucket = self._buckets[key]
+            bucket.seek(0)
+            shutil.copyfileobj(bucket, out)
+
+    def close(self) -> None:
+        """Discard all buckets (placemark counts remain readable)."""
+        for bucket in self._buckets.values():
+            bucket.close()
+        self._buckets.clear()
+
+
+class KMLWriter:
+    """
+    Writes a KML document one sale record at a time.
+
+    Use as a context manager; the document is finished (spooled folders
+    written, footer closed) when the block exits without an error.
+
+    Args:
+        layout: kml_engine layout deciding folders, styles and markup
+        output_path: Destination .kml or .kmz file
+        kmz: Force KMZ output (None = decide from the file suffix)
+    """
+
+    def __init__(self, layout, output_path: Path, kmz: Optional[bool] = None):
+        self.layout = layout
+        self.output_path = Path(output_path)
+        self.kmz = is_kmz_path(output_path) if kmz is None else kmz
+        self.records_written = 0
+        self.spool = PlacemarkSpool()
+        self._output = None
+        self._out: Optional[TextIO] = None
+
+    def __enter__(self) -> 'KMLWriter':
+        self._output = open_kml_output(self.output_path, self.kmz)
+        self._out = self._output.__enter__()
+        self._out.write(self.layout.header())
+        return self
+
+    def add(self, record) -> None:
+        """Add one sale record to the document."""
+        self.layout.add_record(self._out, self.spool, record)
+        self.records_written += 1
+
+    def add_rendered(self, pieces: Iterable[Tuple[Optional[Tuple], str]]) -> None:
+        """
+        Add one record's pre-rendered placemarks (from layout.render_record()).
+
+        Args:
+            pieces: (spool key, markup) pairs; markup with a None key is
+                written straight to the output
+        """
+        for key, markup in pieces:
+            if key is None:
+                self._out.write(markup)
+            else:
+                self.spool.add(key, markup)
+        self.records_written += 1
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        try:
+            if exc_type is None:
+                self.layout.finish_body(self._out, self.spool)
+                self._out.write(self.layout.footer())
+        finally:
+            self.spool.close()
+            self._output.__exit__(exc_type, exc, tb)
+        return False
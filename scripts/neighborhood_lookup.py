@@ -11,74 +11,180 @@ No API keys required - uses publicly available data.
 
 Data source priority:
 1. CrimeGrade.org via Playwright (if installed) - actual crime grades
-2. CrimeGrade.org via urllib (may be blocked by bot protection)
+2. CrimeGrade.org via plain HTTP (may be blocked by bot protection)
 3. Income estimates (Census-based) - always available fallback
 
 To enable Playwright support (recommended for best results):
     pip install playwright
     playwright install chromium
 
+Playwright fetches share one long-lived headless browser (see
+CrimeGradeBrowserPool), which is started on first use and closed at the
+end of batch_lookup() or at interpreter exit.
+
 Future enhancements (TODO):
 - Census block group level crime data (more granular than ZIP)
 - SpotCrime incident counts by address
 - Zillow home value scraping
 """
 
+import asyncio
+import atexit
+import http.client
 import json
-import re
-import urllib.request
-import urllib.error
-import ssl
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, Tuple
 from pathlib import Path
 
+from cache_policy import (DAY, BackgroundRefresher, CachePolicy, FetchUnavailable, SingleFlight,
+                          cached_fetch)
+from cache_store import CacheStore, MemoryCacheStore, SQLiteCacheStore, import_json_cache
+from crimegrade_parser import parse_crimegrade_html
+from http_client import HTTPClient
+from retry_policy import OPEN, CircuitOpenError, get_retry_policy, host_of
+
 # Check if Playwright is available
 try:
-    from playwright.sync_api import sync_playwright
+    from playwright.async_api import async_playwright
     PLAYWRIGHT_AVAILABLE = True
 except ImportError:
     PLAYWRIGHT_AVAILABLE = False
 
+# Number of browser pages the shared Playwright pool renders at once
+BROWSER_POOL_SIZE = 4
+
+# Number of ZIP codes batch_lookup resolves concurrently
+LOOKUP_WORKERS = BROWSER_POOL_SIZE
+
+CRIMEGRADE_URL = 'https://crimegrade.org/safest-places-in-{zip_code}/'
+
+BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# JavaScript predicate: true once the CrimeGrade grade widget has rendered
+CRIMEGRADE_READY_JS = """() => {
+    const text = document.body ? document.body.innerText : '';
+    return /[Cc]rime\\s*[Gg]rade[:\\s]*[A-F][+-]?\\b/.test(text)
+        || !!document.querySelector('[class*="grade"]');
+}"""
+
+# Parsed CrimeGrade results below this confidence fall back to income
+# estimates (cached results from before confidence scoring count as 1.0)
+MIN_CRIME_CONFIDENCE = 0.3
+
 
-# Cache for API responses to avoid repeated lookups
-_zip_cache: Dict[str, Dict] = {}
-_crime_cache: Dict[str, Dict] = {}
+# Cache namespaces for API responses to avoid repeated lookups
+ZIP_NAMESPACE = 'zip'
+CRIME_NAMESPACE = 'crimegrade'
 
-# Cache file path for persistent storage
+# Persistent cache database (per-key upserts, safe to share between runs)
+CACHE_DB_FILE = Path(__file__).parent / '.neighborhood_cache.sqlite3'
+
+# Legacy whole-file JSON caches, imported into the database once
 CACHE_FILE = Path(__file__).parent / '.neighborhood_cache.json'
 CRIME_CACHE_FILE = Path(__file__).parent / '.crimegrade_cache.json'
 
+# Freshness rules per namespace: ZIP metadata almost never changes; crime
+# grades are republished occasionally. Keys with no data are retried after a day.
+CACHE_POLICIES = {
+    ZIP_NAMESPACE: CachePolicy(positive_ttl=365 * DAY, negative_ttl=1 * DAY, stale_ttl=365 * DAY),
+    CRIME_NAMESPACE: CachePolicy(positive_ttl=30 * DAY, negative_ttl=1 * DAY, stale_ttl=60 * DAY),
+}
+
+_cache_store: Optional[CacheStore] = None
+_cache_store_lock = threading.Lock()
+
+# Stale entries are served immediately and refreshed here
+_refresher = BackgroundRefresher()
+
+# Concurrent lookups of the same key share a single fetch
+_inflight = SingleFlight()
+
+# When True, lookups are answered from the cache only (no network)
+_offline = False
+
+# Keep-alive connections shared by the Zippopotam and CrimeGrade fetches.
+# Certificates are not verified (some systems have cert issues).
+_http_client = HTTPClient(verify_tls=False)
+
+
+def set_offline(offline: bool) -> None:
+    """
+    Enable or disable offline mode.
+
+    In offline mode every lookup is answered from the cache, whatever its
+    age; ZIP codes that were never cached fall back to income estimates.
+    """
+    global _offline
+    _offline = offline
+
+
+def is_offline() -> bool:
+    """Return True if lookups are restricted to the cache."""
+    return _offline
+
+
+def wait_for_refreshes() -> None:
+    """Block until background refreshes of stale cache entries finish."""
+    _refresher.wait()
+
+
+def set_cache_store(store: Optional[CacheStore]) -> None:
+    """
+    Replace the cache store used for lookups.
+
+    Args:
+        store: Any CacheStore (e.g. MemoryCacheStore for tests), or None to
+            reopen the default SQLite cache on next use
+    """
+    global _cache_store
+    with _cache_store_lock:
+        if _cache_store is not None and _cache_store is not store:
+            _cache_store.close()
+        _cache_store = store
+
+
+def get_cache_store() -> CacheStore:
+    """
+    Get the active cache store, opening the SQLite cache on first use.
+
+    Legacy JSON cache files are imported the first time the database is
+    opened. If the database cannot be opened, an in-memory store is used.
+    """
+    global _cache_store
+    with _cache_store_lock:
+        if _cache_store is None:
+            try:
+                store = SQLiteCacheStore(CACHE_DB_FILE)
+                import_json_cache(store, ZIP_NAMESPACE, CACHE_FILE)
+                import_json_cache(store, CRIME_NAMESPACE, CRIME_CACHE_FILE)
+            except Exception:
+                store = MemoryCacheStore()  # Silently fall back if can't write cache
+            _cache_store = store
+        return _cache_store
+
 
 def load_cache() -> None:
-    """Load cached neighborhood data from disk."""
-    global _zip_cache, _crime_cache
-    if CACHE_FILE.exists():
-        try:
-            with open(CACHE_FILE, 'r') as f:
-                _zip_cache = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            _zip_cache = {}
-    if CRIME_CACHE_FILE.exists():
-        try:
-            with open(CRIME_CACHE_FILE, 'r') as f:
-                _crime_cache = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            _crime_cache = {}
+    """Open the persistent cache (importing legacy JSON caches if needed)."""
+    get_cache_store()
 
 
 def save_cache() -> None:
-    """Save neighborhood cache to disk."""
-    try:
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(_zip_cache, f, indent=2)
-    except IOError:
-        pass  # Silently fail if can't write cache
-    try:
-        with open(CRIME_CACHE_FILE, 'w') as f:
-            json.dump(_crime_cache, f, indent=2)
-    except IOError:
-        pass
+    """
+    Flush the neighborhood cache.
+
+    Entries are written to the store as each lookup succeeds, so there is
+    nothing left to write; kept so existing callers keep working.
+    """
+
+
+def _cached_lookup(namespace: str, key: str, fetch) -> Optional[Dict]:
+    """Look up a key through the cache policy for its namespace."""
+    return _inflight.do(f'{namespace}:{key}', lambda: cached_fetch(
+        get_cache_store(), namespace, key, fetch,
+        CACHE_POLICIES[namespace], offline=_offline, refresher=_refresher
+    ))
 
 
 def fetch_zip_data(zip_code: str, timeout: int = 10) -> Optional[Dict]:
@@ -86,7 +192,9 @@ def fetch_zip_data(zip_code: str, timeout: int = 10) -> Optional[Dict]:
     Fetch demographic data for a ZIP code from Zippopotam.us API.
 
     This free API provides basic location data. We supplement with
-    income estimates based on state/region.
+    income estimates based on state/region. Results (including unknown
+    ZIP codes) are cached according to CACHE_POLICIES; connection
+    failures and server errors are not.
 
     Args:
         zip_code: 5-digit ZIP code
@@ -97,24 +205,219 @@ def fetch_zip_data(zip_code: str, timeout: int = 10) -> Optional[Dict]:
     """
     zip_code = zip_code.strip()[:5]  # Ensure 5 digits
 
-    if zip_code in _zip_cache:
-        return _zip_cache[zip_code]
+    return _cached_lookup(ZIP_NAMESPACE, zip_code, lambda: _fetch_zip_data_uncached(zip_code, timeout))
 
+
+def _fetch_zip_data_uncached(zip_code: str, timeout: int) -> Optional[Dict]:
+    """Query Zippopotam.us for a ZIP code, bypassing the cache."""
     url = f"https://api.zippopotam.us/us/{zip_code}"
 
     try:
-        # Create SSL context that doesn't verify (some systems have cert issues)
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-
-        req = urllib.request.Request(url, headers={'User-Agent': 'EstateSaleNinja/1.0'})
-        with urllib.request.urlopen(req, timeout=timeout, context=ctx) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            _zip_cache[zip_code] = data
-            return data
-    except (urllib.error.URLError, urllib.error.HTTPError, json.JSONDecodeError, TimeoutError):
-        return None
+        response = get_retry_policy().call(url, lambda: _http_client.get(url, timeout=timeout))
+        if response.status >= 500:
+            raise FetchUnavailable(f"Zippopotam returned HTTP {response.status}")
+        if response.status != 200:
+            return None  # Unknown ZIP code (404) or refused
+        return json.loads(response.text())
+    except (OSError, http.client.HTTPException, json.JSONDecodeError, CircuitOpenError) as e:
+        raise FetchUnavailable(str(e)) from e
+
+
+class CrimeGradeBrowserPool:
+    """
+    Long-lived headless Chromium shared by all CrimeGrade lookups.
+
+    Playwright runs on a private thread with its own asyncio event loop, so
+    fetch() can be called from any thread. One browser context is reused
+    for every ZIP code and up to `size` pages render concurrently; idle
+    pages are kept for the next fetch.
+
+    Args:
+        size: Maximum number of pages rendering at once
+        navigation_timeout: Page load timeout in milliseconds
+        ready_timeout: How long to wait for the grade widget, in milliseconds
+        fetch_timeout: Longest fetch() waits, in seconds, including time
+            spent queued for a free page
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE, navigation_timeout: int = 20000,
+                 ready_timeout: int = 8000, fetch_timeout: float = 60):
+        self.size = max(1, size)
+        self.navigation_timeout = navigation_timeout
+        self.ready_timeout = ready_timeout
+        self.fetch_timeout = fetch_timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._failed = False
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._pages: Optional[asyncio.Queue] = None      # Idle pages
+        self._slots: Optional[asyncio.Semaphore] = None  # Pages that may be in use
+
+    def _start(self) -> bool:
+        """Start the event loop thread and launch the browser (once)."""
+        with self._lock:
+            if self._loop is not None:
+                return True
+            if self._failed:
+                return False
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='crimegrade-browser', daemon=True)
+            thread.start()
+
+            try:
+                asyncio.run_coroutine_threadsafe(self._launch(), loop).result()
+            except Exception:
+                # Chromium missing or failed to start - don't retry per ZIP
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join()
+                loop.close()
+                self._failed = True
+                return False
+
+            self._loop = loop
+            self._thread = thread
+            return True
+
+    async def _launch(self) -> None:
+        self._playwright = await async_playwright().start()
+        try:
+            self._browser = await self._playwright.chromium.launch(
+                headless=True,
+                args=['--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage']
+            )
+            self._context = await self._browser.new_context(
+                ignore_https_errors=True,
+                user_agent=BROWSER_USER_AGENT
+            )
+        except Exception:
+            await self._playwright.stop()
+            self._playwright = None
+            raise
+        self._pages = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.size)
+
+    async def _acquire_page(self):
+        """Wait for a free slot, then reuse an idle page or open a new one."""
+        await self._slots.acquire()
+        try:
+            if not self._pages.empty():
+                return self._pages.get_nowait()
+            return await self._context.new_page()
+        except BaseException:  # Including cancellation by a timed-out fetch()
+            self._slots.release()
+            raise
+
+    async def _release_page(self, page, healthy: bool) -> None:
+        try:
+            if healthy and not page.is_closed():
+                self._pages.put_nowait(page)
+                return
+            # Drop broken pages; the freed slot opens a fresh one on next demand
+            try:
+                await page.close()
+            except Exception:
+                pass
+        finally:
+            self._slots.release()
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        page = await self._acquire_page()
+        healthy = False  # Until the page has finished a navigation
+        try:
+            response = await page.goto(url, wait_until='domcontentloaded',
+                                       timeout=self.navigation_timeout)
+            healthy = True
+            if not response or response.status != 200:
+                return None
+
+            # Wait until the grade widget is on the page rather than a fixed delay
+            try:
+                await page.wait_for_function(CRIMEGRADE_READY_JS, timeout=self.ready_timeout)
+            except Exception:
+                pass  # Parse whatever did render
+
+            return await page.content()
+        except Exception:
+            healthy = False
+            return None
+        finally:
+            await self._release_page(page, healthy)
+
+    def fetch(self, url: str) -> Optional[str]:
+        """
+        Render a page and return its HTML.
+
+        Args:
+            url: Page URL
+
+        Returns:
+            Rendered HTML, or None if the page could not be fetched in
+            fetch_timeout seconds
+        """
+        if not self._start():
+            return None
+        future = asyncio.run_coroutine_threadsafe(self._fetch(url), self._loop)
+        try:
+            return future.result(timeout=self.fetch_timeout)
+        except Exception:
+            future.cancel()  # Frees its page slot if it is still waiting or rendering
+            return None
+
+    async def _shutdown(self) -> None:
+        try:
+            if self._context is not None:
+                await self._context.close()
+            if self._browser is not None:
+                await self._browser.close()
+        finally:
+            if self._playwright is not None:
+                await self._playwright.stop()
+            self._context = self._browser = self._playwright = None
+            self._pages = self._slots = None
+
+    def close(self) -> None:
+        """Close the browser and stop the event loop thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+            if loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=30)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=30)
+            loop.close()
+
+
+_browser_pool: Optional[CrimeGradeBrowserPool] = None
+_browser_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> CrimeGradeBrowserPool:
+    """Get the shared browser pool, creating it on first use."""
+    global _browser_pool
+    with _browser_pool_lock:
+        if _browser_pool is None:
+            _browser_pool = CrimeGradeBrowserPool()
+        return _browser_pool
+
+
+def close_browser_pool() -> None:
+    """Shut down the shared browser pool if one was started."""
+    global _browser_pool
+    with _browser_pool_lock:
+        pool, _browser_pool = _browser_pool, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(close_browser_pool)
 
 
 def fetch_crimegrade_playwright(zip_code: str) -> Optional[str]:
@@ -122,6 +425,10 @@ def fetch_crimegrade_playwright(zip_code: str) -> Optional[str]:
     Fetch CrimeGrade.org page using Playwright (headless browser).
 
     This bypasses bot protection that blocks simple HTTP requests.
+    Pages are rendered by the shared CrimeGradeBrowserPool, so the browser
+    is launched once per run instead of once per ZIP code. Renders are not
+    retried or reported to the circuit breaker; a failed render falls
+    through to fetch_crimegrade_urllib, which is.
     Requires: pip install playwright && playwright install chromium
 
     Args:
@@ -133,71 +440,49 @@ def fetch_crimegrade_playwright(zip_code: str) -> Optional[str]:
     if not PLAYWRIGHT_AVAILABLE:
         return None
 
-    url = f"https://crimegrade.org/safest-places-in-{zip_code}/"
-
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-gpu', '--disable-dev-shm-usage']
-            )
-            context = browser.new_context(
-                ignore_https_errors=True,
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            page = context.new_page()
-
-            try:
-                response = page.goto(url, wait_until='domcontentloaded', timeout=20000)
-
-                # Check for successful response
-                if response and response.status == 200:
-                    # Wait for content to render
-                    page.wait_for_timeout(2000)
-                    html = page.content()
-                    return html
-                else:
-                    return None
-
-            finally:
-                browser.close()
-
-    except Exception:
-        # Any error - return None to fall back to other methods
-        return None
+    url = CRIMEGRADE_URL.format(zip_code=zip_code)
+    return get_browser_pool().fetch(url)
 
 
 def fetch_crimegrade_urllib(zip_code: str, timeout: int = 15) -> Optional[str]:
     """
-    Fetch CrimeGrade.org page using urllib (may be blocked by bot protection).
+    Fetch CrimeGrade.org page over plain HTTP (may be blocked by bot protection).
+
+    Uses the module's keep-alive client, so consecutive lookups reuse the
+    TLS connection to crimegrade.org. Throttling and server errors are
+    retried by the shared RetryPolicy.
 
     Args:
         zip_code: 5-digit ZIP code
         timeout: Request timeout in seconds
 
     Returns:
-        HTML content of the page, or None if fetch fails
-    """
-    url = f"https://crimegrade.org/safest-places-in-{zip_code}/"
+        HTML content of the page, or None if CrimeGrade has no page for
+        the ZIP code or refused the request (e.g. a 403 bot block)
 
-    try:
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-        }
+    Raises:
+        FetchUnavailable: If the connection failed, the server returned a
+            5xx error or the circuit breaker refused the request
+    """
+    url = CRIMEGRADE_URL.format(zip_code=zip_code)
 
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=timeout, context=ctx) as response:
-            return response.read().decode('utf-8')
+    headers = {
+        'User-Agent': BROWSER_USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+    }
 
-    except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError):
-        return None
+    try:
+        response = get_retry_policy().call(
+            url, lambda: _http_client.get(url, headers=headers, timeout=timeout)
+        )
+        if response.status >= 500:
+            raise FetchUnavailable(f"CrimeGrade returned HTTP {response.status}")
+        if response.status != 200:
+            return None  # No page for the ZIP (404) or blocked as a bot (403)
+        return response.text()
+    except (OSError, http.client.HTTPException, CircuitOpenError) as e:
+        raise FetchUnavailable(str(e)) from e
 
 
 def fetch_crimegrade(zip_code: str, timeout: int = 15) -> Optional[Dict]:
@@ -206,9 +491,15 @@ def fetch_crimegrade(zip_code: str, timeout: int = 15) -> Optional[Dict]:
 
     Tries multiple methods in order:
     1. Playwright (headless browser) - best success rate
-    2. urllib with browser headers - may be blocked
+    2. Plain HTTP with browser headers - may be blocked
     3. Returns None to fall back to income estimates
 
+    Results, including ZIP codes CrimeGrade has no grade for or blocks,
+    are cached according to CACHE_POLICIES; connection failures, server
+    errors and an open circuit are not. Stale grades are returned at once
+    and refreshed in the background. In offline mode only the cache is
+    consulted.
+
     Args:
         zip_code: 5-digit ZIP code
         timeout: Request timeout in seconds
@@ -220,109 +511,36 @@ def fetch_crimegrade(zip_code: str, timeout: int = 15) -> Optional[Dict]:
             'violent_grade': str,      # Grade for violent crime
             'property_grade': str,     # Grade for property crime
             'crime_description': str,  # Description like "lower than average"
+            'confidence': float,       # 0-1, how sure the page parse is
         }
         Returns None if lookup fails.
     """
     zip_code = zip_code.strip()[:5]
 
-    # Check cache first
-    if zip_code in _crime_cache:
-        return _crime_cache[zip_code]
+    return _cached_lookup(CRIME_NAMESPACE, zip_code, lambda: _fetch_crimegrade_uncached(zip_code, timeout))
+
 
+def _fetch_crimegrade_uncached(zip_code: str, timeout: int) -> Optional[Dict]:
+    """Fetch and parse a CrimeGrade page, bypassing the cache."""
     html = None
 
+    # Skip both fetchers while CrimeGrade keeps failing (not cached, so the
+    # ZIP is looked up again once the circuit closes)
+    breaker = get_retry_policy().breaker
+    if breaker is not None and breaker.state(host_of(CRIMEGRADE_URL)) == OPEN:
+        raise FetchUnavailable(f"Circuit open for {host_of(CRIMEGRADE_URL)}")
+
     # Try Playwright first (best success rate)
     if PLAYWRIGHT_AVAILABLE:
         html = fetch_crimegrade_playwright(zip_code)
 
-    # Fall back to urllib if Playwright failed or unavailable
+    # Fall back to plain HTTP if Playwright failed or unavailable
     if html is None:
         html = fetch_crimegrade_urllib(zip_code, timeout)
 
     # Parse the HTML if we got it
     if html:
-        result = parse_crimegrade_html(html)
-        if result:
-            _crime_cache[zip_code] = result
-            save_cache()
-            return result
-
-    return None
-
-
-def parse_crimegrade_html(html: str) -> Optional[Dict]:
-    """
-    Parse CrimeGrade.org HTML to extract crime grades.
-
-    Args:
-        html: Raw HTML from CrimeGrade page
-
-    Returns:
-        Dictionary with parsed crime data or None if parsing fails
-    """
-    result = {
-        'overall_grade': None,
-        'violent_grade': None,
-        'property_grade': None,
-        'crime_description': None,
-    }
-
-    # Look for overall crime grade - usually in a prominent location
-    # Pattern: grade like "A+", "B-", "C", "D+", "F" etc.
-    # CrimeGrade shows grades in various formats
-
-    # Try to find "Overall Crime Grade" or similar
-    overall_match = re.search(
-        r'(?:overall|total)\s*(?:crime)?\s*grade[:\s]*([A-F][+-]?)',
-        html, re.IGNORECASE
-    )
-    if overall_match:
-        result['overall_grade'] = overall_match.group(1).upper()
-
-    # Look for letter grades in prominent positions (often in headers or large text)
-    # CrimeGrade typically shows the grade prominently
-    grade_pattern = re.search(
-        r'<[^>]*class="[^"]*grade[^"]*"[^>]*>([A-F][+-]?)</[^>]*>',
-        html, re.IGNORECASE
-    )
-    if grade_pattern and not result['overall_grade']:
-        result['overall_grade'] = grade_pattern.group(1).upper()
-
-    # Alternative: look for grade in title or h1/h2
-    title_match = re.search(
-        r'(?:crime\s+)?grade[:\s]+([A-F][+-]?)',
-        html, re.IGNORECASE
-    )
-    if title_match and not result['overall_grade']:
-        result['overall_grade'] = title_match.group(1).upper()
-
-    # Look for violent crime grade
-    violent_match = re.search(
-        r'violent\s*crime[^A-F]*([A-F][+-]?)',
-        html, re.IGNORECASE
-    )
-    if violent_match:
-        result['violent_grade'] = violent_match.group(1).upper()
-
-    # Look for property crime grade
-    property_match = re.search(
-        r'property\s*crime[^A-F]*([A-F][+-]?)',
-        html, re.IGNORECASE
-    )
-    if property_match:
-        result['property_grade'] = property_match.group(1).upper()
-
-    # Look for crime rate description
-    rate_match = re.search(
-        r'crime\s+(?:rate\s+)?(?:is\s+)?(\d+%?\s+)?(?:lower|higher|average|below|above)[^.]*',
-        html, re.IGNORECASE
-    )
-    if rate_match:
-        result['crime_description'] = rate_match.group(0).strip()
-
-    # If we found at least a grade, return the result
-    if result['overall_grade'] or result['violent_grade'] or result['property_grade']:
-        return result
+        return parse_crimegrade_html(html)
 
     return None
 
@@ -547,9 +765,10 @@ def get_neighborhood_rating(zip_code: str, state: str, city: str = "",
     # Try to get actual crime data from CrimeGrade
     crime_data = None
     crime_grade = None
-    if use_crimegrade:
+    if use_crimegrade and zip_code:
         crime_data = fetch_crimegrade(zip_code)
-        if crime_data:
+        # Grades parsed with low confidence are not trusted over the income estimate
+        if crime_data and crime_data.get('confidence', 1.0) >= MIN_CRIME_CONFIDENCE:
             crime_grade = crime_data.get('overall_grade') or crime_data.get('violent_grade')
 
     # Determine final rating based on available data
@@ -640,34 +859,60 @@ def format_rating_for_display(neighborhood_data: Dict) -> str:
         return f"{rating} ({score}/10) - ${income:,} median income - {desc} [est]"
 
 
-def batch_lookup(locations: list) -> Dict[str, Dict]:
+def batch_lookup(locations: list, workers: int = LOOKUP_WORKERS,
+                 use_crimegrade: bool = True) -> Dict[str, Dict]:
     """
     Look up neighborhood ratings for multiple locations.
 
+    Duplicate ZIP codes are collapsed (the first location seen for a ZIP
+    supplies its state and city) and the unique ZIPs are resolved
+    concurrently. Lookups for a ZIP already in flight - from this batch or
+    another thread - share one fetch.
+
     Args:
         locations: List of dicts with 'zip_code', 'state', 'city' keys
+            (CSV-style 'ZIP', 'State', 'City' keys are also accepted)
+        workers: Number of ZIP codes to resolve at once
+        use_crimegrade: Whether to attempt CrimeGrade lookups
 
     Returns:
-        Dictionary mapping ZIP codes to neighborhood data
+        Dictionary mapping ZIP codes to neighborhood data, in first-seen order
     """
     load_cache()
 
-    results = {}
+    unique = {}
     for loc in locations:
         zip_code = loc.get('ZIP', loc.get('zip_code', ''))
         state = loc.get('State', loc.get('state', ''))
         city = loc.get('City', loc.get('city', ''))
 
-        if zip_code:
-            results[zip_code] = get_neighborhood_rating(zip_code, state, city)
+        # Sales without a ZIP are rated too (from the state alone), so every
+        # sale has an entry in the result
+        if zip_code not in unique:
+            unique[zip_code] = (state, city)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {
+                zip_code: executor.submit(get_neighborhood_rating, zip_code, state, city, use_crimegrade)
+                for zip_code, (state, city) in unique.items()
+            }
+            results = {zip_code: future.result() for zip_code, future in futures.items()}
+    finally:
+        wait_for_refreshes()
+        close_browser_pool()
+        save_cache()
 
-    save_cache()
     return results
 
 
 # Demo/test function
 def main():
     """Test the neighborhood lookup with sample data."""
+    import sys
+    if '--offline' in sys.argv:
+        set_offline(True)
+
     load_cache()
 
     test_locations = [
@@ -682,9 +927,11 @@ def main():
     print("Neighborhood Safety Rating Demo")
     print("=" * 70)
     print("Data sources: CrimeGrade.org (crime stats) + Census (income estimates)")
-    print(f"Playwright: {'AVAILABLE - will use headless browser' if PLAYWRIGHT_AVAILABLE else 'Not installed - using urllib fallback'}")
+    print(f"Playwright: {'AVAILABLE - will use headless browser' if PLAYWRIGHT_AVAILABLE else 'Not installed - using plain HTTP fallback'}")
     if not PLAYWRIGHT_AVAILABLE:
         print("  To enable: pip install playwright && playwright install chromium")
+    if is_offline():
+        print("Offline mode: answering from cache only")
     print("=" * 70)
 
     for loc in test_locations:
@@ -694,6 +941,8 @@ def main():
         print(f"  Data source: {rating.get('data_source', 'unknown')}")
         print(f"  Icon color: {rating['icon_color']}")
 
+    wait_for_refreshes()
+    close_browser_pool()
     save_cache()
     print(f"\n{'=' * 70}")
     print("Cache saved for faster future lookups.")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Per-host token-bucket rate limiting for polite concurrent fetching.
+
+Each host gets its own bucket that refills at a steady rate. A request
+takes one token before it goes out; when the bucket is empty the caller
+blocks until the next token is due. This replaces fixed sleeps between
+requests: a single worker is paced exactly as before, and several workers
+share the same per-host budget instead of multiplying it.
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Args:
+        rate: Tokens added per second
+        capacity: Maximum burst size (tokens held at once)
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token, returning how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            # Token is borrowed from the future; wait until it has been earned
+            return -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """
+        Block until a token is available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """
+    Hands out one token bucket per host.
+
+    Args:
+        rate: Requests per second allowed for each host
+        burst: Requests a host may receive back-to-back before pacing starts
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_delay(cls, delay: float, burst: float = 1.0) -> Optional['HostRateLimiter']:
+        """Build a limiter equivalent to sleeping `delay` seconds per request."""
+        if delay <= 0:
+            return None
+        return cls(1.0 / delay, burst)
+
+    def bucket_for(self, host: str) -> TokenBucket:
+        """Get (or create) the bucket for a host."""
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url: str) -> float:
+        """
+        Block until a request to the URL's host is allowed.
+
+        Args:
+            url: Full URL about to be fetched
+
+        Returns:
+            Seconds spent waiting
+        """
+        host = urlsplit(url).netloc.lower()
+        return self.bucket_for(host).acquire()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Retry policy and per-host circuit breaker for HTTP fetchers.
+
+RetryPolicy.call() runs one request attempt at a time and decides what
+to do with the outcome:
+
+- Success, or a status that retrying cannot fix (404, 403, ...): returned
+  at once.
+- Throttling or server trouble (429, 5xx, timeouts, dropped connections):
+  retried after a capped exponential backoff with full jitter, or after
+  the delay the server asked for in Retry-After.
+- Errors that will not go away (unknown host, bad certificate, bad URL):
+  raised at once.
+
+Every failure, retryable or not, is also reported to a CircuitBreaker,
+and so is every refusal (403 Forbidden, or 429 Too Many Requests, which
+is also retried): a host that keeps blocking us is as unusable as one
+that is down. Any other answer, 404 included, shows the host is healthy
+and resets its failure count. After `failure_threshold` consecutive
+failures for a host, its circuit opens and further requests to that host
+fail fast with CircuitOpenError for `reset_timeout` seconds; then a
+single probe request is let through to decide whether to close it.
+
+Usage:
+    python retry_policy.py --demo    # Run scripted failures against a local server
+"""
+
+import http.client
+import random
+import socket
+import ssl
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+
+# Statuses worth retrying: throttling, timeouts and transient server errors
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Non-retryable refusals that count against a host's circuit even though
+# the server answered (429 is retried, and counted, as a retryable status)
+REFUSAL_STATUSES = {403}
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 30.0
+
+# Retry-After values above this give up instead of waiting
+DEFAULT_MAX_RETRY_AFTER = 120.0
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit open for {host} (retry in {retry_in:.0f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def host_of(url: str) -> str:
+    """Host (and port, if given) a URL points at, lower-cased."""
+    return urlsplit(url).netloc.lower()
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Parse a Retry-After header.
+
+    Args:
+        value: Header value - delay in seconds or an HTTP date
+        now: Current Unix time (default: time.time())
+
+    Returns:
+        Seconds to wait (0 or more), or None if absent or unparseable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, retry_at - now)
+
+
+def is_retryable_status(status: int) -> bool:
+    """Whether a response status is worth retrying."""
+    return status in RETRYABLE_STATUSES
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    Whether a request exception is worth retrying.
+
+    Timeouts, refused or dropped connections and malformed responses are
+    transient; unknown hosts, certificate failures and bad URLs are not.
+    """
+    if isinstance(error, ssl.SSLCertVerificationError):
+        return False
+    if isinstance(error, socket.gaierror):
+        return error.errno == socket.EAI_AGAIN  # Temporary DNS failure only
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    Args:
+        failure_threshold: Consecutive failures that open a host's circuit
+        reset_timeout: Seconds an open circuit rejects requests before a probe
+        clock: Monotonic time source (replaceable for tests)
+    """
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._probing: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def state(self, host: str) -> str:
+        """CLOSED, OPEN or HALF_OPEN (reset timeout elapsed, probe allowed)."""
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return CLOSED
+            if self.clock() - opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return OPEN
+
+    def before_request(self, host: str) -> None:
+        """
+        Check that a request to host may go out.
+
+        Once the reset timeout has passed, exactly one caller is let
+        through as a probe; the others keep failing fast until it reports.
+
+        Raises:
+            CircuitOpenError: The host's circuit is open
+        """
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return
+            elapsed = self.clock() - opened_at
+            if elapsed >= self.reset_timeout and not self._probing.get(host):
+                self._probing[host] = True
+                return
+            raise CircuitOpenError(host, max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self, host: str) -> None:
+        """Close the host's circuit and clear its failure count."""
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+            self._probing.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        """Count a failure, opening (or re-opening) the circuit at the threshold."""
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+            self._probing.pop(host, None)
+            if failures >= self.failure_threshold:
+                self._opened_at[host] = self.clock()
+
+
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a failed request.
+
+    Args:
+        max_attempts: Attempts per call, including the first
+        base_delay: Backoff ceiling for the first retry, in seconds
+        max_delay: Cap on the backoff ceiling
+        max_retry_after: Longest Retry-After honored; longer ones give up
+        breaker: Per-host circuit breaker (None = never fail fast)
+        sleep: Sleep function (replaceable for tests)
+        rng: Random source for jitter
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+                 breaker: Optional[CircuitBreaker] = None,
+                 sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.breaker = breaker
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+
+    def backoff(self, retry: int) -> float:
+        """
+        Delay before retry number `retry` (0 = first retry).
+
+        "Full jitter": uniform between 0 and min(max_delay, base_delay * 2**retry),
+        so workers that failed together do not retry in lockstep.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** retry))
+        return self.rng.uniform(0, ceiling)
+
+    def call(self, url: str, attempt: Callable[[], object],
+             max_attempts: Optional[int] = None):
+        """
+        Run a request with retries.
+
+        Args:
+            url: URL being requested (its host keys the circuit breaker)
+            attempt: Sends the request once; returns a response with
+                `status` and `headers` (lower-cased names) or raises
+            max_attempts: Override the policy's attempt count for this call
+
+        Returns:
+            The first non-retryable response, or the last response once
+            attempts (or the Retry-After budget) run out
+
+        Raises:
+            CircuitOpenError: The host's circuit is open
+            Exception: A non-retryable error, or the last retryable one
+        """
+        host = host_of(url)
+        attempts = max(1, max_attempts or self.max_attempts)
+
+        for retry in range(attempts):
+            if self.breaker is not None:
+                self.breaker.before_request(host)
+
+            try:
+                response = attempt()
+            except Exception as e:
+                self._failed(host)
+                if not is_retryable_error(e) or retry == attempts - 1:
+                    raise
+                self.sleep(self.backoff(retry))
+                continue
+
+            if not is_retryable_status(response.status):
+                if response.status in REFUSAL_STATUSES:
+                    self._failed(host)
+                elif self.breaker is not None:
+                    self.breaker.record_success(host)
+                return response
+
+            self._failed(host)
+            if retry == attempts - 1:
+                return response
+
+            delay = parse_retry_after(response.headers.get('retry-after'))
+            if delay is None:
+                delay = self.backoff(retry)
+            elif delay > self.max_retry_after:
+                return response  # Not worth holding a worker that long
+            self.sleep(delay)
+
+        return response
+
+    def _failed(self, host: str) -> None:
+        if self.breaker is not None:
+            self.breaker.record_failure(host)
+
+
+_default_policy: Optional[RetryPolicy] = None
+_default_policy_lock = threading.Lock()
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Get the retry policy (and circuit breaker) shared by all fetchers."""
+    global _default_policy
+    with _default_policy_lock:
+        if _default_policy is None:
+            _default_policy = RetryPolicy(breaker=CircuitBreaker())
+        return _default_policy
+
+
+# Demo ---------------------------------------------------------------------
+
+def _scripted_server(scripts: Dict[str, list]):
+    """
+    Start a local server that answers each path from a script.
+
+    Each script entry is (status, headers) or 'drop' to close the
+    connection without answering; the last entry repeats.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            script = scripts[self.path]
+            step = script.pop(0) if len(script) > 1 else script[0]
+            if step == 'drop':
+                self.close_connection = True
+                return
+            status, headers = step
+            body = f'{status}\n'.encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def demo() -> None:
+    """Exercise the policy against scripted failure sequences."""
+    from http_client import HTTPClient
+
+    scripts = {
+        '/flaky': [(503, {}), 'drop', (200, {})],
+        '/throttled': [(429, {'Retry-After': '1'}), (200, {})],
+        '/gone': [(404, {})],
+        '/down': [(500, {})],
+    }
+    server = _scripted_server(scripts)
+    base = f'http://127.0.0.1:{server.server_port}'
+    client = HTTPClient()
+    breaker = CircuitBreaker(failure_threshold=4, reset_timeout=1.0)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.2, breaker=breaker)
+
+    for path in ('/flaky', '/throttled', '/gone', '/down', '/down', '/down'):
+        url = base + path
+        start = time.monotonic()
+        try:
+            outcome = policy.call(url, lambda: client.get(url, timeout=5)).status
+        except CircuitOpenError as e:
+            outcome = f'fail fast ({e})'
+        print(f"{path:12s} -> {outcome}  [{time.monotonic() - start:.2f}s, "
+              f"circuit {breaker.state(host_of(url))}]")
+
+    time.sleep(1.0)
+    scripts['/down'] = [(200, {})]
+    url = base + '/down'
+    print(f"{'/down':12s} -> {policy.call(url, lambda: client.get(url, timeout=5)).status}  "
+          f"[probe after reset, circuit {breaker.state(host_of(url))}]")
+    server.shutdown()
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) < 2 or sys.argv[1] != '--demo':
+        print("Usage: python retry_policy.py --demo")
+        print("\nRuns scripted failure sequences against a local stand-in server.")
+        sys.exit(1)
+    demo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Geographic route groups for a weekend's sales.
+
+The *_Details.md files sort sales into route clusters drawn by hand
+("ROUTE 1: BLOOMFIELD HILLS & BIRMINGHAM (Start Here - 0-6 miles)").
+This module draws them from geocoded coordinates:
+
+1. DBSCAN: sales at most LINK_MILES apart are neighbors, a sale with at
+   least MIN_SALES neighbors (itself included) is a core sale, and a
+   group is everything reachable through core sales. Sales in no group
+   are gathered into a final OUTLYING SALES group.
+2. Grid index: sales are projected to miles on a plane through their
+   mean latitude and bucketed into square cells LINK_MILES / sqrt(2) on
+   a side. Any two sales in one cell are neighbors, so a cell holding
+   MIN_SALES sales is core without a single distance check, and
+   neighbors are only looked for in the 21 cells around a sale. The work
+   grows with the number of sales times the local density, not with the
+   square of the number of sales.
+3. A metro area easily chains into one group far too big for a route;
+   such groups are bisected with 2-medoids until none has more than
+   MAX_GROUP sales.
+4. Groups are named after their most common cities, ordered by the
+   distance of their nearest sale from the center point, and written to
+   KML as one folder each, in that order, nearest sale first.
+
+Usage:
+    python route_groups.py <csv> [--center LAT,LON] [--day Saturday] [--markdown details.md]
+                           [--output groups.kml] [--link-miles 4] [--max-size 8] [--offline]
+    python route_groups.py --bench [count]    # Time grouping over random sales
+"""
+
+import math
+import statistics
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Sequence, TextIO, Tuple
+from xml.sax.saxutils import escape
+
+from address_index import AddressIndex
+from geocoder import EARTH_RADIUS_MILES, geocode_sales, haversine_miles
+from kml_engine import (DISCOUNT_LEVELS, DayDiscountLayout, SaleRecord, iter_csv_data, iter_records,
+                        parse_markdown_urls, render_kml)
+from kml_writer import PlacemarkSpool
+from route_planner import Stop, day_stops, parse_point, pop_option
+from sales import Sale
+
+
+# Sales at most this far apart are neighbors (straight-line miles)
+LINK_MILES = 4.0
+
+# Neighbors, the sale itself included, that make a sale a core sale
+MIN_SALES = 2
+
+# Most sales in one group; bigger groups are split
+MAX_GROUP = 8
+
+# Cities named in a group's title
+NAMED_CITIES = 3
+
+# Reassignment rounds when splitting a group in two
+SPLIT_ROUNDS = 10
+
+# Title of the group of sales with no neighbors
+OUTLYING_NAME = 'OUTLYING SALES'
+
+# Cells within two of a cell either way; the four corners are more than
+# one link away (a whole cell lies between the points on both axes)
+NEAR_CELLS = [(dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) < 4]
+
+
+class RouteGroup(NamedTuple):
+    """Sales close enough together for one route."""
+    name: str               # 'BLOOMFIELD HILLS & BIRMINGHAM'
+    stops: List[Stop]       # Nearest to the center first
+    nearest_miles: float    # From the center point
+    farthest_miles: float
+    outlying: bool          # Sales with no neighbors, gathered at the end
+
+    def title(self, number: int) -> str:
+        """'ROUTE 1: BLOOMFIELD HILLS & BIRMINGHAM (Start Here - 0-6 miles)'"""
+        low, high = math.floor(self.nearest_miles), math.ceil(self.farthest_miles)
+        distance = f"{low} miles" if low == high else f"{low}-{high} miles"
+        if self.outlying:
+            return f"{self.name} ({distance})"
+        start = 'Start Here - ' if number == 1 else ''
+        return f"ROUTE {number}: {self.name} ({start}{distance})"
+
+
+def project(points: Sequence[Tuple[float, float]]) -> List[Tuple[float, float]]:
+    """
+    (lat, lon) -> (x, y) in miles on a plane through the points' mean latitude.
+
+    Distances on the plane stay within a few percent of great-circle
+    miles across a state, which is plenty for grouping.
+    """
+    if not points:
+        return []
+    miles_per_degree = EARTH_RADIUS_MILES * math.pi / 180
+    mean_lat = sum(lat for lat, _ in points) / len(points)
+    x_scale = miles_per_degree * math.cos(math.radians(mean_lat))
+    return [(lon * x_scale, lat * miles_per_degree) for lat, lon in points]
+
+
+class _Grid:
+    """Planar points bucketed into cells small enough that a cell is within one link."""
+
+    def __init__(self, xy: Sequence[Tuple[float, float]], link: float):
+        side = link / math.sqrt(2)
+        self.cell_of = [(math.floor(x / side), math.floor(y / side)) for x, y in xy]
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, cell in enumerate(self.cell_of):
+            self.cells.setdefault(cell, []).append(i)
+
+    def near(self, cell: Tuple[int, int]) -> Iterator[Tuple[Tuple[int, int], List[int]]]:
+        """(cell, points) for the non-empty cells that can hold neighbors of points in cell."""
+        cx, cy = cell
+        for dx, dy in NEAR_CELLS:
+            other = (cx + dx, cy + dy)
+            members = self.cells.get(other)
+            if members:
+                yield other, members
+
+
+def dbscan(xy: Sequence[Tuple[float, float]], link: float = LINK_MILES,
+           min_points: int = MIN_SALES) -> List[int]:
+    """
+    Density-based clusters of planar points, found through a grid index.
+
+    Args:
+        xy: Points in miles (from project())
+        link: Largest distance between neighbors
+        min_points: Neighbors, the point itself included, that make a point core
+
+    Returns:
+        Cluster number per point (numbered in order of each cluster's
+        first core point), or -1 for points in no cluster
+    """
+    grid = _Grid(xy, link)
+    link_sq = link * link
+
+    def close(i: int, j: int) -> bool:
+        (x1, y1), (x2, y2) = xy[i], xy[j]
+        return (x1 - x2) ** 2 + (y1 - y2) ** 2 <= link_sq
+
+    # Core points; a cell with enough points is core as a whole
+    core = [False] * len(xy)
+    for cell, members in grid.cells.items():
+        if len(members) >= min_points:
+            for i in members:
+                core[i] = True
+            continue
+        for i in members:
+            count = 0
+            for _, others in grid.near(cell):
+                count += sum(1 for j in others if close(i, j))
+                if count >= min_points:
+                    core[i] = True
+                    break
+
+    # Core points in one cell are all neighbors: join cells, not points
+    core_members = {}
+    for cell, members in grid.cells.items():
+        cores = [i for i in members if core[i]]
+        if cores:
+            core_members[cell] = cores
+    parent = {cell: cell for cell in core_members}
+
+    def find(cell: Tuple[int, int]) -> Tuple[int, int]:
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for cell, cores in core_members.items():
+        for other, _ in grid.near(cell):
+            if other <= cell or other not in core_members or find(other) == find(cell):
+                continue
+            if any(close(i, j) for i in cores for j in core_members[other]):
+                parent[find(other)] = find(cell)
+
+    labels = [-1] * len(xy)
+    numbers: Dict[Tuple[int, int], int] = {}
+    for i, cell in enumerate(grid.cell_of):
+        if core[i]:
+            labels[i] = numbers.setdefault(find(cell), len(numbers))
+
+    # Border points join the cluster of any core neighbor
+    for i, cell in enumerate(grid.cell_of):
+        if core[i]:
+            continue
+        for other, _ in grid.near(cell):
+            j = next((j for j in core_members.get(other, ()) if close(i, j)), None)
+            if j is not None:
+                labels[i] = labels[j]
+                break
+    return labels
+
+
+def split_group(xy: Sequence[Tuple[float, float]], members: List[int],
+                max_size: int = MAX_GROUP) -> List[List[int]]:
+    """
+    Bisect a group with 2-medoids until no part has more than max_size points.
+
+    Each split seeds two medoids far apart (the point farthest from the
+    mean, then the point farthest from that), assigns every point to the
+    nearer medoid, and moves each medoid to the member nearest its part's
+    mean, for up to SPLIT_ROUNDS rounds. Points at one spot (sales sharing
+    a ZIP centroid) cannot be told apart and stay together.
+
+    Returns:
+        Parts of members
+    """
+    if len(members) <= max_size:
+        return [members]
+
+    def dist_sq(i: int, point: Tuple[float, float]) -> float:
+        return (xy[i][0] - point[0]) ** 2 + (xy[i][1] - point[1]) ** 2
+
+    def mean(part: List[int]) -> Tuple[float, float]:
+        return (sum(xy[i][0] for i in part) / len(part), sum(xy[i][1] for i in part) / len(part))
+
+    center = mean(members)
+    a = max(members, key=lambda i: dist_sq(i, center))
+    b = max(members, key=lambda i: dist_sq(i, xy[a]))
+    if xy[a] == xy[b]:
+        return [members]
+
+    for _ in range(SPLIT_ROUNDS):
+        # Ties go to a, so points at one spot never end up on both sides
+        part_a = [i for i in members if dist_sq(i, xy[a]) <= dist_sq(i, xy[b])]
+        in_a = set(part_a)
+        part_b = [i for i in members if i not in in_a]
+        center_a, center_b = mean(part_a), mean(part_b)
+        medoids = (min(part_a, key=lambda i: dist_sq(i, center_a)),
+                   min(part_b, key=lambda i: dist_sq(i, center_b)))
+        if medoids == (a, b):
+            break
+        a, b = medoids
+    return split_group(xy, part_a, max_size) + split_group(xy, part_b, max_size)
+
+
+def city_name(sales: Sequence[Sale]) -> str:
+    """'BLOOMFIELD HILLS & BIRMINGHAM': the most common cities, most common first."""
+    counts = Counter(' '.join(sale.city.upper().split()) for sale in sales if sale.city.strip())
+    cities = [city for city, _ in counts.most_common(NAMED_CITIES)]
+    if len(cities) < 2:
+        return cities[0] if cities else 'UNKNOWN CITY'
+    return ', '.join(cities[:-1]) + ' & ' + cities[-1]
+
+
+def group_stops(stops: List[Stop], center: Tuple[float, float], link_miles: float = LINK_MILES,
+                min_sales: int = MIN_SALES, max_size: int = MAX_GROUP) -> List[RouteGroup]:
+    """
+    Group stops into routes.
+
+    Args:
+        stops: Geocoded sales
+        center: (lat, lon) the groups are ordered from
+        link_miles: Largest distance between neighboring sales
+        min_sales: Neighbors, the sale itself included, that make a sale core
+        max_size: Most sales in one group
+
+    Returns:
+        Groups nearest to the center first, then the outlying sales (if any)
+    """
+    xy = project([(stop.lat, stop.lon) for stop in stops])
+    members: Dict[int, List[int]] = {}
+    for i, label in enumerate(dbscan(xy, link_miles, min_sales)):
+        members.setdefault(label, []).append(i)
+    outlying = members.pop(-1, [])
+    miles = [haversine_miles(center, (stop.lat, stop.lon)) for stop in stops]
+
+    def make_group(part: List[int], is_outlying: bool) -> RouteGroup:
+        part = sorted(part, key=miles.__getitem__)
+        name = OUTLYING_NAME if is_outlying else city_name([stops[i].sale for i in part])
+        return RouteGroup(name, [stops[i] for i in part], miles[part[0]], miles[part[-1]], is_outlying)
+
+    groups = [make_group(part, False)
+              for cluster in members.values() for part in split_group(xy, cluster, max_size)]
+    groups.sort(key=lambda group: (group.nearest_miles, group.farthest_miles))
+    if outlying:
+        groups.append(make_group(outlying, True))
+    return groups
+
+
+class RouteGroupLayout(DayDiscountLayout):
+    """
+    One folder per route group, in route order, with discount icons.
+
+    Placemarks keep arrival order within a folder, so records should
+    arrive in group order (see group_order()). Records of sales in no
+    group go to a final Not Located folder.
+    """
+
+    document_name = 'Estate Sale Route Groups'
+    document_description = 'Estate sales grouped into routes by location'
+
+    def __init__(self, groups: List[RouteGroup]):
+        self.groups = groups
+        self.group_of = {id(stop.sale): number for number, group in enumerate(groups)
+                         for stop in group.stops}
+
+    def add_record(self, f: TextIO, spool: PlacemarkSpool, record: SaleRecord) -> None:
+        number = self.group_of.get(id(record.sale), len(self.groups))
+        discount = record.discount if record.discount in DISCOUNT_LEVELS else 'no_discount'
+        spool.add((number,), self.placemark(record, discount))
+
+    def finish_body(self, f: TextIO, spool: PlacemarkSpool) -> None:
+        titles = [group.title(number) for number, group in enumerate(self.groups, 1)]
+        if spool.count((len(self.groups),)):
+            titles.append('Not Located')
+        for number, title in enumerate(titles):
+            f.write('    <Folder>\n')
+            f.write(f'      <name>{escape(title)}</name>\n')
+            spool.copy_to((number,), f)
+            f.write('    </Folder>\n')
+
+
+def group_order(groups: List[RouteGroup], missing: List[Sale]) -> List[Sale]:
+    """Sales in route order: each group nearest sale first, then the sales not located."""
+    return [stop.sale for group in groups for stop in group.stops] + missing
+
+
+def benchmark(count: int = 5000) -> None:
+    """Time grouping over random sales spread over the metro areas of a state."""
+    import random
+    import time
+
+    rng = random.Random(7)
+    center = (43.0, -84.5)
+    metros = [(center[0] + rng.uniform(-1.5, 1.5), center[1] + rng.uniform(-2.0, 2.0),
+               rng.uniform(0.03, 0.25)) for _ in range(40)]
+    stops = []
+    for i in range(count):
+        if rng.random() < 0.1:
+            town = 'Rural'
+            lat, lon = center[0] + rng.uniform(-1.5, 1.5), center[1] + rng.uniform(-2.0, 2.0)
+        else:
+            metro = rng.randrange(len(metros))
+            lat, lon, spread = metros[metro]
+            town = f'Town {metro}'
+            lat, lon = rng.gauss(lat, spread), rng.gauss(lon, spread)
+        stops.append(Stop(Sale(f'Sale {i}', f'{i} Main St', town, 'MI', '48304', 'Sat 9am-4pm'),
+                          lat, lon, 'street'))
+
+    xy = project([(stop.lat, stop.lon) for stop in stops])
+    start = time.perf_counter()
+    labels = dbscan(xy)
+    dbscan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    groups = group_stops(stops, center)
+    total_time = time.perf_counter() - start
+
+    sizes = [len(group.stops) for group in groups if not group.outlying]
+    print(f"{count} sales")
+    print(f"  grid DBSCAN:       {dbscan_time * 1000:8.1f} ms "
+          f"({len(set(labels) - {-1})} clusters, {labels.count(-1)} outlying)")
+    print(f"  route groups:      {len(sizes):8d} (largest {max(sizes, default=0)} sales)")
+    print(f"  group_stops total: {total_time * 1000:8.1f} ms")
+
+
+def main():
+    """Main entry point."""
+    args = sys.argv[1:]
+    if args and args[0] == '--bench':
+        benchmark(int(args[1]) if len(args) > 1 else 5000)
+        return
+
+    center_text = pop_option(args, '--center')
+    day = pop_option(args, '--day')
+    markdown = pop_option(args, '--markdown')
+    output = pop_option(args, '--output')
+    link_miles = pop_option(args, '--link-miles')
+    max_size = pop_option(args, '--max-size')
+    flags = {arg for arg in args if arg.startswith('--')}
+    args = [arg for arg in args if not arg.startswith('--')]
+
+    if not args:
+        print("Usage: python route_groups.py <csv> [--center LAT,LON] [--day DAY] [--markdown details.md]")
+        print("                              [--output groups.kml] [--link-miles M] [--max-size N] [--offline]")
+        print("       python route_groups.py --bench [count]")
+        print("\nOptions:")
+        print("  --center       Point the groups are ordered from, e.g. 42.5803,-83.2455")
+        print("                 (default: the median of the sales)")
+        print("  --day          Only sales open this day (default: every sale)")
+        print("  --markdown     Details markdown, to link sales to their listings")
+        print("  --output       Output KML (default: <csv>_groups.kml)")
+        print(f"  --link-miles   Largest distance between neighboring sales (default {LINK_MILES:g})")
+        print(f"  --max-size     Most sales in one group (default {MAX_GROUP})")
+        print("  --offline      Use only local indexes and cached geocoder answers")
+        sys.exit(1)
+
+    csv_path = Path(args[0])
+    if not csv_path.exists():
+        print(f"Error: CSV file not found: {csv_path}")
+        sys.exit(1)
+    try:
+        center = parse_point(center_text) if center_text else None
+        link_miles = float(link_miles) if link_miles is not None else LINK_MILES
+        max_size = int(max_size) if max_size is not None else MAX_GROUP
+        if link_miles <= 0 or max_size < 1:
+            raise ValueError(link_miles, max_size)
+    except ValueError:
+        print("Error: --center must be LAT,LON, --link-miles a positive number "
+              "and --max-size a positive whole number")
+        sys.exit(1)
+
+    sales = list(iter_csv_data(csv_path))
+    if day:
+        day = day.capitalize()
+        sales = [sale for sale in sales if sale.schedule.day(day)]
+    address_urls = parse_markdown_urls(Path(markdown)) if markdown else AddressIndex()
+    output_path = Path(output) if output else csv_path.with_name(f"{csv_path.stem}_groups.kml")
+
+    print("Geocoding sales...")
+    geocoder = geocode_sales(sales, offline='--offline' in flags)
+    stops, missing = day_stops(sales, None, geocoder)
+    for sale in missing:
+        print(f"  Not located: {sale.name} - {sale.full_address}")
+    if not stops:
+        print("Error: no sales could be located")
+        sys.exit(1)
+    if center is None:
+        center = (statistics.median(stop.lat for stop in stops),
+                  statistics.median(stop.lon for stop in stops))
+        print(f"  Center (median of sales): {center[0]:.5f}, {center[1]:.5f}")
+
+    groups = group_stops(stops, center, link_miles, MIN_SALES, max_size)
+    records = iter_records(group_order(groups, missing), address_urls, geocoder=geocoder)
+    render_kml(records, RouteGroupLayout(groups), output_path)
+    geocoder.close()
+
+    print(f"✓ {len(groups)} route groups from {len(stops)} sales")
+    for number, group in enumerate(groups, 1):
+        print(f"  {group.title(number)} - {len(group.stops)} sales")
+    print(f"  - KML: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+Visiting order for one day's sales.
+
+The route clusters in the *_Details.md files are drawn by hand. This
+module plans a single route from the user's start point through every
+geocoded sale open on a given day:
+
+1. Distance matrix: great-circle miles between all points, scaled by
+   ROAD_FACTOR to approximate driving distance. Computed as one NumPy
+   expression when NumPy is installed, pairwise otherwise.
+2. Nearest neighbor: from the start point, always drive to the closest
+   unvisited sale.
+3. Local search until no move shortens the route:
+   - 2-opt: reverse a stretch of the route when that uncrosses two legs;
+   - Or-opt: move a run of 1-3 consecutive stops to a better place,
+     either way round.
+   Moves are only tried toward each stop's NEIGHBORS nearest stops,
+   which keeps a pass roughly linear in the number of stops.
+
+The start is fixed; the route either ends at the last sale or, with
+--round-trip, back at the start. The plan is written as a KML folder
+(numbered placemarks and a LineString through them, in order) and a
+markdown itinerary.
+
+To speed up the distance matrix (optional):
+    pip install numpy
+
+Usage:
+    python route_planner.py <csv> --start LAT,LON [--day Saturday] [--markdown details.md]
+                            [--output route.kml] [--round-trip] [--road-factor 1.3] [--offline]
+    python route_planner.py --bench [count]    # Time planning over random stops
+"""
+
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from address_index import AddressIndex
+from geocoder import EARTH_RADIUS_MILES, Geocoder, geocode_sales, haversine_miles
+from kml_engine import create_kml_footer, icon_style, iter_csv_data, match_sale_url, parse_markdown_urls
+from sales import Sale
+from schedule_parser import format_clock
+
+# NumPy is optional - without it the distance matrix is built pair by pair
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+# Driving miles per straight-line mile on suburban road grids
+ROAD_FACTOR = 1.3
+
+# Candidate stops considered for each move of the local search
+NEIGHBORS = 10
+
+# Longest run of stops Or-opt moves at once
+OR_OPT_SEGMENT = 3
+
+# Improvements smaller than this (miles) are rounding noise
+EPSILON = 1e-9
+
+ROUTE_ICON = 'http://maps.google.com/mapfiles/kml/paddle/wht-blank.png'
+START_ICON = 'http://maps.google.com/mapfiles/kml/paddle/go.png'
+ROUTE_LINE_COLOR = 'ff0000ff'  # aabbggrr: opaque red
+
+
+class Stop(NamedTuple):
+    """A sale to visit."""
+    sale: Sale
+    lat: float
+    lon: float
+    precision: str    # Geocoder precision ('street', 'address' or 'zip')
+
+
+class Route(NamedTuple):
+    """Stops in visiting order, with the miles driven to reach each."""
+    start: Tuple[float, float]
+    stops: List[Stop]
+    legs: List[float]      # legs[i] = miles to stops[i]; one more leg home if round_trip
+    round_trip: bool
+
+    @property
+    def total_miles(self) -> float:
+        return sum(self.legs)
+
+
+# Distances ----------------------------------------------------------------
+
+def distance_matrix(points: Sequence[Tuple[float, float]],
+                    road_factor: float = ROAD_FACTOR) -> List[List[float]]:
+    """
+    Estimated driving miles between every pair of (lat, lon) points.
+
+    Args:
+        points: (lat, lon) pairs
+        road_factor: Multiplier from great-circle to driving distance
+
+    Returns:
+        Square matrix as nested lists (indexing lists is faster than
+        indexing an ndarray in the search loops)
+    """
+    if NUMPY_AVAILABLE:
+        coordinates = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        lat, lon = coordinates[:, 0], coordinates[:, 1]
+        h = (np.sin((lat[:, None] - lat[None, :]) / 2) ** 2
+             + np.cos(lat)[:, None] * np.cos(lat)[None, :]
+             * np.sin((lon[:, None] - lon[None, :]) / 2) ** 2)
+        miles = 2 * EARTH_RADIUS_MILES * road_factor * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+        return miles.tolist()
+
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        row = matrix[i]
+        for j in range(i + 1, n):
+            row[j] = matrix[j][i] = haversine_miles(points[i], points[j]) * road_factor
+    return matrix
+
+
+def nearest_neighbors(dist: List[List[float]], count: int = NEIGHBORS) -> List[List[int]]:
+    """For each point, the count closest other points, nearest first."""
+    n = len(dist)
+    count = min(count, n - 1)
+    if NUMPY_AVAILABLE and n:
+        order = np.argsort(np.asarray(dist), axis=1, kind='stable')[:, :count + 1].tolist()
+    else:
+        order = [sorted(range(n), key=row.__getitem__)[:count + 1] for row in dist]
+    # Drop the point itself (not necessarily first when points coincide)
+    return [[j for j in row if j != i][:count] for i, row in enumerate(order)]
+
+
+# Tour construction and improvement ------------------------------------------
+#
+# The searches work on a path of node numbers whose first and last nodes
+# are fixed: node 0 is the start and the last node is a virtual end. Its
+# distance to every stop is 0 for an open route, or the distance back to
+# the start for a round trip - so both cases are the same problem.
+
+def _positions(tour: List[int]) -> List[int]:
+    pos = [0] * len(tour)
+    for i, node in enumerate(tour):
+        pos[node] = i
+    return pos
+
+
+def nearest_neighbor_tour(dist: List[List[float]]) -> List[int]:
+    """Path from node 0 through nodes 1..n-2, greedily, ending at node n-1."""
+    end = len(dist) - 1
+    unvisited = set(range(1, end))
+    tour = [0]
+    current = 0
+    while unvisited:
+        row = dist[current]
+        current = min(unvisited, key=row.__getitem__)
+        unvisited.remove(current)
+        tour.append(current)
+    tour.append(end)
+    return tour
+
+
+def two_opt(tour: List[int], dist: List[List[float]], neighbors: List[List[int]]) -> bool:
+    """
+    Reverse stretches of the tour while that makes it shorter (in place).
+
+    Reversing tour[p+1..q] replaces legs (t[p], t[p+1]) and (t[q], t[q+1])
+    with (t[p], t[q]) and (t[p+1], t[q+1]). A move is only tried when one
+    of the new legs joins a stop to one of its nearest neighbors.
+
+    Returns:
+        True if the tour changed
+    """
+    pos = _positions(tour)
+    last = len(tour) - 1
+    changed = False
+    improved = True
+    while improved:
+        improved = False
+        for a in range(last):  # Every node but the virtual end
+            for c in neighbors[a]:
+                i, j = pos[a], pos[c]
+                lo, hi = (i, j) if i < j else (j, i)
+                # The new leg a-c is either (t[p], t[q]) or (t[p+1], t[q+1])
+                for p, q in ((lo, hi), (lo - 1, hi - 1)):
+                    if p < 0 or q - p < 2 or q >= last:
+                        continue
+                    t_p, t_p1, t_q, t_q1 = tour[p], tour[p + 1], tour[q], tour[q + 1]
+                    gain = (dist[t_p][t_p1] + dist[t_q][t_q1]
+                            - dist[t_p][t_q] - dist[t_p1][t_q1])
+                    if gain > EPSILON:
+                        tour[p + 1:q + 1] = tour[q:p:-1]
+                        for k in range(p + 1, q + 1):
+                            pos[tour[k]] = k
+                        improved = changed = True
+                        break
+                else:
+                    continue
+                break
+    return changed
+
+
+def or_opt(tour: List[int], dist: List[List[float]], neighbors: List[List[int]],
+           max_segment: int = OR_OPT_SEGMENT) -> bool:
+    """
+    Move runs of 1..max_segment stops elsewhere while that shortens the tour (in place).
+
+    A run is tried between each neighbor of its first or last stop and
+    that neighbor's predecessor or successor, in both orientations; the
+    best position found is taken.
+
+    Returns:
+        True if the tour changed
+    """
+    last = len(tour) - 1
+    changed = False
+    improved = True
+    while improved:
+        improved = False
+        pos = _positions(tour)
+        for length in range(1, max_segment + 1):
+            for first in range(1, last):
+                i = pos[first]
+                if i + length > last:
+                    continue
+                s1, s2 = tour[i], tour[i + length - 1]
+                before, after = tour[i - 1], tour[i + length]
+                removed = dist[before][s1] + dist[s2][after] - dist[before][after]
+                if removed <= EPSILON:
+                    continue
+
+                best_gain, best_move = EPSILON, None
+                for end in (s1, s2):
+                    for c in neighbors[end]:
+                        k = pos[c]
+                        for x in (k - 1, k):  # Leg (t[x], t[x+1]) on either side of c
+                            if x < 0 or x >= last or i - 1 <= x < i + length:
+                                continue
+                            u, v = tour[x], tour[x + 1]
+                            base = dist[u][v]
+                            forward = removed - (dist[u][s1] + dist[s2][v] - base)
+                            backward = removed - (dist[u][s2] + dist[s1][v] - base)
+                            if forward > best_gain:
+                                best_gain, best_move = forward, (x, False)
+                            if backward > best_gain:
+                                best_gain, best_move = backward, (x, True)
+
+                if best_move is None:
+                    continue
+                x, reverse = best_move
+                u = tour[x]
+                segment = tour[i:i + length]
+                if reverse:
+                    segment.reverse()
+                del tour[i:i + length]
+                insert_at = tour.index(u) + 1
+                tour[insert_at:insert_at] = segment
+                pos = _positions(tour)
+                improved = changed = True
+    return changed
+
+
+def optimize_tour(dist: List[List[float]], neighbors: Optional[List[List[int]]] = None) -> List[int]:
+    """
+    Nearest-neighbor tour improved by 2-opt and Or-opt until neither helps.
+
+    Args:
+        dist: Matrix over start (node 0), stops and the virtual end (last node)
+        neighbors: Candidate lists (default: nearest_neighbors(dist))
+
+    Returns:
+        Node order from 0 to the last node
+    """
+    if neighbors is None:
+        neighbors = nearest_neighbors(dist)
+    tour = nearest_neighbor_tour(dist)
+    two_opt(tour, dist, neighbors)
+    while or_opt(tour, dist, neighbors) and two_opt(tour, dist, neighbors):
+        pass
+    return tour
+
+
+def _with_virtual_end(dist: List[List[float]], round_trip: bool) -> List[List[float]]:
+    """Append the virtual end node to a matrix whose node 0 is the start."""
+    home = dist[0]
+    end_row = [home[i] if round_trip else 0.0 for i in range(len(dist))]
+    matrix = [row + [end_row[i]] for i, row in enumerate(dist)]
+    matrix.append(end_row + [0.0])
+    return matrix
+
+
+def plan_route(start: Tuple[float, float], stops: List[Stop], round_trip: bool = False,
+               road_factor: float = ROAD_FACTOR) -> Route:
+    """
+    Order stops to keep driving short.
+
+    Args:
+        start: (lat, lon) the route starts from
+        stops: Sales to visit, with coordinates
+        round_trip: End back at the start instead of at the last sale
+        road_factor: Multiplier from great-circle to driving distance
+
+    Returns:
+        Route with stops in visiting order
+    """
+    dist = distance_matrix([start] + [(stop.lat, stop.lon) for stop in stops], road_factor)
+    neighbors = nearest_neighbors(dist)
+    tour = optimize_tour(_with_virtual_end(dist, round_trip), neighbors)
+
+    order = tour[1:-1]
+    legs = [dist[a][b] for a, b in zip([0] + order, order)]
+    if round_trip and order:
+        legs.append(dist[order[-1]][0])
+    return Route(start, [stops[node - 1] for node in order], legs, round_trip)
+
+
+# Output ---------------------------------------------------------------------
+
+def _hours(sale: Sale, day: str) -> str:
+    """'10am-4pm (50% off)' for the sale's hours on day."""
+    hours = sale.schedule.day(day)
+    if hours is None:
+        return ''
+    text = f"{format_clock(hours.opens)}-{format_clock(hours.closes)}"
+    if hours.discount:
+        text += f" ({hours.discount}% off)"
+    return text
+
+
+def route_kml(route: Route, day: str, address_urls: Optional[AddressIndex] = None,
+              details: Optional[List[str]] = None) -> str:
+    """
+    KML document with the route as one folder: numbered placemarks in
+    visiting order and a LineString through them.
+
+    Args:
+        route: Planned route
+        day: Day the route is for (titles and hours)
+        address_urls: AddressIndex of listing URLs, to link placemark titles
+        details: Optional extra HTML line per stop (e.g. arrival time)
+    """
+    title = escape(f"{day} Route: {len(route.stops)} stops, {route.total_miles:.1f} mi")
+    points = [route.start] + [(stop.lat, stop.lon) for stop in route.stops]
+    if route.round_trip:
+        points.append(route.start)
+    coordinates = ' '.join(f'{lon:.6f},{lat:.6f}' for lat, lon in points)
+
+    parts = [f'''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+  <Document>
+    <name>{title}</name>
+    <description>Sales in visiting order (estimated road miles)</description>
+
+''', icon_style('routeStop', ROUTE_ICON), icon_style('routeStart', START_ICON), f'''    <Style id="routeLine">
+      <LineStyle>
+        <color>{ROUTE_LINE_COLOR}</color>
+        <width>4</width>
+      </LineStyle>
+    </Style>
+    <Folder>
+      <name>{title}</name>
+      <Placemark>
+        <name>Start</name>
+        <styleUrl>#routeStart</styleUrl>
+        <Point><coordinates>{route.start[1]:.6f},{route.start[0]:.6f}</coordinates></Point>
+      </Placemark>
+''']
+
+    for number, (stop, leg) in enumerate(zip(route.stops, route.legs), 1):
+        url = match_sale_url(stop.sale, address_urls).url if address_urls else ''
+        name = escape(stop.sale.name)
+        title_html = f'<a href="{url}" target="_blank">{name}</a>' if url else name
+        detail = f'\n{details[number - 1]}' if details else ''
+        parts.append(f'''      <Placemark>
+        <name>{number}. {name}</name>
+        <description><![CDATA[
+<h3>{title_html}</h3>{detail}
+<p><strong>Hours:</strong> {escape(_hours(stop.sale, day))}</p>
+<p><strong>Leg:</strong> {leg:.1f} mi</p>
+]]></description>
+        <styleUrl>#routeStop</styleUrl>
+        <address>{escape(stop.sale.full_address)}</address>
+        <Point><coordinates>{stop.lon:.6f},{stop.lat:.6f}</coordinates></Point>
+      </Placemark>
+''')
+
+    parts.append(f'''      <Placemark>
+        <name>Route</name>
+        <styleUrl>#routeLine</styleUrl>
+        <LineString>
+          <tessellate>1</tessellate>
+          <coordinates>{coordinates}</coordinates>
+        </LineString>
+      </Placemark>
+    </Folder>
+''')
+    parts.append(create_kml_footer())
+    return ''.join(parts)
+
+
+def route_markdown(route: Route, day: str, address_urls: Optional[AddressIndex] = None) -> str:
+    """Markdown itinerary: one numbered entry per stop with hours and leg miles."""
+    lines = [
+        f"# {day} Route",
+        "",
+        f"**Start:** {route.start[0]:.5f}, {route.start[1]:.5f}  ",
+        f"**Stops:** {len(route.stops)}  ",
+        f"**Distance:** {route.total_miles:.1f} mi (estimated road miles)"
+        + (", round trip" if route.round_trip else ""),
+        "",
+    ]
+    cumulative = 0.0
+    for number, (stop, leg) in enumerate(zip(route.stops, route.legs), 1):
+        cumulative += leg
+        url = match_sale_url(stop.sale, address_urls).url if address_urls else ''
+        title = f"[{stop.sale.name}]({url})" if url else stop.sale.name
+        lines.append(f"### {number}. {title}")
+        lines.append("")
+        lines.append(f"**Address:** {stop.sale.full_address}"
+                     + (" (ZIP-level location)" if stop.precision == 'zip' else ""))
+        lines.append("")
+        lines.append(f"**Hours:** {_hours(stop.sale, day)}")
+        lines.append("")
+        lines.append(f"**Drive:** {leg:.1f} mi (total {cumulative:.1f} mi)")
+        lines.append("")
+    if route.round_trip and route.stops:
+        lines.append(f"**Back to start:** {route.legs[-1]:.1f} mi (total {route.total_miles:.1f} mi)")
+        lines.append("")
+    return '\n'.join(lines)
+
+
+# Command line -----------------------------------------------------------------
+
+def busiest_day(sales: List[Sale]) -> str:
+    """Day with the most sales open."""
+    counts = Counter(day for sale in sales for day in sale.schedule.day_names())
+    return counts.most_common(1)[0][0] if counts else 'Saturday'
+
+
+def day_stops(sales: List[Sale], day: Optional[str], geocoder: Geocoder) -> Tuple[List[Stop], List[Sale]]:
+    """
+    Geocoded stops for the sales open on day (every sale if day is None).
+
+    Returns:
+        (stops, sales open that day that could not be located)
+    """
+    stops, missing = [], []
+    for sale in sales:
+        if day is not None and sale.schedule.day(day) is None:
+            continue
+        location = geocoder.locate(sale)
+        if location is None:
+            missing.append(sale)
+        else:
+            stops.append(Stop(sale, location.lat, location.lon, location.precision))
+    return stops, missing
+
+
+def pop_option(args: List[str], name: str) -> Optional[str]:
+    """Remove '--name VALUE' from args and return VALUE (None if absent)."""
+    if name not in args:
+        return None
+    i = args.index(name)
+    if i + 1 >= len(args):
+        print(f"Error: {name} needs a value")
+        sys.exit(1)
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
+
+def parse_point(text: str) -> Tuple[float, float]:
+    """'42.58,-83.24' -> (42.58, -83.24)"""
+    lat, lon = (float(part) for part in text.split(','))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(text)
+    return lat, lon
+
+
+def benchmark(count: int = 300) -> None:
+    """Time route planning over random stops around Bloomfield Hills."""
+    import random
+    import time
+
+    rng = random.Random(7)
+    center = (42.58, -83.24)
+    stops = [
+        Stop(Sale(f'Sale {i}', f'{i} Main St', 'Town', 'MI', '48304', 'Sat 9am-4pm'),
+             center[0] + rng.uniform(-0.4, 0.4), center[1] + rng.uniform(-0.5, 0.5), 'street')
+        for i in range(count)
+    ]
+
+    points = [center] + [(stop.lat, stop.lon) for stop in stops]
+    start = time.perf_counter()
+    dist = distance_matrix(points)
+    matrix_time = time.perf_counter() - start
+    greedy = nearest_neighbor_tour(_with_virtual_end(dist, False))
+    greedy_miles = sum(dist[a][b] for a, b in zip(greedy, greedy[1:-1]))
+
+    start = time.perf_counter()
+    route = plan_route(center, stops)
+    total_time = time.perf_counter() - start
+
+    backend = 'NumPy' if NUMPY_AVAILABLE else 'pure Python (NumPy not installed)'
+    print(f"{count} stops, {backend} distance matrix")
+    print(f"  distance matrix:       {matrix_time * 1000:8.1f} ms")
+    print(f"  nearest neighbor only: {greedy_miles:8.1f} mi")
+    print(f"  2-opt + Or-opt:        {route.total_miles:8.1f} mi "
+          f"({(1 - route.total_miles / greedy_miles) * 100:.1f}% shorter)")
+    print(f"  plan_route total:      {total_time * 1000:8.1f} ms")
+
+
+def main():
+    """Main entry point."""
+    args = sys.argv[1:]
+    if args and args[0] == '--bench':
+        benchmark(int(args[1]) if len(args) > 1 else 300)
+        return
+
+    start_text = pop_option(args, '--start')
+    day = pop_option(args, '--day')
+    markdown = pop_option(args, '--markdown')
+    output = pop_option(args, '--output')
+    road_factor = pop_option(args, '--road-factor')
+    flags = {arg for arg in args if arg.startswith('--')}
+    args = [arg for arg in args if not arg.startswith('--')]
+
+    if not args or start_text is None:
+        print("Usage: python route_planner.py <csv> --start LAT,LON [--day DAY] [--markdown details.md]")
+        print("                               [--output route.kml] [--round-trip] [--road-factor F] [--offline]")
+        print("       python route_planner.py --bench [count]")
+        print("\nOptions:")
+        print("  --start        Where the route starts, e.g. 42.5803,-83.2455")
+        print("  --day          Plan for this day (default: the day with the most sales)")
+        print("  --markdown     Details markdown, to link sales to their listings")
+        print("  --output       Route KML (default: <csv>_<day>_route.kml); the itinerary")
+        print("                 goes next to it as .md")
+        print("  --round-trip   Return to the start after the last sale")
+        print(f"  --road-factor  Driving miles per straight-line mile (default {ROAD_FACTOR})")
+        print("  --offline      Use only local indexes and cached geocoder answers")
+        sys.exit(1)
+
+    csv_path = Path(args[0])
+    if not csv_path.exists():
+        print(f"Error: CSV file not found: {csv_path}")
+        sys.exit(1)
+    try:
+        start = parse_point(start_text)
+        road_factor = float(road_factor) if road_factor is not None else ROAD_FACTOR
+    except ValueError:
+        print("Error: --start must be LAT,LON and --road-factor a number")
+        sys.exit(1)
+
+    sales = list(iter_csv_data(csv_path))
+    day = day.capitalize() if day else busiest_day(sales)
+    address_urls = parse_markdown_urls(Path(markdown)) if markdown else None
+    output_path = Path(output) if output else csv_path.with_name(f"{csv_path.stem}_{day.lower()}_route.kml")
+
+    print(f"Geocoding {day} sales...")
+    geocoder = geocode_sales((sale for sale in sales if sale.schedule.day(day)),
+                             offline='--offline' in flags)
+    stops, missing = day_stops(sales, day, geocoder)
+    for sale in missing:
+        print(f"  Skipped (no location): {sale.name} - {sale.full_address}")
+    if not stops:
+        print(f"Error: no located sales open on {day}")
+        sys.exit(1)
+
+    route = plan_route(start, stops, '--round-trip' in flags, road_factor)
+    output_path.write_text(route_kml(route, day, address_urls), encoding='utf-8')
+    itinerary_path = output_path.with_suffix('.md')
+    itinerary_path.write_text(route_markdown(route, day, address_urls), encoding='utf-8')
+    geocoder.close()
+
+    print(f"✓ {day} route: {len(route.stops)} stops, {route.total_miles:.1f} mi")
+    print(f"  - KML: {output_path}")
+    print(f"  - Itinerary: {itinerary_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Single-pass extraction of sale details from a listing page.
+
+extract_sale_info() walks the HTML once, stopping only at the tags that
+can carry sale details:
+
+- <script type="application/ld+json"> blocks (schema.org Event / Place /
+  PostalAddress), decoded with json
+- <meta> tags with og:* properties or itemprop attributes
+- elements with an itemprop attribute (streetAddress, postalCode, ...)
+- the first <h1> and the <title>
+- elements whose class mentions "address"
+
+Other <script> and <style> bodies are skipped without being scanned.
+Structured sources win over loose ones; regular expressions over the raw
+page are used only when a field is still missing after the pass, and the
+ZIP fallback only accepts a ZIP that follows a state abbreviation, not
+any five-digit number on the page.
+
+Usage:
+    python sale_page.py <page.html>                 # Show extracted fields
+    python sale_page.py --bench [page.html ...]     # Compare with the regex extractor
+"""
+
+import html as html_lib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+FIELDS = ('title', 'address', 'city', 'state', 'zip')
+
+# Sources for each field, most trustworthy first
+FIELD_SOURCES = {
+    'title': ('h1', 'title', 'meta', 'jsonld'),
+    'address': ('jsonld', 'itemprop', 'meta', 'class', 'fallback'),
+    'city': ('jsonld', 'itemprop', 'meta', 'fallback'),
+    'state': ('jsonld', 'itemprop', 'meta', 'fallback'),
+    'zip': ('jsonld', 'itemprop', 'meta', 'fallback'),
+}
+
+# schema.org PostalAddress properties (also used as itemprop names)
+ADDRESS_PROPERTIES = {
+    'streetaddress': 'address',
+    'addresslocality': 'city',
+    'addressregion': 'state',
+    'postalcode': 'zip',
+}
+
+# Open Graph style meta properties
+META_PROPERTIES = {
+    'og:title': 'title',
+    'og:street-address': 'address',
+    'og:locality': 'city',
+    'og:region': 'state',
+    'og:postal-code': 'zip',
+}
+
+# Only tags that can hold sale details stop the scan
+_TAG_RE = re.compile(
+    r'<(?:(?P<skip>script|style)\b(?P<script_attrs>[^>]*)>'
+    r'|(?P<named>meta|h1|title)\b(?P<attrs>[^>]*)>'
+    r'|(?P<other>[a-z][a-z0-9]*)\b(?P<other_attrs>[^>]*?(?:itemprop|address)[^>]*)>)',
+    re.IGNORECASE
+)
+_CLOSE_RE = {
+    'script': re.compile(r'</script\s*>', re.IGNORECASE),
+    'style': re.compile(r'</style\s*>', re.IGNORECASE),
+}
+_ATTR_RE = re.compile(r'([a-z][\w:-]*)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+
+# Last-resort patterns, run only for fields still missing after the scan
+_FALLBACK_PATTERNS = {
+    'address': re.compile(r'"streetAddress"\s*:\s*"([^"]+)"', re.IGNORECASE),
+    'city': re.compile(r'"addressLocality"\s*:\s*"([^"]+)"', re.IGNORECASE),
+    'state': re.compile(r'"addressRegion"\s*:\s*"([^"]+)"', re.IGNORECASE),
+    'zip': re.compile(r'"postalCode"\s*:\s*"([^"]+)"|,\s*[A-Z]{2}\s+(\d{5}(?:-\d{4})?)\b'),
+}
+
+_TITLE_SUFFIXES = [
+    re.compile(r'\s*\|\s*EstateS.*$', re.IGNORECASE),
+    re.compile(r'\s*-\s*Estate Sales\.net.*$', re.IGNORECASE),
+]
+
+
+def _attributes(attrs: str) -> Dict[str, str]:
+    """Parse a tag's attribute string into a dict with lowercased names."""
+    return {
+        m.group(1).lower(): html_lib.unescape(m.group(2) if m.group(2) is not None else m.group(3))
+        for m in _ATTR_RE.finditer(attrs)
+    }
+
+
+def _text_after(page: str, pos: int) -> str:
+    """Text from pos up to the next tag, unescaped and stripped."""
+    end = page.find('<', pos)
+    return html_lib.unescape(page[pos:end if end != -1 else len(page)]).strip()
+
+
+def _json_objects(node) -> Iterator[Dict]:
+    """Every JSON object inside a decoded JSON-LD value, depth first."""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _json_objects(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _json_objects(value)
+
+
+def _types(obj: Dict) -> List[str]:
+    value = obj.get('@type', [])
+    return [value] if isinstance(value, str) else [v for v in value if isinstance(v, str)]
+
+
+def _read_json_ld(text: str, found: Dict[str, Dict[str, str]]) -> None:
+    """Record name and PostalAddress fields from a JSON-LD block."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return
+
+    for obj in _json_objects(data):
+        types = _types(obj)
+        if any(t.endswith('Event') for t in types) and isinstance(obj.get('name'), str):
+            found['title'].setdefault('jsonld', html_lib.unescape(obj['name']).strip())
+        if 'PostalAddress' in types or 'streetAddress' in obj:
+            for prop, field in ADDRESS_PROPERTIES.items():
+                for key, value in obj.items():
+                    if key.lower() == prop and isinstance(value, (str, int)) and str(value).strip():
+                        found[field].setdefault('jsonld', str(value).strip())
+
+
+def clean_title(title: str) -> str:
+    """Strip the site name that listing pages append to their titles."""
+    for pattern in _TITLE_SUFFIXES:
+        title = pattern.sub('', title)
+    return title
+
+
+def extract_sale_info(html: Optional[str]) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Extract sale information from a listing page in one pass.
+
+    Args:
+        html: Page HTML
+
+    Returns:
+        {'title', 'address', 'city', 'state', 'zip'} (None for fields not
+        found), or None if there is no page
+    """
+    if not html:
+        return None
+
+    # field -> source -> first value seen from that source
+    found: Dict[str, Dict[str, str]] = {field: {} for field in FIELDS}
+
+    pos = 0
+    while True:
+        tag = _TAG_RE.search(html, pos)
+        if tag is None:
+            break
+        pos = tag.end()
+
+        skip = tag.group('skip')
+        if skip:
+            close = _CLOSE_RE[skip.lower()].search(html, pos)
+            body_end = close.start() if close else len(html)
+            if 'ld+json' in tag.group('script_attrs').lower():
+                _read_json_ld(html[pos:body_end], found)
+            pos = close.end() if close else len(html)
+            continue
+
+        named = (tag.group('named') or '').lower()
+        if named == 'meta':
+            attrs = _attributes(tag.group('attrs'))
+            content = attrs.get('content', '').strip()
+            if not content:
+                continue
+            field = META_PROPERTIES.get(attrs.get('property', attrs.get('name', '')).lower())
+            if field:
+                found[field].setdefault('meta', content)
+            field = ADDRESS_PROPERTIES.get(attrs.get('itemprop', '').lower())
+            if field:
+                found[field].setdefault('itemprop', content)
+        elif named in ('h1', 'title'):
+            text = _text_after(html, pos)
+            if text:
+                found['title'].setdefault(named, text)
+        else:
+            attrs = _attributes(tag.group('other_attrs'))
+            field = ADDRESS_PROPERTIES.get(attrs.get('itemprop', '').lower())
+            text = _text_after(html, pos)
+            if not text:
+                continue
+            if field:
+                found[field].setdefault('itemprop', text)
+            elif 'address' in attrs.get('class', '').lower():
+                found['address'].setdefault('class', text)
+
+    info = {}
+    for field in FIELDS:
+        if not found[field] and field in _FALLBACK_PATTERNS:
+            match = _FALLBACK_PATTERNS[field].search(html)
+            if match:
+                found[field]['fallback'] = next(g for g in match.groups() if g).strip()
+        value = next((found[field][s] for s in FIELD_SOURCES[field] if s in found[field]), None)
+        info[field] = clean_title(value) if field == 'title' and value else value
+
+    return info
+
+
+# Benchmark ----------------------------------------------------------------
+
+def _regex_extract(html: str) -> Dict[str, Optional[str]]:
+    """The per-field regex extractor this module replaced, for comparison."""
+    patterns = {
+        'title': [r'<h1[^>]*>([^<]+)</h1>', r'<title>([^<]+)</title>',
+                  r'property="og:title"\s+content="([^"]+)"'],
+        'address': [r'itemprop="streetAddress"[^>]*>([^<]+)<',
+                    r'property="og:street-address"\s+content="([^"]+)"',
+                    r'class="[^"]*address[^"]*"[^>]*>([^<]+)<',
+                    r'"streetAddress"\s*:\s*"([^"]+)"'],
+        'city': [r'itemprop="addressLocality"[^>]*>([^<]+)<',
+                 r'property="og:locality"\s+content="([^"]+)"',
+                 r'"addressLocality"\s*:\s*"([^"]+)"'],
+        'state': [r'itemprop="addressRegion"[^>]*>([^<]+)<',
+                  r'property="og:region"\s+content="([^"]+)"',
+                  r'"addressRegion"\s*:\s*"([^"]+)"'],
+        'zip': [r'itemprop="postalCode"[^>]*>([^<]+)<',
+                r'property="og:postal-code"\s+content="([^"]+)"',
+                r'"postalCode"\s*:\s*"([^"]+)"',
+                r'\b(\d{5}(?:-\d{4})?)\b'],
+    }
+    info = dict.fromkeys(FIELDS)
+    for field, field_patterns in patterns.items():
+        for pattern in field_patterns:
+            match = re.search(pattern, html, re.IGNORECASE)
+            if match:
+                info[field] = match.group(1).strip()
+                break
+    return info
+
+
+def synthetic_page(n: int) -> str:
+    """A listing page shaped like the real ones: heavy head, scripts, long body."""
+    script = 'window.__STATE__ = {"items": [%s]};' % ','.join(
+        f'{{"id": {i}, "price": "${i % 90 + 10}.00", "label": "Lot {10000 + i}"}}' for i in range(400)
+    )
+    photos = '\n'.join(
+        f'<div class="photo-tile"><a href="/photos/{n}/{i}"><img src="https://img.example/{n}/{i}.jpg" '
+        f'alt="Item {i}" loading="lazy"></a><span class="caption">Item #{20000 + i}</span></div>'
+        for i in range(600)
+    )
+    json_ld = json.dumps({
+        '@context': 'https://schema.org', '@type': 'SaleEvent',
+        'name': f'Birmingham Estate Sale {n}',
+        'location': {'@type': 'Place', 'name': 'Private residence', 'address': {
+            '@type': 'PostalAddress', 'streetAddress': f'{n} Chapin St',
+            'addressLocality': 'Birmingham', 'addressRegion': 'MI', 'postalCode': '48009'}},
+    })
+    return f'''<!DOCTYPE html><html><head>
+<title>Birmingham Estate Sale {n} | EstateSales.NET</title>
+<meta charset="utf-8"><meta name="viewport" content="width=device-width">
+<meta property="og:title" content="Birmingham Estate Sale {n}">
+{''.join(f'<link rel="preload" href="/static/chunk-{i}.js" as="script">' for i in range(40))}
+<script>{script}</script>
+<script type="application/ld+json">{json_ld}</script>
+<style>{''.join(f'.c{i}{{margin:{i}px}}' for i in range(300))}</style>
+</head><body>
+<header><nav>{''.join(f'<a href="/s/{i}">State {i}</a>' for i in range(60))}</nav></header>
+<main><h1>Birmingham Estate Sale {n}</h1>
+<div class="sale-address">{n} Chapin St, Birmingham, MI 48009</div>
+<p>Call 248-555-0199. Mid-century furniture, 12000 BTU air conditioner, 1950s records.</p>
+{photos}
+</main><footer>Copyright 2025. Ref 90210.</footer></body></html>'''
+
+
+def benchmark(pages: List[str], rounds: int = 20) -> None:
+    """Time extract_sale_info against the regex extractor on the given pages."""
+    total_bytes = sum(len(page) for page in pages)
+
+    start = time.process_time()
+    for _ in range(rounds):
+        for page in pages:
+            _regex_extract(page)
+    regex_time = (time.process_time() - start) / (rounds * len(pages))
+
+    start = time.process_time()
+    for _ in range(rounds):
+        for page in pages:
+            extract_sale_info(page)
+    single_time = (time.process_time() - start) / (rounds * len(pages))
+
+    print(f"Pages: {len(pages)} (avg {total_bytes // len(pages) // 1024} KiB)")
+    print(f"Per-field regex scans: {regex_time * 1000:.2f} ms CPU per page")
+    print(f"Single-pass extractor: {single_time * 1000:.2f} ms CPU per page")
+    print(f"Speedup:               {regex_time / single_time:.1f}x")
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) < 2:
+        print("Usage: python sale_page.py <page.html>")
+        print("       python sale_page.py --bench [page.html ...]")
+        print("\nWith no pages, --bench uses synthetic listing pages.")
+        sys.exit(1)
+
+    if sys.argv[1] == '--bench':
+        paths = sys.argv[2:]
+        if paths:
+            pages = [Path(p).read_text(encoding='utf-8', errors='replace') for p in paths]
+        else:
+            pages = [synthetic_page(n) for n in range(100, 110)]
+        benchmark(pages)
+        return
+
+    page = Path(sys.argv[1]).read_text(encoding='utf-8', errors='replace')
+    for field, value in extract_sale_info(page).items():
+        print(f"{field:8s} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Columnar table of sales for filtering, grouping and sorting.
+
+Summaries used to walk nested {day: {discount: [sales]}} dicts of Python
+objects. SaleTable keeps one compact typed column per attribute instead:
+
+- zip:        index into table.zip_codes
+- days:       bitmask of open days (bit i = DAYS[i])
+- discount:   best discount, as an index into DISCOUNT_LEVELS
+- discount_friday / _saturday / _sunday:
+              that day's discount level index (-1 = closed)
+- safety:     neighborhood rating, as an index into SAFETY_LEVELS (-1 = unknown)
+- score:      neighborhood safety score (NaN = unknown)
+- lat / lon:  coordinates (NaN = not geocoded)
+
+Columns are array.array buffers; when NumPy is installed they are exposed
+as NumPy arrays sharing the same memory, and filters, group counts and
+sorts run vectorized. Without NumPy the same operations run as plain
+loops over the arrays.
+
+To enable vectorized operations (optional):
+    pip install numpy
+
+Usage:
+    python sale_table.py --bench [count]    # Time summaries over synthetic sales
+"""
+
+import math
+import sys
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from kml_engine import DAYS, DISCOUNT_LEVELS, SAFETY_LEVELS, day_discount_level, discount_level
+from sales import Sale
+
+# NumPy is optional - without it the table falls back to Python loops
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+UNKNOWN = -1
+
+# Column name -> array typecode
+COLUMN_TYPES = {
+    'zip': 'I',
+    'days': 'B',
+    'discount': 'b',
+    **{f'discount_{day.lower()}': 'b' for day in DAYS},
+    'safety': 'b',
+    'score': 'f',
+    'lat': 'd',
+    'lon': 'd',
+}
+
+# Columns holding small integer codes (usable as group keys)
+CODED_COLUMNS = {name for name, typecode in COLUMN_TYPES.items() if typecode in 'IBb'}
+
+_NUMPY_TYPES = {'I': 'uint32', 'B': 'uint8', 'b': 'int8', 'f': 'float32', 'd': 'float64'}
+
+
+def day_column(day: str) -> str:
+    """Name of the per-day discount column ('Saturday' -> 'discount_saturday')."""
+    return f'discount_{day.lower()}'
+
+
+class GroupCounts(dict):
+    """Group key tuple -> row count, with prefix totals like PlacemarkSpool.count()."""
+
+    def count(self, prefix: Tuple = ()) -> int:
+        """Rows whose group key starts with prefix."""
+        return sum(n for key, n in self.items() if key[:len(prefix)] == prefix)
+
+
+class SaleTable:
+    """
+    Columnar store of sales.
+
+    Rows are appended with add(); the Sale objects are kept alongside the
+    columns for display (table.sale(row)).
+    """
+
+    def __init__(self):
+        self._columns: Dict[str, array] = {name: array(typecode) for name, typecode in COLUMN_TYPES.items()}
+        self.zip_codes: List[str] = []
+        self._zip_rows: Dict[str, int] = {}
+        self._neighborhoods: List[Optional[Dict]] = []
+        self._sales: List[Sale] = []
+
+    @classmethod
+    def from_sales(cls, sales: Iterable[Sale],
+                   zip_ratings: Optional[Dict[str, Dict]] = None) -> 'SaleTable':
+        """
+        Build a table from sales.
+
+        Args:
+            sales: Sales (any iterable)
+            zip_ratings: Optional ZIP -> neighborhood rating mapping
+
+        Returns:
+            SaleTable with one row per sale, in order
+        """
+        table = cls()
+        for sale in sales:
+            table.add(sale, zip_ratings.get(sale.zip_code) if zip_ratings else None)
+        return table
+
+    def __len__(self) -> int:
+        return len(self._sales)
+
+    def add(self, sale: Sale, neighborhood: Optional[Dict] = None,
+            location: Optional[Tuple[float, float]] = None) -> int:
+        """
+        Append a sale.
+
+        Args:
+            sale: Sale to add (its schedule is parsed if it was not yet)
+            neighborhood: Neighborhood rating for the sale's ZIP, if any
+            location: (lat, lon), if known
+
+        Returns:
+            The new row number
+        """
+        columns = self._columns
+        schedule = sale.schedule
+
+        zip_row = self._zip_rows.get(sale.zip_code)
+        if zip_row is None:
+            zip_row = self._zip_rows[sale.zip_code] = len(self.zip_codes)
+            self.zip_codes.append(sale.zip_code)
+            self._neighborhoods.append(neighborhood)
+        columns['zip'].append(zip_row)
+
+        open_days = schedule.day_names()
+        mask = 0
+        for i, day in enumerate(DAYS):
+            if day in open_days:
+                mask |= 1 << i
+                level = DISCOUNT_LEVELS.index(day_discount_level(schedule, day))
+            else:
+                level = UNKNOWN
+            columns[day_column(day)].append(level)
+        columns['days'].append(mask)
+        columns['discount'].append(DISCOUNT_LEVELS.index(discount_level(schedule.best_discount)))
+
+        rating = neighborhood.get('rating') if neighborhood else None
+        columns['safety'].append(SAFETY_LEVELS.index(rating) if rating in SAFETY_LEVELS else UNKNOWN)
+        columns['score'].append(float(neighborhood['score']) if neighborhood else math.nan)
+
+        lat, lon = location if location else (math.nan, math.nan)
+        columns['lat'].append(lat)
+        columns['lon'].append(lon)
+
+        self._sales.append(sale)
+        return len(self._sales) - 1
+
+    def sale(self, row: int) -> Sale:
+        """The Sale in a row."""
+        return self._sales[row]
+
+    def neighborhood(self, row: int) -> Optional[Dict]:
+        """Neighborhood rating of a row's ZIP, if any."""
+        return self._neighborhoods[self._columns['zip'][row]]
+
+    def column(self, name: str):
+        """
+        A column's values.
+
+        Returns:
+            NumPy array (sharing the column's memory) if NumPy is
+            installed, otherwise the array.array itself
+        """
+        values = self._columns[name]
+        if NUMPY_AVAILABLE:
+            return np.frombuffer(values, dtype=_NUMPY_TYPES[values.typecode]) if values else \
+                np.empty(0, dtype=_NUMPY_TYPES[values.typecode])
+        return values
+
+    def code(self, name: str, value) -> int:
+        """
+        Encode a value for comparison with a coded column.
+
+        'zip' takes a ZIP string, 'safety' a rating name, 'discount' and the
+        per-day discount columns a discount level name; other values pass through.
+        """
+        if name == 'zip':
+            return self._zip_rows.get(value, UNKNOWN)
+        if name == 'safety':
+            return SAFETY_LEVELS.index(value) if value in SAFETY_LEVELS else UNKNOWN
+        if name == 'discount' or name.startswith('discount_'):
+            return DISCOUNT_LEVELS.index(value) if value in DISCOUNT_LEVELS else UNKNOWN
+        return value
+
+    def decode(self, name: str, code: int):
+        """Inverse of code(): the ZIP, rating or level name for a code (None if unknown)."""
+        if name == 'zip':
+            return self.zip_codes[code] if code >= 0 else None
+        if name == 'safety':
+            return SAFETY_LEVELS[code] if code >= 0 else None
+        if name == 'discount' or name.startswith('discount_'):
+            return DISCOUNT_LEVELS[code] if code >= 0 else None
+        return code
+
+    # Filters --------------------------------------------------------------
+
+    def where(self, day: Optional[str] = None, discount: Optional[str] = None,
+              safety: Optional[str] = None, zip_code: Optional[str] = None):
+        """
+        Boolean mask of the rows matching every given condition.
+
+        Args:
+            day: Open on this day
+            discount: This discount level (on `day` if given, else the best)
+            safety: This neighborhood rating ('unknown' = rows without one)
+            zip_code: In this ZIP
+
+        Returns:
+            NumPy bool array, or a list of bools without NumPy
+        """
+        conditions = []  # (column, code, bit test instead of equality)
+        if day is not None:
+            conditions.append(('days', 1 << DAYS.index(day), True))
+        if discount is not None:
+            name = day_column(day) if day is not None else 'discount'
+            conditions.append((name, self.code(name, discount), False))
+        if safety is not None:
+            conditions.append(('safety', self.code('safety', safety), False))
+        if zip_code is not None:
+            conditions.append(('zip', self.code('zip', zip_code), False))
+
+        if NUMPY_AVAILABLE:
+            mask = np.ones(len(self), dtype=bool)
+            for name, code, bit in conditions:
+                values = self.column(name)
+                mask &= ((values & code) != 0) if bit else (values == code)
+            return mask
+
+        mask = [True] * len(self)
+        for name, code, bit in conditions:
+            values = self._columns[name]
+            if bit:
+                mask = [m and (v & code) != 0 for m, v in zip(mask, values)]
+            else:
+                mask = [m and v == code for m, v in zip(mask, values)]
+        return mask
+
+    def rows(self, mask=None) -> List[int]:
+        """Row numbers selected by a mask (all rows if None), in order."""
+        if mask is None:
+            return list(range(len(self)))
+        if NUMPY_AVAILABLE:
+            return np.flatnonzero(mask).tolist()
+        return list(compress(range(len(self)), mask))
+
+    # Grouping and sorting -------------------------------------------------
+
+    def count_by(self, *names: str, mask=None) -> GroupCounts:
+        """
+        Count rows per combination of coded column values.
+
+        Args:
+            names: Coded columns to group by (e.g. 'safety', 'discount')
+            mask: Only count rows selected by this mask
+
+        Returns:
+            GroupCounts keyed by tuples of decoded values (see decode())
+        """
+        for name in names:
+            if name not in CODED_COLUMNS:
+                raise ValueError(f"Cannot group by column: {name}")
+
+        if NUMPY_AVAILABLE:
+            if not names:
+                total = len(self) if mask is None else int(np.count_nonzero(mask))
+                return GroupCounts({(): total} if total else {})
+            keys = np.stack([self.column(name).astype(np.int64) for name in names], axis=1)
+            if mask is not None:
+                keys = keys[mask]
+            unique, counts = np.unique(keys, axis=0, return_counts=True)
+            raw = {tuple(int(v) for v in key): int(n) for key, n in zip(unique, counts)}
+        else:
+            keys = zip(*(self._columns[name] for name in names)) if names else (() for _ in range(len(self)))
+            if mask is not None:
+                keys = compress(keys, mask)
+            raw = Counter(keys)
+
+        return GroupCounts({
+            tuple(self.decode(name, code) for name, code in zip(names, key)): n
+            for key, n in raw.items()
+        })
+
+    def placements(self, *names: str) -> GroupCounts:
+        """
+        Count placemarks per (names..., day, discount level on that day).
+
+        A multi-day sale counts once for every day it is open, as in the
+        KML day folders.
+        """
+        counts = GroupCounts()
+        for day in DAYS:
+            column = day_column(day)
+            if NUMPY_AVAILABLE:
+                mask = self.column(column) >= 0
+            else:
+                mask = [level >= 0 for level in self._columns[column]]
+            for key, n in self.count_by(*names, column, mask=mask).items():
+                counts[key[:-1] + (day, key[-1])] = n
+        return counts
+
+    def order_by(self, name: str, rows: Optional[Sequence[int]] = None,
+                 descending: bool = False) -> List[int]:
+        """
+        Sort rows by a column (stable; NaN sorts last).
+
+        Args:
+            name: Column to sort by
+            rows: Rows to sort (default: all)
+            descending: Largest first
+
+        Returns:
+            Row numbers in sorted order
+        """
+        if NUMPY_AVAILABLE:
+            values = self.column(name)
+            selected = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+            keys = values[selected].astype(np.float64)
+            if descending:
+                keys = -keys
+            return selected[np.argsort(keys, kind='stable')].tolist()
+
+        values = self._columns[name]
+        selected = range(len(self)) if rows is None else rows
+
+        def key(row):
+            value = values[row]
+            if value != value:  # NaN
+                return (1, 0)
+            return (0, -value if descending else value)
+
+        return sorted(selected, key=key)
+
+
+# Benchmark ----------------------------------------------------------------
+
+def benchmark(count: int = 50000) -> None:
+    """Time table construction and summaries over synthetic sales."""
+    import random
+    import time
+    from schedule_parser import synthetic_descriptions
+
+    rng = random.Random(7)
+    descriptions = synthetic_descriptions(count)
+    zips = [f'{48000 + i:05d}' for i in range(300)]
+    ratings = {
+        zip_code: {'rating': rng.choice(SAFETY_LEVELS), 'score': rng.randint(1, 10)}
+        for zip_code in zips
+    }
+    sales = [
+        Sale(f'Sale {i}', f'{i} Main St', 'Town', 'MI', rng.choice(zips), description)
+        for i, description in enumerate(descriptions)
+    ]
+
+    start = time.perf_counter()
+    table = SaleTable.from_sales(sales, ratings)
+    built = time.perf_counter() - start
+
+    timings = []
+    for label, run in (
+        ('count by safety', lambda: table.count_by('safety')),
+        ('placements by safety/day/discount', lambda: table.placements('safety')),
+        ('filter Sat 50% off, excellent', lambda: table.rows(
+            table.where(day='Saturday', discount='50%', safety='excellent'))),
+        ('sort by safety score', lambda: table.order_by('score', descending=True)),
+    ):
+        start = time.perf_counter()
+        run()
+        timings.append((label, time.perf_counter() - start))
+
+    backend = 'NumPy' if NUMPY_AVAILABLE else 'array (NumPy not installed)'
+    print(f"{count} sales, {backend} backend")
+    print(f"  build table (parses schedules): {built * 1000:8.1f} ms")
+    for label, elapsed in timings:
+        print(f"  {label:32s}: {elapsed * 1000:8.1f} ms")
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) < 2 or sys.argv[1] != '--bench':
+        print("Usage: python sale_table.py --bench [count]")
+        sys.exit(1)
+    benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Sale record and the CSV loader shared by all scripts.
+
+csv.DictReader builds a fresh dict (hash table plus key references) for
+every row, and scripts used to add keys to those dicts as they went.
+Sale is a fixed-shape record with __slots__: six string fields, any extra
+CSV columns as a tuple, and the parsed schedule, which is computed on
+first use and then kept.
+
+Code written against DictReader rows keeps working: sale['ZIP'] and
+sale.get('City', '') read the CSV column of that name.
+
+Usage:
+    python sales.py --bench <sales.csv>    # Compare memory with DictReader rows
+"""
+
+import csv
+import sys
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from schedule_parser import Schedule, parse_schedule
+
+
+# Columns every sales CSV has, in file order
+CSV_COLUMNS = ('Name', 'Address', 'City', 'State', 'ZIP', 'Description')
+
+# CSV column -> Sale attribute
+_ATTRIBUTES = {
+    'Name': 'name',
+    'Address': 'address',
+    'City': 'city',
+    'State': 'state',
+    'ZIP': 'zip_code',
+    'Description': 'description',
+}
+
+
+class Sale:
+    """
+    One estate sale from a CSV row.
+
+    Args:
+        name, address, city, state, zip_code, description: CSV fields
+        extra: (column, value) pairs for any other CSV columns
+    """
+
+    __slots__ = ('name', 'address', 'city', 'state', 'zip_code', 'description',
+                 'extra', '_schedule')
+
+    def __init__(self, name: str, address: str, city: str, state: str, zip_code: str,
+                 description: str, extra: Tuple[Tuple[str, str], ...] = ()):
+        self.name = name
+        self.address = address
+        self.city = city
+        self.state = state
+        self.zip_code = zip_code
+        self.description = description
+        self.extra = extra
+        self._schedule: Optional[Schedule] = None
+
+    @property
+    def full_address(self) -> str:
+        """'street, city, state zip'"""
+        return f"{self.address}, {self.city}, {self.state} {self.zip_code}"
+
+    @property
+    def schedule(self) -> Schedule:
+        """Hours and discounts parsed from the description (parsed once)."""
+        if self._schedule is None:
+            self._schedule = parse_schedule(self.description)
+        return self._schedule
+
+    def __getitem__(self, column: str) -> str:
+        """Value of a CSV column, as on a DictReader row."""
+        attribute = _ATTRIBUTES.get(column)
+        if attribute is not None:
+            return getattr(self, attribute)
+        for name, value in self.extra:
+            if name == column:
+                return value
+        raise KeyError(column)
+
+    def get(self, column: str, default: Optional[str] = None) -> Optional[str]:
+        """Value of a CSV column, or default if the CSV had no such column."""
+        try:
+            return self[column]
+        except KeyError:
+            return default
+
+    def values(self) -> Tuple[str, ...]:
+        """Every CSV value, standard columns first."""
+        return (self.name, self.address, self.city, self.state, self.zip_code,
+                self.description) + tuple(value for _, value in self.extra)
+
+    def as_row(self) -> Dict[str, str]:
+        """The sale as a CSV row dict (for csv.DictWriter)."""
+        row = dict(zip(CSV_COLUMNS, self.values()))
+        row.update(self.extra)
+        return row
+
+    def __repr__(self) -> str:
+        return f"Sale({self.name!r}, {self.full_address!r})"
+
+
+def iter_sales(csv_path: Path) -> Iterator[Sale]:
+    """
+    Stream sales from a CSV file.
+
+    Args:
+        csv_path: Path to the CSV file
+
+    Yields:
+        One Sale per row with a Name (empty rows are skipped)
+
+    Raises:
+        ValueError: The header lacks one of CSV_COLUMNS
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        missing = [column for column in CSV_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"{csv_path}: missing CSV columns {', '.join(missing)}")
+
+        standard_fields = itemgetter(*(header.index(column) for column in CSV_COLUMNS))
+        extra_columns = [(i, column) for i, column in enumerate(header) if column not in _ATTRIBUTES]
+        width = len(header)
+
+        for row in reader:
+            if len(row) < width:
+                row += [''] * (width - len(row))  # Short rows read as empty fields
+            name, address, city, state, zip_code, description = standard_fields(row)
+            if not name:  # Skip empty rows
+                continue
+            extra = tuple((column, row[i]) for i, column in extra_columns) if extra_columns else ()
+            yield Sale(name, address, city, state, zip_code, description, extra)
+
+
+def load_sales(csv_path: Path) -> List[Sale]:
+    """
+    Read every sale from a CSV file.
+
+    Args:
+        csv_path: Path to the CSV file
+
+    Returns:
+        List of Sales in file order
+    """
+    return list(iter_sales(csv_path))
+
+
+# Benchmark ----------------------------------------------------------------
+
+def benchmark(csv_path: Path) -> None:
+    """Compare the memory held by DictReader rows and Sale records."""
+    import time
+    import tracemalloc
+
+    def measure(load):
+        start = time.perf_counter()
+        load()
+        elapsed = time.perf_counter() - start  # Timed without tracing overhead
+        tracemalloc.start()
+        rows = load()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return len(rows), size, elapsed
+
+    def dict_rows():
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            return [row for row in csv.DictReader(f) if row['Name']]
+
+    for label, load in (('DictReader rows', dict_rows), ('Sale records', lambda: load_sales(csv_path))):
+        count, size, elapsed = measure(load)
+        print(f"{label:16s}: {count} sales, {size / 1024 / 1024:6.1f} MB "
+              f"({size / max(count, 1):.0f} bytes/sale), {elapsed * 1000:.0f} ms")
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) < 3 or sys.argv[1] != '--bench':
+        print("Usage: python sales.py --bench <sales.csv>")
+        sys.exit(1)
+    benchmark(Path(sys.argv[2]))
+
+
+if __name__ == "__main__":
+    main()
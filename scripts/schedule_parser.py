@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Single-pass parser for estate sale hours descriptions.
+
+Descriptions look like:
+
+    "Thu 10am-4pm, Fri 10am-4pm, Sat 10am-4pm (50% OFF most items) | Park on street"
+    "Fri-Sun 9am-2pm | Crystal, pottery"
+
+parse_schedule() tokenizes a description with one precompiled pattern in
+a single left-to-right scan and returns a Schedule: the open days (any of
+the seven, with ranges such as "Fri-Sun" expanded) with opening and
+closing times and the percentage off each day, plus the free-text notes
+after the '|'. Any percentage is recognized ("40% off", "75% OFF select
+items"), not just 25/30/50.
+
+Usage:
+    python schedule_parser.py "<description>"     # Show the parsed schedule
+    python schedule_parser.py --bench [N]         # Compare with the regex functions
+"""
+
+import re
+import sys
+import time
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# First three letters of any accepted spelling -> full day name
+_DAY_PREFIXES = {day[:3].lower(): day for day in WEEKDAYS}
+
+
+def _time_pattern(name: str) -> str:
+    """Clock time ('10am', '3:30 p.m.', '4', 'noon') with groups prefixed by name."""
+    return (rf'(?:(?P<{name}_hour>\d{{1,2}})(?::(?P<{name}_minute>\d{{2}}))?\s*'
+            rf'(?:(?P<{name}_ampm>[ap])\.?m\.?)?|(?P<{name}_word>noon|midnight))')
+
+
+# One alternation per token kind, each wrapped in a named group so that
+# match.lastgroup names the kind. Matched against lowercased text; the
+# lookahead rejects positions that cannot start a token before any
+# alternative is tried, which keeps the single finditer() scan cheap.
+_TOKEN_RE = re.compile(rf'''
+    (?=[\d,;\-–mtwfsn])
+    (?:
+        (?P<discount>(?P<pct>\d{{1,3}})\s*%\s*off\b(?P<cond>[^,;)|]*))     # "50% off most items"
+      | (?P<hours>{_time_pattern('open')}\s*(?:-|–|\bto\b)\s*{_time_pattern('close')})
+      | \b(?P<day>mon(?:day)?|tue(?:s(?:day)?)?|wed(?:nesday)?
+              |thu(?:r(?:s(?:day)?)?)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)\b
+      | (?P<through>-|–|\bto\b|\bthru\b|\bthrough\b)                 # Day range
+      | (?P<sep>[,;])
+    )
+''', re.VERBOSE)
+
+_HOURS_RE = re.compile(rf"{_time_pattern('open')}\s*(?:-|–|\bto\b)\s*{_time_pattern('close')}")
+
+_DISCOUNT_RE = re.compile(r'(\d{1,3})\s*%\s*off\b')
+
+
+class DayHours(NamedTuple):
+    """Hours and discount for one open day."""
+    day: str                 # Full day name, e.g. 'Saturday'
+    opens: Optional[int]     # Minutes after midnight (None if not given)
+    closes: Optional[int]    # Minutes after midnight (None if not given)
+    discount: int            # Percent off that day (0 = none listed)
+    discount_note: str       # Qualifier after "% off", e.g. 'most items'
+
+
+class Schedule(NamedTuple):
+    """A parsed sale description."""
+    days: Tuple[DayHours, ...]   # In description order
+    notes: str                   # Text after the first '|'
+    notes_discount: int          # Largest "% off" mentioned in the notes
+
+    def day(self, name: str) -> Optional[DayHours]:
+        """Hours for a day ('Saturday'), or None if the sale is closed."""
+        for hours in self.days:
+            if hours.day == name:
+                return hours
+        return None
+
+    def day_names(self) -> List[str]:
+        """Open days, in description order, without repeats."""
+        names = []
+        for hours in self.days:
+            if hours.day not in names:
+                names.append(hours.day)
+        return names
+
+    @property
+    def best_discount(self) -> int:
+        """Largest percentage off mentioned anywhere in the description."""
+        return max([hours.discount for hours in self.days] + [self.notes_discount])
+
+
+def _clock(token: re.Match, name: str, meridiem: Optional[str] = None) -> int:
+    """
+    Minutes after midnight for the open_* or close_* groups of a token.
+
+    Args:
+        token: Match of _HOURS_RE
+        name: 'open' or 'close'
+        meridiem: 'a' or 'p' to assume when the time has no am/pm
+            (None = business hours: 7-11 are morning, 12-6 afternoon)
+    """
+    word = token.group(f'{name}_word')
+    if word:
+        return 12 * 60 if word == 'noon' else 0
+
+    hour = int(token.group(f'{name}_hour'))
+    minute = int(token.group(f'{name}_minute') or 0)
+    meridiem = token.group(f'{name}_ampm') or meridiem or ('a' if 7 <= hour <= 11 else 'p')
+    return (hour % 12 + (12 if meridiem == 'p' else 0)) * 60 + minute
+
+
+@lru_cache(maxsize=1024)
+def _hours(text: str) -> Tuple[int, int]:
+    """
+    Opening and closing minutes for the text of an 'hours' token.
+
+    An opening time without am/pm takes the closing time's ("1-4pm"),
+    unless that would put it after closing ("10-4pm" opens at 10am).
+    Cached: the same few ranges ("10am-4pm") recur across descriptions.
+    """
+    token = _HOURS_RE.fullmatch(text)
+    closes = _clock(token, 'close')
+    open_explicit = token.group('open_ampm') or token.group('open_word')
+    close_explicit = token.group('close_ampm') or token.group('close_word')
+    if open_explicit or not close_explicit:
+        return _clock(token, 'open'), closes
+
+    opens = _clock(token, 'open', 'p' if closes >= 12 * 60 else 'a')
+    if opens > closes:
+        opens = _clock(token, 'open', 'a')
+    return opens, closes
+
+
+def format_clock(minutes: Optional[int]) -> str:
+    """Format minutes after midnight as '10am' or '3:30pm'."""
+    if minutes is None:
+        return '?'
+    hour, minute = divmod(minutes, 60)
+    suffix = 'am' if hour < 12 else 'pm'
+    hour = hour % 12 or 12
+    return f"{hour}{suffix}" if minute == 0 else f"{hour}:{minute:02d}{suffix}"
+
+
+def day_range(first: str, last: str) -> List[str]:
+    """Days from first to last inclusive, wrapping past Sunday."""
+    start = WEEKDAYS.index(first)
+    span = (WEEKDAYS.index(last) - start) % 7
+    return [WEEKDAYS[(start + i) % 7] for i in range(span + 1)]
+
+
+def parse_schedule(description: str) -> Schedule:
+    """
+    Parse an hours description into a Schedule in one scan.
+
+    Entries are a day list ("Sat", "Fri-Sun", "Sat & Sun") followed by an
+    optional time range and an optional "(N% OFF ...)" discount, in
+    either order; commas separate entries. Day names in the notes are ignored.
+
+    Args:
+        description: Raw description from the CSV
+
+    Returns:
+        Schedule (days is empty if no day names were found)
+    """
+    hours_text, _, notes = description.partition('|')
+    lowered = hours_text.lower()
+    # Discount notes are sliced from the original text when lowercasing kept offsets
+    original = hours_text if len(lowered) == len(hours_text) else lowered
+
+    entries = []             # [days, opens, closes, discount, note]
+    entry = None
+    pending_range = False
+
+    for token in _TOKEN_RE.finditer(lowered):
+        kind = token.lastgroup
+
+        if kind == 'day':
+            day = _DAY_PREFIXES[token.group('day')[:3]]
+            if entry is None or entry[1] is not None or entry[3]:
+                entry = [[day], None, None, 0, '']
+                entries.append(entry)
+            elif pending_range:
+                entry[0].extend(day_range(entry[0][-1], day)[1:])
+            else:
+                entry[0].append(day)
+            pending_range = False
+
+        elif kind == 'through':
+            pending_range = entry is not None and entry[1] is None
+
+        elif kind == 'hours':
+            if entry is not None:
+                entry[1], entry[2] = _hours(token.group('hours'))
+            pending_range = False
+
+        elif kind == 'discount':
+            percent = int(token.group('pct'))
+            start, end = token.span('cond')
+            note = original[start:end]
+            # "Sun 50% off 10am-2pm": the condition swallowed the day's hours
+            if entry is not None and entry[1] is None:
+                hours = _HOURS_RE.search(lowered, start, end)
+                if hours:
+                    entry[1], entry[2] = _hours(hours.group())
+                    note = original[start:hours.start()] + original[hours.end():end]
+            if entry is not None and percent > entry[3]:
+                entry[3] = percent
+                entry[4] = note.strip()
+            pending_range = False
+
+        else:  # sep
+            pending_range = False
+
+    notes = notes.strip()
+    notes_discount = 0
+    if '%' in notes:
+        notes_discount = max((int(pct) for pct in _DISCOUNT_RE.findall(notes.lower())), default=0)
+
+    days = tuple(
+        DayHours(day, opens, closes, discount, note)
+        for day_names, opens, closes, discount, note in entries
+        for day in day_names
+    )
+    return Schedule(days, notes, notes_discount)
+
+
+def format_schedule(schedule: Schedule) -> str:
+    """Render a Schedule as one line per day (for the command line)."""
+    lines = []
+    for hours in schedule.days:
+        line = f"{hours.day:9s} {format_clock(hours.opens)}-{format_clock(hours.closes)}"
+        if hours.discount:
+            line += f"  {hours.discount}% off"
+            if hours.discount_note:
+                line += f" ({hours.discount_note})"
+        lines.append(line)
+    if schedule.notes:
+        lines.append(f"Notes: {schedule.notes}")
+    return '\n'.join(lines)
+
+
+# Benchmark ----------------------------------------------------------------
+
+def _regex_parse(description: str) -> Tuple:
+    """The per-field regex functions this parser replaced, for comparison."""
+    def discount_level(text):
+        if re.search(r'50%\s*off', text, re.IGNORECASE):
+            return '50%'
+        if re.search(r'(25|30)%\s*off', text, re.IGNORECASE):
+            return '25-30%'
+        return 'no_discount'
+
+    def discount_for_day(text, day):
+        for line in text.split(','):
+            if re.search(rf'\b{day[:3]}\b', line, re.IGNORECASE):
+                if re.search(r'50%\s*off', line, re.IGNORECASE):
+                    return '50%'
+                if re.search(r'(25|30)%\s*off', line, re.IGNORECASE):
+                    return '25-30%'
+        return discount_level(text)
+
+    lower = description.lower()
+    days = [day for day in ('Friday', 'Saturday', 'Sunday') if re.search(rf'\b{day[:3].lower()}\b', lower)]
+    return (days, discount_level(description), {day: discount_for_day(description, day) for day in days})
+
+
+def synthetic_descriptions(count: int, seed: int = 7) -> List[str]:
+    """Generate descriptions in the style of the example CSVs."""
+    import random
+
+    rng = random.Random(seed)
+    abbreviations = [day[:3] for day in WEEKDAYS]
+    notes = ['', ' | Park on street', " | Don't block driveways",
+             ' | Crystal, pottery, Ethan Allen furniture', ' | Cash only; 50% off Sunday']
+
+    descriptions = []
+    for _ in range(count):
+        start = rng.randrange(7)
+        parts = []
+        if rng.random() < 0.15:
+            last = abbreviations[(start + rng.randrange(1, 3)) % 7]
+            parts.append(f"{abbreviations[start]}-{last} {rng.randint(8, 11)}am-{rng.randint(2, 5)}pm")
+        else:
+            for offset in range(rng.randint(1, 4)):
+                part = f"{abbreviations[(start + offset) % 7]} {rng.randint(8, 11)}am-{rng.randint(1, 5)}:30pm"
+                if rng.random() < 0.25:
+                    part += f" ({rng.choice([25, 30, 40, 50, 75])}% OFF{rng.choice(['', ' most items'])})"
+                parts.append(part)
+        descriptions.append(', '.join(parts) + rng.choice(notes))
+    return descriptions
+
+
+def benchmark(count: int = 100000) -> None:
+    """Time parse_schedule against the regex functions on a synthetic corpus."""
+    corpus = synthetic_descriptions(count)
+
+    start = time.perf_counter()
+    for description in corpus:
+        _regex_parse(description)
+    regex_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for description in corpus:
+        parse_schedule(description)
+    single_time = time.perf_counter() - start
+
+    print(f"Descriptions:           {count}")
+    print(f"Per-field regex search: {regex_time:.2f}s ({regex_time / count * 1e6:.1f} us each)")
+    print(f"Single-pass tokenizer:  {single_time:.2f}s ({single_time / count * 1e6:.1f} us each)")
+    print(f"Speedup:                {regex_time / single_time:.1f}x")
+
+
+def main():
+    """Main entry point."""
+    if len(sys.argv) < 2:
+        print('Usage: python schedule_parser.py "<description>"')
+        print("       python schedule_parser.py --bench [N]")
+        sys.exit(1)
+
+    if sys.argv[1] == '--bench':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+        return
+
+    print(format_schedule(parse_schedule(sys.argv[1])))
+
+
+if __name__ == "__main__":
+    main()
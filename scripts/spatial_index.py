@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Radius, bounding-box and nearest-sale queries over geocoded sales.
+
+The methodology starts from "center point + 30 mile radius". A
+SpatialIndex answers that without looking at every sale:
+
+- Every point is keyed by its geohash (GEOHASH_PRECISION characters,
+  a cell of a few meters) and the keys are kept sorted. The points in
+  a coarser geohash cell all share the cell's prefix, so they are one
+  contiguous range, found with two binary searches.
+- A query box is covered by the cells of the finest precision that
+  needs at most MAX_COVER_CELLS of them; only those ranges are read,
+  and each point in them is checked exactly (great-circle miles for
+  radius queries).
+- nearest() doubles a search radius, starting at NEAREST_START_MILES,
+  until the circle holds k sales.
+
+A query costs a few binary searches plus the sales near the query
+area, so trimming a multi-state scrape to one metro reads only that
+metro's sales.
+
+The command line is a filter stage: it trims a sales CSV (geocoded as
+the converters do) or a KML (by <Point>, else by geocoding <address>)
+to a radius, a box or the nearest sales, ready for rendering. KML
+folders left empty are removed.
+
+Usage:
+    python spatial_index.py <input.csv|input.kml> --center LAT,LON --radius MILES [--output out] [--offline]
+    python spatial_index.py <input.csv|input.kml> --box SOUTH,WEST,NORTH,EAST [--output out] [--offline]
+    python spatial_index.py <input.csv|input.kml> --center LAT,LON --nearest K [--output out] [--offline]
+    python spatial_index.py --bench [count]    # Time queries over random sales
+"""
+
+import csv
+import math
+import sys
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+from address_index import parse_full_address
+from geocoder import EARTH_RADIUS_MILES, Geocoder, geocode_sales, haversine_miles
+from kml_stream import KML_NAMESPACE
+from route_planner import Stop, day_stops, parse_point, pop_option
+from sales import CSV_COLUMNS, Sale, load_sales
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Characters per point key (cells of about 5 x 5 meters)
+GEOHASH_PRECISION = 9
+
+# Most cells used to cover a query box (coarser cells are used beyond this)
+MAX_COVER_CELLS = 32
+
+# First search radius of a nearest-sales query (doubled until it holds k)
+NEAREST_START_MILES = 1.0
+
+# Sorts after every geohash character: prefix + this bounds a prefix range
+_PREFIX_END = '~'
+
+_NS = {'kml': KML_NAMESPACE}
+
+# A query box: (south, west, north, east) in degrees; west > east crosses
+# the antimeridian
+Box = Tuple[float, float, float, float]
+
+
+def _cell_bits(precision: int) -> Tuple[int, int]:
+    """(latitude bits, longitude bits) of a geohash; longitude takes the odd bit."""
+    bits = 5 * precision
+    return bits // 2, (bits + 1) // 2
+
+
+def _cell_index(value: float, low: float, span: float, bits: int) -> int:
+    """Cell number of value along one axis split into 2**bits cells."""
+    cells = 1 << bits
+    return min(max(int((value - low) / span * cells), 0), cells - 1)
+
+
+def _cell_hash(lat_index: int, lon_index: int, precision: int) -> str:
+    """Geohash of a cell given its row and column at precision."""
+    lat_bits, lon_bits = _cell_bits(precision)
+    code = 0
+    for bit in range(5 * precision):
+        # Bits alternate longitude, latitude, most significant first
+        if bit % 2 == 0:
+            code = code << 1 | (lon_index >> (lon_bits - 1 - bit // 2)) & 1
+        else:
+            code = code << 1 | (lat_index >> (lat_bits - 1 - bit // 2)) & 1
+    return ''.join(GEOHASH_ALPHABET[(code >> 5 * (precision - 1 - k)) & 31] for k in range(precision))
+
+
+def geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash of a point, e.g. (42.5803, -83.2455) -> 'dpsf1xw2p'."""
+    lat_bits, lon_bits = _cell_bits(precision)
+    return _cell_hash(_cell_index(lat, -90.0, 180.0, lat_bits),
+                      _cell_index(lon, -180.0, 360.0, lon_bits), precision)
+
+
+def radius_box(center: Tuple[float, float], miles: float) -> Box:
+    """Smallest box holding every point within miles of center (great-circle)."""
+    lat, lon = center
+    angle = miles / EARTH_RADIUS_MILES
+    south, north = max(lat - math.degrees(angle), -90.0), min(lat + math.degrees(angle), 90.0)
+    cos_lat = math.cos(math.radians(lat))
+    if south == -90.0 or north == 90.0 or math.sin(angle) >= cos_lat:
+        return south, -180.0, north, 180.0  # Reaches a pole: every longitude
+    spread = math.degrees(math.asin(math.sin(angle) / cos_lat))
+    west, east = lon - spread, lon + spread
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, west, north, east
+
+
+def _lon_ranges(west: float, east: float) -> List[Tuple[float, float]]:
+    """Longitude ranges of a box, split at the antimeridian."""
+    return [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+
+
+def _in_box(lat: float, lon: float, box: Box) -> bool:
+    south, west, north, east = box
+    if not south <= lat <= north:
+        return False
+    return west <= lon <= east if west <= east else (lon >= west or lon <= east)
+
+
+def cover_cells(box: Box, max_cells: int = MAX_COVER_CELLS) -> List[str]:
+    """
+    Geohash prefixes of the cells covering a box.
+
+    Uses the finest precision needing at most max_cells cells (precision 1
+    has only 32, so the whole world is always coverable).
+    """
+    south, west, north, east = box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_bits, lon_bits = _cell_bits(precision)
+        rows = range(_cell_index(south, -90.0, 180.0, lat_bits),
+                     _cell_index(north, -90.0, 180.0, lat_bits) + 1)
+        columns = [range(_cell_index(low, -180.0, 360.0, lon_bits),
+                         _cell_index(high, -180.0, 360.0, lon_bits) + 1)
+                   for low, high in _lon_ranges(west, east)]
+        if len(rows) * sum(map(len, columns)) <= max_cells or precision == 1:
+            # The two sides of a box crossing the antimeridian can share a cell
+            return list(dict.fromkeys(_cell_hash(row, column, precision)
+                                      for row in rows for span in columns for column in span))
+    return []
+
+
+class SpatialIndex:
+    """
+    Points with attached items, sorted by geohash for cell range scans.
+
+    Args:
+        entries: (lat, lon, item) for every point; items are returned by
+            the queries as they are
+    """
+
+    def __init__(self, entries: Iterable[Tuple[float, float, Any]]):
+        keyed = sorted(((geohash(lat, lon), lat, lon, item) for lat, lon, item in entries),
+                       key=lambda entry: entry[0])
+        self._keys = [key for key, _, _, _ in keyed]
+        self._points = [(lat, lon) for _, lat, lon, _ in keyed]
+        self._items = [item for _, _, _, item in keyed]
+
+    @classmethod
+    def from_stops(cls, stops: Iterable[Stop]) -> 'SpatialIndex':
+        """Index geocoded sales; queries return the Stops."""
+        return cls((stop.lat, stop.lon, stop) for stop in stops)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _candidates(self, box: Box) -> Iterator[int]:
+        """Positions of the points in the cells covering box (a superset of the box)."""
+        for prefix in cover_cells(box):
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(self._keys, prefix + _PREFIX_END, start)
+            yield from range(start, end)
+
+    def in_box(self, south: float, west: float, north: float, east: float) -> List[Any]:
+        """
+        Items inside a box, in geohash order.
+
+        Args:
+            south, west, north, east: Box edges in degrees (west > east
+                for a box crossing the antimeridian)
+        """
+        box = (south, west, north, east)
+        return [self._items[i] for i in self._candidates(box) if _in_box(*self._points[i], box)]
+
+    def within_radius(self, center: Tuple[float, float], miles: float) -> List[Tuple[float, Any]]:
+        """
+        Items within miles of center (great-circle).
+
+        Returns:
+            (miles, item) pairs, nearest first
+        """
+        found = []
+        for i in self._candidates(radius_box(center, miles)):
+            distance = haversine_miles(center, self._points[i])
+            if distance <= miles:
+                found.append((distance, i))
+        found.sort()
+        return [(distance, self._items[i]) for distance, i in found]
+
+    def nearest(self, center: Tuple[float, float], k: int) -> List[Tuple[float, Any]]:
+        """
+        The k items nearest to center (fewer if the index holds fewer).
+
+        Returns:
+            (miles, item) pairs, nearest first
+        """
+        if k <= 0 or not self._keys:
+            return []
+        # Half the circumference reaches every point on Earth
+        widest = math.pi * EARTH_RADIUS_MILES
+        miles = NEAREST_START_MILES
+        while True:
+            found = self.within_radius(center, min(miles, widest))
+            if len(found) >= k or miles >= widest:
+                return found[:k]
+            miles *= 2
+
+
+def index_sales(sales: Iterable[Sale], geocoder: Geocoder) -> Tuple[SpatialIndex, List[Sale]]:
+    """
+    Spatial index of the sales the geocoder can place.
+
+    Returns:
+        (index whose items are route_planner Stops, sales not located)
+    """
+    stops, missing = day_stops(list(sales), None, geocoder)
+    return SpatialIndex.from_stops(stops), missing
+
+
+def address_sale(address: str) -> Sale:
+    """A Sale holding only a 'Street, City, ST 12345' address, for geocoding."""
+    parts = [part.strip() for part in address.split(',')]
+    city = parts[1] if len(parts) > 2 else ''
+    state = parts[-1].split()[0] if len(parts) > 1 and parts[-1].split() else ''
+    return Sale('', parts[0], city, state if not state.isdigit() else '',
+                parse_full_address(address).zip_code, '')
+
+
+def placemark_point(placemark: ET.Element) -> Optional[Tuple[float, float]]:
+    """(lat, lon) from a placemark's <Point>, or None without one."""
+    coordinates = placemark.find('.//kml:Point/kml:coordinates', _NS)
+    if coordinates is None or not coordinates.text:
+        return None
+    try:
+        lon, lat = (float(value) for value in coordinates.text.strip().split(',')[:2])
+    except ValueError:
+        return None
+    return lat, lon
+
+
+# A query over an index: the selected items
+Query = Callable[[SpatialIndex], List[Any]]
+
+
+def filter_csv(input_path: Path, output_path: Path, query: Query, offline: bool = False) -> Tuple[int, int, int]:
+    """
+    Write the sales of a CSV selected by query, in CSV order.
+
+    Returns:
+        (sales kept, sales read, sales that could not be located)
+    """
+    sales = load_sales(input_path)
+    geocoder = geocode_sales(sales, offline)
+    index, missing = index_sales(sales, geocoder)
+    geocoder.close()
+    selected = {id(stop.sale) for stop in query(index)}
+
+    extra_fieldnames = [column for column, _ in sales[0].extra] if sales else []
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(CSV_COLUMNS) + extra_fieldnames)
+        writer.writeheader()
+        for sale in sales:
+            if id(sale) in selected:
+                writer.writerow(sale.as_row())
+    return len(selected), len(sales), len(missing)
+
+
+def filter_kml(input_path: Path, output_path: Path, query: Query, offline: bool = False) -> Tuple[int, int, int]:
+    """
+    Write a KML with only the placemarks selected by query.
+
+    Placemarks are placed by their <Point>, or else by geocoding their
+    <address>. Styles and folder structure are kept; folders left
+    without placemarks are removed.
+
+    Returns:
+        (placemarks kept, placemarks read, placemarks that could not be located)
+    """
+    ET.register_namespace('', KML_NAMESPACE)
+    tree = ET.parse(str(input_path))
+    parents = {child: parent for parent in tree.iter() for child in parent}
+    placemarks = list(tree.iter(f'{{{KML_NAMESPACE}}}Placemark'))
+
+    points = {id(placemark): placemark_point(placemark) for placemark in placemarks}
+    unplaced = {}
+    for placemark in placemarks:
+        address = placemark.find('kml:address', _NS)
+        if points[id(placemark)] is None and address is not None and address.text:
+            unplaced[id(placemark)] = address_sale(address.text)
+    if unplaced:
+        geocoder = geocode_sales(unplaced.values(), offline)
+        for key, sale in unplaced.items():
+            points[key] = geocoder.point(sale)
+        geocoder.close()
+
+    index = SpatialIndex((point[0], point[1], placemark) for placemark in placemarks
+                         for point in [points[id(placemark)]] if point is not None)
+    selected = {id(placemark) for placemark in query(index)}
+    for placemark in placemarks:
+        if id(placemark) not in selected:
+            parents[placemark].remove(placemark)
+
+    # Deepest folders first, so a folder holding only empty folders goes too
+    folders = list(tree.iter(f'{{{KML_NAMESPACE}}}Folder'))
+    for folder in reversed(folders):
+        if folder.find('.//kml:Placemark', _NS) is None:
+            parents[folder].remove(folder)
+
+    tree.write(str(output_path), encoding='utf-8', xml_declaration=True)
+    located = sum(1 for placemark in placemarks if points[id(placemark)] is not None)
+    return len(selected), len(placemarks), len(placemarks) - located
+
+
+def benchmark(count: int = 100000) -> None:
+    """Time radius and nearest queries over random sales across several states."""
+    import random
+    import time
+
+    rng = random.Random(7)
+    metros = [(rng.uniform(38.0, 46.0), rng.uniform(-90.0, -80.0)) for _ in range(60)]
+    entries = []
+    for i in range(count):
+        lat, lon = rng.choice(metros)
+        entries.append((rng.gauss(lat, 0.3), rng.gauss(lon, 0.3), i))
+
+    start = time.perf_counter()
+    index = SpatialIndex(entries)
+    build_time = time.perf_counter() - start
+
+    center, miles, rounds = metros[0], 30.0, 50
+    start = time.perf_counter()
+    for _ in range(rounds):
+        found = index.within_radius(center, miles)
+    query_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    scanned = [item for lat, lon, item in entries if haversine_miles(center, (lat, lon)) <= miles]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        index.nearest(center, 10)
+    nearest_time = (time.perf_counter() - start) / rounds
+
+    print(f"{count} sales")
+    print(f"  build index:           {build_time * 1000:8.1f} ms")
+    print(f"  {miles:g} mile radius query: {query_time * 1000:8.2f} ms ({len(found)} sales)")
+    print(f"  full scan:             {scan_time * 1000:8.2f} ms ({len(scanned)} sales, "
+          f"{'same' if sorted(item for _, item in found) == sorted(scanned) else 'DIFFERENT'} result)")
+    print(f"  10 nearest query:      {nearest_time * 1000:8.2f} ms")
+
+
+def main():
+    """Main entry point."""
+    args = sys.argv[1:]
+    if args and args[0] == '--bench':
+        benchmark(int(args[1]) if len(args) > 1 else 100000)
+        return
+
+    center_text = pop_option(args, '--center')
+    radius = pop_option(args, '--radius')
+    box_text = pop_option(args, '--box')
+    nearest = pop_option(args, '--nearest')
+    output = pop_option(args, '--output')
+    flags = {arg for arg in args if arg.startswith('--')}
+    args = [arg for arg in args if not arg.startswith('--')]
+
+    modes = [radius is not None, box_text is not None, nearest is not None]
+    if not args or sum(modes) != 1 or (box_text is None and center_text is None):
+        print("Usage: python spatial_index.py <input.csv|input.kml> --center LAT,LON --radius MILES")
+        print("       python spatial_index.py <input.csv|input.kml> --box SOUTH,WEST,NORTH,EAST")
+        print("       python spatial_index.py <input.csv|input.kml> --center LAT,LON --nearest K")
+        print("       python spatial_index.py --bench [count]")
+        print("\nOptions:")
+        print("  --center   Query center, e.g. 42.5803,-83.2455")
+        print("  --radius   Keep sales within this many miles of the center")
+        print("  --box      Keep sales inside this box (degrees)")
+        print("  --nearest  Keep the K sales nearest the center")
+        print("  --output   Output file (default: <input>_filtered.csv / .kml)")
+        print("  --offline  Use only local indexes and cached geocoder answers")
+        sys.exit(1)
+
+    input_path = Path(args[0])
+    if not input_path.exists():
+        print(f"Error: input file not found: {input_path}")
+        sys.exit(1)
+    try:
+        center = parse_point(center_text) if center_text is not None else None
+        if radius is not None:
+            miles = float(radius)
+            if miles < 0:
+                raise ValueError(radius)
+            query: Query = lambda index: [item for _, item in index.within_radius(center, miles)]
+            description = f"within {miles:g} miles of {center_text}"
+        elif nearest is not None:
+            k = int(nearest)
+            query = lambda index: [item for _, item in index.nearest(center, k)]
+            description = f"nearest {k} to {center_text}"
+        else:
+            south, west, north, east = (float(value) for value in box_text.split(','))
+            if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+                raise ValueError(box_text)
+            query = lambda index: index.in_box(south, west, north, east)
+            description = f"inside {box_text}"
+    except ValueError:
+        print("Error: --center must be LAT,LON, --radius a number of miles, --nearest a whole number")
+        print("       and --box SOUTH,WEST,NORTH,EAST in degrees")
+        sys.exit(1)
+
+    is_kml = input_path.suffix.lower() == '.kml'
+    output_path = Path(output) if output else input_path.with_name(
+        f"{input_path.stem}_filtered{input_path.suffix}")
+
+    print(f"Filtering {input_path.name}: {description}")
+    if is_kml:
+        kept, total, missing = filter_kml(input_path, output_path, query, '--offline' in flags)
+        what = 'placemarks'
+    else:
+        kept, total, missing = filter_csv(input_path, output_path, query, '--offline' in flags)
+        what = 'sales'
+    if missing:
+        print(f"  {missing} {what} could not be located and were left out")
+    print(f"✓ Kept {kept} of {total} {what}")
+    print(f"  - Output: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
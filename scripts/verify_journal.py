@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Checkpoint journal for URL verification runs.
+
+verify_urls.py appends one JSON line per placemark to the journal as soon
+as its result is known, so an interrupted run loses at most the requests
+that were in flight. With --resume, placemarks that already have a
+successful result for the same URL and content hash are skipped, and the
+final report is built from the journal rather than from memory.
+
+The content hash covers the placemark fields that are compared against
+the listing (name, street, city, state, ZIP, URL), so a sale whose KML
+entry changed since the last run is verified again. Failed fetches are
+always retried on resume.
+
+Journal lines look like:
+    {"url": ..., "hash": ..., "verified_at": ..., "placemark": {...}, "result": {...}}
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, Optional, TextIO, Tuple
+
+
+# Placemark fields that feed the comparison, and so the content hash
+HASHED_FIELDS = ('name', 'street', 'city', 'state', 'zip', 'url')
+
+
+def default_journal_path(kml_path: Path) -> Path:
+    """Journal file kept next to a KML (Estate_Sales.kml -> Estate_Sales.verify.jsonl)."""
+    return Path(kml_path).with_suffix('.verify.jsonl')
+
+
+def placemark_key(placemark: Dict) -> Tuple[str, str]:
+    """
+    Journal key for a placemark.
+
+    Returns:
+        (url, content hash of HASHED_FIELDS)
+    """
+    content = json.dumps([placemark.get(field) for field in HASHED_FIELDS], ensure_ascii=False)
+    return placemark['url'], hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class VerificationJournal:
+    """
+    Append-only JSONL record of per-placemark verification results.
+
+    Use as a context manager. Later lines for the same key replace earlier
+    ones; a truncated last line (from a killed run) is ignored.
+
+    Args:
+        path: Journal file
+        resume: Keep and extend an existing journal (False = start afresh)
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = Path(path)
+        self.resume = resume
+        self.resumed = 0
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._file: Optional[TextIO] = None
+
+    def __enter__(self) -> 'VerificationJournal':
+        if self.resume:
+            self._load()
+            self.resumed = len(self._entries)
+        self._file = open(self.path, 'a' if self.resume else 'w', encoding='utf-8')
+        if self.resume and self._unterminated():
+            self._file.write('\n')  # Keep new lines off the end of a partial one
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
+
+    def _load(self) -> None:
+        """Read an existing journal into memory."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = (entry['url'], entry['hash'])
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue  # Partial line from an interrupted write
+                self._entries[key] = entry
+
+    def _unterminated(self) -> bool:
+        """Whether the journal ends part-way through a line."""
+        with open(self.path, 'rb') as f:
+            if f.seek(0, 2) == 0:
+                return False
+            f.seek(-1, 2)
+            return f.read(1) != b'\n'
+
+    def result_for(self, placemark: Dict) -> Optional[Dict]:
+        """Journaled result for a placemark, or None if it has none."""
+        entry = self._entries.get(placemark_key(placemark))
+        return entry['result'] if entry else None
+
+    def is_verified(self, placemark: Dict) -> bool:
+        """Whether a placemark already has a successful result."""
+        result = self.result_for(placemark)
+        return result is not None and result.get('status') == 'success'
+
+    def record(self, placemark: Dict, result: Dict) -> None:
+        """Append a placemark's result and flush it to disk."""
+        url, content_hash = placemark_key(placemark)
+        entry = {
+            'url': url,
+            'hash': content_hash,
+            'verified_at': time.time(),
+            'placemark': placemark,
+            'result': result,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self._entries[(url, content_hash)] = entry
+
+    def close(self) -> None:
+        """Close the journal file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
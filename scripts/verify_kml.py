@@ -3,11 +3,14 @@
 Verify that KML output matches the source markdown and CSV data.
 """
 
-import csv
+import json
 import re
 import sys
 from pathlib import Path
-from xml.etree import ElementTree as ET
+from typing import Dict, Iterable, List, Optional
+
+from kml_stream import iter_placemarks
+from sales import iter_sales
 
 
 def parse_markdown_details(markdown_path: Path):
@@ -44,94 +47,203 @@ def parse_markdown_details(markdown_path: Path):
 
 def parse_csv_data(csv_path: Path):
     """Extract all sales from CSV."""
-    sales = []
-
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['Name']:
-                full_address = f"{row['Address']}, {row['City']}, {row['State']} {row['ZIP']}"
-                sales.append({
-                    'name': row['Name'],
-                    'address': full_address,
-                    'description': row['Description']
-                })
-
-    return sales
+    return [
+        {'name': sale.name, 'address': sale.full_address, 'description': sale.description}
+        for sale in iter_sales(csv_path)
+    ]
 
 
 def parse_kml_data(kml_path: Path):
     """Extract all placemarks from KML."""
-    tree = ET.parse(kml_path)
-    root = tree.getroot()
+    return list(iter_placemarks(kml_path))
 
-    # Handle KML namespace
-    ns = {'kml': 'http://www.opengis.net/kml/2.2'}
 
-    placemarks = []
-    for placemark in root.findall('.//kml:Placemark', ns):
-        name_elem = placemark.find('kml:name', ns)
-        desc_elem = placemark.find('kml:description', ns)
-        addr_elem = placemark.find('kml:address', ns)
+def normalize_address(addr):
+    """Normalize address for comparison."""
+    if not addr:
+        return ""
+    return ' '.join(addr.lower().split()).replace(',', '')
 
-        name = name_elem.text if name_elem is not None else None
-        description = desc_elem.text if desc_elem is not None else None
-        address = addr_elem.text if addr_elem is not None else None
 
-        # Extract URL from description CDATA
-        url = None
-        if description:
-            url_match = re.search(r'href="(https://[^"]+)"', description)
-            if url_match:
-                url = url_match.group(1)
+def index_by_address(records: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Group records by normalized address.
+
+    Args:
+        records: Dicts with an 'address' key
+
+    Returns:
+        Dictionary mapping normalized address to records, in input order
+    """
+    index = {}
+    for record in records:
+        index.setdefault(normalize_address(record['address']), []).append(record)
+    return index
+
+
+def compact(placemark: Dict) -> Dict:
+    """Keep only the fields the cross-checks need (drops the description)."""
+    return {'name': placemark['name'], 'address': placemark['address'], 'url': placemark['url']}
+
+
+def build_diff(csv_sales: List[Dict], md_sales: List[Dict], kml_placemarks: Iterable[Dict]) -> Dict:
+    """
+    Compare the three sources by normalized address.
+
+    Multi-day layouts repeat a sale's placemark once per day; each address
+    is compared once, using its first placemark.
+
+    Args:
+        csv_sales: From parse_csv_data()
+        md_sales: From parse_markdown_details()
+        kml_placemarks: From iter_placemarks() (any iterable; read once)
+
+    Returns:
+        {
+            'missing_from_kml': [address, ...],       # In CSV, not in KML
+            'extra_in_kml': [address, ...],           # In KML, not in CSV
+            'missing_from_markdown': [address, ...],  # In CSV, not in markdown
+            'mismatched': [                           # Same address, different value
+                {'address': str, 'field': 'name' | 'url',
+                 'expected': str, 'actual': str, 'source': 'csv' | 'markdown'},
+            ],
+            'counts': {'csv': int, 'markdown': int, 'kml': int, 'kml_unique': int},
+        }
+    """
+    csv_index = index_by_address(csv_sales)
+    md_index = index_by_address(md_sales)
+    kml_index = {}
+    kml_total = 0
+    for placemark in kml_placemarks:
+        kml_total += 1
+        kml_index.setdefault(normalize_address(placemark['address']), compact(placemark))
+
+    diff = {
+        'missing_from_kml': [],
+        'extra_in_kml': [],
+        'missing_from_markdown': [],
+        'mismatched': [],
+        'counts': {
+            'csv': len(csv_sales),
+            'markdown': len(md_sales),
+            'kml': kml_total,
+            'kml_unique': len(kml_index),
+        },
+    }
+
+    for key, csv_records in csv_index.items():
+        address = csv_records[0]['address']
+        if key not in md_index:
+            diff['missing_from_markdown'].append(address)
+
+        kml_pm = kml_index.get(key)
+        if kml_pm is None:
+            diff['missing_from_kml'].append(address)
+            continue
+
+        if csv_records[0]['name'] != kml_pm['name']:
+            diff['mismatched'].append({
+                'address': address, 'field': 'name', 'source': 'csv',
+                'expected': csv_records[0]['name'], 'actual': kml_pm['name'],
+            })
 
-        placemarks.append({
-            'name': name,
-            'address': address,
-            'url': url,
-            'description': description
-        })
+        md_records = md_index.get(key)
+        if md_records and md_records[0]['url'] != kml_pm['url']:
+            diff['mismatched'].append({
+                'address': address, 'field': 'url', 'source': 'markdown',
+                'expected': md_records[0]['url'], 'actual': kml_pm['url'],
+            })
 
-    return placemarks
+    for key, kml_pm in kml_index.items():
+        if key not in csv_index:
+            diff['extra_in_kml'].append(kml_pm['address'])
 
+    return diff
 
-def normalize_address(addr):
-    """Normalize address for comparison."""
-    if not addr:
-        return ""
-    return ' '.join(addr.lower().split()).replace(',', '')
 
+def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path,
+               diff_path: Optional[Path] = None):
+    """
+    Perform comprehensive verification.
+
+    All cross-checks use hash indexes keyed by normalized address (or name),
+    so run time is linear in the size of the three inputs.
 
-def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
-    """Perform comprehensive verification."""
+    Args:
+        csv_path: Path to the source CSV
+        markdown_path: Path to the markdown details file
+        kml_path: Path to the generated KML
+        diff_path: If given, write a machine-readable JSON diff here
+
+    Returns:
+        Exit code (0 = all checks passed, 1 = failures)
+    """
     print("=" * 80)
     print("COMPREHENSIVE KML VERIFICATION")
     print("=" * 80)
     print()
 
-    # Load all data
+    # Load the (small) source files; the KML is streamed below
     print("Loading data files...")
     csv_sales = parse_csv_data(csv_path)
     md_sales = parse_markdown_details(markdown_path)
-    kml_placemarks = parse_kml_data(kml_path)
+
+    md_url_by_addr = {}
+    for md_sale in md_sales:
+        md_url_by_addr[normalize_address(md_sale['address'])] = md_sale['url']
+
+    # Single streaming pass over the KML: count placemarks, tally URL
+    # results (check 3) and keep only the first placemark per address/name
+    kml_count = 0
+    kml_by_addr = {}
+    kml_by_name = {}
+    urls_matched = 0
+    urls_missing = 0
+    url_mismatches = []
+
+    for kml_pm in iter_placemarks(kml_path):
+        kml_count += 1
+        addr_key = normalize_address(kml_pm['address'])
+        if addr_key not in kml_by_addr:
+            kml_by_addr[addr_key] = compact(kml_pm)
+        if kml_pm['name'] not in kml_by_name:
+            kml_by_name[kml_pm['name']] = kml_by_addr[addr_key]
+
+        expected_url = md_url_by_addr.get(addr_key)
+        if expected_url:
+            if kml_pm['url'] == expected_url:
+                urls_matched += 1
+            elif kml_pm['url']:
+                url_mismatches.append({
+                    'name': kml_pm['name'],
+                    'expected': expected_url,
+                    'actual': kml_pm['url']
+                })
+            else:
+                urls_missing += 1
+        else:
+            # URL not in markdown (shouldn't happen if counts match)
+            pass
 
     print(f"  CSV sales: {len(csv_sales)}")
     print(f"  Markdown sales: {len(md_sales)}")
-    print(f"  KML placemarks: {len(kml_placemarks)}")
+    print(f"  KML placemarks: {kml_count}")
     print()
 
+    csv_by_addr = index_by_address(csv_sales)
+
     # Check 1: Count verification
     print("CHECK 1: Count Verification")
     print("-" * 80)
-    if len(csv_sales) == len(kml_placemarks):
+    if len(csv_sales) == kml_count:
         print(f"✓ PASS: KML has same count as CSV ({len(csv_sales)} sales)")
     else:
-        print(f"✗ FAIL: Count mismatch - CSV: {len(csv_sales)}, KML: {len(kml_placemarks)}")
+        print(f"✗ FAIL: Count mismatch - CSV: {len(csv_sales)}, KML: {kml_count}")
 
-    if len(md_sales) == len(kml_placemarks):
+    if len(md_sales) == kml_count:
         print(f"✓ PASS: KML has same count as markdown ({len(md_sales)} sales)")
     else:
-        print(f"✗ FAIL: Count mismatch - Markdown: {len(md_sales)}, KML: {len(kml_placemarks)}")
+        print(f"✗ FAIL: Count mismatch - Markdown: {len(md_sales)}, KML: {kml_count}")
     print()
 
     # Check 2: All CSV sales present in KML
@@ -141,14 +253,9 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
     csv_missing = []
 
     for csv_sale in csv_sales:
-        found = False
-        for kml_pm in kml_placemarks:
-            if normalize_address(csv_sale['address']) == normalize_address(kml_pm['address']):
-                found = True
-                csv_in_kml += 1
-                break
-
-        if not found:
+        if normalize_address(csv_sale['address']) in kml_by_addr:
+            csv_in_kml += 1
+        else:
             csv_missing.append(csv_sale['name'])
 
     print(f"✓ Found {csv_in_kml}/{len(csv_sales)} CSV sales in KML")
@@ -162,36 +269,7 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
     print("CHECK 3: URL Verification")
     print("-" * 80)
 
-    # Build markdown URL lookup by address
-    md_url_by_addr = {}
-    for md_sale in md_sales:
-        addr_key = normalize_address(md_sale['address'])
-        md_url_by_addr[addr_key] = md_sale['url']
-
-    urls_matched = 0
-    urls_missing = 0
-    url_mismatches = []
-
-    for kml_pm in kml_placemarks:
-        addr_key = normalize_address(kml_pm['address'])
-        expected_url = md_url_by_addr.get(addr_key)
-
-        if expected_url:
-            if kml_pm['url'] == expected_url:
-                urls_matched += 1
-            elif kml_pm['url']:
-                url_mismatches.append({
-                    'name': kml_pm['name'],
-                    'expected': expected_url,
-                    'actual': kml_pm['url']
-                })
-            else:
-                urls_missing += 1
-        else:
-            # URL not in markdown (shouldn't happen if counts match)
-            pass
-
-    print(f"✓ Correct URLs: {urls_matched}/{len(kml_placemarks)}")
+    print(f"✓ Correct URLs: {urls_matched}/{kml_count}")
     if urls_missing > 0:
         print(f"✗ Missing URLs: {urls_missing}")
     if url_mismatches:
@@ -210,17 +288,17 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
     addr_mismatches = []
 
     for csv_sale in csv_sales:
-        for kml_pm in kml_placemarks:
-            if csv_sale['name'] == kml_pm['name']:
-                if normalize_address(csv_sale['address']) == normalize_address(kml_pm['address']):
-                    addr_matches += 1
-                else:
-                    addr_mismatches.append({
-                        'name': csv_sale['name'],
-                        'csv_addr': csv_sale['address'],
-                        'kml_addr': kml_pm['address']
-                    })
-                break
+        kml_pm = kml_by_name.get(csv_sale['name'])
+        if kml_pm is None:
+            continue
+        if normalize_address(csv_sale['address']) == normalize_address(kml_pm['address']):
+            addr_matches += 1
+        else:
+            addr_mismatches.append({
+                'name': csv_sale['name'],
+                'csv_addr': csv_sale['address'],
+                'kml_addr': kml_pm['address']
+            })
 
     print(f"✓ Matching addresses: {addr_matches}/{len(csv_sales)}")
     if addr_mismatches:
@@ -241,12 +319,10 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
         print(f"  MD Address: {md_sale['address']}")
         print(f"  MD URL: {md_sale['url']}")
 
+        addr_key = normalize_address(md_sale['address'])
+
         # Find in CSV
-        csv_match = None
-        for csv_sale in csv_sales:
-            if normalize_address(md_sale['address']) in normalize_address(csv_sale['address']):
-                csv_match = csv_sale
-                break
+        csv_match = csv_by_addr.get(addr_key, [None])[0]
 
         if csv_match:
             print(f"  CSV Name: {csv_match['name']}")
@@ -255,11 +331,7 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
             print("  ✗ NOT FOUND IN CSV")
 
         # Find in KML
-        kml_match = None
-        for kml_pm in kml_placemarks:
-            if normalize_address(md_sale['address']) == normalize_address(kml_pm['address']):
-                kml_match = kml_pm
-                break
+        kml_match = kml_by_addr.get(addr_key)
 
         if kml_match:
             print(f"  KML Name: {kml_match['name']}")
@@ -274,6 +346,12 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
         else:
             print("  ✗ NOT FOUND IN KML")
 
+    if diff_path is not None:
+        diff = build_diff(csv_sales, md_sales, iter_placemarks(kml_path))
+        with open(diff_path, 'w', encoding='utf-8') as f:
+            json.dump(diff, f, indent=2)
+        print(f"\nMachine-readable diff written to {diff_path}")
+
     print()
     print("=" * 80)
     print("SUMMARY")
@@ -282,11 +360,11 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
     total_checks = 4
     passed_checks = 0
 
-    if len(csv_sales) == len(kml_placemarks):
+    if len(csv_sales) == kml_count:
         passed_checks += 1
     if csv_in_kml == len(csv_sales):
         passed_checks += 1
-    if urls_matched == len(kml_placemarks):
+    if urls_matched == kml_count:
         passed_checks += 1
     if addr_matches == len(csv_sales):
         passed_checks += 1
@@ -301,14 +379,37 @@ def verify_kml(csv_path: Path, markdown_path: Path, kml_path: Path):
         return 1
 
 
+def print_usage() -> None:
+    """Print command-line usage."""
+    print("Usage: python verify_kml.py <csv_file> <markdown_file> <kml_file> [--diff-json diff.json]")
+    print("\nOptions:")
+    print("  --diff-json PATH  Also write missing/extra/mismatched entries as JSON")
+
+
+def usage_error(message: str) -> None:
+    """Print an argument error and the usage, then exit."""
+    print(f"Error: {message}\n")
+    print_usage()
+    sys.exit(1)
+
+
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: python verify_kml.py <csv_file> <markdown_file> <kml_file>")
+    args = sys.argv[1:]
+    diff_path = None
+    if '--diff-json' in args:
+        idx = args.index('--diff-json')
+        if idx + 1 >= len(args) or args[idx + 1].startswith('--'):
+            usage_error("--diff-json needs a path")
+        diff_path = Path(args[idx + 1])
+        del args[idx:idx + 2]
+
+    if len(args) < 3:
+        print_usage()
         sys.exit(1)
 
-    csv_path = Path(sys.argv[1])
-    markdown_path = Path(sys.argv[2])
-    kml_path = Path(sys.argv[3])
+    csv_path = Path(args[0])
+    markdown_path = Path(args[1])
+    kml_path = Path(args[2])
 
     if not csv_path.exists():
         print(f"Error: CSV file not found: {csv_path}")
@@ -323,7 +424,7 @@ def main():
         sys.exit(1)
 
     try:
-        return verify_kml(csv_path, markdown_path, kml_path)
+        return verify_kml(csv_path, markdown_path, kml_path, diff_path)
     except Exception as e:
         print(f"Error during verification: {e}")
         import traceback
@@ -3,92 +3,89 @@
 Verify that data in KML matches the actual estate sale websites.
 """
 
-import re
 import sys
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from xml.etree import ElementTree as ET
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from http_client import get_client, raise_for_status
+from kml_stream import iter_placemarks
+from rate_limiter import HostRateLimiter
+from verify_journal import VerificationJournal, default_journal_path
+from retry_policy import get_retry_policy
+from sale_page import extract_sale_info
+
+
+def iter_sales_with_urls(kml_path: Path) -> Iterator[Dict]:
+    """
+    Stream placemarks that link to a listing, with parsed address parts.
+
+    Args:
+        kml_path: Path to the KML file
+
+    Yields:
+        Dicts with name, address, street, city, state, zip and url
+    """
+    for placemark in iter_placemarks(kml_path):
+        url = placemark['url']
+        if not url:  # Only include placemarks with URLs
+            continue
+
+        # Parse address components
+        address = placemark['address']
+        addr_parts = address.split(',') if address else []
+        street = addr_parts[0].strip() if len(addr_parts) > 0 else ""
+        city = addr_parts[1].strip() if len(addr_parts) > 1 else ""
+        state_zip = addr_parts[2].strip() if len(addr_parts) > 2 else ""
+
+        # Extract state and zip
+        state_zip_parts = state_zip.split()
+        state = state_zip_parts[0] if len(state_zip_parts) > 0 else ""
+        zip_code = state_zip_parts[1] if len(state_zip_parts) > 1 else ""
+
+        yield {
+            'name': placemark['name'],
+            'address': address,
+            'street': street,
+            'city': city,
+            'state': state,
+            'zip': zip_code,
+            'url': url
+        }
 
 
-def parse_kml_data(kml_path: Path):
+def parse_kml_data(kml_path: Path) -> List[Dict]:
     """Extract all placemarks with URLs from KML."""
-    tree = ET.parse(kml_path)
-    root = tree.getroot()
-
-    # Handle KML namespace
-    ns = {'kml': 'http://www.opengis.net/kml/2.2'}
-
-    placemarks = []
-    for placemark in root.findall('.//kml:Placemark', ns):
-        name_elem = placemark.find('kml:name', ns)
-        desc_elem = placemark.find('kml:description', ns)
-        addr_elem = placemark.find('kml:address', ns)
-
-        name = name_elem.text if name_elem is not None else None
-        description = desc_elem.text if desc_elem is not None else None
-        address = addr_elem.text if addr_elem is not None else None
-
-        # Extract URL from description CDATA
-        url = None
-        if description:
-            url_match = re.search(r'href="(https://[^"]+)"', description)
-            if url_match:
-                url = url_match.group(1)
-
-        if url:  # Only include placemarks with URLs
-            # Parse address components
-            addr_parts = address.split(',') if address else []
-            street = addr_parts[0].strip() if len(addr_parts) > 0 else ""
-            city = addr_parts[1].strip() if len(addr_parts) > 1 else ""
-            state_zip = addr_parts[2].strip() if len(addr_parts) > 2 else ""
-
-            # Extract state and zip
-            state_zip_parts = state_zip.split()
-            state = state_zip_parts[0] if len(state_zip_parts) > 0 else ""
-            zip_code = state_zip_parts[1] if len(state_zip_parts) > 1 else ""
-
-            placemarks.append({
-                'name': name,
-                'address': address,
-                'street': street,
-                'city': city,
-                'state': state,
-                'zip': zip_code,
-                'url': url
-            })
-
-    return placemarks
+    return list(iter_sales_with_urls(kml_path))
 
 
 def fetch_url(url, retries=3):
-    """Fetch URL content with retries."""
+    """
+    Fetch URL content with retries.
+
+    Uses the shared keep-alive client with a conditional GET, so a listing
+    that has not changed since the last run is answered with a 304 and
+    served from the stored copy. Throttling and server errors are retried
+    by the shared RetryPolicy (backoff with jitter, Retry-After, per-host
+    circuit breaker); other errors are raised at once.
+
+    Returns:
+        Page HTML, or None if the page does not exist (404)
+    """
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
+    client = get_client()
 
-    for attempt in range(retries):
-        try:
-            req = Request(url, headers=headers)
-            with urlopen(req, timeout=10) as response:
-                return response.read().decode('utf-8', errors='ignore')
-        except HTTPError as e:
-            if e.code == 404:
-                return None  # Page not found
-            elif attempt == retries - 1:
-                raise
-            time.sleep(2)  # Wait before retry
-        except URLError as e:
-            if attempt == retries - 1:
-                raise
-            time.sleep(2)
-        except Exception as e:
-            if attempt == retries - 1:
-                raise
-            time.sleep(2)
-
-    return None
+    response = get_retry_policy().call(
+        url, lambda: client.get(url, headers=headers, timeout=10, conditional=True),
+        max_attempts=retries
+    )
+    if response.status == 404:
+        return None  # Page not found
+    raise_for_status(response)
+    return response.text(errors='ignore')
 
 
 def normalize_text(text):
@@ -99,98 +96,24 @@ def normalize_text(text):
     return ' '.join(text.lower().split())
 
 
-def extract_sale_info(html):
-    """Extract sale information from HTML."""
-    if not html:
-        return None
+def verify_sale(placemark, rate_limiter: Optional[HostRateLimiter] = None):
+    """
+    Verify a single sale against its URL.
 
-    info = {
-        'title': None,
-        'address': None,
-        'city': None,
-        'state': None,
-        'zip': None
-    }
+    Args:
+        placemark: Placemark dict from iter_sales_with_urls()
+        rate_limiter: Per-host limiter to wait on before fetching (None = no pacing)
 
-    # Extract title - look for common patterns
-    title_patterns = [
-        r'<h1[^>]*>([^<]+)</h1>',
-        r'<title>([^<]+)</title>',
-        r'property="og:title"\s+content="([^"]+)"',
-    ]
-
-    for pattern in title_patterns:
-        match = re.search(pattern, html, re.IGNORECASE)
-        if match:
-            title = match.group(1).strip()
-            # Clean up common suffixes
-            title = re.sub(r'\s*\|\s*EstateS.*$', '', title, flags=re.IGNORECASE)
-            title = re.sub(r'\s*-\s*Estate Sales\.net.*$', '', title, flags=re.IGNORECASE)
-            info['title'] = title
-            break
-
-    # Extract address - look for schema.org markup or common patterns
-    addr_patterns = [
-        r'itemprop="streetAddress"[^>]*>([^<]+)<',
-        r'property="og:street-address"\s+content="([^"]+)"',
-        r'class="[^"]*address[^"]*"[^>]*>([^<]+)<',
-        r'"streetAddress"\s*:\s*"([^"]+)"',
-    ]
-
-    for pattern in addr_patterns:
-        match = re.search(pattern, html, re.IGNORECASE)
-        if match:
-            info['address'] = match.group(1).strip()
-            break
-
-    # Extract city
-    city_patterns = [
-        r'itemprop="addressLocality"[^>]*>([^<]+)<',
-        r'property="og:locality"\s+content="([^"]+)"',
-        r'"addressLocality"\s*:\s*"([^"]+)"',
-    ]
-
-    for pattern in city_patterns:
-        match = re.search(pattern, html, re.IGNORECASE)
-        if match:
-            info['city'] = match.group(1).strip()
-            break
-
-    # Extract state
-    state_patterns = [
-        r'itemprop="addressRegion"[^>]*>([^<]+)<',
-        r'property="og:region"\s+content="([^"]+)"',
-        r'"addressRegion"\s*:\s*"([^"]+)"',
-    ]
-
-    for pattern in state_patterns:
-        match = re.search(pattern, html, re.IGNORECASE)
-        if match:
-            info['state'] = match.group(1).strip()
-            break
-
-    # Extract ZIP
-    zip_patterns = [
-        r'itemprop="postalCode"[^>]*>([^<]+)<',
-        r'property="og:postal-code"\s+content="([^"]+)"',
-        r'"postalCode"\s*:\s*"([^"]+)"',
-        r'\b(\d{5}(?:-\d{4})?)\b',  # Generic ZIP pattern
-    ]
-
-    for pattern in zip_patterns:
-        match = re.search(pattern, html, re.IGNORECASE)
-        if match:
-            info['zip'] = match.group(1).strip()
-            break
-
-    return info
-
-
-def verify_sale(placemark, delay=1.0):
-    """Verify a single sale against its URL."""
+    Returns:
+        Result dict with 'status', 'matches' and either 'web_info' or 'error'
+    """
     url = placemark['url']
 
     try:
+        # Be polite - wait for this host's next request slot
+        if rate_limiter is not None:
+            rate_limiter.acquire(url)
+
         # Fetch the page
         html = fetch_url(url)
 
@@ -259,49 +182,148 @@ def verify_sale(placemark, delay=1.0):
             'error': str(e),
             'matches': {}
         }
-    finally:
-        # Be polite - wait between requests
-        time.sleep(delay)
-
-
-def verify_all_urls(kml_path: Path, delay=1.5):
-    """Verify all URLs in KML file."""
-    print("=" * 80)
-    print("URL VERIFICATION - Checking data against live websites")
-    print("=" * 80)
-    print()
 
-    placemarks = parse_kml_data(kml_path)
-    print(f"Found {len(placemarks)} sales with URLs to verify")
-    print(f"Estimated time: ~{int(len(placemarks) * delay / 60)} minutes")
-    print()
 
+def verify_placemarks(
+    placemarks: Iterable[Dict],
+    rate_limiter: Optional[HostRateLimiter] = None,
+    workers: int = 1,
+    on_result: Optional[Callable[[int, Dict, Dict], None]] = None
+) -> List[Dict]:
+    """
+    Verify placemarks on a bounded worker pool.
+
+    Requests to each host are paced by the rate limiter, so extra workers
+    overlap network latency without exceeding the per-host budget.
+    Placemarks are pulled from the iterable only as workers free up, so a
+    streamed KML is never read far ahead of the requests.
+
+    Args:
+        placemarks: Placemark dicts from iter_sales_with_urls() (any iterable)
+        rate_limiter: Shared per-host limiter (None = no pacing)
+        workers: Maximum number of requests in flight
+        on_result: Optional callback(index, placemark, result), called in
+            placemark order as results become available
+
+    Returns:
+        List of {'placemark', 'result'} dicts in the original placemark order
+    """
     results = []
+    workers = max(1, workers)
+    pending = deque()
 
-    for i, pm in enumerate(placemarks, 1):
-        print(f"[{i}/{len(placemarks)}] Checking: {pm['name'][:50]}...")
-        result = verify_sale(pm, delay=delay)
+    def collect_oldest():
+        # Collect in submission order so output matches the KML order
+        pm, future = pending.popleft()
+        result = future.result()
         results.append({
             'placemark': pm,
             'result': result
         })
+        if on_result is not None:
+            on_result(len(results), pm, result)
 
-        # Show quick status
-        if result['status'] == 'error':
-            print(f"  ✗ ERROR: {result['error']}")
-        else:
-            matches = result['matches']
-            match_summary = []
-            for key, val in matches.items():
-                if val is True:
-                    match_summary.append(f"{key}✓")
-                elif val is False:
-                    match_summary.append(f"{key}✗")
-                else:
-                    match_summary.append(f"{key}?")
-            print(f"  → {' '.join(match_summary)}")
-
-    # Generate summary report
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for pm in placemarks:
+            if len(pending) >= 2 * workers:
+                collect_oldest()
+            pending.append((pm, executor.submit(verify_sale, pm, rate_limiter)))
+
+        while pending:
+            collect_oldest()
+
+    return results
+
+
+def print_result_status(result: Dict) -> None:
+    """Print the one-line status for a verified sale."""
+    if result['status'] == 'error':
+        print(f"  ✗ ERROR: {result['error']}")
+    else:
+        matches = result['matches']
+        match_summary = []
+        for key, val in matches.items():
+            if val is True:
+                match_summary.append(f"{key}✓")
+            elif val is False:
+                match_summary.append(f"{key}✗")
+            else:
+                match_summary.append(f"{key}?")
+        print(f"  → {' '.join(match_summary)}")
+
+
+def verify_all_urls(kml_path: Path, delay=1.5, workers=1,
+                    journal_path: Optional[Path] = None, resume: bool = False):
+    """
+    Verify all URLs in KML file.
+
+    Each result is appended to a checkpoint journal as it completes, and
+    the summary is built from the journal. With resume=True, sales that
+    already verified successfully (same URL and content) are skipped.
+
+    Args:
+        kml_path: Path to the KML file
+        delay: Minimum seconds between requests to the same host
+        workers: Number of concurrent fetches
+        journal_path: Checkpoint journal (default: next to the KML)
+        resume: Continue from an existing journal instead of starting afresh
+
+    Returns:
+        Exit code (0 = passed, 1 = failed)
+    """
+    if journal_path is None:
+        journal_path = default_journal_path(kml_path)
+
+    print("=" * 80)
+    print("URL VERIFICATION - Checking data against live websites")
+    print("=" * 80)
+    print()
+
+    with VerificationJournal(journal_path, resume=resume) as journal:
+        # Cheap streaming pass for the counts; the sales are read again lazily below
+        total_sales = 0
+        done = 0
+        for pm in iter_sales_with_urls(kml_path):
+            total_sales += 1
+            done += journal.is_verified(pm)
+
+        print(f"Found {total_sales} sales with URLs to verify")
+        if resume:
+            print(f"Resuming from {journal_path}: {done} already verified")
+        print(f"Estimated time: ~{int((total_sales - done) * delay / 60)} minutes")
+        if workers > 1:
+            print(f"Workers: {workers} (max 1 request per {delay}s per host)")
+        print()
+
+        def show_progress(i, pm, result):
+            journal.record(pm, result)
+            print(f"[{done + i}/{total_sales}] Checking: {pm['name'][:50]}...")
+            print_result_status(result)
+
+        rate_limiter = HostRateLimiter.from_delay(delay)
+        pending = (pm for pm in iter_sales_with_urls(kml_path) if not journal.is_verified(pm))
+        verify_placemarks(pending, rate_limiter, workers, on_result=show_progress)
+
+        # Report on every sale in the KML, in KML order, from the journal
+        results = []
+        for pm in iter_sales_with_urls(kml_path):
+            result = journal.result_for(pm)
+            if result is not None:
+                results.append({'placemark': pm, 'result': result})
+
+    return print_report(results)
+
+
+def print_report(results: List[Dict]) -> int:
+    """
+    Print the verification summary.
+
+    Args:
+        results: {'placemark', 'result'} dicts in KML order
+
+    Returns:
+        Exit code (0 = passed, 1 = failed)
+    """
     print()
     print("=" * 80)
     print("VERIFICATION SUMMARY")
@@ -388,25 +410,71 @@ def verify_all_urls(kml_path: Path, delay=1.5):
         return 1
 
 
+def print_usage() -> None:
+    """Print command-line usage."""
+    print("Usage: python verify_urls.py <kml_file> [delay_seconds] [--workers N] [--resume] [--journal PATH]")
+    print("\nOptions:")
+    print("  --workers N     Fetch up to N pages at once (per-host delay still applies)")
+    print("  --resume        Skip sales already verified in the journal (same URL and content)")
+    print("  --journal PATH  Checkpoint journal (default: <kml_name>.verify.jsonl next to the KML)")
+    print("\nExample:")
+    print("  python verify_urls.py Estate_Sales.kml")
+    print("  python verify_urls.py Estate_Sales.kml 2.0")
+    print("  python verify_urls.py Estate_Sales.kml 1.0 --workers 4")
+    print("  python verify_urls.py Estate_Sales.kml --resume")
+
+
+def usage_error(message: str) -> None:
+    """Print an argument error and the usage, then exit."""
+    print(f"Error: {message}\n")
+    print_usage()
+    sys.exit(1)
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python verify_urls.py <kml_file> [delay_seconds]")
-        print("\nExample:")
-        print("  python verify_urls.py Estate_Sales.kml")
-        print("  python verify_urls.py Estate_Sales.kml 2.0")
+        print_usage()
         sys.exit(1)
 
-    kml_path = Path(sys.argv[1])
-    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 1.5
+    # Parse arguments
+    args = sys.argv[1:]
+    workers = 1
+    if '--workers' in args:
+        idx = args.index('--workers')
+        if idx + 1 >= len(args):
+            usage_error("--workers needs a value")
+        value = args[idx + 1]
+        if not value.isdigit() or int(value) < 1:
+            usage_error(f"--workers needs a positive whole number, not {value!r}")
+        workers = int(value)
+        del args[idx:idx + 2]
+
+    journal_path = None
+    if '--journal' in args:
+        idx = args.index('--journal')
+        if idx + 1 >= len(args) or args[idx + 1].startswith('--'):
+            usage_error("--journal needs a path")
+        journal_path = Path(args[idx + 1])
+        del args[idx:idx + 2]
+
+    resume = '--resume' in args
+    if resume:
+        args.remove('--resume')
+
+    if not args:
+        usage_error("no KML file given")
+    kml_path = Path(args[0])
+    delay = float(args[1]) if len(args) > 1 else 1.5
 
     if not kml_path.exists():
         print(f"Error: KML file not found: {kml_path}")
         sys.exit(1)
 
     try:
-        return verify_all_urls(kml_path, delay=delay)
+        return verify_all_urls(kml_path, delay=delay, workers=workers,
+                               journal_path=journal_path, resume=resume)
     except KeyboardInterrupt:
-        print("\n\nVerification interrupted by user")
+        print("\n\nVerification interrupted by user (run again with --resume to continue)")
         sys.exit(1)
     except Exception as e:
         print(f"\nError during verification: {e}")
@@ -0,0 +1,869 @@
+#!/usr/bin/env python3
+"""
+Time-window-aware visit schedule for one day's sales.
+
+route_planner orders stops by distance alone. Here each stop also has
+the hours parsed from its description (schedule_parser), and the order
+is chosen for the day as it would actually run:
+
+- a visit starts no earlier than the sale opens (arriving early means
+  waiting) and must end, DWELL minutes later, before it closes;
+- when a sale is discounted only part of the day ("Sat 9am-4pm,
+  Sat 12pm-3pm (50% OFF)"), a visit inside the discount window is
+  preferred: missing it costs discount_weight minutes per percentage
+  point, and the schedule waits for the window to open when the wait is
+  shorter than that;
+- the cost of a schedule is the time from leaving home to leaving the
+  last sale (or getting home, for a round trip), plus missed-discount
+  penalties, plus a heavy penalty per minute a visit runs past closing.
+
+The search is the one route_planner uses, evaluated on time instead of
+miles: a greedy earliest-finish tour (or route_planner's shortest route,
+whichever is better) improved by Or-opt and 2-opt moves toward each
+stop's nearest neighbors. A candidate order is only simulated from the
+first position it changes, and abandoned as soon as it cannot beat the
+current schedule. Stops that do not fit are put back wherever room
+opens up, and a few seeded ruin-and-recreate rounds (remove a cluster of
+nearby stops, rebuild around it) get the search out of local optima, so
+the same input always gives the same plan. All of the searches share a
+budget of SEARCH_MOVES candidate orders, so a large day is replanned in
+bounded time.
+
+Stops that cannot be visited at all (closed before they can be reached,
+or open for less than the dwell time), and stops still running late
+after the search, are left out and reported with the reason.
+
+Usage:
+    python visit_scheduler.py <csv> --start LAT,LON [--day Saturday] [--depart 9am] [--dwell 20]
+                              [--speed 25] [--markdown details.md] [--output schedule.kml]
+                              [--round-trip] [--offline]
+    python visit_scheduler.py --bench [count]    # Time scheduling over random stops
+"""
+
+import math
+import random
+import re
+import sys
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from address_index import AddressIndex
+from geocoder import geocode_sales
+from kml_engine import iter_csv_data, match_sale_url, parse_markdown_urls
+from route_planner import (
+    OR_OPT_SEGMENT,
+    ROAD_FACTOR,
+    Route,
+    Stop,
+    busiest_day,
+    day_stops,
+    distance_matrix,
+    nearest_neighbors,
+    parse_point,
+    plan_route,
+    pop_option,
+    route_kml
+)
+from sales import Sale
+from schedule_parser import format_clock
+
+
+# Minutes spent at each sale
+DWELL = 20
+
+# Average driving speed over estimated road miles
+SPEED_MPH = 25
+
+# Leave home at 9am unless told otherwise
+DEPARTURE = 9 * 60
+
+# Hours assumed when a description gives none for the day
+DEFAULT_OPENS = 9 * 60
+DEFAULT_CLOSES = 16 * 60
+
+# Minutes of extra driving or waiting worth one percentage point off
+DISCOUNT_WEIGHT = 0.6
+
+# Cost per minute a visit runs past closing (makes lateness the last resort)
+LATE_WEIGHT = 1000.0
+
+# Ruin-and-recreate rounds after the first local optimum, each taking out
+# a stop and its nearest neighbors (1/RUIN_FRACTION of the route). The
+# search stops early after RUIN_PATIENCE rounds in a row find nothing better.
+RUIN_ROUNDS = 30
+RUIN_PATIENCE = 10
+RUIN_FRACTION = 8
+RUIN_SEED = 7
+
+# Candidate orders the local search may try for one plan, across the
+# first search and every ruin-and-recreate round. Keeps replanning a big
+# day interactive; typical days finish well within it.
+SEARCH_MOVES = 20000
+
+# Improvements smaller than this (minutes) are rounding noise
+EPSILON = 1e-6
+
+_CLOCK_RE = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?m\.?)?', re.IGNORECASE)
+
+
+class Visit(NamedTuple):
+    """One stop of a schedule; times are minutes after midnight."""
+    stop: Stop
+    arrive: float
+    start: float          # Later than arrive when waiting for the sale (or its discount) to open
+    leave: float
+    miles: float          # Driven from the previous stop
+    discount: int         # Percent off at the time of the visit
+
+
+class VisitPlan(NamedTuple):
+    """A day's schedule and the stops left out of it."""
+    day: str
+    start: Tuple[float, float]
+    departure: float
+    visits: List[Visit]
+    skipped: List[Tuple[Stop, str]]   # (stop, reason)
+    round_trip: bool
+    home_miles: float                 # Drive back to the start (round trip only)
+    finish: float                     # Leaving the last sale, or home for a round trip
+
+    @property
+    def total_miles(self) -> float:
+        return sum(visit.miles for visit in self.visits) + self.home_miles
+
+    def route(self) -> Route:
+        """The schedule as a route_planner Route (for route_kml)."""
+        legs = [visit.miles for visit in self.visits]
+        if self.round_trip and self.visits:
+            legs.append(self.home_miles)
+        return Route(self.start, [visit.stop for visit in self.visits], legs, self.round_trip)
+
+
+def parse_clock(text: str) -> int:
+    """'9am', '9:30am', '13:00' -> minutes after midnight."""
+    match = _CLOCK_RE.fullmatch(text.strip())
+    if match is None:
+        raise ValueError(text)
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == 'p' else 0)
+    if hour > 23 or minute > 59:
+        raise ValueError(text)
+    return hour * 60 + minute
+
+
+def day_windows(sale: Sale, day: str) -> Tuple[int, int, int, int, int]:
+    """
+    Opening and discount windows of a sale on day.
+
+    Returns:
+        (opens, closes, discount percent, discount opens, discount closes);
+        the discount window is the open window when the discount covers
+        the whole day, or there is none
+    """
+    entries = [hours for hours in sale.schedule.days if hours.day == day]
+    opens = min((hours.opens for hours in entries if hours.opens is not None), default=DEFAULT_OPENS)
+    closes = max((hours.closes for hours in entries if hours.closes is not None), default=DEFAULT_CLOSES)
+    best = max(entries, key=lambda hours: hours.discount, default=None)
+    if best is None or not best.discount:
+        return opens, closes, 0, opens, closes
+    discount_opens = best.opens if best.opens is not None else opens
+    discount_closes = best.closes if best.closes is not None else closes
+    return opens, closes, best.discount, discount_opens, discount_closes
+
+
+class _Problem:
+    """
+    Time-window problem over node 0 (the start) and stops 1..n.
+
+    Orders are lists of stop nodes; simulate() walks one and returns the
+    (time, penalty) state after every position.
+    """
+
+    def __init__(self, stops: List[Stop], start: Tuple[float, float], day: str,
+                 departure: float, dwell: float, speed_mph: float, road_factor: float,
+                 round_trip: bool, discount_weight: float, max_moves: int):
+        self.departure = departure
+        self.dwell = dwell
+        self.round_trip = round_trip
+        self.moves_left = max_moves  # Local-search budget, shared by every search of a plan
+        self.miles = distance_matrix([start] + [(stop.lat, stop.lon) for stop in stops], road_factor)
+        self.travel = [[miles * 60 / speed_mph for miles in row] for row in self.miles]
+
+        self.opens, self.closes, self.discount = [0.0], [0.0], [0]
+        self.discount_opens, self.discount_closes, self.miss_penalty = [0.0], [0.0], [0.0]
+        for stop in stops:
+            opens, closes, discount, discount_opens, discount_closes = day_windows(stop.sale, day)
+            self.opens.append(opens)
+            self.closes.append(closes)
+            self.discount.append(discount)
+            self.discount_opens.append(discount_opens)
+            self.discount_closes.append(discount_closes)
+            # Only a discount narrower than the open hours can be missed
+            narrower = discount and (discount_opens, discount_closes) != (opens, closes)
+            self.miss_penalty.append(discount * discount_weight if narrower else 0.0)
+
+    def visit(self, prev: int, node: int, time: float) -> Tuple[float, float, float, bool]:
+        """
+        Drive from prev to node leaving at time, and visit.
+
+        Returns:
+            (arrival, start of visit, penalty incurred, discount window made)
+        """
+        arrive = time + self.travel[prev][node]
+        start = arrive if arrive > self.opens[node] else self.opens[node]
+        penalty = 0.0
+        made = True
+        miss = self.miss_penalty[node]
+        if miss:
+            discount_opens = self.discount_opens[node]
+            latest = self.discount_closes[node] - self.dwell
+            if start < discount_opens <= latest and discount_opens - start < miss:
+                start = discount_opens  # Worth waiting for the discount
+            elif not discount_opens <= start <= latest:
+                penalty = miss
+                made = False
+        late = start + self.dwell - self.closes[node]
+        if late > 0:
+            penalty += LATE_WEIGHT * late
+        return arrive, start, penalty, made
+
+    def simulate(self, order: List[int], first: int = 0,
+                 states: Optional[List[Tuple[float, float]]] = None,
+                 limit: float = float('inf'),
+                 last: Optional[int] = None) -> Optional[List[Tuple[float, float]]]:
+        """
+        (time leaving, total penalty) after each position of order.
+
+        Args:
+            order: Stop nodes in visiting order
+            first: Re-simulate from this position, reusing states before it
+            states: States of an order sharing order[:first]
+            limit: Give up once the cost can no longer be below this
+            last: Stop after this position (default: the end of order)
+
+        Returns:
+            States per position, or None if the limit was reached
+        """
+        result = states[:first] if first else []
+        time, penalty = result[-1] if result else (self.departure, 0.0)
+        prev = order[first - 1] if first else 0
+        dwell, departure = self.dwell, self.departure
+        for node in order[first:None if last is None else last + 1]:
+            _, start, added, _ = self.visit(prev, node, time)
+            time = start + dwell
+            penalty += added
+            if time - departure + penalty >= limit:
+                return None
+            result.append((time, penalty))
+            prev = node
+        return result
+
+    def insertion_cost(self, order: List[int], states: List[Tuple[float, float]],
+                       k: int, node: int, limit: float = float('inf')) -> Optional[float]:
+        """
+        Cost of order with node inserted at position k, or None if not below limit.
+
+        A delay that waiting for an opening soaks up leaves the rest of the
+        day unchanged, so simulation stops where the schedules meet again.
+        """
+        time, penalty = states[k - 1] if k else (self.departure, 0.0)
+        _, start, added, _ = self.visit(order[k - 1] if k else 0, node, time)
+        time = start + self.dwell
+        penalty += added
+        prev = node
+        for i in range(k, len(order)):
+            if time - self.departure + penalty >= limit:
+                return None
+            _, start, added, _ = self.visit(prev, order[i], time)
+            time = start + self.dwell
+            penalty += added
+            if time == states[i][0]:
+                # Back in step: the rest only repeats the old penalties
+                penalty += states[-1][1] - states[i][1]
+                break
+            prev = order[i]
+        else:
+            if self.round_trip:
+                time += self.travel[prev][0]
+            cost = time - self.departure + penalty
+            return cost if cost < limit else None
+        cost = self.cost(order, [(states[-1][0], penalty)])
+        return cost if cost < limit else None
+
+    def cost(self, order: List[int], states: List[Tuple[float, float]]) -> float:
+        """Minutes from departure to the end of the day, plus penalties."""
+        if not order:
+            return 0.0
+        time, penalty = states[-1]
+        if self.round_trip:
+            time += self.travel[order[-1]][0]
+        return time - self.departure + penalty
+
+    def greedy(self, nodes: List[int]) -> List[int]:
+        """Repeatedly visit the stop that can be finished earliest (penalties included)."""
+        unvisited = set(nodes)
+        order = []
+        prev, time = 0, self.departure
+        while unvisited:
+            best, best_score, best_time = None, float('inf'), time
+            for node in unvisited:
+                _, start, penalty, _ = self.visit(prev, node, time)
+                score = start + self.dwell + penalty
+                if score < best_score or (score == best_score and node < best):
+                    best, best_score, best_time = node, score, start + self.dwell
+            order.append(best)
+            unvisited.remove(best)
+            prev, time = best, best_time
+        return order
+
+
+def _improve(problem: _Problem, order: List[int], neighbors: List[List[int]],
+             focus: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    Or-opt and 2-opt moves on the time-window cost until neither helps
+    or the problem's move budget (SEARCH_MOVES) is spent.
+
+    Args:
+        problem: Time-window problem
+        order: Starting order
+        neighbors: Nearest-neighbor lists (moves are tried toward these)
+        focus: Only start from moves of these stops (default: all)
+
+    Returns:
+        Improved order
+    """
+    states = problem.simulate(order)
+    best = problem.cost(order, states)
+
+    def attempt(candidate: List[int], first: int, last: int) -> bool:
+        """Take candidate if it is cheaper; it differs from order only in [first, last]."""
+        nonlocal order, states, best
+        limit = best - EPSILON
+        # Simulate through the first stop after the changed stretch: from
+        # there on the legs are the same. Visits start no earlier when that
+        # stop is left later, and leaving later can only save penalties the
+        # current schedule pays further on (discount windows it misses), so
+        # the candidate cannot win unless it has saved that much already.
+        junction = last + 1
+        new_states = problem.simulate(candidate, first, states, limit, junction)
+        if new_states is None:
+            return False
+        if junction + 1 < len(candidate):
+            time, penalty = new_states[-1]
+            old_time, old_penalty = states[junction]
+            downstream_penalty = states[-1][1] - old_penalty
+            if time >= old_time - EPSILON and penalty - old_penalty >= downstream_penalty - EPSILON:
+                return False
+            new_states = problem.simulate(candidate, junction + 1, new_states, limit)
+            if new_states is None:
+                return False
+        cost = problem.cost(candidate, new_states)
+        if cost < best - EPSILON:
+            order, states, best = candidate, new_states, cost
+            return True
+        return False
+
+    present = set(order)  # Moves reorder stops but never add or remove any
+    # Stops whose moves are still worth trying ("don't look bits"): all of
+    # them at first, then those around each change
+    active = set(order) if focus is None else present & set(focus)
+
+    def moves(node: int):
+        """Candidate orders for node, with the stretch each one changes."""
+        # Or-opt: move a run starting at node next to one of node's neighbors
+        i = order.index(node)
+        for length in range(1, OR_OPT_SEGMENT + 1):
+            if i + length > len(order):
+                break
+            segment = order[i:i + length]
+            rest = order[:i] + order[i + length:]
+            targets = set()
+            for c in neighbors[node]:
+                if c == 0:
+                    targets.add(0)
+                elif c in present and c not in segment:
+                    k = rest.index(c)
+                    targets.update((k, k + 1))
+            for k in sorted(targets):
+                if k != i:
+                    yield rest[:k] + segment + rest[k:], min(i, k), max(i, k) + length - 1, segment
+
+        # 2-opt: reverse the stretch between node and one of its neighbors
+        for c in neighbors[node]:
+            if c not in present:
+                continue
+            j = order.index(c)
+            lo, hi = (i, j) if i < j else (j, i)
+            for p, q in ((lo + 1, hi), (lo, hi - 1)):
+                if q - p >= 1:
+                    yield order[:p] + order[p:q + 1][::-1] + order[q + 1:], p, q, (node, c)
+
+    while active and problem.moves_left > 0:
+        node = min(active, key=order.index)  # Earliest in the route first
+        for candidate, first, last, moved in moves(node):
+            problem.moves_left -= 1
+            if attempt(candidate, first, last):
+                for changed in moved:
+                    active.add(changed)
+                    active.update(c for c in neighbors[changed] if c in present)
+                break
+        else:
+            active.discard(node)
+    return order
+
+
+def plan_visits(stops: List[Stop], start: Tuple[float, float], day: str,
+                departure: float = DEPARTURE, dwell: float = DWELL,
+                speed_mph: float = SPEED_MPH, road_factor: float = ROAD_FACTOR,
+                round_trip: bool = False, discount_weight: float = DISCOUNT_WEIGHT,
+                max_moves: int = SEARCH_MOVES) -> VisitPlan:
+    """
+    Schedule visits to stops within their opening hours.
+
+    Args:
+        stops: Sales open on day, with coordinates
+        start: (lat, lon) the day starts from
+        day: Day to schedule ('Saturday')
+        departure: Leaving time, in minutes after midnight
+        dwell: Minutes spent at each sale
+        speed_mph: Average speed over estimated road miles
+        road_factor: Multiplier from great-circle to driving distance
+        round_trip: End the day back at the start
+        discount_weight: Minutes worth one percentage point off
+        max_moves: Candidate orders the local search may try in all
+
+    Returns:
+        VisitPlan with projected arrival times and the stops left out
+    """
+    problem = _Problem(stops, start, day, departure, dwell, speed_mph, road_factor,
+                       round_trip, discount_weight, max_moves)
+
+    # Stops no order can reach in time
+    skipped = []
+    nodes = []
+    for node, stop in enumerate(stops, 1):
+        earliest = max(departure + problem.travel[0][node], problem.opens[node])
+        if problem.closes[node] - problem.opens[node] < dwell:
+            skipped.append((stop, f"open {format_clock(problem.opens[node])}-"
+                                  f"{format_clock(problem.closes[node])}, shorter than a visit"))
+        elif earliest + dwell > problem.closes[node]:
+            skipped.append((stop, f"closes at {format_clock(problem.closes[node])}; "
+                                  f"earliest arrival {format_clock(round(earliest))}"))
+        else:
+            nodes.append(node)
+
+    order = []
+    if nodes:
+        # Start from the better of the greedy schedule and the shortest route
+        neighbors = nearest_neighbors(problem.miles)
+        node_of = {id(stops[node - 1]): node for node in nodes}
+        route = plan_route(start, [stops[node - 1] for node in nodes], round_trip, road_factor)
+        candidates = [problem.greedy(nodes), [node_of[id(stop)] for stop in route.stops]]
+        order = min(candidates, key=lambda o: problem.cost(o, problem.simulate(o)))
+
+        # Leave out stops until nothing runs late, so the search works on a
+        # schedule that fits; then win back whatever still fits
+        dropped = []
+        while True:
+            late = _first_late(problem, order)
+            if late is None:
+                break
+            node = _costliest_before(problem, order, order.index(late))
+            order.remove(node)
+            dropped.append(node)
+        order = _recreate(problem, order, dropped, neighbors)
+        order, dropped = _ruin_and_recreate(problem, order, dropped, neighbors)
+        skipped.extend((stops[node - 1], _unfit_reason(problem, stops, order, node)) for node in dropped)
+
+    visits = []
+    prev, time = 0, departure
+    for node in order:
+        arrive, start_time, _, made = problem.visit(prev, node, time)
+        discount = problem.discount[node] if made else 0
+        visits.append(Visit(stops[node - 1], arrive, start_time, start_time + dwell,
+                            problem.miles[prev][node], discount))
+        prev, time = node, start_time + dwell
+
+    home_miles = problem.miles[prev][0] if round_trip and order else 0.0
+    finish = time + (problem.travel[prev][0] if round_trip and order else 0.0)
+    return VisitPlan(day, start, departure, visits, skipped, round_trip, home_miles, finish)
+
+
+def _around(nodes: Iterable[int], neighbors: List[List[int]]) -> Set[int]:
+    """Nodes and their nearest neighbors."""
+    result = set(nodes)
+    for node in list(result):
+        result.update(neighbors[node])
+    return result
+
+
+def _recreate(problem: _Problem, order: List[int], dropped: List[int],
+              neighbors: List[List[int]], nearby: Optional[Set[int]] = None) -> List[int]:
+    """
+    Local search, then put back dropped stops that fit, until neither changes anything.
+
+    Args:
+        nearby: Where the order just changed: the search starts from these
+            stops and only these dropped stops are retried (default: all)
+    """
+    order = _improve(problem, order, neighbors, nearby)
+    while dropped:
+        inserted = _reinsert(problem, order, dropped, nearby)
+        if not inserted:
+            break
+        order = _improve(problem, order, neighbors, _around(inserted, neighbors))
+    return order
+
+
+def _ruin_and_recreate(problem: _Problem, order: List[int], dropped: List[int],
+                       neighbors: List[List[int]]) -> Tuple[List[int], List[int]]:
+    """
+    Escape local optima: take out a stop and its nearby stops, rebuild, and
+    keep the result if it visits more stops, or as many for less.
+
+    Runs up to RUIN_ROUNDS rounds from a fixed seed, so plans are
+    repeatable, and stops once RUIN_PATIENCE rounds in a row bring no
+    improvement or the move budget is spent.
+
+    Returns:
+        (best order, stops it leaves out)
+    """
+    rng = random.Random(RUIN_SEED)
+    best = (-len(order), problem.cost(order, problem.simulate(order)))
+    best_order, best_dropped = order, dropped
+    idle = 0
+    for _ in range(RUIN_ROUNDS):
+        if not best_order or idle >= RUIN_PATIENCE or problem.moves_left <= 0:
+            break
+        order, dropped = best_order[:], best_dropped[:]
+        size = max(2, len(order) // RUIN_FRACTION)
+        seed = rng.choice(order)
+        removed = [seed] + [node for node in neighbors[seed] if node in order][:size - 1]
+        for node in removed:
+            order.remove(node)
+        dropped.extend(removed)
+        # Room was made around the removed stops: rebuild there
+        order = _recreate(problem, order, dropped, neighbors, _around(removed, neighbors))
+        result = (-len(order), problem.cost(order, problem.simulate(order)))
+        if result < (best[0], best[1] - EPSILON):
+            best, best_order, best_dropped = result, order, dropped
+            idle = 0
+        else:
+            idle += 1
+    return best_order, best_dropped
+
+
+def _costliest_before(problem: _Problem, order: List[int], position: int) -> int:
+    """Stop in order[:position + 1] whose removal gets past position soonest."""
+    states = problem.simulate(order, last=position)
+    best, best_state = order[position], states[position - 1] if position else (problem.departure, 0.0)
+    for j in range(position):
+        candidate = order[:j] + order[j + 1:]
+        state = problem.simulate(candidate, j, states, last=position - 1)[-1]
+        if state < best_state:
+            best, best_state = order[j], state
+    return best
+
+
+def _reinsert(problem: _Problem, order: List[int], dropped: List[int],
+              candidates: Optional[Set[int]] = None) -> List[int]:
+    """
+    Put dropped stops back where they fit, cheapest position first (in place).
+
+    Args:
+        problem: Time-window problem
+        order: Current order (changed in place)
+        dropped: Stops left out (the ones put back are removed)
+        candidates: Only try these dropped stops (default: all)
+
+    Returns:
+        The stops put back
+    """
+    inserted = []
+    tries = dropped if candidates is None else [node for node in dropped if node in candidates]
+    dwell = problem.dwell
+    for node in sorted(tries, key=lambda node: problem.closes[node]):
+        states = problem.simulate(order)
+        latest = problem.closes[node] - dwell
+        # Nothing may run late, which caps the cost of any position worth
+        # taking; each cheaper position found lowers the cap further
+        nodes = order + [node]
+        limit = (max(problem.closes[n] for n in nodes) - problem.departure + 1.0
+                 + sum(problem.miss_penalty[n] for n in nodes)
+                 + (max(problem.travel[n][0] for n in nodes) if problem.round_trip else 0.0))
+        found = []
+        for k in range(len(order) + 1):
+            # Later positions are reached later still: stop once this one is too late
+            leave = states[k - 1][0] if k else problem.departure
+            if max(leave + problem.travel[order[k - 1] if k else 0][node], problem.opens[node]) > latest:
+                break
+            cost = problem.insertion_cost(order, states, k, node, limit)
+            if cost is not None:
+                limit = cost
+                found.append(order[:k] + [node] + order[k:])
+        # Lateness is priced in, but take only a position where nothing is late
+        for candidate in reversed(found):
+            if _first_late(problem, candidate) is None:
+                order[:] = candidate
+                dropped.remove(node)
+                inserted.append(node)
+                break
+    return inserted
+
+
+def _first_late(problem: _Problem, order: List[int]) -> Optional[int]:
+    """First stop in order whose visit would end after closing."""
+    prev, time = 0, problem.departure
+    for node in order:
+        _, start, _, _ = problem.visit(prev, node, time)
+        if start + problem.dwell > problem.closes[node] + EPSILON:
+            return node
+        prev, time = node, start + problem.dwell
+    return None
+
+
+def _unfit_reason(problem: _Problem, stops: List[Stop], order: List[int], node: int) -> str:
+    """
+    Why a left-out stop does not fit the final order.
+
+    Every position is tried; the reason describes the one that runs the
+    least late: either the stop's own visit ends after it closes, or it
+    pushes a later visit past closing.
+    """
+    states = problem.simulate(order)
+    dwell = problem.dwell
+    best_late, reason = float('inf'), "no time left for it in this route"
+    for k in range(len(order) + 1):
+        _, start, _, _ = problem.visit(order[k - 1] if k else 0, node,
+                                       states[k - 1][0] if k else problem.departure)
+        time = start + dwell
+        late = time - problem.closes[node]
+        if late > EPSILON:
+            if late < best_late:
+                best_late = late
+                reason = (f"closes at {_clock(problem.closes[node])}; squeezed in between "
+                          f"the other visits it could not be left before {_clock(time)}")
+            continue
+
+        prev = node
+        for i in range(k, len(order)):
+            _, start, _, _ = problem.visit(prev, order[i], time)
+            time = start + dwell
+            late = time - problem.closes[order[i]]
+            if late > EPSILON:
+                if late < best_late:
+                    best_late = late
+                    reason = (f"fitting it in would make {stops[order[i] - 1].sale.name} run "
+                              f"{math.ceil(late)} min past its {_clock(problem.closes[order[i]])} closing")
+                break
+            if time <= states[i][0]:
+                break  # Back in step with the schedule: nothing later is late
+            prev = order[i]
+    return reason
+
+
+# Output ---------------------------------------------------------------------
+
+def _clock(minutes: float) -> str:
+    return format_clock(int(round(minutes)))
+
+
+def _hours_text(sale: Sale, day: str) -> str:
+    """'9am-4pm (50% off 12pm-3pm)'"""
+    opens, closes, discount, discount_opens, discount_closes = day_windows(sale, day)
+    text = f"{format_clock(opens)}-{format_clock(closes)}"
+    if discount:
+        text += f" ({discount}% off"
+        if (discount_opens, discount_closes) != (opens, closes):
+            text += f" {format_clock(discount_opens)}-{format_clock(discount_closes)}"
+        text += ")"
+    return text
+
+
+def _visit_text(visit: Visit, day: str) -> str:
+    """'9:20am-9:40am (waited 10 min), 50% off'"""
+    text = f"{_clock(visit.start)}-{_clock(visit.leave)}"
+    wait = round(visit.start - visit.arrive)
+    if wait > 0:
+        text += f" (arrive {_clock(visit.arrive)}, wait {wait} min)"
+    _, _, discount, _, _ = day_windows(visit.stop.sale, day)
+    if visit.discount:
+        text += f", {visit.discount}% off"
+    elif discount:
+        text += ", before/after the discount window"
+    return text
+
+
+def plan_kml(plan: VisitPlan, address_urls: Optional[AddressIndex] = None) -> str:
+    """The schedule as a route_planner KML folder, with visit times per stop."""
+    details = [f"<p><strong>Visit:</strong> {_visit_text(visit, plan.day)}</p>"
+               for visit in plan.visits]
+    return route_kml(plan.route(), plan.day, address_urls, details)
+
+
+def plan_markdown(plan: VisitPlan, address_urls: Optional[AddressIndex] = None) -> str:
+    """Markdown itinerary with projected arrival times and skipped stops."""
+    end_label = "Home" if plan.round_trip else "Done"
+    lines = [
+        f"# {plan.day} Schedule",
+        "",
+        f"**Start:** {plan.start[0]:.5f}, {plan.start[1]:.5f}, leaving {_clock(plan.departure)}  ",
+        f"**Stops:** {len(plan.visits)}"
+        + (f" ({len(plan.skipped)} could not be fit)" if plan.skipped else "") + "  ",
+        f"**Distance:** {plan.total_miles:.1f} mi (estimated road miles)  ",
+        f"**{end_label}:** {_clock(plan.finish)}",
+        "",
+    ]
+    for number, visit in enumerate(plan.visits, 1):
+        sale = visit.stop.sale
+        url = match_sale_url(sale, address_urls).url if address_urls else ''
+        title = f"[{sale.name}]({url})" if url else sale.name
+        lines.append(f"### {number}. {_clock(visit.arrive)} - {title}")
+        lines.append("")
+        lines.append(f"**Address:** {sale.full_address}"
+                     + (" (ZIP-level location)" if visit.stop.precision == 'zip' else ""))
+        lines.append("")
+        lines.append(f"**Hours:** {_hours_text(sale, plan.day)}")
+        lines.append("")
+        lines.append(f"**Visit:** {_visit_text(visit, plan.day)}")
+        lines.append("")
+        lines.append(f"**Drive:** {visit.miles:.1f} mi")
+        lines.append("")
+
+    if plan.skipped:
+        lines.append("## Could Not Fit")
+        lines.append("")
+        for stop, reason in plan.skipped:
+            lines.append(f"- **{stop.sale.name}** ({stop.sale.full_address}): {reason}")
+        lines.append("")
+    return '\n'.join(lines)
+
+
+# Command line -----------------------------------------------------------------
+
+# Left-out stops listed by the benchmark
+BENCH_REASONS = 10
+
+
+def benchmark(count: int = 120) -> None:
+    """Time scheduling over random stops and opening hours."""
+    import random
+    import time
+
+    rng = random.Random(7)
+    center = (42.58, -83.24)
+    stops = []
+    for i in range(count):
+        opens = rng.choice(['8am', '9am', '10am', '11am'])
+        closes = rng.choice(['2pm', '3pm', '4pm', '5pm'])
+        description = f"Sat {opens}-{closes}"
+        if rng.random() < 0.2:
+            description += f", Sat 12pm-{closes} (50% OFF)"
+        sale = Sale(f'Sale {i}', f'{i} Main St', 'Town', 'MI', '48304', description)
+        stops.append(Stop(sale, center[0] + rng.uniform(-0.1, 0.1),
+                          center[1] + rng.uniform(-0.12, 0.12), 'street'))
+
+    start = time.perf_counter()
+    plan = plan_visits(stops, center, 'Saturday', departure=8 * 60, dwell=5, speed_mph=30)
+    elapsed = time.perf_counter() - start
+
+    made = sum(1 for visit in plan.visits if visit.discount)
+    print(f"{count} stops")
+    print(f"  scheduled:          {len(plan.visits)} ({len(plan.skipped)} could not be fit)")
+    print(f"  discount windows:   {made} made")
+    print(f"  day ends:           {_clock(plan.finish)}, {plan.total_miles:.1f} mi")
+    print(f"  plan_visits:        {elapsed * 1000:8.1f} ms")
+    for stop, reason in plan.skipped[:BENCH_REASONS]:
+        print(f"  could not fit:      {stop.sale.name} - {reason}")
+    if len(plan.skipped) > BENCH_REASONS:
+        print(f"                      ... and {len(plan.skipped) - BENCH_REASONS} more")
+
+
+def main():
+    """Main entry point."""
+    args = sys.argv[1:]
+    if args and args[0] == '--bench':
+        benchmark(int(args[1]) if len(args) > 1 else 120)
+        return
+
+    start_text = pop_option(args, '--start')
+    day = pop_option(args, '--day')
+    depart = pop_option(args, '--depart')
+    dwell = pop_option(args, '--dwell')
+    speed = pop_option(args, '--speed')
+    road_factor = pop_option(args, '--road-factor')
+    markdown = pop_option(args, '--markdown')
+    output = pop_option(args, '--output')
+    flags = {arg for arg in args if arg.startswith('--')}
+    args = [arg for arg in args if not arg.startswith('--')]
+
+    if not args or start_text is None:
+        print("Usage: python visit_scheduler.py <csv> --start LAT,LON [--day DAY] [--depart 9am]")
+        print("                                 [--dwell MIN] [--speed MPH] [--road-factor F]")
+        print("                                 [--markdown details.md] [--output schedule.kml]")
+        print("                                 [--round-trip] [--offline]")
+        print("       python visit_scheduler.py --bench [count]")
+        print("\nOptions:")
+        print("  --start        Where the day starts, e.g. 42.5803,-83.2455")
+        print("  --day          Schedule this day (default: the day with the most sales)")
+        print(f"  --depart       Leaving time (default {format_clock(DEPARTURE)})")
+        print(f"  --dwell        Minutes at each sale (default {DWELL})")
+        print(f"  --speed        Average driving speed in mph (default {SPEED_MPH})")
+        print(f"  --road-factor  Driving miles per straight-line mile (default {ROAD_FACTOR})")
+        print("  --markdown     Details markdown, to link sales to their listings")
+        print("  --output       Schedule KML (default: <csv>_<day>_schedule.kml); the")
+        print("                 itinerary goes next to it as .md")
+        print("  --round-trip   Return to the start after the last sale")
+        print("  --offline      Use only local indexes and cached geocoder answers")
+        sys.exit(1)
+
+    csv_path = Path(args[0])
+    if not csv_path.exists():
+        print(f"Error: CSV file not found: {csv_path}")
+        sys.exit(1)
+    try:
+        start = parse_point(start_text)
+        departure = parse_clock(depart) if depart else DEPARTURE
+        dwell = float(dwell) if dwell else DWELL
+        speed = float(speed) if speed else SPEED_MPH
+        road_factor = float(road_factor) if road_factor else ROAD_FACTOR
+        if dwell < 0 or speed <= 0:
+            raise ValueError
+    except ValueError:
+        print("Error: --start must be LAT,LON, --depart a time like 9am, "
+              "and --dwell/--speed/--road-factor positive numbers")
+        sys.exit(1)
+
+    sales = list(iter_csv_data(csv_path))
+    day = day.capitalize() if day else busiest_day(sales)
+    address_urls = parse_markdown_urls(Path(markdown)) if markdown else None
+    output_path = Path(output) if output else csv_path.with_name(f"{csv_path.stem}_{day.lower()}_schedule.kml")
+
+    print(f"Geocoding {day} sales...")
+    geocoder = geocode_sales((sale for sale in sales if sale.schedule.day(day)),
+                             offline='--offline' in flags)
+    stops, missing = day_stops(sales, day, geocoder)
+    geocoder.close()
+    for sale in missing:
+        print(f"  Skipped (no location): {sale.name} - {sale.full_address}")
+    if not stops:
+        print(f"Error: no located sales open on {day}")
+        sys.exit(1)
+
+    plan = plan_visits(stops, start, day, departure, dwell, speed, road_factor,
+                       '--round-trip' in flags)
+    output_path.write_text(plan_kml(plan, address_urls), encoding='utf-8')
+    itinerary_path = output_path.with_suffix('.md')
+    itinerary_path.write_text(plan_markdown(plan, address_urls), encoding='utf-8')
+
+    print(f"✓ {day} schedule: {len(plan.visits)} visits, {plan.total_miles:.1f} mi, "
+          f"done {_clock(plan.finish)}")
+    for stop, reason in plan.skipped:
+        print(f"  Could not fit: {stop.sale.name} - {reason}")
+    print(f"  - KML: {output_path}")
+    print(f"  - Itinerary: {itinerary_path}")
+
+
+if __name__ == "__main__":
+    main()
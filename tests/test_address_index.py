@@ -0,0 +1,33 @@
+"""Tests for address_index.py."""
+
+from address_index import AddressIndex
+
+
+def make_index() -> AddressIndex:
+    return AddressIndex.from_mapping({
+        '971 Stratford Lane, Bloomfield Hills, MI 48304': 'https://example.com/1',
+        '12 Main Street, Troy, MI 48084': 'https://example.com/2',
+        '40 Main Street, Birmingham, MI 48009': 'https://example.com/3',
+    })
+
+
+def test_house_numbers_must_match():
+    index = make_index()
+
+    assert index.match('971 Stratford Ln', '48304') == ('https://example.com/1', 1.0)
+    assert index.match('123 Main St', '48084').url == ''
+
+
+def test_street_without_house_number_prefers_its_zip():
+    index = make_index()
+
+    assert index.match('Main Street', '48009').url == 'https://example.com/3'
+    assert index.match('Main Street', '48084').url == 'https://example.com/2'
+
+
+def test_street_without_house_number_falls_back_to_other_zips():
+    index = make_index()
+
+    assert index.match('Stratford Lane', '48084').url == 'https://example.com/1'
+    assert index.match('Stratford Lane').url == 'https://example.com/1'
+    assert index.match('Woodward Avenue').url == ''
@@ -0,0 +1,39 @@
+"""Tests for cache_policy.py."""
+
+import time
+
+from cache_policy import DAY, CachePolicy, FetchUnavailable, cached_fetch
+from cache_store import MemoryCacheStore
+
+POLICY = CachePolicy(positive_ttl=10 * DAY, negative_ttl=1 * DAY, stale_ttl=10 * DAY)
+
+
+def unavailable():
+    raise FetchUnavailable('connection refused')
+
+
+def test_no_data_answer_is_cached():
+    store = MemoryCacheStore()
+    assert cached_fetch(store, 'ns', 'key', lambda: None, POLICY) is None
+
+    entry = store.get('ns', 'key')
+    assert entry is not None and entry.value is None
+    assert cached_fetch(store, 'ns', 'key', unavailable, POLICY) is None  # Fresh negative, no fetch
+
+
+def test_unavailable_source_is_not_cached():
+    store = MemoryCacheStore()
+    assert cached_fetch(store, 'ns', 'key', unavailable, POLICY) is None
+    assert store.get('ns', 'key') is None
+
+    assert cached_fetch(store, 'ns', 'key', lambda: {'grade': 'B'}, POLICY) == {'grade': 'B'}
+
+
+def test_unavailable_source_keeps_old_entry():
+    store = MemoryCacheStore()
+    for age in (15 * DAY, 30 * DAY):  # Stale, then expired
+        fetched_at = time.time() - age
+        store.put('ns', 'key', {'grade': 'B'}, fetched_at=fetched_at)
+
+        assert cached_fetch(store, 'ns', 'key', unavailable, POLICY) == {'grade': 'B'}
+        assert store.get('ns', 'key').fetched_at == fetched_at
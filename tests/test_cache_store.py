@@ -0,0 +1,141 @@
+"""Tests for cache_store.py."""
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+from cache_store import (SCHEMA_VERSION, CacheEntry, MemoryCacheStore, SQLiteCacheStore,
+                         import_json_cache)
+
+
+def user_version(path) -> int:
+    conn = sqlite3.connect(str(path))
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_new_database_gets_the_current_schema(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    SQLiteCacheStore(path).close()
+
+    conn = sqlite3.connect(str(path))
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.close()
+    assert {'entries', 'meta'} <= tables
+    assert user_version(path) == SCHEMA_VERSION
+
+
+def test_unversioned_database_is_migrated_in_place(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    conn = sqlite3.connect(str(path))
+    conn.execute('CREATE TABLE unrelated (x INTEGER)')
+    conn.execute('INSERT INTO unrelated VALUES (1)')
+    conn.commit()
+    conn.close()
+    assert user_version(path) == 0
+
+    store = SQLiteCacheStore(path)
+    store.put('zip', '48304', {'rating': 'excellent'})
+    store.close()
+
+    assert user_version(path) == SCHEMA_VERSION
+    conn = sqlite3.connect(str(path))
+    assert conn.execute('SELECT x FROM unrelated').fetchall() == [(1,)]
+    conn.close()
+
+
+def test_reopening_keeps_entries(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    store = SQLiteCacheStore(path)
+    store.put('zip', '48304', {'rating': 'excellent'}, fetched_at=100.0)
+    store.close()
+
+    store = SQLiteCacheStore(path)
+    assert store.get('zip', '48304') == CacheEntry({'rating': 'excellent'}, 100.0)
+    store.close()
+
+
+def test_newer_schema_is_refused(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    conn = sqlite3.connect(str(path))
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION + 1}')
+    conn.close()
+
+    with pytest.raises(RuntimeError, match='newer than supported'):
+        SQLiteCacheStore(path)
+
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def store(request, tmp_path):
+    store = SQLiteCacheStore(tmp_path / 'cache.sqlite3') if request.param == 'sqlite' else MemoryCacheStore()
+    yield store
+    store.close()
+
+
+def test_upsert_round_trip(store):
+    assert store.get('zip', '48304') is None
+
+    store.put('zip', '48304', {'rating': 'good'}, fetched_at=1.0)
+    store.put('zip', '48304', {'rating': 'excellent'}, fetched_at=2.0)
+    store.put('zip', '48009', None, fetched_at=3.0)  # Negative entries round-trip too
+    store.put('crime', '48304', 'B+', fetched_at=4.0)
+
+    assert store.get('zip', '48304') == CacheEntry({'rating': 'excellent'}, 2.0)
+    assert store.get('zip', '48009') == CacheEntry(None, 3.0)
+    assert sorted(store.items('zip')) == [
+        ('48009', CacheEntry(None, 3.0)),
+        ('48304', CacheEntry({'rating': 'excellent'}, 2.0)),
+    ]
+
+    store.delete('zip', '48304')
+    assert store.get('zip', '48304') is None
+    assert store.get('crime', '48304') == CacheEntry('B+', 4.0)
+
+
+def test_put_many_and_meta(store):
+    store.put_many('zip', {'1': 'a', '2': 'b'}, fetched_at=5.0)
+    store.put_many('zip', {'2': 'c'}, fetched_at=6.0)
+
+    assert dict(store.items('zip')) == {'1': CacheEntry('a', 5.0), '2': CacheEntry('c', 6.0)}
+    assert store.get_meta('marker') is None
+    store.set_meta('marker', 'x')
+    store.set_meta('marker', 'y')
+    assert store.get_meta('marker') == 'y'
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / 'neighborhood_cache.json'
+    legacy.write_text(json.dumps({'48304': {'rating': 'excellent'}, '48009': {'rating': 'good'}}))
+    os.utime(legacy, (1000.0, 1000.0))
+    path = tmp_path / 'cache.sqlite3'
+
+    store = SQLiteCacheStore(path)
+    store.put('zip', '48009', {'rating': 'fresher'}, fetched_at=2000.0)
+    assert import_json_cache(store, 'zip', legacy) == 1
+    assert store.get('zip', '48304') == CacheEntry({'rating': 'excellent'}, 1000.0)
+    assert store.get('zip', '48009') == CacheEntry({'rating': 'fresher'}, 2000.0)  # Not overwritten
+
+    # Later edits to the JSON file are not re-imported, even after reopening
+    store.delete('zip', '48304')
+    legacy.write_text(json.dumps({'48304': {'rating': 'poor'}, '10001': {'rating': 'fair'}}))
+    store.close()
+
+    store = SQLiteCacheStore(path)
+    assert import_json_cache(store, 'zip', legacy) == 0
+    assert store.get('zip', '48304') is None
+    assert store.get('zip', '10001') is None
+    store.close()
+
+
+def test_missing_or_corrupt_legacy_json(tmp_path):
+    store = MemoryCacheStore()
+    assert import_json_cache(store, 'zip', tmp_path / 'missing.json') == 0
+
+    corrupt = tmp_path / 'corrupt.json'
+    corrupt.write_text('{"48304": ')
+    assert import_json_cache(store, 'zip', corrupt) == 0
+    assert list(store.items('zip')) == []
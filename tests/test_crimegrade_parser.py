@@ -0,0 +1,54 @@
+"""Tests for crimegrade_parser.py."""
+
+from crimegrade_parser import MAX_REGION, find_grade_regions, parse_crimegrade_html, synthetic_page
+
+WIDGET = '''<div class="grade-card">
+  <h2>Overall Crime Grade</h2><div class="overall-grade">B+</div>
+  <p>The crime rate is 23% lower than the national average.</p>
+  <div class="row"><span>Violent Crime</span><span class="grade">A-</span></div>
+  <div class="row"><span>Property Crime</span><span class="grade">C</span></div>
+</div>'''
+
+
+def test_rendered_page():
+    result = parse_crimegrade_html(synthetic_page(size_mb=0.5))
+
+    assert result == {
+        'overall_grade': 'B+',
+        'violent_grade': 'A-',
+        'property_grade': 'C',
+        'crime_description': 'crime rate is 23% lower than the national average',
+        'confidence': 1.0,
+    }
+
+
+def test_regions_are_bounded_and_cover_the_widget():
+    page = synthetic_page(size_mb=1.0)
+    regions = find_grade_regions(page)
+    widget = page.index('Overall Crime Grade')
+
+    assert sum(end - start for start, end in regions) <= MAX_REGION
+    assert all(a_end < b_start for (_, a_end), (b_start, _) in zip(regions, regions[1:]))
+    assert any(start <= widget < end for start, end in regions)
+
+
+def test_text_outside_the_regions_is_ignored():
+    stray = '<p>Crime grade: F</p>' + '<script>' + 'x' * 200000 + '</script>'
+    page = stray + '<span>Violent Crime</span><span class="grade">B</span>'
+
+    result = parse_crimegrade_html(page)
+
+    assert result['violent_grade'] == 'B'
+    assert result['overall_grade'] == 'B'  # From the grade widget, not the stray 'F'
+
+
+def test_grade_widget_without_labels():
+    result = parse_crimegrade_html('<div class="overall-grade">D+</div>')
+
+    assert result['overall_grade'] == 'D+'
+    assert result['confidence'] == 0.45
+
+
+def test_grades_must_be_capital_letters():
+    assert parse_crimegrade_html('<p>Violent crime a concern; property crime b-listed</p>') is None
+    assert parse_crimegrade_html('<html><body>No grades here</body></html>') is None
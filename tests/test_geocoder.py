@@ -0,0 +1,100 @@
+"""Tests for geocoder.py."""
+
+import pytest
+
+import geocoder
+import retry_policy
+from cache_policy import FetchUnavailable
+from cache_store import MemoryCacheStore
+from geocoder import CensusGeocoder, Geocoder, RemoteGeocoder
+from retry_policy import RetryPolicy
+from sales import Sale
+
+SALE = Sale('Estate Sale', '100 Main St', 'Troy', 'MI', '48083', '')
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: str = ''):
+        self.status = status
+        self.headers = {}
+        self.body = body
+
+    def text(self) -> str:
+        return self.body
+
+
+class FakeClient:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, timeout=None):
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+class ScriptedGeocoder(RemoteGeocoder):
+    name = 'scripted'
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def geocode(self, one_line_address):
+        answer = self.answers[min(self.calls, len(self.answers) - 1)]
+        self.calls += 1
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def single_attempt(monkeypatch):
+    monkeypatch.setattr(retry_policy, '_default_policy', RetryPolicy(max_attempts=1))
+
+
+def census_answer(monkeypatch, response):
+    monkeypatch.setattr(geocoder, 'get_client', lambda: FakeClient(response))
+    return CensusGeocoder().geocode(SALE.full_address)
+
+
+def test_census_match_and_no_match(monkeypatch, single_attempt):
+    body = '{"result": {"addressMatches": [{"coordinates": {"x": -83.1, "y": 42.5}}]}}'
+    assert census_answer(monkeypatch, FakeResponse(200, body)) == {'lat': 42.5, 'lon': -83.1}
+    assert census_answer(monkeypatch, FakeResponse(200, '{"result": {"addressMatches": []}}')) == {}
+
+
+def test_census_rejected_request_is_a_negative_answer(monkeypatch, single_attempt):
+    assert census_answer(monkeypatch, FakeResponse(400)) is None
+
+
+@pytest.mark.parametrize('response', [
+    ConnectionRefusedError('refused'),
+    FakeResponse(503),
+    FakeResponse(200, '<html>maintenance</html>'),
+    FakeResponse(200, '{"errors": ["unexpected"]}'),
+])
+def test_census_failures_raise(monkeypatch, single_attempt, response):
+    with pytest.raises(FetchUnavailable):
+        census_answer(monkeypatch, response)
+
+
+def test_failed_lookups_are_not_cached():
+    store = MemoryCacheStore()
+    remote = ScriptedGeocoder(FetchUnavailable('down'), {'lat': 42.5, 'lon': -83.1})
+
+    assert Geocoder(remote=remote, store=store).locate(SALE) is None
+
+    # A new run asks again instead of trusting a cached failure
+    location = Geocoder(remote=remote, store=store).locate(SALE)
+    assert (location.lat, location.lon, location.precision) == (42.5, -83.1, 'address')
+    assert remote.calls == 2
+
+
+def test_no_match_is_cached():
+    store = MemoryCacheStore()
+    remote = ScriptedGeocoder({}, {'lat': 42.5, 'lon': -83.1})
+
+    assert Geocoder(remote=remote, store=store).locate(SALE) is None
+    assert Geocoder(remote=remote, store=store).locate(SALE) is None
+    assert remote.calls == 1
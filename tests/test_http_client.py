@@ -0,0 +1,155 @@
+"""Tests for http_client.py."""
+
+import gzip
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cache_store import MemoryCacheStore
+from http_client import VALIDATOR_NAMESPACE, HTTPClient, HTTPStatusError, raise_for_status
+
+PAGE = '<html><body>Lake Orion Estate Sale — café chairs</body></html>'.encode('utf-8')
+ETAG = '"v1"'
+
+
+class PageServer:
+    """Local server recording each request's path, headers and client port."""
+
+    def __init__(self):
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers), self.client_address[1]))
+                headers = {'Content-Type': 'text/html; charset=utf-8'}
+                body = PAGE
+                status = 200
+                if self.path == '/page':
+                    headers['ETag'] = ETAG
+                    if self.headers.get('If-None-Match') == ETAG:
+                        status, body = 304, b''
+                elif self.path == '/gzip':
+                    headers['Content-Encoding'] = 'gzip'
+                    body = gzip.compress(PAGE)
+                elif self.path == '/deflate':
+                    headers['Content-Encoding'] = 'deflate'
+                    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)  # Raw, no zlib header
+                    body = compressor.compress(PAGE) + compressor.flush()
+                elif self.path == '/moved':
+                    status, body = 302, b''
+                    headers['Location'] = '/gzip'
+                elif self.path == '/missing':
+                    status, body = 404, b'not here'
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    server = PageServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client():
+    client = HTTPClient(validator_store=MemoryCacheStore())
+    yield client
+    client.close()
+
+
+def test_not_modified_is_served_from_the_store(server, client):
+    first = client.get(server.base + '/page', conditional=True)
+    assert (first.status, first.body, first.from_cache) == (200, PAGE, False)
+    assert client.validator_store.get(VALIDATOR_NAMESPACE, server.base + '/page') is not None
+
+    second = client.get(server.base + '/page', conditional=True)
+    assert server.requests[-1][1].get('If-None-Match') == ETAG
+    assert (second.status, second.body, second.from_cache) == (200, PAGE, True)
+    assert second.text() == PAGE.decode('utf-8')
+    assert client.stats['not_modified'] == 1
+
+
+def test_plain_get_does_not_send_validators(server, client):
+    client.get(server.base + '/page', conditional=True)
+    response = client.get(server.base + '/page')
+
+    assert 'If-None-Match' not in server.requests[-1][1]
+    assert (response.status, response.from_cache) == (200, False)
+
+
+@pytest.mark.parametrize('path', ['/gzip', '/deflate'])
+def test_compressed_bodies_are_decoded(server, client, path):
+    response = client.get(server.base + path)
+
+    assert 'gzip' in server.requests[-1][1]['Accept-Encoding']
+    assert response.body == PAGE
+    assert 'café' in response.text()
+
+
+def test_redirects_are_followed(server, client):
+    response = client.get(server.base + '/moved')
+
+    assert [path for path, _, _ in server.requests] == ['/moved', '/gzip']
+    assert response.url == server.base + '/gzip'
+    assert response.body == PAGE
+
+
+def test_error_statuses_are_returned_not_raised(server, client):
+    response = client.get(server.base + '/missing')
+
+    assert response.status == 404
+    with pytest.raises(HTTPStatusError):
+        raise_for_status(response)
+
+
+def test_connections_are_reused_for_the_same_host(server, client):
+    for path in ('/page', '/gzip', '/missing', '/page'):
+        client.get(server.base + path)
+
+    assert len({port for _, _, port in server.requests}) == 1
+    assert client.stats['connections'] == 1
+    assert client.stats['reused'] == 3
+
+
+def test_concurrent_requests_each_get_a_connection(server, client):
+    barrier = threading.Barrier(3)
+
+    def fetch():
+        barrier.wait()
+        client.get(server.base + '/gzip')
+
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Later requests pick up the pooled connections instead of opening more
+    opened = client.stats['connections']
+    for _ in range(opened):
+        client.get(server.base + '/gzip')
+    assert client.stats['connections'] == opened
+    assert len(server.requests) == 3 + opened
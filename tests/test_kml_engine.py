@@ -0,0 +1,27 @@
+"""Tests for kml_engine.py."""
+
+from address_index import AddressIndex
+from kml_engine import SafetyLayout, UNRATED_SAFETY, iter_records, render_kml
+from sales import Sale
+
+
+def make_sale(zip_code: str) -> Sale:
+    return Sale('Test Sale', '12 Main St', 'Troy', 'MI', zip_code,
+                'Fri 9am-3pm, Sat 9am-3pm 50% off')
+
+
+def test_safety_layout_accepts_sales_without_a_rating(tmp_path):
+    rated = {'rating': 'good', 'score': 8, 'description': 'Nice suburb'}
+    sales = [make_sale('48084'), make_sale('')]
+    records = list(iter_records(sales, AddressIndex(), {'48084': rated}))
+    assert records[1].neighborhood is None
+
+    for sort_by_safety in (False, True):
+        output = tmp_path / f'sales-{sort_by_safety}.kml'
+        writer = render_kml(records, SafetyLayout(sort_by_safety), output)
+        kml = output.read_text()
+
+        assert writer.records_written == 2
+        assert kml.count('<Placemark>') == 4  # Two sales, open two days each
+        assert '<strong>Neighborhood:</strong> Unknown' in kml
+        assert f'#{UNRATED_SAFETY}_' in kml
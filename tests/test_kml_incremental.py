@@ -0,0 +1,81 @@
+"""Tests for kml_incremental.py."""
+
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from kml_engine import (DayDiscountLayout, FlatLayout, SafetyLayout, iter_csv_data, iter_records,
+                        parse_markdown_urls, render_kml)
+from kml_incremental import IncrementalBuild
+from kml_writer import KMZ_DOCUMENT_NAME
+from sales import Sale
+
+EXAMPLE = Path(__file__).parent.parent / 'examples' / '2025-11-08-bloomfield-hills'
+CSV_PATH = EXAMPLE / 'Estate_Sales_11-08-2025.csv'
+MARKDOWN_PATH = EXAMPLE / 'Estate_Sales_11-08-2025_Details.md'
+
+RATINGS = {
+    '48304': {'rating': 'excellent', 'score': 9, 'description': 'Quiet suburb'},
+    '48301': {'rating': 'good', 'score': 8, 'description': 'Residential'},
+}
+
+LAYOUTS = {
+    'flat': FlatLayout,
+    'day-discount': DayDiscountLayout,
+    'safety': lambda: SafetyLayout(sort_by_safety=True),
+}
+
+
+def document_bytes(path: Path) -> bytes:
+    if path.suffix == '.kmz':
+        with zipfile.ZipFile(path) as archive:
+            return archive.read(KMZ_DOCUMENT_NAME)
+    return path.read_bytes()
+
+
+def incremental_build(layout, sales, address_urls, output_path):
+    with IncrementalBuild(layout, output_path, address_urls) as build:
+        for sale in sales:
+            build.add_sale(sale, RATINGS.get(sale.zip_code))
+    return build
+
+
+def full_build(layout, sales, address_urls, output_path):
+    render_kml(iter_records(sales, address_urls, RATINGS), layout, output_path)
+
+
+@pytest.mark.parametrize('suffix', ['.kml', '.kmz'])
+@pytest.mark.parametrize('layout_name', sorted(LAYOUTS))
+def test_incremental_rebuild_matches_a_fresh_full_build(tmp_path, layout_name, suffix):
+    make_layout = LAYOUTS[layout_name]
+    address_urls = parse_markdown_urls(MARKDOWN_PATH)
+    sales = list(iter_csv_data(CSV_PATH))
+    assert len(sales) > 3
+
+    output = tmp_path / f'incremental{suffix}'
+    first = incremental_build(make_layout(), sales, address_urls, output)
+    assert (first.rendered, first.reused) == (len(sales), 0)
+    reference = tmp_path / f'reference{suffix}'
+    full_build(make_layout(), sales, address_urls, reference)
+    assert document_bytes(output) == document_bytes(reference)
+
+    # Change one sale's hours and drop the last one
+    old = sales[1]
+    changed = Sale(old.name, old.address, old.city, old.state, old.zip_code,
+                   'Fri 8am-2pm, Sat 9am-1pm (75% OFF)', old.extra)
+    edited = [sales[0], changed] + sales[2:-1]
+
+    second = incremental_build(make_layout(), edited, address_urls, output)
+    assert (second.rendered, second.reused, second.removed) == (1, len(edited) - 1, 2)
+    assert not second.up_to_date
+
+    fresh = tmp_path / f'fresh{suffix}'
+    full_build(make_layout(), edited, address_urls, fresh)
+    assert document_bytes(output) == document_bytes(fresh)
+    assert b'75% OFF' in document_bytes(output)
+
+    # Nothing changed since: the output is left alone
+    third = incremental_build(make_layout(), edited, address_urls, output)
+    assert third.up_to_date and third.rendered == 0
+    assert document_bytes(output) == document_bytes(fresh)
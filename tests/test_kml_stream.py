@@ -0,0 +1,100 @@
+"""Tests for kml_stream.py."""
+
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from address_index import AddressIndex
+from kml_engine import (DayDiscountLayout, FlatLayout, iter_csv_data, iter_records,
+                        parse_markdown_urls, render_kml)
+from kml_stream import KML_NAMESPACE, extract_url, iter_placemarks
+from sales import Sale
+
+EXAMPLE = Path(__file__).parent.parent / 'examples' / '2025-11-08-bloomfield-hills'
+CSV_PATH = EXAMPLE / 'Estate_Sales_11-08-2025.csv'
+MARKDOWN_PATH = EXAMPLE / 'Estate_Sales_11-08-2025_Details.md'
+
+NS = {'kml': KML_NAMESPACE}
+
+
+def tree_placemarks(kml_path: Path):
+    """The placemarks as the old whole-tree ET.parse() reader saw them."""
+    root = ET.parse(str(kml_path)).getroot()
+    placemarks = []
+    for elem in root.findall('.//kml:Placemark', NS):
+        description = elem.findtext('kml:description', None, NS)
+        placemarks.append({
+            'name': elem.findtext('kml:name', None, NS),
+            'address': elem.findtext('kml:address', None, NS),
+            'url': extract_url(description),
+            'description': description,
+        })
+    return placemarks
+
+
+def test_round_trip_of_a_written_kml(tmp_path):
+    address_urls = parse_markdown_urls(MARKDOWN_PATH)
+    sales = list(iter_csv_data(CSV_PATH))
+    sales.append(Sale("Mom & Pop's <Vintage> Sale", '5 Elm St', 'Troy', 'MI', '48083',
+                      'Fri 9am-3pm | Cash & carry, "no" holds'))
+    output = tmp_path / 'sales.kml'
+    render_kml(iter_records(sales, address_urls), FlatLayout(), output)
+
+    placemarks = list(iter_placemarks(output))
+
+    expected_urls = [record.url or None for record in iter_records(sales, address_urls)]
+    assert [(p['name'], p['address'], p['url']) for p in placemarks] == [
+        (sale.name, sale.full_address, url) for sale, url in zip(sales, expected_urls)
+    ]
+    assert sum(url is not None for url in expected_urls) > len(sales) // 2
+    # The description is HTML, so its text stays entity-escaped
+    assert 'Cash &amp; carry, "no" holds' in placemarks[-1]['description']
+
+
+def test_nested_folders_match_the_whole_tree_reader(tmp_path):
+    address_urls = parse_markdown_urls(MARKDOWN_PATH)
+    output = tmp_path / 'sales.kml'
+    render_kml(iter_records(iter_csv_data(CSV_PATH), address_urls), DayDiscountLayout(), output)
+
+    streamed = list(iter_placemarks(output))
+    assert streamed == tree_placemarks(output)
+    # Multi-day sales are listed under every day they are open
+    assert len(streamed) > sum(1 for _ in iter_csv_data(CSV_PATH))
+
+
+def test_reads_the_document_inside_a_kmz(tmp_path):
+    kml = tmp_path / 'sales.kml'
+    render_kml(iter_records(iter_csv_data(CSV_PATH), AddressIndex()), FlatLayout(), kml)
+    kmz = tmp_path / 'sales.kmz'
+    with zipfile.ZipFile(kmz, 'w') as archive:
+        archive.writestr('files/icon.txt', 'not a document')
+        archive.write(kml, 'doc.kml')
+
+    assert list(iter_placemarks(kmz)) == list(iter_placemarks(kml))
+
+
+def test_kmz_without_a_document_is_rejected(tmp_path):
+    kmz = tmp_path / 'empty.kmz'
+    with zipfile.ZipFile(kmz, 'w') as archive:
+        archive.writestr('readme.txt', 'nothing here')
+
+    with pytest.raises(ValueError):
+        list(iter_placemarks(kmz))
+
+
+def test_placemarks_are_read_lazily(tmp_path):
+    kml = tmp_path / 'truncated.kml'
+    kml.write_text(
+        f'<kml xmlns="{KML_NAMESPACE}"><Document>'
+        '<Placemark><name>First</name></Placemark>'
+        '<Placemark><name>Second</name></Placemark>'
+        '<Placemark><name>Cut off'
+    )
+
+    placemarks = iter_placemarks(kml)
+    assert next(placemarks)['name'] == 'First'
+    assert next(placemarks)['name'] == 'Second'
+    with pytest.raises(ET.ParseError):
+        next(placemarks)
@@ -0,0 +1,104 @@
+"""Tests for kml_writer.py."""
+
+import io
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from kml_engine import (DayDiscountLayout, FlatLayout, SafetyLayout, iter_csv_data, iter_records,
+                        parse_markdown_urls)
+from kml_stream import KML_NAMESPACE, iter_placemarks
+from kml_writer import KMZ_DOCUMENT_NAME, KMLWriter, PlacemarkSpool
+
+EXAMPLE = Path(__file__).parent.parent / 'examples' / '2025-11-08-bloomfield-hills'
+CSV_PATH = EXAMPLE / 'Estate_Sales_11-08-2025.csv'
+MARKDOWN_PATH = EXAMPLE / 'Estate_Sales_11-08-2025_Details.md'
+
+LAYOUTS = {
+    'flat': FlatLayout,
+    'day-discount': DayDiscountLayout,
+    'safety': lambda: SafetyLayout(sort_by_safety=True),
+}
+
+NS = {'kml': KML_NAMESPACE}
+
+
+def write(layout, output_path: Path, kmz=None, spool_limit=None) -> KMLWriter:
+    records = iter_records(iter_csv_data(CSV_PATH), parse_markdown_urls(MARKDOWN_PATH))
+    with KMLWriter(layout, output_path, kmz) as writer:
+        if spool_limit is not None:
+            writer.spool.memory_limit = spool_limit
+        for record in records:
+            writer.add(record)
+    return writer
+
+
+@pytest.mark.parametrize('layout_name', sorted(LAYOUTS))
+def test_kmz_streams_back_the_same_placemarks(tmp_path, layout_name):
+    make_layout = LAYOUTS[layout_name]
+    kml = tmp_path / 'sales.kml'
+    kmz = tmp_path / 'sales.kmz'
+    write(make_layout(), kml)
+    # Tiny spool limit: every folder rolls over to a temporary file
+    writer = write(make_layout(), kmz, spool_limit=64)
+
+    with zipfile.ZipFile(kmz) as archive:
+        assert archive.namelist() == [KMZ_DOCUMENT_NAME]
+        assert archive.getinfo(KMZ_DOCUMENT_NAME).compress_type == zipfile.ZIP_DEFLATED
+        assert archive.read(KMZ_DOCUMENT_NAME) == kml.read_bytes()
+    assert kmz.stat().st_size < kml.stat().st_size
+
+    placemarks = list(iter_placemarks(kmz))
+    assert placemarks == list(iter_placemarks(kml))
+    assert writer.records_written == sum(1 for _ in iter_csv_data(CSV_PATH))
+    if layout_name == 'flat':
+        assert len(placemarks) == writer.records_written
+    else:
+        assert len(placemarks) == writer.spool.count()
+
+
+def test_folder_placemarks_keep_csv_order_within_a_folder(tmp_path):
+    output = tmp_path / 'sales.kml'
+    write(DayDiscountLayout(), output)
+    csv_order = [sale.name for sale in iter_csv_data(CSV_PATH)]
+
+    root = ET.parse(str(output)).getroot()
+    leaf_folders = [folder for folder in root.iter(f'{{{KML_NAMESPACE}}}Folder')
+                    if folder.find('kml:Placemark', NS) is not None]
+    assert len(leaf_folders) > 1
+    for folder in leaf_folders:
+        names = [p.findtext('kml:name', None, NS) for p in folder.findall('kml:Placemark', NS)]
+        positions = [csv_order.index(name) for name in names]
+        assert positions == sorted(positions)
+
+
+def test_spool_rolls_over_without_reordering():
+    spool = PlacemarkSpool(memory_limit=16)
+    for n in range(50):
+        spool.add(('Saturday', n % 3), f'<Placemark>{n}</Placemark>')
+    spool.add(('Friday', 0), '<Placemark>friday</Placemark>')
+
+    assert spool.count() == 51
+    assert spool.count(('Saturday',)) == 50
+    assert spool.count(('Saturday', 1)) == 17
+
+    out = io.StringIO()
+    spool.copy_to(('Saturday',), out)
+    expected = ''.join(f'<Placemark>{n}</Placemark>'
+                       for level in range(3) for n in range(50) if n % 3 == level)
+    assert out.getvalue() == expected
+
+    spool.close()
+    assert spool.count(('Friday',)) == 1  # Counts outlive the buckets
+
+
+def test_failed_build_does_not_finish_the_document(tmp_path):
+    output = tmp_path / 'sales.kml'
+    with pytest.raises(RuntimeError):
+        with KMLWriter(FlatLayout(), output) as writer:
+            writer.add(next(iter_records(iter_csv_data(CSV_PATH), parse_markdown_urls(MARKDOWN_PATH))))
+            raise RuntimeError('interrupted')
+
+    assert '</kml>' not in output.read_text()
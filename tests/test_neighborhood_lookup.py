@@ -0,0 +1,101 @@
+"""Tests for neighborhood_lookup.py."""
+
+import pytest
+
+import neighborhood_lookup
+import retry_policy
+from cache_store import MemoryCacheStore
+from kml_engine import SAFETY_LEVELS
+from retry_policy import CircuitBreaker, RetryPolicy, host_of
+
+
+@pytest.fixture
+def memory_cache():
+    store = MemoryCacheStore()
+    neighborhood_lookup.set_cache_store(store)
+    yield store
+    neighborhood_lookup.set_cache_store(None)
+
+
+def test_batch_lookup_rates_sales_without_a_zip(memory_cache):
+    ratings = neighborhood_lookup.batch_lookup([
+        {'ZIP': '48304', 'State': 'MI', 'City': 'Bloomfield Hills'},
+        {'ZIP': '', 'State': 'MI', 'City': 'Troy'},
+        {'ZIP': '48304', 'State': 'MI', 'City': 'Bloomfield Hills'},
+    ], use_crimegrade=False)
+
+    assert list(ratings) == ['48304', '']
+    assert ratings['']['state'] == 'MI'
+    assert ratings['']['rating'] in SAFETY_LEVELS
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: str = ''):
+        self.status = status
+        self.headers = {}
+        self.body = body
+
+    def text(self) -> str:
+        return self.body
+
+
+@pytest.fixture
+def single_attempt(monkeypatch):
+    monkeypatch.setattr(retry_policy, '_default_policy', RetryPolicy(max_attempts=1))
+
+
+def test_network_failure_is_not_cached(memory_cache, single_attempt, monkeypatch):
+    def refuse(url, **kwargs):
+        raise ConnectionRefusedError('refused')
+
+    monkeypatch.setattr(neighborhood_lookup, 'PLAYWRIGHT_AVAILABLE', False)
+    monkeypatch.setattr(neighborhood_lookup._http_client, 'get', refuse)
+
+    assert neighborhood_lookup.fetch_zip_data('48304') is None
+    assert neighborhood_lookup.fetch_crimegrade('48304') is None
+    assert memory_cache.get(neighborhood_lookup.ZIP_NAMESPACE, '48304') is None
+    assert memory_cache.get(neighborhood_lookup.CRIME_NAMESPACE, '48304') is None
+
+
+def test_unknown_zip_is_cached_as_negative(memory_cache, single_attempt, monkeypatch):
+    monkeypatch.setattr(neighborhood_lookup._http_client, 'get',
+                        lambda url, **kwargs: FakeResponse(404))
+
+    assert neighborhood_lookup.fetch_zip_data('00000') is None
+    entry = memory_cache.get(neighborhood_lookup.ZIP_NAMESPACE, '00000')
+    assert entry is not None and entry.value is None
+
+
+def test_open_circuit_is_not_cached(memory_cache, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure(host_of(neighborhood_lookup.CRIMEGRADE_URL))
+    monkeypatch.setattr(retry_policy, '_default_policy', RetryPolicy(breaker=breaker))
+
+    def unexpected(url, **kwargs):
+        raise AssertionError('request sent while the circuit is open')
+
+    monkeypatch.setattr(neighborhood_lookup._http_client, 'get', unexpected)
+
+    assert neighborhood_lookup.fetch_crimegrade('48304') is None
+    assert memory_cache.get(neighborhood_lookup.CRIME_NAMESPACE, '48304') is None
+
+
+def test_blocked_page_is_cached_as_negative(memory_cache, single_attempt, monkeypatch):
+    monkeypatch.setattr(neighborhood_lookup, 'PLAYWRIGHT_AVAILABLE', False)
+    monkeypatch.setattr(neighborhood_lookup._http_client, 'get',
+                        lambda url, **kwargs: FakeResponse(403))
+
+    assert neighborhood_lookup.fetch_crimegrade('48304') is None
+    entry = memory_cache.get(neighborhood_lookup.CRIME_NAMESPACE, '48304')
+    assert entry is not None and entry.value is None
+
+
+def test_server_error_is_not_cached(memory_cache, single_attempt, monkeypatch):
+    monkeypatch.setattr(neighborhood_lookup, 'PLAYWRIGHT_AVAILABLE', False)
+    monkeypatch.setattr(neighborhood_lookup._http_client, 'get',
+                        lambda url, **kwargs: FakeResponse(503))
+
+    assert neighborhood_lookup.fetch_zip_data('48304') is None
+    assert neighborhood_lookup.fetch_crimegrade('48304') is None
+    assert memory_cache.get(neighborhood_lookup.ZIP_NAMESPACE, '48304') is None
+    assert memory_cache.get(neighborhood_lookup.CRIME_NAMESPACE, '48304') is None
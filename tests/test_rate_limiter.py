@@ -0,0 +1,76 @@
+"""Tests for rate_limiter.py."""
+
+import pytest
+
+import rate_limiter
+from rate_limiter import HostRateLimiter, TokenBucket
+
+
+class FakeTime:
+    """Stand-in for the time module: sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+
+def test_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate=10, capacity=3)
+
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert clock.now == pytest.approx(0.2)
+
+
+def test_bucket_refills_while_idle_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+
+    clock.now += 60  # Idle far longer than it takes to fill
+    assert [bucket.acquire() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_waiting_callers_queue_for_successive_tokens(clock):
+    bucket = TokenBucket(rate=4)
+    bucket.acquire()
+
+    # Reservations made at the same instant wait 1, 2, 3 intervals
+    assert [bucket._reserve() for _ in range(3)] == pytest.approx([0.25, 0.5, 0.75])
+
+
+def test_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_hosts_are_paced_independently(clock):
+    limiter = HostRateLimiter(rate=1)
+
+    assert limiter.acquire('https://a.example.com/1') == 0.0
+    assert limiter.acquire('https://b.example.com/1') == 0.0
+    assert limiter.acquire('https://A.example.com/2') == pytest.approx(1.0)
+    assert limiter.bucket_for('a.example.com') is limiter.bucket_for('a.example.com')
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_from_delay():
+    assert HostRateLimiter.from_delay(0) is None
+    limiter = HostRateLimiter.from_delay(0.5, burst=3)
+    assert (limiter.rate, limiter.burst) == (2.0, 3)
@@ -0,0 +1,309 @@
+"""Tests for retry_policy.py."""
+
+import random
+import socket
+from typing import Optional
+
+import pytest
+
+from http_client import HTTPClient
+from retry_policy import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy,
+                          _scripted_server, host_of, parse_retry_after)
+
+URL = 'https://example.com/page'
+HOST = 'example.com'
+
+
+class FakeResponse:
+    def __init__(self, status: int, retry_after: Optional[str] = None):
+        self.status = status
+        self.headers = {'retry-after': retry_after} if retry_after else {}
+
+
+class Script:
+    """Attempt function that plays back responses (or raises exceptions) in order."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(*outcome) if isinstance(outcome, tuple) else FakeResponse(outcome)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_policy(**kwargs):
+    sleeps = []
+    policy = RetryPolicy(sleep=sleeps.append, rng=random.Random(1), **kwargs)
+    return policy, sleeps
+
+
+def test_retries_server_errors_then_succeeds():
+    policy, sleeps = make_policy(max_attempts=3)
+    attempt = Script(503, 502, 200)
+
+    assert policy.call(URL, attempt).status == 200
+    assert attempt.calls == 3
+    assert len(sleeps) == 2
+
+
+def test_does_not_retry_permanent_statuses():
+    policy, sleeps = make_policy()
+    attempt = Script(404, 200)
+
+    assert policy.call(URL, attempt).status == 404
+    assert attempt.calls == 1
+    assert sleeps == []
+
+
+def test_returns_last_response_when_attempts_run_out():
+    policy, sleeps = make_policy(max_attempts=2)
+    attempt = Script(503)
+
+    assert policy.call(URL, attempt).status == 503
+    assert attempt.calls == 2
+
+
+def test_backoff_is_capped_full_jitter():
+    policy, _ = make_policy(base_delay=1.0, max_delay=5.0)
+
+    for retry, ceiling in ((0, 1.0), (1, 2.0), (2, 4.0), (3, 5.0), (10, 5.0)):
+        delays = [policy.backoff(retry) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+
+def test_honors_retry_after():
+    policy, sleeps = make_policy()
+
+    assert policy.call(URL, Script((429, '7'), 200)).status == 200
+    assert sleeps == [7.0]
+
+
+def test_gives_up_on_long_retry_after():
+    policy, sleeps = make_policy(max_retry_after=60)
+    attempt = Script((503, '3600'), 200)
+
+    assert policy.call(URL, attempt).status == 503
+    assert attempt.calls == 1
+    assert sleeps == []
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT', now=1445412480.0) == 30.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412480.0) == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_retries_dropped_connections_but_not_unknown_hosts():
+    policy, sleeps = make_policy()
+    attempt = Script(ConnectionResetError('reset'), 200)
+    assert policy.call(URL, attempt).status == 200
+    assert attempt.calls == 2
+
+    attempt = Script(socket.gaierror(socket.EAI_NONAME, 'unknown host'), 200)
+    with pytest.raises(socket.gaierror):
+        policy.call(URL, attempt)
+    assert attempt.calls == 1
+
+
+def test_circuit_opens_after_threshold_and_fails_fast():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+    policy, _ = make_policy(max_attempts=1, breaker=breaker)
+
+    for _ in range(2):
+        policy.call(URL, Script(500))
+        assert breaker.state(HOST) == CLOSED
+    policy.call(URL, Script(500))
+    assert breaker.state(HOST) == OPEN
+
+    attempt = Script(200)
+    with pytest.raises(CircuitOpenError):
+        policy.call(URL, attempt)
+    assert attempt.calls == 0
+    assert breaker.state('other.example.com') == CLOSED
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, clock=Clock())
+    policy, _ = make_policy(max_attempts=1, breaker=breaker)
+
+    policy.call(URL, Script(500))
+    policy.call(URL, Script(200))
+    policy.call(URL, Script(500))
+    assert breaker.state(HOST) == CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure(HOST)
+    assert breaker.state(HOST) == OPEN
+
+    clock.now = 60
+    assert breaker.state(HOST) == HALF_OPEN
+    breaker.before_request(HOST)  # The probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request(HOST)
+
+    breaker.record_success(HOST)
+    assert breaker.state(HOST) == CLOSED
+    breaker.before_request(HOST)
+
+
+def test_failed_probe_reopens_the_circuit():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    policy, _ = make_policy(max_attempts=1, breaker=breaker)
+    breaker.record_failure(HOST)
+
+    clock.now = 60
+    policy.call(URL, Script(503))
+    assert breaker.state(HOST) == OPEN
+
+    clock.now = 119
+    with pytest.raises(CircuitOpenError):
+        policy.call(URL, Script(200))
+    clock.now = 120
+    assert policy.call(URL, Script(200)).status == 200
+    assert breaker.state(HOST) == CLOSED
+
+
+def test_blocked_requests_count_against_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=3, clock=Clock())
+    policy, sleeps = make_policy(breaker=breaker)
+
+    for _ in range(3):
+        assert policy.call(URL, Script(403)).status == 403
+    assert breaker.state(HOST) == OPEN
+    assert sleeps == []  # Refusals are not retried
+
+
+def test_not_found_counts_as_a_healthy_answer():
+    breaker = CircuitBreaker(failure_threshold=2, clock=Clock())
+    policy, _ = make_policy(max_attempts=1, breaker=breaker)
+
+    policy.call(URL, Script(500))
+    policy.call(URL, Script(404))
+    policy.call(URL, Script(500))
+    assert breaker.state(HOST) == CLOSED
+
+
+# Against a local stand-in server -------------------------------------------
+
+@pytest.fixture
+def stand_in():
+    """The stand-in server's scripts (keyed by path) and base URL."""
+    scripts = {}
+    server = _scripted_server(scripts)
+    yield scripts, f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    # No idle connections, so a dropped connection reaches the policy
+    # instead of being retried by the pool on a fresh socket
+    client = HTTPClient(max_idle_per_host=0)
+    yield client
+    client.close()
+
+
+def get_through(policy, client, url):
+    """Fetch url through the policy, counting the attempts it made."""
+    attempts = []
+
+    def attempt():
+        attempts.append(url)
+        return client.get(url, timeout=5)
+
+    return policy.call(url, attempt), len(attempts)
+
+
+def test_server_error_then_dropped_connection_then_success(stand_in, client):
+    scripts, base = stand_in
+    scripts['/flaky'] = [(503, {}), 'drop', (200, {})]
+    breaker = CircuitBreaker(failure_threshold=4, clock=Clock())
+    policy, sleeps = make_policy(max_attempts=3, breaker=breaker)
+    url = base + '/flaky'
+
+    response, attempts = get_through(policy, client, url)
+    assert response.status == 200
+    assert response.text() == '200\n'
+    assert attempts == 3
+    assert len(sleeps) == 2
+    assert breaker.state(host_of(url)) == CLOSED
+
+
+def test_server_retry_after_is_honored(stand_in, client):
+    scripts, base = stand_in
+    scripts['/throttled'] = [(429, {'Retry-After': '2'}), (200, {})]
+    policy, sleeps = make_policy(max_attempts=3)
+
+    response, attempts = get_through(policy, client, base + '/throttled')
+    assert response.status == 200
+    assert attempts == 2
+    assert sleeps == [2.0]
+
+
+def test_server_not_found_is_not_retried(stand_in, client):
+    scripts, base = stand_in
+    scripts['/gone'] = [(404, {})]
+    breaker = CircuitBreaker(failure_threshold=1, clock=Clock())
+    policy, sleeps = make_policy(max_attempts=3, breaker=breaker)
+    url = base + '/gone'
+
+    response, attempts = get_through(policy, client, url)
+    assert response.status == 404
+    assert attempts == 1
+    assert sleeps == []
+    assert breaker.state(host_of(url)) == CLOSED
+
+
+def test_server_outage_opens_circuit_then_one_probe_closes_it(stand_in, client):
+    scripts, base = stand_in
+    scripts['/down'] = [(500, {})]
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=4, reset_timeout=30, clock=clock)
+    policy, _ = make_policy(max_attempts=3, breaker=breaker)
+    url = base + '/down'
+    host = host_of(url)
+
+    response, attempts = get_through(policy, client, url)
+    assert (response.status, attempts) == (500, 3)
+    assert breaker.state(host) == CLOSED
+
+    # The fourth consecutive failure opens the circuit mid-call
+    with pytest.raises(CircuitOpenError):
+        get_through(policy, client, url)
+    assert breaker.state(host) == OPEN
+    with pytest.raises(CircuitOpenError):
+        get_through(policy, client, url)
+
+    scripts['/down'] = [(200, {})]
+    clock.now = 30
+    assert breaker.state(host) == HALF_OPEN
+    breaker.before_request(host)  # Another worker's probe is in flight
+    with pytest.raises(CircuitOpenError):
+        get_through(policy, client, url)
+
+    breaker.record_failure(host)  # That probe failed; wait out a fresh timeout
+    clock.now = 60
+    response, attempts = get_through(policy, client, url)
+    assert (response.status, attempts) == (200, 1)
+    assert breaker.state(host) == CLOSED
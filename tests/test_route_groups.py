@@ -0,0 +1,104 @@
+"""Tests for route_groups.py."""
+
+import random
+
+import pytest
+
+from route_groups import OUTLYING_NAME, dbscan, group_stops, project, split_group
+from route_planner import Stop
+from sales import Sale
+
+DETROIT = (42.33, -83.05)
+
+
+def seeded_points(seed: int, count: int):
+    """A few dense towns, a sparse spread between them and duplicate points."""
+    rng = random.Random(seed)
+    towns = [(DETROIT[0] + rng.uniform(-0.6, 0.6), DETROIT[1] + rng.uniform(-0.8, 0.8))
+             for _ in range(6)]
+    points = []
+    for n in range(count):
+        if n % 3 == 0:
+            points.append((DETROIT[0] + rng.uniform(-0.8, 0.8), DETROIT[1] + rng.uniform(-1.0, 1.0)))
+        elif n % 7 == 0 and points:
+            points.append(points[-1])  # Sales sharing a ZIP centroid
+        else:
+            lat, lon = rng.choice(towns)
+            points.append((lat + rng.gauss(0, 0.03), lon + rng.gauss(0, 0.04)))
+    return points
+
+
+def naive_dbscan(xy, link, min_points):
+    """Textbook DBSCAN by all-pairs distances; border points report every cluster they touch."""
+    n = len(xy)
+    link_sq = link * link
+    neighbors = [[j for j in range(n)
+                  if (xy[i][0] - xy[j][0]) ** 2 + (xy[i][1] - xy[j][1]) ** 2 <= link_sq]
+                 for i in range(n)]
+    core = [len(neighbors[i]) >= min_points for i in range(n)]
+
+    labels = [-1] * n
+    clusters = 0
+    for i in range(n):
+        if not core[i] or labels[i] != -1:
+            continue
+        labels[i] = clusters
+        stack = [i]
+        while stack:
+            for j in neighbors[stack.pop()]:
+                if core[j] and labels[j] == -1:
+                    labels[j] = clusters
+                    stack.append(j)
+        clusters += 1
+
+    border_options = [
+        {labels[j] for j in neighbors[i] if core[j]} if not core[i] else {labels[i]}
+        for i in range(n)
+    ]
+    return labels, core, border_options
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('link, min_points', [(0.5, 2), (1.5, 3), (4.0, 2), (4.0, 5), (10.0, 4)])
+def test_grid_dbscan_equals_naive_dbscan(seed, link, min_points):
+    xy = project(seeded_points(seed, 400))
+
+    labels = dbscan(xy, link, min_points)
+    expected, core, options = naive_dbscan(xy, link, min_points)
+
+    for i, label in enumerate(labels):
+        if core[i]:
+            assert label == expected[i]  # Same clusters, numbered the same way
+        elif options[i]:
+            assert label in options[i]  # A border point joins one of its core neighbors
+        else:
+            assert label == -1
+    assert len(set(labels) - {-1}) == len(set(expected) - {-1})
+
+
+def test_split_group_respects_the_size_limit():
+    xy = project(seeded_points(4, 300))
+    members = list(range(len(xy)))
+
+    parts = split_group(xy, members, max_size=8)
+    assert sorted(i for part in parts for i in part) == members
+    # Only points stacked at one spot may exceed the limit
+    for part in parts:
+        assert len(part) <= 8 or len({xy[i] for i in part}) == 1
+
+
+def test_group_stops_orders_groups_and_collects_outliers():
+    points = seeded_points(5, 120) + [(45.0, -85.0)]
+    stops = [Stop(Sale(f'Sale {n}', f'{n} Main St', 'Troy', 'MI', '48083', ''), lat, lon, 'street')
+             for n, (lat, lon) in enumerate(points)]
+
+    groups = group_stops(stops, DETROIT, link_miles=2.0, max_size=8)
+
+    assert sorted(stop.sale.name for group in groups for stop in group.stops) == \
+        sorted(stop.sale.name for stop in stops)
+    regular = [group for group in groups if not group.outlying]
+    assert all(len(group.stops) <= 8 or len({(s.lat, s.lon) for s in group.stops}) == 1
+               for group in regular)
+    assert [g.nearest_miles for g in regular] == sorted(g.nearest_miles for g in regular)
+    assert groups[-1].name == OUTLYING_NAME
+    assert stops[-1] in groups[-1].stops
@@ -0,0 +1,82 @@
+"""Tests for route_planner.py."""
+
+import itertools
+import random
+
+import pytest
+
+from route_planner import Stop, distance_matrix, nearest_neighbors, plan_route, two_opt
+from sales import Sale
+
+START = (42.58, -83.25)
+
+
+def make_stops(seed: int, count: int):
+    rng = random.Random(seed)
+    return [Stop(Sale(f'Sale {n}', f'{n} Main St', 'Troy', 'MI', '48083', ''),
+                 START[0] + rng.uniform(-0.3, 0.3), START[1] + rng.uniform(-0.4, 0.4), 'street')
+            for n in range(count)]
+
+
+def route_miles(dist, order, round_trip):
+    """Miles from node 0 through order (stop node numbers), home again if round_trip."""
+    nodes = [0] + order + ([0] if round_trip else [])
+    return sum(dist[a][b] for a, b in zip(nodes, nodes[1:]))
+
+
+def nearest_neighbor_miles(dist, round_trip):
+    unvisited = set(range(1, len(dist)))
+    order, current = [], 0
+    while unvisited:
+        current = min(unvisited, key=lambda j: (dist[current][j], j))
+        unvisited.remove(current)
+        order.append(current)
+    return route_miles(dist, order, round_trip)
+
+
+def planned_order(route, stops):
+    return [stops.index(stop) + 1 for stop in route.stops]
+
+
+@pytest.mark.parametrize('round_trip', [False, True])
+@pytest.mark.parametrize('seed, count', [(1, 12), (2, 40), (3, 120)])
+def test_route_is_no_longer_than_nearest_neighbor(seed, count, round_trip):
+    stops = make_stops(seed, count)
+    dist = distance_matrix([START] + [(stop.lat, stop.lon) for stop in stops])
+
+    route = plan_route(START, stops, round_trip=round_trip)
+
+    assert sorted(planned_order(route, stops)) == list(range(1, count + 1))
+    assert len(route.legs) == count + (1 if round_trip else 0)
+    assert route.total_miles == pytest.approx(route_miles(dist, planned_order(route, stops), round_trip))
+    assert route.total_miles <= nearest_neighbor_miles(dist, round_trip) + 1e-9
+
+
+@pytest.mark.parametrize('round_trip', [False, True])
+@pytest.mark.parametrize('seed', [4, 5, 6])
+def test_small_route_is_optimal(seed, round_trip):
+    stops = make_stops(seed, 7)
+    dist = distance_matrix([START] + [(stop.lat, stop.lon) for stop in stops])
+    best = min(route_miles(dist, list(order), round_trip)
+               for order in itertools.permutations(range(1, 8)))
+
+    assert plan_route(START, stops, round_trip=round_trip).total_miles == pytest.approx(best)
+
+
+def test_two_opt_uncrosses_a_tour():
+    # Square corners visited in a crossing order: 0 -> 2 -> 1 -> 3 -> end
+    points = [(0.0, 0.0), (0.0, 0.1), (0.1, 0.0), (0.1, 0.1)]
+    dist = distance_matrix(points)
+    dist = [row + [0.0] for row in dist] + [[0.0] * 5]  # Open route: free virtual end
+    tour = [0, 2, 1, 3, 4]
+
+    assert two_opt(tour, dist, nearest_neighbors(dist))
+    assert tour in ([0, 1, 3, 2, 4], [0, 2, 3, 1, 4])
+
+
+def test_empty_and_single_stop_routes():
+    assert plan_route(START, []).stops == []
+    stop = make_stops(7, 1)
+    route = plan_route(START, stop, round_trip=True)
+    assert route.stops == stop
+    assert route.legs[0] == pytest.approx(route.legs[1])
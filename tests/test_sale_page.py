@@ -0,0 +1,72 @@
+"""Tests for sale_page.py."""
+
+from sale_page import extract_sale_info, synthetic_page
+
+MICRODATA_PAGE = '''<html><head><title>Troy Moving Sale | EstateSales.NET</title></head>
+<body><h1>Troy Moving Sale</h1>
+<div itemprop="address" itemscope>
+  <span itemprop="streetAddress">12 Main St</span>,
+  <span itemprop="addressLocality">Troy</span>,
+  <span itemprop="addressRegion">MI</span>
+  <span itemprop="postalCode">48084</span>
+</div></body></html>'''
+
+META_PAGE = '''<html><head>
+<meta property="og:title" content="Lake Orion Estate Sale">
+<meta property="og:street-address" content="55 Lake Shore Dr">
+<meta property="og:locality" content="Lake Orion">
+<meta property="og:region" content="MI">
+<meta property="og:postal-code" content="48362">
+</head><body><p>Call 248-555-0199, lot 90210.</p></body></html>'''
+
+
+def test_json_ld_page():
+    info = extract_sale_info(synthetic_page(7))
+
+    assert info == {
+        'title': 'Birmingham Estate Sale 7',
+        'address': '7 Chapin St',
+        'city': 'Birmingham',
+        'state': 'MI',
+        'zip': '48009',
+    }
+
+
+def test_microdata_page():
+    info = extract_sale_info(MICRODATA_PAGE)
+
+    assert info == {
+        'title': 'Troy Moving Sale',
+        'address': '12 Main St',
+        'city': 'Troy',
+        'state': 'MI',
+        'zip': '48084',
+    }
+
+
+def test_open_graph_page():
+    info = extract_sale_info(META_PAGE)
+
+    assert info['title'] == 'Lake Orion Estate Sale'
+    assert (info['address'], info['city'], info['state'], info['zip']) == \
+        ('55 Lake Shore Dr', 'Lake Orion', 'MI', '48362')
+
+
+def test_structured_data_wins_over_page_text():
+    page = ('<script>var decoy = {"streetAddress": "1 Wrong Way"};</script>'
+            '<div class="sale-address">9 Elm St, Troy, MI 48098</div>'
+            '<span itemprop="streetAddress">9 Elm Street</span>')
+
+    assert extract_sale_info(page)['address'] == '9 Elm Street'
+
+
+def test_zip_fallback_needs_a_state_before_it():
+    page = '<p>Ref 90210. Call 248-555-0199.</p><p>Troy, MI 48098</p>'
+    assert extract_sale_info(page)['zip'] == '48098'
+
+    assert extract_sale_info('<p>Lot 90210, 12000 BTU</p>')['zip'] is None
+
+
+def test_no_page():
+    assert extract_sale_info(None) is None
+    assert extract_sale_info('') is None
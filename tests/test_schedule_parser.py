@@ -0,0 +1,42 @@
+"""Tests for schedule_parser.py."""
+
+import pytest
+
+from schedule_parser import parse_schedule
+
+
+@pytest.mark.parametrize('description', [
+    'Sun 10am-2pm 50% off',
+    'Sun 50% off 10am-2pm',
+    'Sun (50% OFF) 10am-2pm',
+])
+def test_discount_and_hours_in_either_order(description):
+    schedule = parse_schedule(description)
+
+    assert schedule.day_names() == ['Sunday']
+    sunday = schedule.day('Sunday')
+    assert (sunday.opens, sunday.closes) == (10 * 60, 14 * 60)
+    assert sunday.discount == 50
+    assert sunday.discount_note == ''
+
+
+def test_discount_condition_keeps_its_note_around_the_hours():
+    sunday = parse_schedule('Sun 50% off most items 10am-2pm, Mon 9-3').day('Sunday')
+
+    assert (sunday.opens, sunday.closes, sunday.discount_note) == (600, 840, 'most items')
+
+
+def test_discount_window_after_the_hours_stays_a_note():
+    saturday = parse_schedule('Sat 9am-4pm (50% off 12pm-3pm)').day('Saturday')
+
+    assert (saturday.opens, saturday.closes) == (9 * 60, 16 * 60)
+    assert saturday.discount_note == '12pm-3pm'
+
+
+def test_day_ranges_notes_and_any_percentage():
+    schedule = parse_schedule('Fri-Sun 9am-2pm (40% OFF select items) | Cash only; 75% off Sunday')
+
+    assert schedule.day_names() == ['Friday', 'Saturday', 'Sunday']
+    assert {hours.discount for hours in schedule.days} == {40}
+    assert schedule.notes == 'Cash only; 75% off Sunday'
+    assert schedule.best_discount == 75
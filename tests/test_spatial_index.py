@@ -0,0 +1,92 @@
+"""Tests for spatial_index.py."""
+
+import random
+
+import pytest
+
+from geocoder import haversine_miles
+from spatial_index import SpatialIndex, _in_box, geohash
+
+DETROIT = (42.33, -83.05)
+
+
+def random_points(seed: int, count: int):
+    """Points clustered around Detroit, scattered worldwide and near the antimeridian and poles."""
+    rng = random.Random(seed)
+    points = []
+    for n in range(count):
+        kind = n % 4
+        if kind == 0:
+            point = (DETROIT[0] + rng.gauss(0, 0.3), DETROIT[1] + rng.gauss(0, 0.3))
+        elif kind == 1:
+            point = (rng.uniform(-90, 90), rng.uniform(-180, 180))
+        elif kind == 2:
+            point = (rng.uniform(-60, 60), rng.choice((-1, 1)) * rng.uniform(178, 180))
+        else:
+            point = (rng.choice((-1, 1)) * rng.uniform(85, 90), rng.uniform(-180, 180))
+        points.append(point)
+    return points
+
+
+@pytest.fixture(scope='module')
+def points():
+    return random_points(7, 4000)
+
+
+@pytest.fixture(scope='module')
+def index(points):
+    return SpatialIndex((lat, lon, n) for n, (lat, lon) in enumerate(points))
+
+
+def scan_radius(points, center, miles):
+    found = [(haversine_miles(center, point), n) for n, point in enumerate(points)]
+    return sorted((distance, n) for distance, n in found if distance <= miles)
+
+
+CENTERS = [DETROIT, (42.9, -82.4), (0.0, 179.9), (-30.0, -179.5), (89.5, 10.0), (-88.0, -120.0)]
+
+
+@pytest.mark.parametrize('center', CENTERS)
+@pytest.mark.parametrize('miles', [0.5, 5, 40, 300, 2500])
+def test_radius_query_equals_a_full_scan(points, index, center, miles):
+    found = index.within_radius(center, miles)
+
+    assert sorted((distance, n) for distance, n in found) == scan_radius(points, center, miles)
+    assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+@pytest.mark.parametrize('center', CENTERS)
+@pytest.mark.parametrize('k', [1, 3, 25, 400])
+def test_nearest_equals_a_full_scan(points, index, center, k):
+    found = index.nearest(center, k)
+    expected = sorted(haversine_miles(center, point) for point in points)[:k]
+
+    assert [distance for distance, _ in found] == pytest.approx(expected)
+    for distance, n in found:
+        assert haversine_miles(center, points[n]) == distance
+
+
+def test_nearest_with_fewer_points_than_k():
+    index = SpatialIndex([(42.0, -83.0, 'a'), (-42.0, 97.0, 'b')])
+
+    assert [item for _, item in index.nearest(DETROIT, 5)] == ['a', 'b']
+    assert index.nearest(DETROIT, 0) == []
+    assert SpatialIndex([]).nearest(DETROIT, 3) == []
+
+
+@pytest.mark.parametrize('box', [
+    (42.0, -83.5, 42.6, -82.5),
+    (-10.0, 170.0, 10.0, -170.0),  # Crosses the antimeridian
+    (80.0, -180.0, 90.0, 180.0),
+    (-90.0, -180.0, 90.0, 180.0),
+])
+def test_box_query_equals_a_full_scan(points, index, box):
+    expected = {n for n, (lat, lon) in enumerate(points) if _in_box(lat, lon, box)}
+
+    assert set(index.in_box(*box)) == expected
+
+
+def test_geohash_matches_reference_values():
+    # Published examples for the standard base-32 geohash
+    assert geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geohash(42.605, -5.603, 5) == 'ezs42'
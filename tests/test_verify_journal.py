@@ -0,0 +1,119 @@
+"""Tests for verify_journal.py."""
+
+import json
+
+import verify_urls
+from verify_journal import VerificationJournal
+
+KML_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2"><Document>
+{placemarks}
+</Document></kml>'''
+
+PLACEMARK_TEMPLATE = '''<Placemark>
+  <name>Sale {n}</name>
+  <address>{n} Main St, Troy, MI 48083</address>
+  <description><![CDATA[<a href="https://example.com/sale/{n}">Listing</a>]]></description>
+</Placemark>'''
+
+
+def placemark(n: int, name: str = None) -> dict:
+    return {
+        'name': name or f'Sale {n}',
+        'street': f'{n} Main St',
+        'city': 'Troy',
+        'state': 'MI',
+        'zip': '48083',
+        'url': f'https://example.com/sale/{n}',
+    }
+
+
+SUCCESS = {'status': 'success', 'matches': {}, 'web_info': {}}
+FAILURE = {'status': 'error', 'error': 'HTTP 503', 'matches': {}}
+
+
+def test_resume_reads_back_recorded_results(tmp_path):
+    path = tmp_path / 'run.verify.jsonl'
+    with VerificationJournal(path) as journal:
+        journal.record(placemark(1), SUCCESS)
+        journal.record(placemark(2), FAILURE)
+
+    with VerificationJournal(path, resume=True) as journal:
+        assert journal.resumed == 2
+        assert journal.is_verified(placemark(1))
+        assert not journal.is_verified(placemark(2))  # Failed fetches are retried
+        assert journal.result_for(placemark(2)) == FAILURE
+        # A changed KML entry has a different hash, so it is verified again
+        assert journal.result_for(placemark(1, name='Renamed Sale')) is None
+
+
+def test_without_resume_the_journal_starts_afresh(tmp_path):
+    path = tmp_path / 'run.verify.jsonl'
+    with VerificationJournal(path) as journal:
+        journal.record(placemark(1), SUCCESS)
+
+    with VerificationJournal(path) as journal:
+        assert journal.resumed == 0
+        assert not journal.is_verified(placemark(1))
+    assert path.read_text() == ''
+
+
+def test_truncated_last_line_is_ignored_and_not_extended(tmp_path):
+    path = tmp_path / 'run.verify.jsonl'
+    with VerificationJournal(path) as journal:
+        journal.record(placemark(1), SUCCESS)
+        journal.record(placemark(2), SUCCESS)
+    # Killed half-way through writing the second line
+    text = path.read_text()
+    path.write_text(text[:len(text) - 20])
+
+    with VerificationJournal(path, resume=True) as journal:
+        assert journal.resumed == 1
+        assert journal.is_verified(placemark(1))
+        assert not journal.is_verified(placemark(2))
+        journal.record(placemark(2), SUCCESS)
+
+    # The new record went on its own line, so the next resume sees it
+    with VerificationJournal(path, resume=True) as journal:
+        assert journal.is_verified(placemark(2))
+    lines = path.read_text().splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[2])['url'] == placemark(2)['url']
+
+
+def test_later_lines_replace_earlier_ones(tmp_path):
+    path = tmp_path / 'run.verify.jsonl'
+    with VerificationJournal(path) as journal:
+        journal.record(placemark(1), FAILURE)
+        journal.record(placemark(1), SUCCESS)
+
+    with VerificationJournal(path, resume=True) as journal:
+        assert journal.resumed == 1
+        assert journal.result_for(placemark(1)) == SUCCESS
+
+
+def test_verify_all_urls_resumes_where_it_stopped(tmp_path, monkeypatch, capsys):
+    kml_path = tmp_path / 'sales.kml'
+    kml_path.write_text(KML_TEMPLATE.format(
+        placemarks='\n'.join(PLACEMARK_TEMPLATE.format(n=n) for n in range(1, 5))))
+    journal_path = tmp_path / 'sales.verify.jsonl'
+
+    # An earlier run finished sales 1 and 3 and failed on 2
+    with VerificationJournal(journal_path) as journal:
+        journal.record(placemark(1), SUCCESS)
+        journal.record(placemark(2), FAILURE)
+        journal.record(placemark(3), SUCCESS)
+
+    fetched = []
+
+    def verify(pm, rate_limiter=None):
+        fetched.append(pm['url'])
+        return SUCCESS
+
+    monkeypatch.setattr(verify_urls, 'verify_sale', verify)
+    verify_urls.verify_all_urls(kml_path, delay=0, journal_path=journal_path, resume=True)
+
+    assert fetched == [placemark(2)['url'], placemark(4)['url']]
+    assert 'Resuming from' in capsys.readouterr().out
+    with VerificationJournal(journal_path, resume=True) as journal:
+        assert all(journal.is_verified(placemark(n)) for n in range(1, 5))
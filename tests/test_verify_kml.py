@@ -0,0 +1,23 @@
+"""Tests for verify_kml.py."""
+
+import sys
+
+import pytest
+
+import verify_kml
+
+
+@pytest.mark.parametrize('argv', [
+    ['a.csv', 'a.md', 'a.kml', '--diff-json'],
+    ['--diff-json', '--other', 'a.csv', 'a.md', 'a.kml'],
+])
+def test_diff_json_without_a_path_prints_usage(monkeypatch, capsys, argv):
+    monkeypatch.setattr(sys, 'argv', ['verify_kml.py'] + argv)
+
+    with pytest.raises(SystemExit) as exited:
+        verify_kml.main()
+
+    assert exited.value.code == 1
+    out = capsys.readouterr().out
+    assert 'Error: --diff-json needs a path' in out
+    assert 'Usage: python verify_kml.py' in out
@@ -0,0 +1,137 @@
+"""Tests for verify_urls.py."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+import retry_policy
+import verify_urls
+from cache_store import MemoryCacheStore
+from http_client import HTTPClient
+from rate_limiter import HostRateLimiter
+from retry_policy import RetryPolicy
+from sale_page import synthetic_page
+
+DELAY = 0.1
+
+
+def test_concurrent_results_keep_placemark_order(monkeypatch):
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+    pulled = []
+
+    def slow_verify(placemark, rate_limiter=None):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        # Later placemarks finish first
+        time.sleep(0.002 * (20 - placemark['n']))
+        with lock:
+            running[0] -= 1
+        return {'status': 'ok', 'n': placemark['n']}
+
+    def placemarks():
+        for n in range(20):
+            pulled.append(n)
+            yield {'n': n, 'url': f'https://example.com/{n}'}
+
+    seen = []
+
+    def on_result(index, placemark, result):
+        # Never more than 2 * workers placemarks read ahead of the results
+        assert len(pulled) - index <= 2 * 4
+        seen.append((index, placemark['n'], result['n']))
+
+    monkeypatch.setattr(verify_urls, 'verify_sale', slow_verify)
+    results = verify_urls.verify_placemarks(placemarks(), workers=4, on_result=on_result)
+
+    assert [entry['placemark']['n'] for entry in results] == list(range(20))
+    assert [entry['result']['n'] for entry in results] == list(range(20))
+    assert seen == [(i + 1, i, i) for i in range(20)]
+    assert 1 < peak[0] <= 4
+
+
+class ListingServer:
+    """Local server answering /sale/<n> with a synthetic listing page."""
+
+    def __init__(self):
+        self.arrivals = {}  # Host header -> request arrival times
+        self.running = 0
+        self.peak = 0
+        lock = threading.Lock()
+        listing = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with lock:
+                    listing.arrivals.setdefault(self.headers['Host'], []).append(time.monotonic())
+                    listing.running += 1
+                    listing.peak = max(listing.peak, listing.running)
+                time.sleep(0.02)  # Network latency for workers to overlap
+                body = synthetic_page(int(self.path.rsplit('/', 1)[1])).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    listing.running -= 1
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_port
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def listings(monkeypatch):
+    client = HTTPClient(validator_store=MemoryCacheStore())
+    monkeypatch.setattr(http_client, '_default_client', client)
+    monkeypatch.setattr(retry_policy, '_default_policy', RetryPolicy(max_attempts=1))
+    server = ListingServer()
+    yield server
+    server.close()
+    client.close()
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_verifies_real_pages_in_order_with_per_host_pacing(listings, workers):
+    # Two host names for the same server get separate request budgets
+    hosts = [f'127.0.0.1:{listings.port}', f'localhost:{listings.port}']
+    placemarks = [{
+        'name': f'Birmingham Estate Sale {n}',
+        'street': f'{n} Chapin St',
+        'city': 'Birmingham',
+        'state': 'MI',
+        'zip': '48009',
+        'url': f'http://{hosts[n % 2]}/sale/{n}',
+    } for n in range(12)]
+
+    results = verify_urls.verify_placemarks(
+        placemarks, rate_limiter=HostRateLimiter.from_delay(DELAY), workers=workers)
+
+    assert [entry['placemark'] for entry in results] == placemarks
+    for n, entry in enumerate(results):
+        assert entry['result']['status'] == 'success'
+        assert entry['result']['web_info']['address'] == f'{n} Chapin St'
+        assert all(entry['result']['matches'].values())
+
+    assert sorted(listings.arrivals) == sorted(hosts)
+    for arrivals in listings.arrivals.values():
+        assert len(arrivals) == 6
+        gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+        assert min(gaps) >= DELAY * 0.8
+    if workers > 1:
+        assert listings.peak > 1
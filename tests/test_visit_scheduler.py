@@ -0,0 +1,112 @@
+"""Tests for visit_scheduler.py."""
+
+import random
+
+import pytest
+
+from route_planner import Stop
+from sales import Sale
+from visit_scheduler import day_windows, parse_clock, plan_visits
+
+CENTER = (42.58, -83.24)
+
+
+def make_stops(seed: int, count: int, spread: float = 0.1):
+    rng = random.Random(seed)
+    stops = []
+    for n in range(count):
+        opens = rng.choice(['8am', '9am', '10am', '11am', '1pm'])
+        closes = rng.choice(['11:30am', '12pm', '2pm', '3pm', '4pm'])
+        description = f"Sat {opens}-{closes}"
+        if rng.random() < 0.3:
+            description += f", Sat {rng.choice(['11am', '12pm', '1pm'])}-{closes} (50% OFF)"
+        sale = Sale(f'Sale {n}', f'{n} Main St', 'Troy', 'MI', '48083', description)
+        stops.append(Stop(sale, CENTER[0] + rng.uniform(-spread, spread),
+                          CENTER[1] + rng.uniform(-spread, spread), 'street'))
+    return stops
+
+
+def assert_within_hours(plan, dwell):
+    for visit in plan.visits:
+        opens, closes, _, _, _ = day_windows(visit.stop.sale, 'Saturday')
+        assert visit.start >= visit.arrive
+        assert visit.start >= opens
+        assert visit.leave == pytest.approx(visit.start + dwell)
+        assert visit.leave <= closes + 1e-6
+
+
+@pytest.mark.parametrize('round_trip', [False, True])
+@pytest.mark.parametrize('seed, count, dwell', [(1, 8, 20), (2, 20, 20), (3, 40, 15), (4, 80, 5)])
+def test_visits_stay_within_opening_hours(seed, count, dwell, round_trip):
+    stops = make_stops(seed, count)
+
+    plan = plan_visits(stops, CENTER, 'Saturday', departure=parse_clock('8am'), dwell=dwell,
+                       speed_mph=25, round_trip=round_trip)
+
+    assert_within_hours(plan, dwell)
+    # Every stop is either visited once or reported with a reason
+    planned = [visit.stop for visit in plan.visits] + [stop for stop, _ in plan.skipped]
+    assert sorted(stop.sale.name for stop in planned) == sorted(stop.sale.name for stop in stops)
+    assert all(reason for _, reason in plan.skipped)
+    for before, after in zip(plan.visits, plan.visits[1:]):
+        assert after.arrive >= before.leave
+
+
+def test_overbooked_day_leaves_stops_out_instead_of_running_late():
+    # Far more stops than fit in a morning, spread out so driving takes real time
+    stops = make_stops(5, 30, spread=0.4)
+
+    plan = plan_visits(stops, CENTER, 'Saturday', departure=parse_clock('9am'), dwell=30)
+
+    assert plan.skipped
+    assert_within_hours(plan, 30)
+
+
+def test_plans_are_repeatable():
+    stops = make_stops(6, 40)
+
+    first = plan_visits(stops, CENTER, 'Saturday', dwell=10)
+    second = plan_visits(stops, CENTER, 'Saturday', dwell=10)
+    assert [v.stop.sale.name for v in first.visits] == [v.stop.sale.name for v in second.visits]
+    assert first.skipped == second.skipped
+
+
+def test_waits_for_a_discount_window_when_it_is_worth_it():
+    sale = Sale('Half Off', '1 Main St', 'Troy', 'MI', '48083', 'Sat 9am-4pm, Sat 10am-4pm (50% OFF)')
+    stops = [Stop(sale, CENTER[0] + 0.01, CENTER[1], 'street')]
+
+    # A ten minute wait is worth 50% off
+    visit, = plan_visits(stops, CENTER, 'Saturday', departure=parse_clock('9:45am'), dwell=20).visits
+    assert (visit.start, visit.discount) == (parse_clock('10am'), 50)
+
+    # An hour is not, at the default weight
+    visit, = plan_visits(stops, CENTER, 'Saturday', departure=parse_clock('9am'), dwell=20).visits
+    assert visit.start == visit.arrive < parse_clock('10am')
+    assert visit.discount == 0
+
+
+def test_left_out_stops_say_why_they_do_not_fit():
+    # Two one-hour sales at the same spot: only one 40 minute visit fits
+    stops = [Stop(Sale(name, '1 Main St', 'Troy', 'MI', '48083', 'Sat 9am-10am'), *CENTER, 'street')
+             for name in ('First Sale', 'Second Sale')]
+
+    plan = plan_visits(stops, CENTER, 'Saturday', departure=parse_clock('9am'), dwell=40)
+
+    (visit,), ((skipped, reason),) = plan.visits, plan.skipped
+    assert visit.stop is not skipped
+    assert reason in (
+        f"fitting it in would make {visit.stop.sale.name} run 20 min past its 10am closing",
+        "closes at 10am; squeezed in between the other visits it could not be left before 10:20am",
+    )
+
+
+def test_search_budget_still_gives_a_valid_plan():
+    stops = make_stops(7, 60)
+
+    capped = plan_visits(stops, CENTER, 'Saturday', dwell=10, max_moves=0)
+    full = plan_visits(stops, CENTER, 'Saturday', dwell=10)
+
+    assert_within_hours(capped, 10)
+    assert len(capped.visits) + len(capped.skipped) == len(stops)
+    assert len(capped.visits) <= len(full.visits)
+    assert all(reason != "no time left for it in this route" for _, reason in full.skipped)